@@ -4,10 +4,9 @@ GNN Fraud Rings - graph from real transactions only.
 from typing import List, Any
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 
 from app.core.dependencies import get_db, get_current_active_user
-from app.db.models import Transaction as TransactionModel
+from app.db import queries
 
 router = APIRouter()
 
@@ -24,9 +23,7 @@ async def get_gnn_clusters(
     GET /api/v1/gnn/clusters
     Build graph from real transactions only. Returns 404 if no data.
     """
-    q = select(TransactionModel).where(TransactionModel.user_id == current_user.id)
-    r = await db.execute(q)
-    rows = r.scalars().all()
+    rows = await queries.user_graph_edges(db, current_user.id)
 
     if not rows:
         return {"nodes": [], "edges": [], "clusters": []}
@@ -41,6 +41,15 @@ async def detailed_health_check(db: AsyncSession = Depends(get_db)):
         async with httpx.AsyncClient(timeout=5.0) as client:
             r = await client.get(f"{settings.ML_SERVICE_URL}/health")
             components["ml_service"] = {"status": "healthy" if r.status_code == 200 else "unhealthy"}
+            if r.status_code == 200:
+                from app.services import feature_schema
+                remote = r.json().get("feature_schema")
+                if remote != feature_schema.schema_info():
+                    components["ml_service"] = {
+                        "status": "unhealthy",
+                        "error": f"feature schema mismatch: backend {feature_schema.schema_info()}, ml {remote}",
+                    }
+                    status_val = "degraded"
     except Exception as e:
         components["ml_service"] = {"status": "unhealthy", "error": str(e)}
         status_val = "degraded"
@@ -66,6 +75,29 @@ def get_metrics():
     raise HTTPException(status_code=501, detail="Metrics pipeline not implemented")
 
 
+@router.get("/caches", tags=["Health"])
+def cache_stats():
+    """Hit / miss / eviction counters of the in-process profile caches and velocity counters."""
+    from app.services.profile_cache import cache_stats as profile_cache_stats
+    from app.services.velocity import tracker as velocity_tracker
+    return {
+        "enabled": settings.PROFILE_CACHE_ENABLED,
+        "caches": profile_cache_stats(),
+        "velocity": velocity_tracker.stats(),
+    }
+
+
+@router.get("/upstreams", tags=["Health"])
+def upstream_stats():
+    """Per-upstream (ML, explain) connection reuse and circuit breaker state; the embedded scorer's executor."""
+    from app.services import upstream
+    stats = upstream.stats()
+    if settings.SCORING_BACKEND == "embedded":
+        from app.services.embedded_ml import get_embedded_ml
+        stats["embedded_ml"] = get_embedded_ml().stats()
+    return stats
+
+
 @router.get("/status", tags=["Health"])
 def service_status():
     """Service status from config only."""
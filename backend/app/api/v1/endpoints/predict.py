@@ -9,7 +9,9 @@ from loguru import logger
 
 from app.core.dependencies import get_db, get_current_active_user, get_ml_client
 from app.schemas.transaction import PredictFraudRequest, PredictFraudResponse, ModelScores
-from app.services.scoring_orchestrator import ScoringOrchestrator
+from app.services.scoring_orchestrator import ScoringOrchestrator, scored_by_models
+from app.services.behavior_stats import record_transaction
+from app.services import entity_sketches, feature_store
 from app.db.models import Transaction as TransactionModel, Alert, Explanation
 from app.db.session import AsyncSessionLocal
 
@@ -87,6 +89,15 @@ async def predict_fraud(
             )
             persist_session.add(db_txn)
             await persist_session.flush()
+            stats = None
+            if scored_by_models(result):  # a fallback score is not the user's risk history
+                stats = await record_transaction(
+                    persist_session, current_user.id, db_txn.amount, db_txn.transaction_time,
+                    db_txn.is_fraudulent, db_txn.risk_score,
+                )
+            sketches = await entity_sketches.record_transaction(
+                persist_session, current_user.id, db_txn.merchant_id, db_txn.device_id, body.ip_address,
+            )
             if result.get("explanation"):
                 expl = result["explanation"]
                 persist_session.add(
@@ -110,6 +121,7 @@ async def predict_fraud(
                     )
                 )
             await persist_session.commit()
+            await feature_store.record_transaction(db_txn, stats, sketches)
             # Publish event for real-time clients
             try:
                 from app.services.broadcaster import publish
@@ -154,4 +166,5 @@ async def predict_fraud(
             isolation_forest=float(ml_results.get("iforest_score", 0.0)),
             gnn=float(ml_results.get("graph_risk_score", 0.0)),
         ),
+        pipeline=result.get("pipeline"),
     )
@@ -14,7 +14,10 @@ from app.schemas.transaction import (
     TransactionCreate, TransactionResponse, TransactionListResponse,
     FraudAlertResponse, TransactionStats, FraudTrend,
 )
-from app.services.scoring_orchestrator import ScoringOrchestrator
+from app.services.scoring_orchestrator import ScoringOrchestrator, scored_by_models
+from app.services.behavior_stats import record_transaction
+from app.services import entity_sketches, feature_store
+from app.db import queries
 from app.db.models import Transaction as TransactionModel, Alert, Explanation, User
 
 router = APIRouter()
@@ -66,6 +69,15 @@ async def analyze_transaction(
         )
         db.add(db_txn)
         await db.flush()
+        stats = None
+        if scored_by_models(result):  # a fallback score is not the user's risk history
+            stats = await record_transaction(
+                db, current_user.id, db_txn.amount, db_txn.transaction_time,
+                db_txn.is_fraudulent, db_txn.risk_score,
+            )
+        sketches = await entity_sketches.record_transaction(
+            db, current_user.id, db_txn.merchant_id, db_txn.device_id, transaction.ip_address,
+        )
         if result.get("explanation"):
             expl = result["explanation"]
             db.add(
@@ -89,6 +101,7 @@ async def analyze_transaction(
                 )
             )
         await db.commit()
+        await feature_store.record_transaction(db_txn, stats, sketches)
     except Exception as e:
         logger.error(f"DB write failed: {e}")
         await db.rollback()
@@ -107,6 +120,7 @@ async def analyze_transaction(
         explanation=result.get("explanation"),
         timestamp=datetime.now().isoformat(),
         recommended_action=_recommended_action(result["risk_level"]),
+        pipeline=result.get("pipeline"),
     )
 
 
@@ -195,36 +209,23 @@ async def get_recent_alerts(
     current_user=Depends(get_current_active_user),
 ):
     """Recent alerts from DB only."""
-    q = (
-        select(Alert)
-        .join(TransactionModel, Alert.transaction_id == TransactionModel.id)
-        .where(and_(TransactionModel.user_id == current_user.id, Alert.status == "pending"))
-        .order_by(desc(Alert.created_at))
-        .limit(limit)
-    )
-    r = await db.execute(q)
-    alerts = r.scalars().all()
-    out = []
-    for a in alerts:
-        rt = await db.execute(select(TransactionModel).where(TransactionModel.id == a.transaction_id))
-        t = rt.scalar_one_or_none()
-        if t:
-            out.append(
-                FraudAlertResponse(
-                    alert_id=str(a.id),
-                    transaction_id=t.transaction_id,
-                    amount=t.amount,
-                    merchant_id=t.merchant_id,
-                    risk_score=t.risk_score,
-                    risk_level=t.risk_level or "low",
-                    alert_type=a.alert_type,
-                    severity=a.severity,
-                    message=a.message,
-                    created_at=a.created_at.isoformat() if a.created_at else "",
-                    status=a.status,
-                )
-            )
-    return out
+    rows = await queries.recent_alerts(db, current_user.id, limit)
+    return [
+        FraudAlertResponse(
+            alert_id=str(a.alert_id),
+            transaction_id=a.transaction_id,
+            amount=a.amount,
+            merchant_id=a.merchant_id,
+            risk_score=a.risk_score,
+            risk_level=a.risk_level or "low",
+            alert_type=a.alert_type,
+            severity=a.severity,
+            message=a.message,
+            created_at=a.created_at.isoformat() if a.created_at else "",
+            status=a.status,
+        )
+        for a in rows
+    ]
 
 
 @router.get("/trends/risk", response_model=List[FraudTrend])
@@ -303,15 +304,9 @@ async def get_transaction(
     current_user=Depends(get_current_active_user),
 ):
     """Single transaction from DB. 404 if not found."""
-    q = select(TransactionModel).where(
-        and_(TransactionModel.transaction_id == transaction_id, TransactionModel.user_id == current_user.id)
-    )
-    r = await db.execute(q)
-    t = r.scalar_one_or_none()
+    t = await queries.transaction_detail(db, current_user.id, transaction_id)
     if not t:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transaction not found")
-    rex = await db.execute(select(Explanation).where(Explanation.transaction_id == t.id))
-    ex = rex.scalar_one_or_none()
     return TransactionResponse(
         transaction_id=t.transaction_id,
         amount=t.amount,
@@ -323,7 +318,14 @@ async def get_transaction(
         risk_level=t.risk_level or "low",
         is_fraudulent=t.is_fraudulent,
         confidence_score=t.confidence_score or 0.0,
-        explanation={"summary": ex.summary, "reasons": ex.reasons or [], "suggested_actions": ex.suggested_actions or []} if ex else None,
+        explanation={
+            "transaction_id": t.transaction_id,
+            "summary": t.summary,
+            "reasons": t.reasons or [],
+            "suggested_actions": t.suggested_actions or [],
+            "confidence": t.explanation_confidence or 0.0,
+            "model_used": t.model_used,
+        } if t.explanation_id else None,
         timestamp=(t.created_at.isoformat() if t.created_at else datetime.now().isoformat()),
         recommended_action=_recommended_action(t.risk_level or "low"),
     )
@@ -337,12 +339,7 @@ async def list_transactions(
     current_user=Depends(get_current_active_user),
 ):
     """List transactions from DB. Real query only."""
-    q = select(TransactionModel).where(TransactionModel.user_id == current_user.id)
-    cnt = await db.execute(select(func.count()).select_from(q.subquery()))
-    total = cnt.scalar() or 0
-    q = q.order_by(desc(TransactionModel.transaction_time)).offset(skip).limit(limit)
-    r = await db.execute(q)
-    rows = r.scalars().all()
+    total, rows = await queries.transaction_page(db, current_user.id, skip, limit)
     items = [
         {
             "transaction_id": t.transaction_id,
@@ -78,19 +78,88 @@ class Settings(BaseSettings):
             self.REDIS_URL = f"redis://{auth}{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         return self
 
+    # =========================
+    # Feature Extraction
+    # =========================
+    # Fetch all DB-backed feature inputs in one statement instead of one query per input
+    FEATURE_EXTRACTION_FUSED: bool = True
+    # Behavioral features from the incrementally maintained user_behavior_stats table
+    USER_BEHAVIOR_STATS_ENABLED: bool = True
+    USER_BEHAVIOR_HALFLIFE_HOURS: float = 168.0
+    # In-process LRU/TTL cache for merchant and device profiles
+    PROFILE_CACHE_ENABLED: bool = True
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 300.0
+    # Device transaction counts change on every write; keep them short-lived
+    DEVICE_COUNT_CACHE_TTL_SECONDS: float = 30.0
+    # Online feature store in Redis, read before Postgres (requires fused extraction + behavior stats)
+    FEATURE_STORE_ENABLED: bool = False
+    FEATURE_STORE_PREFIX: str = "fs"
+    FEATURE_STORE_TTL_SECONDS: int = 86400
+    FEATURE_STORE_TIMEOUT_SECONDS: float = 0.05
+    # In-memory 1m/10m/1h/24h velocity counters per user, device, merchant and IP (~1.5 KB per key)
+    VELOCITY_ENABLED: bool = True
+    VELOCITY_MAX_KEYS: int = 100000
+    VELOCITY_IDLE_TTL_SECONDS: float = 90000.0
+    # Card-testing rule: a user, device or IP at this many transactions in 1m (or 10m) adds to graph_risk_raw
+    VELOCITY_BURST_1M: int = 5
+    VELOCITY_BURST_10M: int = 20
+    VELOCITY_BURST_RISK: float = 0.3
+    # HyperLogLog distinct-count sketches (device/merchant/IP -> users, user -> devices) for graph features
+    ENTITY_SKETCHES_ENABLED: bool = True
+
     # =========================
     # ML Service
     # =========================
     ML_SERVICE_URL: str = "http://localhost:8001"
     ML_MODEL_TIMEOUT: int = 30
+    # One pooled keep-alive client per upstream service (see app.services.upstream)
+    ML_POOL_MAX_CONNECTIONS: int = 100
+    ML_POOL_MAX_KEEPALIVE: int = 20
+    # Comma-separated ML replicas (overrides ML_SERVICE_URL), balanced by outstanding requests
+    ML_SERVICE_URLS: str = ""
+    # Hedged /predict: duplicate a call to a second replica once it outlives this latency percentile
+    ML_HEDGE_ENABLED: bool = True
+    ML_HEDGE_PERCENTILE: float = 95.0
+    ML_HEDGE_MIN_DELAY_MS: float = 10.0
+    # No hedges while this many ML calls are in flight
+    ML_HEDGE_MAX_OUTSTANDING: int = 64
+    # "remote": score over HTTP against the ML service; "embedded": load ml.inference in this process
+    SCORING_BACKEND: str = "remote"
+    # Directory holding the ml package (empty: the repository root above backend/)
+    ML_EMBEDDED_PATH: str = ""
+    # Embedded mode: model calls run on this many threads, refusing new ones past the pending bound
+    ML_EMBEDDED_WORKERS: int = 4
+    ML_EMBEDDED_MAX_PENDING: int = 64
 
     # =========================
     # Explainability Service
     # =========================
     EXPLAIN_SERVICE_URL: str = "http://localhost:8002"
+    EXPLAIN_TIMEOUT: float = 30.0  # LLM generation is slow
+    EXPLAIN_POOL_MAX_CONNECTIONS: int = 20
+    EXPLAIN_POOL_MAX_KEEPALIVE: int = 10
     LLM_MODEL_NAME: str = "llama3"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
 
+    # =========================
+    # Upstream clients
+    # =========================
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # Consecutive failures (errors, timeouts, 5xx) that open an upstream's circuit breaker
+    UPSTREAM_BREAKER_FAILURES: int = 5
+    UPSTREAM_BREAKER_RESET_SECONDS: float = 10.0
+    # Adaptive (AIMD) cap on calls in flight per upstream; excess calls wait, then are shed
+    UPSTREAM_LIMIT_ENABLED: bool = True
+    UPSTREAM_LIMIT_INITIAL: int = 20
+    UPSTREAM_LIMIT_MIN: int = 2
+    UPSTREAM_LIMIT_MAX: int = 200
+    # A call slower than this x the recent minimum latency lowers the limit
+    UPSTREAM_LIMIT_LATENCY_TOLERANCE: float = 2.0
+    UPSTREAM_LIMIT_BACKOFF: float = 0.9
+    UPSTREAM_LIMIT_QUEUE_TIMEOUT_MS: float = 50.0
+    UPSTREAM_LIMIT_MAX_QUEUE: int = 100
+
     # =========================
     # Alerting
     # =========================
@@ -108,6 +177,10 @@ class Settings(BaseSettings):
     RISK_SCORE_HIGH: float = 75.0
     RISK_SCORE_MEDIUM: float = 50.0
     RISK_SCORE_LOW: float = 25.0
+    # Per-transaction scoring deadline shared by the pipeline stages (0: no deadline)
+    SCORING_DEADLINE_MS: float = 0.0
+    # Risk score (0-100) substituted when ML scoring runs out of the deadline; the default routes to review
+    SCORING_FALLBACK_RISK_SCORE: float = 50.0
 
     # =========================
     # Rate Limiting
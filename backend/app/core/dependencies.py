@@ -82,9 +82,9 @@ async def get_current_active_user(
 
 
 def get_ml_client():
-    """ML service client. Fails at call time if service unavailable."""
-    from app.services.ml_client import MLClient
-    return MLClient()
+    """Scoring client for SCORING_BACKEND (remote ML service or embedded). Fails at call time if unavailable."""
+    from app.services.ml_client import scoring_client
+    return scoring_client()
 
 
 def get_explain_client():
@@ -6,7 +6,7 @@ from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
     Column, String, Integer, Float, Boolean, DateTime, 
-    ForeignKey, JSON, Text, BigInteger, Index
+    ForeignKey, JSON, Text, BigInteger, Index, LargeBinary
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.dialects.postgresql import UUID
@@ -87,6 +87,45 @@ class Transaction(Base):
     )
 
 
+class UserBehaviorStats(Base):
+    """Incrementally maintained per-user behavioral aggregates (one row per user)"""
+    __tablename__ = "user_behavior_stats"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    
+    # Welford running mean / sum of squared deviations of amount
+    amount_mean = Column(Float, nullable=False, default=0.0)
+    amount_m2 = Column(Float, nullable=False, default=0.0)
+    
+    # Running sums
+    fraud_count = Column(Integer, nullable=False, default=0)
+    risk_score_sum = Column(Float, nullable=False, default=0.0)
+    first_transaction_time = Column(DateTime)
+    last_transaction_time = Column(DateTime)
+    
+    # Exponentially time-decayed averages
+    decayed_weight = Column(Float, nullable=False, default=0.0)
+    decayed_amount_mean = Column(Float, nullable=False, default=0.0)
+    decayed_risk_score_mean = Column(Float, nullable=False, default=0.0)
+    decayed_at = Column(DateTime)
+    
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
+class EntitySketch(Base):
+    """HyperLogLog distinct-count sketch per entity, e.g. the distinct users seen on a device"""
+    __tablename__ = "entity_sketches"
+    
+    # device_users, merchant_users, user_devices or ip_users
+    kind = Column(String(32), primary_key=True)
+    entity_id = Column(String(100), primary_key=True)
+    # Serialized HyperLogLog registers (sparse while small, see services/entity_sketches.py)
+    sketch = Column(LargeBinary, nullable=False)
+    
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
 class Explanation(Base):
     """LLM-generated explanations for risk scores"""
     __tablename__ = "explanations"
@@ -0,0 +1,117 @@
+"""
+Projection-only queries for hot read paths
+
+Each statement is built once at import from Core table columns and takes
+its values as bind parameters, so:
+
+- only the listed columns are fetched (never the transactions.features
+  JSON blob) and rows come back as plain Row tuples, without ORM entity
+  construction or identity-map bookkeeping;
+- the SQL text is identical on every call, so SQLAlchemy's compiled cache
+  hits and the asyncpg dialect reuses its per-connection prepared
+  statement instead of re-parsing.
+
+Add new hot reads here rather than building select(Model) per request.
+"""
+
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, and_, bindparam, func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Alert, Explanation, Transaction
+
+_txn = Transaction.__table__
+_alert = Alert.__table__
+_explanation = Explanation.__table__
+
+_user_id = bindparam("user_id", type_=_txn.c.user_id.type)
+_limit = bindparam("limit", type_=Integer)
+_offset = bindparam("offset", type_=Integer)
+
+# Behavioral window over a user's most recent transactions (FeatureExtractor)
+USER_HISTORY = (
+    select(_txn.c.amount, _txn.c.transaction_time, _txn.c.is_fraudulent, _txn.c.risk_score)
+    .where(_txn.c.user_id == _user_id)
+    .order_by(_txn.c.transaction_time.desc())
+    .limit(_limit)
+)
+
+USER_TRANSACTION_COUNT = select(func.count()).select_from(_txn).where(_txn.c.user_id == _user_id)
+
+TRANSACTION_PAGE = (
+    select(
+        _txn.c.transaction_id, _txn.c.amount, _txn.c.currency, _txn.c.merchant_id,
+        _txn.c.transaction_time, _txn.c.risk_score, _txn.c.risk_level, _txn.c.is_fraudulent,
+    )
+    .where(_txn.c.user_id == _user_id)
+    .order_by(_txn.c.transaction_time.desc())
+    .offset(_offset)
+    .limit(_limit)
+)
+
+# One transaction with its explanation, if any (LEFT JOIN instead of a second query)
+TRANSACTION_DETAIL = (
+    select(
+        _txn.c.transaction_id, _txn.c.amount, _txn.c.currency, _txn.c.merchant_id, _txn.c.device_id,
+        _txn.c.transaction_time, _txn.c.risk_score, _txn.c.risk_level, _txn.c.is_fraudulent,
+        _txn.c.confidence_score, _txn.c.created_at,
+        _explanation.c.id.label("explanation_id"),
+        _explanation.c.summary, _explanation.c.reasons, _explanation.c.suggested_actions,
+        _explanation.c.confidence.label("explanation_confidence"), _explanation.c.model_used,
+    )
+    .select_from(_txn.outerjoin(_explanation, _explanation.c.transaction_id == _txn.c.id))
+    .where(and_(_txn.c.transaction_id == bindparam("transaction_id"), _txn.c.user_id == _user_id))
+    .limit(1)
+)
+
+# Pending alerts with their transaction columns (one JOIN instead of a query per alert)
+RECENT_ALERTS = (
+    select(
+        _alert.c.id.label("alert_id"), _alert.c.alert_type, _alert.c.severity, _alert.c.message,
+        _alert.c.created_at, _alert.c.status,
+        _txn.c.transaction_id, _txn.c.amount, _txn.c.merchant_id, _txn.c.risk_score, _txn.c.risk_level,
+    )
+    .select_from(_alert.join(_txn, _alert.c.transaction_id == _txn.c.id))
+    .where(and_(_txn.c.user_id == _user_id, _alert.c.status == "pending"))
+    .order_by(_alert.c.created_at.desc())
+    .limit(_limit)
+)
+
+# Entity-graph columns for the GNN clusters view
+USER_GRAPH_EDGES = select(
+    _txn.c.user_id, _txn.c.device_id, _txn.c.merchant_id, _txn.c.risk_score,
+    _txn.c.location_city, _txn.c.location_country,
+).where(_txn.c.user_id == _user_id)
+
+
+async def user_history(db: AsyncSession, user_id: Any, limit: int) -> Sequence[Row]:
+    """(amount, transaction_time, is_fraudulent, risk_score), newest first"""
+    result = await db.execute(USER_HISTORY, {"user_id": user_id, "limit": limit})
+    return result.all()
+
+
+async def transaction_page(db: AsyncSession, user_id: Any, offset: int, limit: int) -> Tuple[int, Sequence[Row]]:
+    """(total count, one page of list columns), newest first"""
+    count = await db.execute(USER_TRANSACTION_COUNT, {"user_id": user_id})
+    result = await db.execute(TRANSACTION_PAGE, {"user_id": user_id, "offset": offset, "limit": limit})
+    return count.scalar() or 0, result.all()
+
+
+async def transaction_detail(db: AsyncSession, user_id: Any, transaction_id: str) -> Optional[Row]:
+    """Detail columns plus explanation columns (None when unexplained)"""
+    result = await db.execute(TRANSACTION_DETAIL, {"user_id": user_id, "transaction_id": transaction_id})
+    return result.first()
+
+
+async def recent_alerts(db: AsyncSession, user_id: Any, limit: int) -> Sequence[Row]:
+    """Newest pending alerts for a user's transactions"""
+    result = await db.execute(RECENT_ALERTS, {"user_id": user_id, "limit": limit})
+    return result.all()
+
+
+async def user_graph_edges(db: AsyncSession, user_id: Any) -> Sequence[Row]:
+    """Entity columns of every transaction by a user"""
+    result = await db.execute(USER_GRAPH_EDGES, {"user_id": user_id})
+    return result.all()
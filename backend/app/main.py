@@ -10,7 +10,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from loguru import logger
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 
 from app.core.config import settings
 from app.api.v1.router import api_router
@@ -27,6 +27,14 @@ async def lifespan(app: FastAPI):
     logger.info("Starting FinGuard AI Backend")
     logger.info("Environment: %s", settings.ENVIRONMENT)
 
+    # Long-lived keep-alive clients for the ML and explain services
+    from app.services.upstream import close_upstreams, open_upstreams
+    open_upstreams()
+    # SCORING_BACKEND=embedded: load the models in this process (in the background)
+    from app.services.embedded_ml import close_embedded_ml, open_embedded_ml
+    if settings.SCORING_BACKEND == "embedded":
+        open_embedded_ml()
+
     try:
         async with engine.connect() as conn:
             await conn.execute(text("SELECT 1"))
@@ -34,6 +42,8 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("Database not reachable at startup: %s", e)
         yield
+        await close_embedded_ml()
+        await close_upstreams()
         await engine.dispose()
         return
 
@@ -56,6 +66,24 @@ async def lifespan(app: FastAPI):
         else:
             logger.warning("Table check failed: %s", e)
 
+    # Existing DB: add tables introduced since it was created (create_all skips existing ones)
+    if not tables_created:
+        try:
+            rebuild_scripts = {
+                "user_behavior_stats": "rebuild_behavior_stats.py",
+                "entity_sketches": "rebuild_entity_sketches.py",
+            }
+            async with engine.begin() as conn:
+                existing = await conn.run_sync(
+                    lambda c: {name for name in rebuild_scripts if inspect(c).has_table(name)}
+                )
+                await conn.run_sync(Base.metadata.create_all)
+            for name, script in rebuild_scripts.items():
+                if name not in existing:
+                    logger.warning(f"Created {name}; run python {script} to backfill it")
+        except Exception as e:
+            logger.warning("Could not create new tables: %s", e)
+
     # If we just created tables, ensure demo user exists so login works
     if tables_created:
         try:
@@ -76,6 +104,10 @@ async def lifespan(app: FastAPI):
     yield
 
     logger.info("Shutting down FinGuard AI Backend")
+    from app.services.feature_store import close_feature_store
+    await close_feature_store()
+    await close_embedded_ml()
+    await close_upstreams()
     await engine.dispose()
 
 
@@ -143,8 +175,12 @@ async def health_check():
         import httpx
         async with httpx.AsyncClient(timeout=1.0) as client:
             try:
-                r = await client.get(f"{settings.ML_SERVICE_URL}/health")
-                ml_status = "up" if r.status_code == 200 else "down"
+                if settings.SCORING_BACKEND == "embedded":
+                    from app.services.embedded_ml import get_embedded_ml
+                    ml_status = "up" if await get_embedded_ml().health_check() else "down"
+                else:
+                    r = await client.get(f"{settings.ML_SERVICE_URL}/health")
+                    ml_status = "up" if r.status_code == 200 else "down"
             except Exception:
                 ml_status = "down"
             try:
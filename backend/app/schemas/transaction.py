@@ -50,6 +50,7 @@ class PredictFraudResponse(BaseModel):
     fraud_score: float = Field(..., ge=0, le=1, description="Combined fraud score 0-1")
     risk_label: str = Field(..., description="LOW | MEDIUM | HIGH")
     model_scores: ModelScores
+    pipeline: Optional[Dict[str, Any]] = Field(None, description="Per-stage timings (ms) and stages that fell back")
 
 
 class TransactionCreate(BaseModel):
@@ -59,6 +60,7 @@ class TransactionCreate(BaseModel):
     currency: str = Field(default="USD", description="Currency code (ISO 4217)")
     merchant_id: str = Field(..., description="Merchant identifier")
     device_id: Optional[str] = Field(None, description="Device fingerprint")
+    ip_address: Optional[str] = Field(None, description="Client IP address")
     location_lat: Optional[float] = Field(None, description="Latitude")
     location_lng: Optional[float] = Field(None, description="Longitude")
     location_country: Optional[str] = Field(None, description="Country code (ISO 3166-1 alpha-2)")
@@ -183,6 +185,7 @@ class TransactionResponse(BaseModel):
     explanation: Optional[ExplanationResponse] = Field(None, description="AI explanation")
     recommended_action: str = Field(..., description="Recommended action")
     timestamp: str = Field(..., description="Processing timestamp")
+    pipeline: Optional[Dict[str, Any]] = Field(None, description="Per-stage timings (ms) and stages that fell back")
     
     class Config:
         from_attributes = True
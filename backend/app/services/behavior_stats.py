@@ -0,0 +1,150 @@
+"""
+Incrementally maintained per-user behavioral statistics.
+
+Each persisted transaction folds into the user's `user_behavior_stats` row in
+the same DB transaction that inserts it, so behavioral features are a single
+primary-key lookup instead of a scan over recent history:
+
+- amount mean / variance via Welford's algorithm
+- fraud count and risk score sum as running sums
+- first / last transaction time as running min / max
+- time-decayed averages of amount and risk score (half-life configurable)
+
+These are lifetime aggregates. The history scan they replace
+(USER_BEHAVIOR_STATS_ENABLED=False) only reads the user's last 100
+transactions, so for users with more than 100 transactions
+user_transaction_count, user_avg_amount, user_amount_std,
+user_frequency_days and time_since_first_transaction differ between the
+two paths: the stats cover the whole history.
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import UserBehaviorStats
+
+
+def new_stats(user_id: Any) -> UserBehaviorStats:
+    """Empty stats row for a user with no transactions"""
+    return UserBehaviorStats(
+        user_id=user_id,
+        transaction_count=0,
+        amount_mean=0.0,
+        amount_m2=0.0,
+        fraud_count=0,
+        risk_score_sum=0.0,
+        decayed_weight=0.0,
+        decayed_amount_mean=0.0,
+        decayed_risk_score_mean=0.0,
+    )
+
+
+def apply_transaction(
+    stats: Any,
+    amount: float,
+    transaction_time: datetime,
+    is_fraudulent: bool,
+    risk_score: Optional[float],
+    halflife_hours: Optional[float] = None,
+) -> Any:
+    """
+    Fold one transaction into `stats` in O(1).
+
+    Works on a UserBehaviorStats row or any object with the same attributes.
+    Transactions may arrive out of time order: min/max are order-free, and a
+    late event enters the decayed averages with the weight it would have had
+    if it had arrived in order, 0.5 ** (age before decayed_at / half-life).
+    """
+    halflife = settings.USER_BEHAVIOR_HALFLIFE_HOURS if halflife_hours is None else halflife_hours
+    amount = float(amount)
+    risk = float(risk_score or 0.0)
+
+    # Welford update
+    count = stats.transaction_count + 1
+    delta = amount - stats.amount_mean
+    stats.amount_mean += delta / count
+    stats.amount_m2 += delta * (amount - stats.amount_mean)
+    stats.transaction_count = count
+
+    if is_fraudulent:
+        stats.fraud_count += 1
+    stats.risk_score_sum += risk
+
+    if stats.first_transaction_time is None or transaction_time < stats.first_transaction_time:
+        stats.first_transaction_time = transaction_time
+    if stats.last_transaction_time is None or transaction_time > stats.last_transaction_time:
+        stats.last_transaction_time = transaction_time
+
+    # Exponential time decay to the newer of decayed_at and this event, then add the observation
+    weight, observation = stats.decayed_weight, 1.0
+    if stats.decayed_at is not None and transaction_time > stats.decayed_at:
+        elapsed_hours = (transaction_time - stats.decayed_at).total_seconds() / 3600
+        weight *= math.pow(0.5, elapsed_hours / halflife)
+    elif stats.decayed_at is not None and transaction_time < stats.decayed_at:
+        age_hours = (stats.decayed_at - transaction_time).total_seconds() / 3600
+        observation = math.pow(0.5, age_hours / halflife)
+    total = weight + observation
+    stats.decayed_amount_mean = (stats.decayed_amount_mean * weight + amount * observation) / total
+    stats.decayed_risk_score_mean = (stats.decayed_risk_score_mean * weight + risk * observation) / total
+    stats.decayed_weight = total
+    if stats.decayed_at is None or transaction_time > stats.decayed_at:
+        stats.decayed_at = transaction_time
+    return stats
+
+
+def amount_std(stats: Any) -> float:
+    """Population standard deviation of amount (matches np.std)"""
+    if stats.transaction_count < 2:
+        return 0.0
+    return math.sqrt(max(stats.amount_m2, 0.0) / stats.transaction_count)
+
+
+def mean_interarrival_hours(stats: Any) -> float:
+    """Mean gap between consecutive transactions: (last - first) / (n - 1)"""
+    if stats.transaction_count < 2:
+        return 0.0
+    span = (stats.last_transaction_time - stats.first_transaction_time).total_seconds() / 3600
+    return span / (stats.transaction_count - 1)
+
+
+async def record_transaction(
+    session: AsyncSession,
+    user_id: Any,
+    amount: float,
+    transaction_time: datetime,
+    is_fraudulent: bool,
+    risk_score: Optional[float],
+) -> UserBehaviorStats:
+    """
+    Update the user's stats row inside the caller's DB transaction.
+
+    Creates the row if missing (ON CONFLICT DO NOTHING keeps concurrent first
+    writes safe), then locks it for the read-modify-write.
+    """
+    await session.execute(
+        pg_insert(UserBehaviorStats)
+        .values(
+            user_id=user_id,
+            transaction_count=0,
+            amount_mean=0.0,
+            amount_m2=0.0,
+            fraud_count=0,
+            risk_score_sum=0.0,
+            decayed_weight=0.0,
+            decayed_amount_mean=0.0,
+            decayed_risk_score_mean=0.0,
+        )
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+    result = await session.execute(
+        select(UserBehaviorStats).where(UserBehaviorStats.user_id == user_id).with_for_update()
+    )
+    stats = result.scalar_one()
+    apply_transaction(stats, amount, transaction_time, is_fraudulent, risk_score)
+    return stats
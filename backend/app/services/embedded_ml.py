@@ -0,0 +1,144 @@
+"""
+In-process ML scoring for single-node deployments (SCORING_BACKEND=embedded)
+
+EmbeddedMLClient implements ml_client.ScoringBackend with MLClient's result
+shapes, but instead of posting the feature vector to the ML service it
+imports ml.inference into the backend process and calls predict_vector /
+predict_batch directly. The models are loaded and warmed once, in the background at startup
+(open_embedded_ml), and every model call runs on a dedicated
+ml.executor.InferenceExecutor thread pool so the event loop is never
+blocked. Past ML_EMBEDDED_MAX_PENDING calls in flight, new calls are
+refused with UpstreamUnavailable, as a full remote upstream would be.
+
+The ML service's own settings (MODEL_PATH, CASCADE_MODE, MODEL_PARALLEL,
+GNN_*, ...) are read from this process's environment.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.services import feature_schema
+from app.services.upstream import UpstreamUnavailable
+
+_scorer: Optional["EmbeddedMLClient"] = None
+
+
+def _import_ml():
+    """ml.inference and ml.executor, with ML_EMBEDDED_PATH (default: the repository root) on sys.path"""
+    root = settings.ML_EMBEDDED_PATH or str(Path(__file__).resolve().parents[3])
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    try:
+        from ml import executor, inference
+    except ModuleNotFoundError as e:
+        raise ModuleNotFoundError(
+            f"SCORING_BACKEND=embedded could not import ml.inference: no module named {e.name!r} "
+            f"(importing from {root}; see backend/requirements-embedded.txt)",
+            name=e.name,
+        ) from e
+    return inference, executor
+
+
+class EmbeddedMLClient:
+    """Scores with ml.inference in this process, on a bounded thread pool"""
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.inference, executor = _import_ml()
+        self._saturated = executor.ExecutorSaturated
+        self.executor = executor.InferenceExecutor(
+            settings.ML_EMBEDDED_WORKERS if workers is None else workers,
+            settings.ML_EMBEDDED_MAX_PENDING if max_pending is None else max_pending,
+        )
+        self._warming: Optional[asyncio.Future] = None
+
+    def start(self) -> None:
+        """Load and warm the models on a background thread (scoring before that loads them on first use)"""
+        if self._warming is None:
+            self._warming = asyncio.get_running_loop().run_in_executor(None, self.inference.warm_up)
+
+    async def close(self) -> None:
+        if self._warming is not None:
+            try:
+                await self._warming
+            except Exception as e:
+                logger.warning(f"Embedded ML warmup failed: {e}")
+        self.executor.shutdown()
+
+    async def _run(self, fn, *args: Any) -> Dict[str, Any]:
+        try:
+            return await self.executor.run(fn, *args)
+        except self._saturated as e:
+            logger.warning(f"Embedded ML call refused: {e}")
+            raise UpstreamUnavailable(str(e)) from e
+        except Exception as e:
+            logger.error(f"Embedded ML inference failed: {e}")
+            raise RuntimeError(f"Embedded ML inference failed: {e}") from e
+
+    async def predict(self, features: Dict[str, Any], transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one transaction; returns the dict the ML service's /predict returns"""
+        row = feature_schema.to_vector(features)[np.newaxis, :]
+        keys = feature_schema.entity_keys(transaction_data)[np.newaxis, :]
+        result = await self._run(self.inference.predict_vector, row, keys)
+        return self.inference.predict_response(result)
+
+    async def predict_batch(self, feature_matrix, entity_keys=None) -> List[Dict[str, Any]]:
+        """Score an (N, n) float32 matrix in FEATURE_ORDER; one dict per row, as MLClient.predict_batch"""
+        from app.services.ml_client import rows_from_columns
+        matrix = np.asarray(feature_matrix, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[1] != len(feature_schema.FEATURE_ORDER):
+            raise feature_schema.SchemaMismatchError(
+                f"Expected (N, {len(feature_schema.FEATURE_ORDER)}) features, got {matrix.shape}"
+            )
+        args = (matrix,) if entity_keys is None else (matrix, np.asarray(entity_keys))
+        result = await self._run(self.inference.predict_batch, *args)
+        return rows_from_columns(self.inference.predict_batch_response(result, int(matrix.shape[0])))
+
+    async def get_model_info(self) -> Dict[str, Any]:
+        """Loaded model version and registry state (the ML service's /models, without the file checks)"""
+        return {
+            "embedded": True,
+            "model_path": self.inference.MODEL_DIR,
+            "feature_schema": feature_schema.schema_info(),
+            "registry": self.inference.registry.stats(),
+        }
+
+    async def retrain_model(self, training_data: list) -> Dict[str, Any]:
+        return {"error": "Retraining is not available with SCORING_BACKEND=embedded"}
+
+    async def health_check(self) -> bool:
+        """Healthy once the background warmup has finished without error"""
+        return self._warming is not None and self._warming.done() and self._warming.exception() is None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self._warming is not None and self._warming.done() and self._warming.exception() is None,
+            "executor": self.executor.stats(),
+            "model_parallel": self.inference.parallel_stats(),
+        }
+
+
+def get_embedded_ml() -> EmbeddedMLClient:
+    """Process-wide embedded scorer (created on first use)"""
+    global _scorer
+    if _scorer is None:
+        _scorer = EmbeddedMLClient()
+    return _scorer
+
+
+def open_embedded_ml() -> None:
+    """Create the scorer and start loading its models (app startup)"""
+    get_embedded_ml().start()
+
+
+async def close_embedded_ml() -> None:
+    """Stop the scorer's thread pool (app shutdown)"""
+    global _scorer
+    if _scorer is not None:
+        await _scorer.close()
+        _scorer = None
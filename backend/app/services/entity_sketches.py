@@ -0,0 +1,208 @@
+"""
+HyperLogLog distinct-count sketches for graph features.
+
+One sketch per (kind, entity) in `entity_sketches`, maintained on write:
+
+- device_users:   distinct users seen on a device
+- merchant_users: distinct users seen at a merchant
+- user_devices:   distinct devices a user transacted from
+- ip_users:       distinct users seen behind an IP address
+
+Sketches use 2^12 registers of a 64-bit hash. Error bound: for large counts
+the relative standard error is 1.04 / sqrt(4096) ~= 1.6% (about +-3.3% at
+95%); below 2.5 * 4096 distinct values linear counting is used, which is
+near exact for the small counts typical of devices and IPs (expected
+register collisions ~= n^2 / 8192, i.e. well under one for n < 90).
+Estimates are constant-time and each sketch is at most ~4 KB; sketches with
+few members are stored sparsely (3 bytes per non-empty register).
+"""
+
+import math
+import struct
+from hashlib import blake2b
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import EntitySketch
+
+PRECISION = 12
+KINDS = ("device_users", "merchant_users", "user_devices", "ip_users")
+FEATURE_NAMES = {
+    "device_users": "device_distinct_users",
+    "merchant_users": "merchant_distinct_users",
+    "user_devices": "user_distinct_devices",
+    "ip_users": "ip_distinct_users",
+}
+
+_SPARSE = 1
+_DENSE = 2
+_HEADER = struct.Struct(">BB")
+_SPARSE_ENTRY = struct.Struct(">HB")
+
+
+def _hash64(value: Any) -> int:
+    return int.from_bytes(blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Dense-register HyperLogLog with sparse serialization"""
+
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p: int = PRECISION, registers: Optional[bytearray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value: Any) -> bool:
+        """Add a member; returns True if the sketch changed"""
+        x = _hash64(value)
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches of different precision")
+        mine = np.frombuffer(self.registers, dtype=np.uint8)
+        self.registers = bytearray(np.maximum(mine, np.frombuffer(other.registers, dtype=np.uint8)).tobytes())
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.p, bytearray(self.registers))
+
+    def count(self) -> float:
+        """Estimated number of distinct members"""
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        zeros = self.m - int(np.count_nonzero(registers))
+        if zeros == self.m:
+            return 0.0
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.ldexp(1.0, -registers.astype(np.int32)).sum())
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            return self.m * math.log(self.m / zeros)
+        return estimate
+
+    def count_with(self, value: Any) -> float:
+        """Estimated distinct members if `value` were added (the sketch is unchanged)"""
+        sketch = self.copy()
+        sketch.add(value)
+        return sketch.count()
+
+    def to_bytes(self) -> bytes:
+        nonzero = [(i, r) for i, r in enumerate(self.registers) if r]
+        if _SPARSE_ENTRY.size * len(nonzero) < self.m:
+            return _HEADER.pack(_SPARSE, self.p) + b"".join(_SPARSE_ENTRY.pack(i, r) for i, r in nonzero)
+        return _HEADER.pack(_DENSE, self.p) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        encoding, p = _HEADER.unpack_from(data)
+        body = memoryview(data)[_HEADER.size:]
+        if encoding == _DENSE:
+            return cls(p, bytearray(body))
+        if encoding != _SPARSE:
+            raise ValueError(f"Unknown sketch encoding {encoding}")
+        sketch = cls(p)
+        for index, rank in _SPARSE_ENTRY.iter_unpack(body):
+            sketch.registers[index] = rank
+        return sketch
+
+
+def sketch_members(
+    user_id: Any,
+    merchant_id: Optional[Any],
+    device_id: Optional[Any],
+    ip_address: Optional[str],
+) -> Dict[str, Tuple[str, str]]:
+    """kind -> (entity_id, member) touched by one transaction"""
+    members = {}
+    if device_id:
+        members["device_users"] = (str(device_id), str(user_id))
+        members["user_devices"] = (str(user_id), str(device_id))
+    if merchant_id:
+        members["merchant_users"] = (str(merchant_id), str(user_id))
+    if ip_address:
+        members["ip_users"] = (str(ip_address), str(user_id))
+    return members
+
+
+def distinct_features(sketches: Dict[str, Optional[HyperLogLog]], members: Dict[str, Tuple[str, str]]) -> Dict[str, int]:
+    """
+    Distinct-count graph features, counting the current transaction's member.
+    `shared_device_count` is the number of other users seen on the device.
+    """
+    features = {}
+    for kind, name in FEATURE_NAMES.items():
+        if kind not in members:
+            features[name] = 0
+            continue
+        sketch = sketches.get(kind)
+        estimate = sketch.count_with(members[kind][1]) if sketch is not None else 1.0
+        features[name] = max(int(round(estimate)), 1)
+    features["shared_device_count"] = max(features["device_distinct_users"] - 1, 0)
+    return features
+
+
+def _key_filter(members: Dict[str, Tuple[str, str]]):
+    return or_(*[
+        and_(EntitySketch.kind == kind, EntitySketch.entity_id == entity_id)
+        for kind, (entity_id, _) in members.items()
+    ])
+
+
+async def load_sketches(session: AsyncSession, members: Dict[str, Tuple[str, str]]) -> Dict[str, Optional[HyperLogLog]]:
+    """Sketches for the given keys in one primary-key lookup (None where absent)"""
+    sketches: Dict[str, Optional[HyperLogLog]] = {kind: None for kind in members}
+    if not members:
+        return sketches
+    result = await session.execute(
+        select(EntitySketch.kind, EntitySketch.sketch).where(_key_filter(members))
+    )
+    for kind, data in result.all():
+        sketches[kind] = HyperLogLog.from_bytes(data)
+    return sketches
+
+
+async def record_transaction(
+    session: AsyncSession,
+    user_id: Any,
+    merchant_id: Optional[Any],
+    device_id: Optional[Any],
+    ip_address: Optional[str],
+) -> Dict[str, Tuple[str, HyperLogLog]]:
+    """
+    Add the transaction's members to their sketches inside the caller's DB
+    transaction. Rows are created if missing, locked in key order and only
+    rewritten when a register changed. Returns kind -> (entity_id, sketch).
+    """
+    members = sketch_members(user_id, merchant_id, device_id, ip_address)
+    if not members:
+        return {}
+    empty = HyperLogLog().to_bytes()
+    await session.execute(
+        pg_insert(EntitySketch)
+        .values([{"kind": kind, "entity_id": entity_id, "sketch": empty} for kind, (entity_id, _) in members.items()])
+        .on_conflict_do_nothing(index_elements=["kind", "entity_id"])
+    )
+    result = await session.execute(
+        select(EntitySketch)
+        .where(_key_filter(members))
+        .order_by(EntitySketch.kind, EntitySketch.entity_id)
+        .with_for_update()
+    )
+    updated = {}
+    for row in result.scalars():
+        sketch = HyperLogLog.from_bytes(row.sketch)
+        if sketch.add(members[row.kind][1]):
+            row.sketch = sketch.to_bytes()
+        updated[row.kind] = (row.entity_id, sketch)
+    return updated
@@ -9,14 +9,16 @@ import httpx
 from loguru import logger
 
 from app.core.config import settings
+from app.services.upstream import UpstreamUnavailable, get_upstream
 
 
 class ExplainClient:
-    """HTTP client for explanation service communication"""
+    """HTTP client for explanation service communication (on the shared pooled "explain" upstream)"""
     
     def __init__(self):
         self.base_url = settings.EXPLAIN_SERVICE_URL
-        self.timeout = 30  # Longer timeout for LLM processing
+        self.timeout = settings.EXPLAIN_TIMEOUT  # Longer timeout for LLM processing
+        self.upstream = get_upstream("explain")
         
     async def generate_explanation(self, transaction_data: Dict[str, Any], query: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -36,23 +38,23 @@ class ExplainClient:
                 "llm_model": settings.LLM_MODEL_NAME
             }
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/explain",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
+            response = await self.upstream.post(
+                "/explain",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result
+            logger.error(f"Explanation service error: {response.status_code} - {response.text}")
+            response.raise_for_status()
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result
-                logger.error(f"Explanation service error: {response.status_code} - {response.text}")
-                response.raise_for_status()
-                    
         except httpx.TimeoutException as e:
             logger.error("Explanation service timeout")
             raise RuntimeError("Explanation service timeout") from e
-        except httpx.HTTPStatusError as e:
+        except (httpx.HTTPStatusError, UpstreamUnavailable):
             raise
         except Exception as e:
             logger.error(f"Explanation service communication failed: {e}")
@@ -66,17 +68,17 @@ class ExplainClient:
                 "limit": limit
             }
             
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(
-                    f"{self.base_url}/patterns",
-                    params=params
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                logger.error(f"Patterns service error: {response.status_code} - {response.text}")
-                response.raise_for_status()
-        except httpx.HTTPStatusError:
+            response = await self.upstream.get(
+                "/patterns",
+                params=params,
+                timeout=10,
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            logger.error(f"Patterns service error: {response.status_code} - {response.text}")
+            response.raise_for_status()
+        except (httpx.HTTPStatusError, UpstreamUnavailable):
             raise
         except Exception as e:
             logger.error(f"Failed to get fraud patterns: {e}")
@@ -90,16 +92,16 @@ class ExplainClient:
                 "user_id": user_id
             }
             
-            async with httpx.AsyncClient(timeout=15) as client:
-                response = await client.post(
-                    f"{self.base_url}/query",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                response.raise_for_status()
-                return response.json()
-        except httpx.HTTPStatusError:
+            response = await self.upstream.post(
+                "/query",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=15,
+            )
+            
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPStatusError, UpstreamUnavailable):
             raise
         except Exception as e:
             logger.error(f"Failed to query knowledge base: {e}")
@@ -108,8 +110,7 @@ class ExplainClient:
     async def health_check(self) -> bool:
         """Check if explanation service is healthy"""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                response = await client.get(f"{self.base_url}/health")
-                return response.status_code == 200
+            response = await self.upstream.get("/health", guarded=False, timeout=5)
+            return response.status_code == 200
         except Exception:
             return False
\ No newline at end of file
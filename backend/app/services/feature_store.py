@@ -0,0 +1,477 @@
+"""
+Redis-backed online feature store.
+
+Holds the DB-backed inputs of feature extraction so backend replicas can score
+without querying Postgres. Key layout (prefix `FEATURE_STORE_PREFIX`):
+
+- `{p}:user:{user_id}`                        hash, user_behavior_stats columns
+- `{p}:merchant:{merchant_id}`                hash, merchant profile (`known=0` if unknown)
+- `{p}:device:{device_id}`                    hash, device profile (`known=0` if unknown)
+- `{p}:device:{device_id}:txns`               hash, `total` and per-user transaction counts
+- `{p}:merchant:{merchant_id}:activity`       zset, transaction ids scored by time (last 24h)
+- `{p}:merchant:{merchant_id}:activity:{uid}` zset, the same restricted to one user
+- `{p}:merchant:{merchant_id}:activity_since` marker: the activity zsets are complete
+- `{p}:sketch:{kind}:{entity_id}`             `{register sum}:{base64 HyperLogLog sketch}` (`0:` if none exists)
+
+All inputs for one transaction are read in a single pipelined round trip.
+Missing components are reported back so the caller can load them from
+Postgres and backfill them. Persisted transactions are written through:
+user stats replace the user hash, activity zsets get the transaction id
+(idempotent), device counts are incremented when already present and
+sketches are replaced with the copy updated in Postgres.
+
+User stats and sketches are snapshots taken after commit, so two writers
+can reach Redis in the opposite order to their commits. Both are written
+by a Lua script that keeps the stored value when it is newer: stats by
+`transaction_count`, sketches by the sum of their registers (registers only
+grow, and Postgres updates each sketch under a row lock).
+
+Device counts can drift by a transaction when a backfill races a concurrent
+write; every key expires after `FEATURE_STORE_TTL_SECONDS`, which bounds it.
+Profiles use the profile cache TTL, matching the in-process cache.
+"""
+
+import asyncio
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from types import SimpleNamespace
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services import profile_cache
+from app.services.entity_sketches import HyperLogLog
+
+ACTIVITY_WINDOW = timedelta(hours=24)
+
+STATS_FIELDS = {
+    "transaction_count": int,
+    "amount_mean": float,
+    "amount_m2": float,
+    "fraud_count": int,
+    "risk_score_sum": float,
+    "first_transaction_time": datetime,
+    "last_transaction_time": datetime,
+    "decayed_weight": float,
+    "decayed_amount_mean": float,
+    "decayed_risk_score_mean": float,
+    "decayed_at": datetime,
+}
+MERCHANT_FIELDS = {
+    "risk_score": float,
+    "total_transactions": int,
+    "fraud_count": int,
+    "avg_transaction_amount": float,
+    "category": str,
+}
+DEVICE_FIELDS = {
+    "risk_score": float,
+    "associated_accounts": int,
+    "is_suspicious": bool,
+    "device_type": str,
+}
+
+# Device transaction count field for transactions without a user
+ANONYMOUS_FIELD = "_anonymous"
+
+# Inputs read() must return for a transaction to be scored without Postgres
+REQUIRED_INPUTS = (
+    "user_stats",
+    "merchant_profile",
+    "merchant_activity_24h",
+    "device_profile",
+    "device_txn_count",
+)
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _decode(value: Optional[str], kind: type) -> Any:
+    if value is None or value == "":
+        return None
+    if kind is bool:
+        return value == "1"
+    if kind is datetime:
+        return datetime.fromisoformat(value)
+    return kind(value)
+
+
+def _encode_mapping(values: Dict[str, Any], fields: Dict[str, type]) -> Dict[str, str]:
+    # Redis hashes cannot hold None: absent fields decode back to None
+    return {name: _encode(values[name]) for name in fields if values.get(name) is not None}
+
+
+def _decode_mapping(raw: Dict[str, str], fields: Dict[str, type]) -> Dict[str, Any]:
+    return {name: _decode(raw.get(name), kind) for name, kind in fields.items()}
+
+
+def _timestamp(value: datetime) -> float:
+    return value.timestamp()
+
+
+# KEYS[1] user hash; ARGV: ttl, transaction_count, field/value pairs.
+# Replaces the hash unless it holds more transactions.
+_WRITE_USER_STATS = """
+local stored = tonumber(redis.call('HGET', KEYS[1], 'transaction_count'))
+if stored and stored > tonumber(ARGV[2]) then return 0 end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] sketch key; ARGV: ttl, register sum, `{register sum}:{base64}` value.
+# Replaces the value unless the stored sketch has a larger register sum.
+_WRITE_SKETCH = """
+local stored = redis.call('GET', KEYS[1])
+local version = stored and tonumber(string.match(stored, '^(%d+):'))
+if version and version > tonumber(ARGV[2]) then return 0 end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[1])
+return 1
+"""
+
+
+def _decode_sketch(raw: str) -> Optional[HyperLogLog]:
+    """A stored `{register sum}:{base64}` sketch value (None for an empty one)"""
+    payload = raw.partition(":")[2] if ":" in raw else raw
+    return HyperLogLog.from_bytes(base64.b64decode(payload)) if payload else None
+
+
+class OnlineFeatureStore:
+    """Per-user, per-device and per-merchant feature state in Redis hashes"""
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "fs",
+        ttl_seconds: int = 86400,
+        profile_ttl_seconds: int = 300,
+    ):
+        self.client = client
+        self.prefix = prefix
+        # Activity zsets cover 24h; shorter key TTLs would drop entries still in the window
+        self.ttl_seconds = max(int(ttl_seconds), int(ACTIVITY_WINDOW.total_seconds()))
+        self.profile_ttl_seconds = int(profile_ttl_seconds)
+
+    # Keys
+    def _user_key(self, user_id: Any) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def _merchant_key(self, merchant_id: Any) -> str:
+        return f"{self.prefix}:merchant:{merchant_id}"
+
+    def _device_key(self, device_id: Any) -> str:
+        return f"{self.prefix}:device:{device_id}"
+
+    def _device_txns_key(self, device_id: Any) -> str:
+        return f"{self.prefix}:device:{device_id}:txns"
+
+    def _activity_key(self, merchant_id: Any, user_id: Any = None) -> str:
+        key = f"{self.prefix}:merchant:{merchant_id}:activity"
+        return key if user_id is None else f"{key}:{user_id}"
+
+    def _activity_marker_key(self, merchant_id: Any) -> str:
+        return f"{self.prefix}:merchant:{merchant_id}:activity_since"
+
+    def _sketch_key(self, kind: str, entity_id: Any) -> str:
+        return f"{self.prefix}:sketch:{kind}:{entity_id}"
+
+    async def read(
+        self,
+        user_id: Any,
+        merchant_id: Optional[Any],
+        device_id: Optional[Any],
+        now: Optional[datetime] = None,
+        sketch_members: Optional[Dict[str, Tuple[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fetch every stored input for one transaction in one round trip.
+
+        Returns a dict holding the subset of REQUIRED_INPUTS (plus
+        shared_device_count) that the store has; inputs for an absent
+        merchant / device id are filled with their empty values. With
+        `sketch_members` (kind -> (entity_id, member)) the sketches are read
+        too and returned as `sketches` when every one of them is stored.
+        """
+        now = now or datetime.now()
+        since = _timestamp(now - ACTIVITY_WINDOW)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._user_key(user_id))
+        if merchant_id:
+            pipe.hgetall(self._merchant_key(merchant_id))
+            pipe.exists(self._activity_marker_key(merchant_id))
+            pipe.zcount(self._activity_key(merchant_id), since, "+inf")
+            pipe.zcount(self._activity_key(merchant_id, user_id), since, "+inf")
+        if device_id:
+            pipe.hgetall(self._device_key(device_id))
+            pipe.hmget(self._device_txns_key(device_id), ["total", str(user_id), ANONYMOUS_FIELD])
+        for kind, (entity_id, _) in (sketch_members or {}).items():
+            pipe.get(self._sketch_key(kind, entity_id))
+        results = iter(await pipe.execute())
+
+        inputs: Dict[str, Any] = {}
+        raw_user = next(results)
+        if raw_user:
+            stats = _decode_mapping(raw_user, STATS_FIELDS)
+            inputs["user_stats"] = SimpleNamespace(**stats) if stats["transaction_count"] else None
+
+        if merchant_id:
+            raw_merchant, has_activity, merchant_count, own_count = (next(results) for _ in range(4))
+            if raw_merchant:
+                inputs["merchant_profile"] = (
+                    _decode_mapping(raw_merchant, MERCHANT_FIELDS) if raw_merchant.get("known") == "1" else None
+                )
+            if has_activity:
+                inputs["merchant_activity_24h"] = int(merchant_count) - int(own_count)
+        else:
+            inputs["merchant_profile"] = None
+            inputs["merchant_activity_24h"] = 0
+
+        if device_id:
+            raw_device, (total, own, anonymous) = next(results), next(results)
+            if raw_device:
+                inputs["device_profile"] = (
+                    _decode_mapping(raw_device, DEVICE_FIELDS) if raw_device.get("known") == "1" else None
+                )
+            if total is not None:
+                inputs["device_txn_count"] = int(total)
+                # Matches `user_id != :uid`, which never counts NULL user ids
+                inputs["shared_device_count"] = int(total) - int(own or 0) - int(anonymous or 0)
+        else:
+            inputs["device_profile"] = None
+            inputs["device_txn_count"] = 0
+            inputs["shared_device_count"] = 0
+
+        if sketch_members is not None:
+            sketches = {kind: next(results) for kind in sketch_members}
+            if all(raw is not None for raw in sketches.values()):
+                inputs["sketches"] = {kind: _decode_sketch(raw) for kind, raw in sketches.items()}
+        return inputs
+
+    @staticmethod
+    def missing(inputs: Dict[str, Any], with_sketches: bool = False) -> Set[str]:
+        """Required inputs absent from a read() result (plus `sketches` if requested)"""
+        required = REQUIRED_INPUTS + ("sketches",) if with_sketches else REQUIRED_INPUTS
+        return {name for name in required if name not in inputs}
+
+    async def backfill(
+        self,
+        user_id: Any,
+        merchant_id: Optional[Any],
+        device_id: Optional[Any],
+        inputs: Dict[str, Any],
+        missing: Iterable[str],
+        device_user_counts: Optional[Dict[Any, int]] = None,
+        merchant_activity: Optional[Iterable[Tuple[str, Any, datetime]]] = None,
+        sketch_members: Optional[Dict[str, Tuple[str, Any]]] = None,
+    ) -> None:
+        """
+        Store inputs loaded from Postgres for the components read() lacked.
+
+        `device_user_counts` maps user id (None for anonymous) -> transactions
+        on the device; `merchant_activity` is (transaction_id, user_id,
+        transaction_time) for the merchant's last 24h, excluding anonymous ones.
+        Sketches are stored from `inputs["sketches"]` and `sketch_members`.
+        """
+        missing = set(missing)
+        pipe = self.client.pipeline(transaction=False)
+        if "user_stats" in missing:
+            self._queue_user_stats(pipe, user_id, inputs.get("user_stats"))
+        if merchant_id and "merchant_profile" in missing:
+            self._queue_profile(pipe, self._merchant_key(merchant_id), inputs.get("merchant_profile"), MERCHANT_FIELDS)
+        if device_id and "device_profile" in missing:
+            self._queue_profile(pipe, self._device_key(device_id), inputs.get("device_profile"), DEVICE_FIELDS)
+        if device_id and "device_txn_count" in missing and device_user_counts is not None:
+            key = self._device_txns_key(device_id)
+            counts = {
+                ANONYMOUS_FIELD if uid is None else str(uid): int(count)
+                for uid, count in device_user_counts.items()
+            }
+            counts["total"] = sum(counts.values())
+            pipe.delete(key)
+            pipe.hset(key, mapping=counts)
+            pipe.expire(key, self.ttl_seconds)
+        if merchant_id and "merchant_activity_24h" in missing and merchant_activity is not None:
+            rows = list(merchant_activity)
+            if rows:
+                pipe.zadd(self._activity_key(merchant_id), {txn_id: _timestamp(ts) for txn_id, _, ts in rows})
+                per_user: Dict[Any, Dict[str, float]] = {}
+                for txn_id, uid, ts in rows:
+                    per_user.setdefault(uid, {})[txn_id] = _timestamp(ts)
+                for uid, members in per_user.items():
+                    pipe.zadd(self._activity_key(merchant_id, uid), members)
+                    pipe.expire(self._activity_key(merchant_id, uid), self.ttl_seconds)
+                pipe.expire(self._activity_key(merchant_id), self.ttl_seconds)
+            pipe.set(self._activity_marker_key(merchant_id), _encode(datetime.now()), ex=self.ttl_seconds)
+        if "sketches" in missing and sketch_members is not None and "sketches" in inputs:
+            for kind, (entity_id, _) in sketch_members.items():
+                self._queue_sketch(pipe, kind, entity_id, inputs["sketches"].get(kind))
+        await pipe.execute()
+
+    async def record_transaction(
+        self,
+        transaction_id: str,
+        user_id: Any,
+        merchant_id: Optional[Any],
+        device_id: Optional[Any],
+        transaction_time: datetime,
+        stats: Optional[Any],
+        sketches: Optional[Dict[str, Tuple[Any, HyperLogLog]]] = None,
+    ) -> None:
+        """
+        Write through a persisted transaction, the user's updated stats (None
+        if they were not updated) and the updated sketches
+        (kind -> (entity_id, sketch)).
+        """
+        increment_device = False
+        if device_id:
+            increment_device = bool(await self.client.exists(self._device_txns_key(device_id)))
+
+        pipe = self.client.pipeline(transaction=False)
+        if stats is not None:
+            self._queue_user_stats(pipe, user_id, stats)
+        if merchant_id:
+            cutoff = _timestamp(transaction_time - ACTIVITY_WINDOW)
+            for key in (self._activity_key(merchant_id), self._activity_key(merchant_id, user_id)):
+                pipe.zadd(key, {transaction_id: _timestamp(transaction_time)})
+                pipe.zremrangebyscore(key, "-inf", f"({cutoff}")
+                pipe.expire(key, self.ttl_seconds)
+            pipe.expire(self._activity_marker_key(merchant_id), self.ttl_seconds)
+        if increment_device:
+            key = self._device_txns_key(device_id)
+            pipe.hincrby(key, "total", 1)
+            pipe.hincrby(key, str(user_id), 1)
+            pipe.expire(key, self.ttl_seconds)
+        for kind, (entity_id, sketch) in (sketches or {}).items():
+            self._queue_sketch(pipe, kind, entity_id, sketch)
+        await pipe.execute()
+
+    async def invalidate_profiles(self, merchant_ids: Iterable[Any] = (), device_ids: Iterable[Any] = ()) -> None:
+        """Drop stored merchant / device profiles after they were written"""
+        keys = [self._merchant_key(m) for m in merchant_ids] + [self._device_key(d) for d in device_ids]
+        if keys:
+            await self.client.delete(*keys)
+
+    def _queue_user_stats(self, pipe: Any, user_id: Any, stats: Any) -> None:
+        if stats is None or not stats.transaction_count:
+            values = {"transaction_count": "0"}
+        else:
+            values = _encode_mapping({name: getattr(stats, name) for name in STATS_FIELDS}, STATS_FIELDS)
+        pairs = [item for field_value in values.items() for item in field_value]
+        pipe.eval(
+            _WRITE_USER_STATS, 1, self._user_key(user_id), self.ttl_seconds, values["transaction_count"], *pairs,
+        )
+
+    def _queue_profile(self, pipe: Any, key: str, profile: Optional[Dict[str, Any]], fields: Dict[str, type]) -> None:
+        values = {"known": "0"} if profile is None else {"known": "1", **_encode_mapping(profile, fields)}
+        pipe.delete(key)
+        pipe.hset(key, mapping=values)
+        pipe.expire(key, self.profile_ttl_seconds)
+
+    def _queue_sketch(self, pipe: Any, kind: str, entity_id: Any, sketch: Optional[HyperLogLog]) -> None:
+        if sketch is None:
+            version, payload = 0, ""
+        else:
+            version, payload = sum(sketch.registers), base64.b64encode(sketch.to_bytes()).decode()
+        pipe.eval(
+            _WRITE_SKETCH, 1, self._sketch_key(kind, entity_id), self.ttl_seconds, version, f"{version}:{payload}",
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_store: Optional[OnlineFeatureStore] = None
+
+
+def get_feature_store() -> Optional[OnlineFeatureStore]:
+    """Process-wide store, or None when FEATURE_STORE_ENABLED is off"""
+    global _store
+    if not settings.FEATURE_STORE_ENABLED:
+        return None
+    if _store is None:
+        import redis.asyncio as redis
+
+        client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=settings.FEATURE_STORE_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.FEATURE_STORE_TIMEOUT_SECONDS,
+        )
+        _store = OnlineFeatureStore(
+            client,
+            prefix=settings.FEATURE_STORE_PREFIX,
+            ttl_seconds=settings.FEATURE_STORE_TTL_SECONDS,
+            profile_ttl_seconds=settings.PROFILE_CACHE_TTL_SECONDS,
+        )
+    return _store
+
+
+async def close_feature_store() -> None:
+    """Close the Redis connection pool (app shutdown)"""
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+async def record_transaction(
+    transaction: Any,
+    stats: Optional[Any],
+    sketches: Optional[Dict[str, Tuple[Any, HyperLogLog]]] = None,
+) -> None:
+    """
+    Write a committed transaction through to the store, if enabled.
+
+    Never raises: the transaction is already persisted and the store
+    backfills itself from Postgres on the next miss.
+    """
+    store = get_feature_store()
+    if store is None:
+        return
+    try:
+        await store.record_transaction(
+            transaction.transaction_id,
+            transaction.user_id,
+            transaction.merchant_id,
+            transaction.device_id,
+            transaction.transaction_time,
+            stats,
+            sketches,
+        )
+    except Exception as e:
+        logger.warning(f"Feature store write failed: {e}")
+
+
+_invalidation_tasks: Set[asyncio.Task] = set()
+
+
+def _invalidate_stored_profiles(merchant_ids: Set[Any], device_ids: Set[Any]) -> None:
+    """Profile cache listener: drop the same profiles from Redis without blocking the commit"""
+    if _store is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(_store.invalidate_profiles(merchant_ids, device_ids))
+    _invalidation_tasks.add(task)
+    task.add_done_callback(_invalidation_done)
+
+
+def _invalidation_done(task: asyncio.Task) -> None:
+    _invalidation_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Feature store profile invalidation failed: {task.exception()}")
+
+
+profile_cache.add_invalidation_listener(_invalidate_stored_profiles)
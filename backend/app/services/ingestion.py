@@ -3,21 +3,52 @@ Data ingestion and feature extraction service
 """
 
 import asyncio
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+from uuid import UUID
 import numpy as np
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, case, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from app.db.models import Transaction, Merchant, Device, FraudPattern
+from app.core.config import settings
+from app.db import queries
+from app.db.models import Transaction, Merchant, Device, FraudPattern, UserBehaviorStats, EntitySketch
+from app.services import behavior_stats, entity_sketches, profile_cache, velocity
+from app.services.feature_schema import FEATURE_INDEX, FEATURE_ORDER, SchemaMismatchError
+from app.services.feature_store import OnlineFeatureStore, get_feature_store
+
+# Number of most recent user transactions behavioral features are computed over
+USER_HISTORY_LIMIT = 100
 
 
 class FeatureExtractor:
     """Extract features from transaction data for ML models"""
     
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, fused: Optional[bool] = None,
+                 use_behavior_stats: Optional[bool] = None, use_profile_cache: Optional[bool] = None,
+                 feature_store: Optional[OnlineFeatureStore] = None, use_velocity: Optional[bool] = None,
+                 use_sketches: Optional[bool] = None):
         self.db = db_session
+        # Fused mode fetches every DB-backed input in a single statement
+        self.fused = settings.FEATURE_EXTRACTION_FUSED if fused is None else fused
+        # Read behavioral features from user_behavior_stats instead of scanning history
+        self.use_behavior_stats = (
+            settings.USER_BEHAVIOR_STATS_ENABLED if use_behavior_stats is None else use_behavior_stats
+        )
+        # Serve merchant / device profiles and device counts from the in-process cache
+        self.use_profile_cache = (
+            settings.PROFILE_CACHE_ENABLED if use_profile_cache is None else use_profile_cache
+        )
+        # Online feature store (Redis) read before Postgres; it mirrors the fused stats-based inputs
+        self.feature_store = feature_store if feature_store is not None else get_feature_store()
+        if not (self.fused and self.use_behavior_stats):
+            self.feature_store = None
+        # Count every scored transaction in the in-memory velocity windows
+        self.use_velocity = settings.VELOCITY_ENABLED if use_velocity is None else use_velocity
+        # Distinct-entity graph features from HyperLogLog sketches instead of counting transactions
+        self.use_sketches = settings.ENTITY_SKETCHES_ENABLED if use_sketches is None else use_sketches
     
     async def extract_features(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """
@@ -29,43 +60,752 @@ class FeatureExtractor:
         3. Merchant features
         4. Device features
         5. Temporal features
-        6. Graph-based features (simulated)
+        6. Graph-based features (distinct users / devices per entity from sketches)
+        7. Velocity features (1m / 10m / 1h / 24h counts and amounts; only
+           a card-testing burst reaches the models, as graph_risk_raw)
+        
+        In fused mode all DB-backed inputs are fetched in one round trip;
+        the resulting feature dict is identical to the sequential path.
+        With the online feature store enabled they come from Redis first.
         """
         try:
-            features = {}
-            
-            # 1. Basic transaction features
-            features.update(self._extract_basic_features(transaction_data))
-            
-            # 2. Behavioral features (async)
-            behavioral_features = await self._extract_behavioral_features(user_id, transaction_data)
-            features.update(behavioral_features)
-            
-            # 3. Merchant features (async)
-            merchant_features = await self._extract_merchant_features(transaction_data.get("merchant_id"))
-            features.update(merchant_features)
-            
-            # 4. Device features (async)
-            device_features = await self._extract_device_features(transaction_data.get("device_id"))
-            features.update(device_features)
-            
-            # 5. Temporal features
-            features.update(self._extract_temporal_features(transaction_data))
-            
-            # 6. Graph features (simulated - in production this would come from GNN)
-            graph_features = await self._extract_graph_features(user_id, transaction_data)
-            features.update(graph_features)
-            
-            # 7. Derived features
+            if self.feature_store is not None:
+                features = await self._extract_features_with_store(transaction_data, user_id)
+            elif self.fused:
+                features = await self._extract_features_fused(transaction_data, user_id)
+            else:
+                features = await self._extract_features_sequential(transaction_data, user_id)
+        except Exception as e:
+            logger.error(f"Feature extraction failed: {e}")
+            await self.db.rollback()
+            return self.fallback_features(transaction_data, user_id)
+        
+        if self.use_velocity:
+            self._observe_velocity(features, transaction_data, user_id)
+        return features
+    
+    def _default_features(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Every schema feature without DB-backed inputs: new user, unknown
+        merchant and device, no graph activity
+        """
+        features = self._extract_basic_features(transaction_data)
+        features.update(self._behavioral_from_stats(None, transaction_data))
+        features.update(self._merchant_features_from_profile(None))
+        features.update(self._device_features_from_profile(None, 0))
+        features.update(self._extract_temporal_features(transaction_data))
+        features.update(self._graph_features_from_counts(0, 0))
+        features.update(self._create_derived_features(features))
+        return features
+    
+    def fallback_features(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """
+        Features for a transaction whose extraction ran out of time: the
+        defaults (no DB-backed inputs) plus the in-memory velocity counters
+        """
+        features = self._default_features(transaction_data)
+        if self.use_velocity:
+            self._observe_velocity(features, transaction_data, user_id)
+        return features
+    
+    def _observe_velocity(self, features: Dict[str, Any], transaction_data: Dict[str, Any], user_id: str) -> None:
+        """Count the transaction, add its velocity features and any burst risk to graph_risk_raw"""
+        counts = velocity.observe_transaction(transaction_data, user_id)
+        features.update(counts)
+        burst = velocity.burst_risk(counts)
+        if burst:
+            features["graph_risk_raw"] = min(features.get("graph_risk_raw", 0.0) + burst, 1.0)
             features.update(self._create_derived_features(features))
+    
+    async def _extract_features_sequential(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Extract features with one query per DB-backed input"""
+        features = {}
+        
+        # 1. Basic transaction features
+        features.update(self._extract_basic_features(transaction_data))
+        
+        # 2. Behavioral features (async)
+        behavioral_features = await self._extract_behavioral_features(user_id, transaction_data)
+        features.update(behavioral_features)
+        
+        # 3. Merchant features (async)
+        merchant_features = await self._extract_merchant_features(transaction_data.get("merchant_id"))
+        features.update(merchant_features)
+        
+        # 4. Device features (async)
+        device_features = await self._extract_device_features(transaction_data.get("device_id"))
+        features.update(device_features)
+        
+        # 5. Temporal features
+        features.update(self._extract_temporal_features(transaction_data))
+        
+        # 6. Graph features (simulated - in production this would come from GNN)
+        graph_features = await self._extract_graph_features(user_id, transaction_data)
+        features.update(graph_features)
+        
+        # 7. Derived features
+        features.update(self._create_derived_features(features))
+        
+        logger.debug(f"Extracted {len(features)} features for transaction")
+        return features
+    
+    async def _extract_features_fused(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Extract features with every DB-backed input fetched in one statement"""
+        inputs = await self._fetch_fused_inputs(transaction_data, user_id)
+        features = self._features_from_inputs(transaction_data, user_id, inputs)
+        logger.debug(f"Extracted {len(features)} features for transaction (fused)")
+        return features
+    
+    async def _extract_features_with_store(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Extract features from the online feature store, backfilling what it lacks from Postgres"""
+        merchant_id = transaction_data.get("merchant_id")
+        device_id = transaction_data.get("device_id")
+        members = self._sketch_members(transaction_data, user_id)
+        
+        try:
+            inputs = await self.feature_store.read(user_id, merchant_id, device_id, sketch_members=members)
+        except Exception as e:
+            logger.warning(f"Feature store read failed, falling back to Postgres: {e}")
+            return await self._extract_features_fused(transaction_data, user_id)
+        
+        missing = self.feature_store.missing(inputs, with_sketches=members is not None)
+        if missing:
+            inputs = await self._fetch_fused_inputs(transaction_data, user_id)
+            await self._backfill_feature_store(user_id, merchant_id, device_id, inputs, missing, members)
+        
+        features = self._features_from_inputs(transaction_data, user_id, inputs)
+        logger.debug(f"Extracted {len(features)} features for transaction (feature store, missing: {sorted(missing)})")
+        return features
+    
+    async def _backfill_feature_store(self, user_id: str, merchant_id: Optional[str], device_id: Optional[str],
+                                      inputs: Dict[str, Any], missing: set,
+                                      sketch_members: Optional[Dict[str, Tuple[str, str]]] = None) -> None:
+        """Load the store components Postgres inputs do not cover and write everything missing back"""
+        try:
+            device_user_counts = None
+            if device_id and "device_txn_count" in missing:
+                result = await self.db.execute(
+                    select(Transaction.user_id, func.count(Transaction.id))
+                    .where(Transaction.device_id == device_id)
+                    .group_by(Transaction.user_id)
+                )
+                device_user_counts = dict(result.all())
             
-            logger.debug(f"Extracted {len(features)} features for transaction")
-            return features
+            merchant_activity = None
+            if merchant_id and "merchant_activity_24h" in missing:
+                recent_time = datetime.now() - timedelta(hours=24)
+                result = await self.db.execute(
+                    select(Transaction.transaction_id, Transaction.user_id, Transaction.transaction_time)
+                    .where(
+                        and_(
+                            Transaction.merchant_id == merchant_id,
+                            Transaction.user_id.isnot(None),
+                            Transaction.transaction_time >= recent_time,
+                        )
+                    )
+                )
+                merchant_activity = result.all()
             
+            await self.feature_store.backfill(
+                user_id, merchant_id, device_id, inputs, missing,
+                device_user_counts=device_user_counts,
+                merchant_activity=merchant_activity,
+                sketch_members=sketch_members,
+            )
         except Exception as e:
-            logger.error(f"Feature extraction failed: {e}")
+            logger.warning(f"Feature store backfill failed: {e}")
+    
+    async def _fetch_fused_inputs(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """
+        Every DB-backed feature input from one statement (cached profiles excluded).
+        
+        Profile misses stay single-flight with the sequential path: a profile
+        another request is already loading is awaited from that load instead of
+        selected again, and profiles selected here are claimed in the cache
+        first, so concurrent lookups of the same key wait for this statement.
+        
+        Keys: user_stats (stats row or None) or, with stats disabled, behavioral
+        (window features); merchant_profile, device_profile, device_txn_count,
+        merchant_activity_24h and either sketches (kind -> HyperLogLog or
+        None) or, with sketches disabled, shared_device_count.
+        """
+        merchant_id = transaction_data.get("merchant_id")
+        device_id = transaction_data.get("device_id")
+        members = self._sketch_members(transaction_data, user_id)
+        
+        # Cached profiles, and profiles another request is loading, are left out of the
+        # statement; the rest are claimed so concurrent lookups wait for this statement
+        sources = {
+            "merchant_profile": (profile_cache.merchant_cache, merchant_id, self._load_merchant_profile),
+            "device_profile": (profile_cache.device_cache, device_id, self._load_device_profile),
+            "device_txn_count": (profile_cache.device_txn_count_cache, device_id,
+                                 self._load_device_transaction_count),
+        }
+        lookups = {name: self._claim_cache(cache, entity_id) for name, (cache, entity_id, _) in sources.items()}
+        load = {name: state in ("claimed", "load") for name, (state, _) in lookups.items()}
+        claims = {name: {sources[name][1]: claim} for name, (state, claim) in lookups.items() if state == "claimed"}
+        
+        try:
+            result = await self.db.execute(self._build_fused_query(
+                user_id, merchant_id, device_id,
+                load_merchant=load["merchant_profile"],
+                load_device=load["device_profile"],
+                load_device_count=load["device_txn_count"],
+                sketch_members=members,
+            ))
+            row = result.one()
+            loaded = self._fused_profiles(row, load)
+        except BaseException as e:
+            for name, claim in claims.items():
+                self._settle_claims(sources[name][0], claim, error=e)
+            raise
+        for name, claim in claims.items():
+            self._settle_claims(sources[name][0], claim, {sources[name][1]: loaded[name]})
+        
+        profiles = {}
+        for name, (state, value) in lookups.items():
+            if state == "hit":
+                profiles[name] = value
+            elif state == "loading":
+                profiles[name] = await sources[name][2](sources[name][1])
+            else:
+                profiles[name] = loaded[name]
+        
+        inputs = {}
+        if self.use_behavior_stats:
+            inputs["user_stats"] = row if row.transaction_count else None
+        elif row.txn_count:
+            txn_count = int(row.txn_count)
+            avg_amount = float(row.avg_amount)
+            # Population std from E[x^2] - E[x]^2 (matches np.std over the window)
+            variance = float(row.avg_amount_sq) - avg_amount ** 2 if txn_count > 1 else 0.0
+            # Mean gap between consecutive transactions telescopes to (last - first) / (n - 1)
+            span_hours = (row.last_time - row.first_time).total_seconds() / 3600
+            inputs["behavioral"] = self._behavioral_from_aggregates(
+                transaction_data,
+                transaction_count=txn_count,
+                avg_amount=avg_amount,
+                amount_std=np.sqrt(max(variance, 0.0)),
+                avg_frequency_hours=span_hours / (txn_count - 1) if txn_count > 1 else 0,
+                last_transaction_time=row.last_time,
+                first_transaction_time=row.first_time,
+                fraud_count=int(row.fraud_count or 0),
+                avg_risk_score=float(row.avg_risk_score) if row.avg_risk_score is not None else 0.0,
+            )
+        else:
+            inputs["behavioral"] = self._behavioral_from_stats(None, transaction_data)
+        
+        inputs.update(profiles)
+        inputs["merchant_activity_24h"] = int(row.merchant_activity_24h or 0)
+        if members is None:
+            inputs["shared_device_count"] = int(row.shared_device_count or 0)
+        else:
+            inputs["sketches"] = {
+                kind: self._sketch_from_bytes(getattr(row, f"sketch_{kind}")) for kind in members
+            }
+        return inputs
+    
+    @staticmethod
+    def _fused_profiles(row: Any, load: Dict[str, bool]) -> Dict[str, Any]:
+        """Profiles selected by the fused statement, keyed like its inputs"""
+        profiles = {}
+        if load["merchant_profile"]:
+            profiles["merchant_profile"] = None
+            if row.merchant_pk is not None:
+                profiles["merchant_profile"] = {
+                    "risk_score": row.merchant_risk_score,
+                    "total_transactions": row.merchant_total_transactions,
+                    "fraud_count": row.merchant_fraud_count,
+                    "avg_transaction_amount": row.merchant_avg_transaction_amount,
+                    "category": row.merchant_category,
+                }
+        if load["device_profile"]:
+            profiles["device_profile"] = None
+            if row.device_pk is not None:
+                profiles["device_profile"] = {
+                    "risk_score": row.device_risk_score,
+                    "associated_accounts": row.device_associated_accounts,
+                    "is_suspicious": row.device_is_suspicious,
+                    "device_type": row.device_type,
+                }
+        if load["device_txn_count"]:
+            profiles["device_txn_count"] = int(row.device_txn_count or 0)
+        return profiles
+    
+    def _sketch_members(self, transaction_data: Dict[str, Any], user_id: str) -> Optional[Dict[str, Tuple[str, str]]]:
+        """Sketch keys touched by the transaction, or None with sketches disabled"""
+        if not self.use_sketches:
+            return None
+        return entity_sketches.sketch_members(
+            user_id,
+            transaction_data.get("merchant_id"),
+            transaction_data.get("device_id"),
+            transaction_data.get("ip_address"),
+        )
+    
+    @staticmethod
+    def _sketch_from_bytes(data: Optional[bytes]) -> Optional[entity_sketches.HyperLogLog]:
+        return entity_sketches.HyperLogLog.from_bytes(data) if data is not None else None
+    
+    def _features_from_inputs(self, transaction_data: Dict[str, Any], user_id: str,
+                              inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Assemble the feature dict from pre-fetched inputs (fused statement or feature store)"""
+        features = {}
+        features.update(self._extract_basic_features(transaction_data))
+        if "behavioral" in inputs:
+            features.update(inputs["behavioral"])
+        else:
+            features.update(self._behavioral_from_stats(inputs["user_stats"], transaction_data))
+        features.update(self._merchant_features_from_profile(inputs["merchant_profile"]))
+        features.update(self._device_features_from_profile(inputs["device_profile"], inputs["device_txn_count"]))
+        features.update(self._extract_temporal_features(transaction_data))
+        if "sketches" in inputs:
+            distinct = entity_sketches.distinct_features(
+                inputs["sketches"], self._sketch_members(transaction_data, user_id)
+            )
+            features.update(distinct)
+            shared_device_count = distinct["shared_device_count"]
+        else:
+            shared_device_count = inputs["shared_device_count"]
+        features.update(self._graph_features_from_counts(shared_device_count, inputs["merchant_activity_24h"]))
+        features.update(self._create_derived_features(features))
+        return features
+    
+    def _build_fused_query(
+        self,
+        user_id: str,
+        merchant_id: Optional[str],
+        device_id: Optional[str],
+        load_merchant: bool = True,
+        load_device: bool = True,
+        load_device_count: bool = True,
+        sketch_members: Optional[Dict[str, Tuple[str, str]]] = None,
+    ):
+        """
+        Single statement returning every DB-backed feature input: the user's
+        behavior stats row (or, with stats disabled, window aggregates over
+        recent history in a CTE), the merchant and device rows (LEFT JOINs)
+        and the device / shared-device / merchant-activity counts (scalar
+        subqueries). The load_* flags drop inputs already served from cache.
+        With `sketch_members` the shared-device count is replaced by one
+        `sketch_{kind}` primary-key lookup per entity sketch.
+        """
+        if self.use_behavior_stats:
+            # One primary-key lookup; the anchor row keeps the result at exactly one row
+            anchor = select(literal(1).label("anchor")).subquery("anchor")
+            user_columns = [
+                column for column in UserBehaviorStats.__table__.c
+                if column.name not in ("user_id", "updated_at")
+            ]
+            user_from = anchor.outerjoin(UserBehaviorStats, UserBehaviorStats.user_id == user_id)
+        else:
+            recent = (
+                select(
+                    Transaction.amount,
+                    Transaction.transaction_time,
+                    Transaction.is_fraudulent,
+                    Transaction.risk_score,
+                )
+                .where(Transaction.user_id == user_id)
+                .order_by(desc(Transaction.transaction_time))
+                .limit(USER_HISTORY_LIMIT)
+                .cte("recent_user_transactions")
+            )
+            user_stats = select(
+                func.count().label("txn_count"),
+                func.avg(recent.c.amount).label("avg_amount"),
+                func.avg(recent.c.amount * recent.c.amount).label("avg_amount_sq"),
+                func.min(recent.c.transaction_time).label("first_time"),
+                func.max(recent.c.transaction_time).label("last_time"),
+                func.sum(case((recent.c.is_fraudulent == True, 1), else_=0)).label("fraud_count"),
+                func.avg(recent.c.risk_score).label("avg_risk_score"),
+            ).subquery("user_stats")
+            user_columns = [user_stats]
+            user_from = user_stats
+        
+        columns = list(user_columns)
+        from_clause = user_from
+        if load_merchant:
+            columns += [
+                Merchant.id.label("merchant_pk"),
+                Merchant.risk_score.label("merchant_risk_score"),
+                Merchant.total_transactions.label("merchant_total_transactions"),
+                Merchant.fraud_count.label("merchant_fraud_count"),
+                Merchant.avg_transaction_amount.label("merchant_avg_transaction_amount"),
+                Merchant.category.label("merchant_category"),
+            ]
+            from_clause = from_clause.outerjoin(Merchant, Merchant.id == merchant_id)
+        if load_device:
+            columns += [
+                Device.id.label("device_pk"),
+                Device.risk_score.label("device_risk_score"),
+                Device.associated_accounts.label("device_associated_accounts"),
+                Device.is_suspicious.label("device_is_suspicious"),
+                Device.device_type.label("device_type"),
+            ]
+            from_clause = from_clause.outerjoin(Device, Device.id == device_id)
+        
+        if device_id:
+            if load_device_count:
+                columns.append(
+                    select(func.count(Transaction.id))
+                    .where(Transaction.device_id == device_id)
+                    .scalar_subquery()
+                    .label("device_txn_count")
+                )
+        elif load_device_count:
+            columns.append(literal(0).label("device_txn_count"))
+        
+        if merchant_id:
+            recent_time = datetime.now() - timedelta(hours=24)
+            merchant_activity = (
+                select(func.count(Transaction.id))
+                .where(
+                    and_(
+                        Transaction.merchant_id == merchant_id,
+                        Transaction.user_id != user_id,
+                        Transaction.transaction_time >= recent_time,
+                    )
+                )
+                .scalar_subquery()
+            )
+        else:
+            merchant_activity = literal(0)
+        
+        if sketch_members is not None:
+            for kind, (entity_id, _) in sketch_members.items():
+                columns.append(
+                    select(EntitySketch.sketch)
+                    .where(and_(EntitySketch.kind == kind, EntitySketch.entity_id == entity_id))
+                    .scalar_subquery()
+                    .label(f"sketch_{kind}")
+                )
+        elif device_id:
+            columns.append(
+                select(func.count(Transaction.id))
+                .where(and_(Transaction.device_id == device_id, Transaction.user_id != user_id))
+                .scalar_subquery()
+                .label("shared_device_count")
+            )
+        else:
+            columns.append(literal(0).label("shared_device_count"))
+        
+        return select(
+            *columns,
+            merchant_activity.label("merchant_activity_24h"),
+        ).select_from(from_clause)
+    
+    async def extract_features_batch(
+        self,
+        transactions: Sequence[Dict[str, Any]],
+        user_ids: Union[str, UUID, Sequence[Union[str, UUID]]],
+    ) -> np.ndarray:
+        """
+        Feature matrix for a batch: one float32 row per transaction, columns in FEATURE_ORDER
+        
+        Row i equals feature_schema.to_vector(extract_features(transactions[i],
+        user_ids[i])). Each DB-backed input is loaded for the whole batch with
+        one IN (...) query and the columns are computed over NumPy arrays.
+        `user_ids` is one id per transaction or a single id for all of them.
+        """
+        n = len(transactions)
+        if isinstance(user_ids, (str, UUID)):
+            user_ids = [user_ids] * n
+        user_ids = [str(user_id) for user_id in user_ids]
+        if len(user_ids) != n:
+            raise ValueError(f"Expected {n} user ids, got {len(user_ids)}")
+        
+        matrix = np.zeros((n, len(FEATURE_ORDER)), dtype=np.float32)
+        if not n:
+            return matrix
+        
+        try:
+            columns = await self._batch_feature_columns(transactions, user_ids)
+        except Exception as e:
+            logger.error(f"Batch feature extraction failed: {e}")
             await self.db.rollback()
-            return self._extract_basic_features(transaction_data)
+            columns = self._batch_default_columns(transactions)
+        
+        missing = [name for name in FEATURE_ORDER if name not in columns]
+        if missing:
+            raise SchemaMismatchError(f"Batch extraction is missing schema features: {missing}")
+        for name, index in FEATURE_INDEX.items():
+            matrix[:, index] = columns[name]
+        
+        if self.use_velocity:
+            # Only the burst risk fits the matrix; the per-window values are not schema features
+            graph_risk = FEATURE_INDEX["graph_risk_raw"]
+            for row, (transaction_data, user_id) in enumerate(zip(transactions, user_ids)):
+                burst = velocity.burst_risk(velocity.observe_transaction(transaction_data, user_id))
+                matrix[row, graph_risk] = min(matrix[row, graph_risk] + burst, 1.0)
+        
+        logger.debug(f"Extracted {matrix.shape[0]}x{matrix.shape[1]} feature matrix for batch")
+        return matrix
+    
+    async def _batch_feature_columns(self, transactions: Sequence[Dict[str, Any]],
+                                     user_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Every FEATURE_ORDER column the extractor produces, as arrays over the batch"""
+        now = datetime.now()
+        merchant_ids = [t.get("merchant_id") or None for t in transactions]
+        device_ids = [t.get("device_id") or None for t in transactions]
+        
+        columns = self._batch_basic_columns(transactions)
+        columns.update(await self._batch_behavioral_columns(user_ids, now))
+        std = columns["user_amount_std"]
+        columns["behavioral_deviation"] = np.where(
+            std > 0, (columns["amount"] - columns["user_avg_amount"]) / np.where(std > 0, std, 1.0), 0.0
+        )
+        
+        merchants = await self._batch_load_profiles(Merchant, profile_cache.merchant_cache,
+                                                    merchant_ids, self._merchant_profile)
+        devices = await self._batch_load_profiles(Device, profile_cache.device_cache,
+                                                  device_ids, self._device_profile)
+        # Unknown or absent merchants / devices score 0.5, as in the per-transaction path
+        merchant_rows = [merchants[m] if m else None for m in merchant_ids]
+        device_rows = [devices[d] if d else None for d in device_ids]
+        columns["merchant_risk_score"] = np.array([
+            float(m["risk_score"]) / 100.0 if m else 0.5 for m in merchant_rows
+        ])
+        columns["merchant_fraud_count"] = np.array([float(m["fraud_count"] or 0) if m else 0.0 for m in merchant_rows])
+        columns["merchant_total_txn"] = np.array([
+            float(m["total_transactions"] or 0) if m else 0.0 for m in merchant_rows
+        ])
+        columns["device_risk_score"] = np.array([
+            float(d["risk_score"]) / 100.0 if d else 0.5 for d in device_rows
+        ])
+        columns["device_is_suspicious"] = np.array([1.0 if d and d["is_suspicious"] else 0.0 for d in device_rows])
+        columns["device_account_count"] = np.array([
+            float(d["associated_accounts"] or 0) if d else 1.0 for d in device_rows
+        ])
+        
+        n = len(transactions)
+        columns["hour_of_day"] = np.full(n, now.hour, dtype=np.float64)
+        columns["day_of_week"] = np.full(n, now.weekday(), dtype=np.float64)
+        columns["is_weekend"] = np.full(n, 1.0 if now.weekday() >= 5 else 0.0)
+        
+        shared_device_count = await self._batch_shared_device_counts(device_ids, user_ids)
+        merchant_activity = await self._batch_merchant_activity(merchant_ids, user_ids, now)
+        graph_risk = np.where(shared_device_count > 3, 0.3, 0.0) + np.where(merchant_activity > 10, 0.2, 0.0)
+        columns["graph_risk_raw"] = np.minimum(graph_risk, 1.0)
+        return columns
+    
+    def _batch_basic_columns(self, transactions: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Basic transaction features as arrays (see _extract_basic_features)"""
+        amounts = np.array([float(t.get("amount", 0)) for t in transactions], dtype=np.float64)
+        has_location = np.array([bool(t.get("location_lat") and t.get("location_lng")) for t in transactions])
+        return {
+            "amount": amounts,
+            "amount_log": np.log1p(amounts),
+            "currency": np.array([self._encode_currency(t.get("currency", "USD")) for t in transactions],
+                                 dtype=np.float64),
+            "transaction_type": np.array([self._encode_transaction_type(t.get("transaction_type", "purchase"))
+                                          for t in transactions], dtype=np.float64),
+            "category": np.array([self._encode_category(t.get("category", "other")) for t in transactions],
+                                 dtype=np.float64),
+            "has_location": has_location.astype(np.float64),
+            "latitude": np.array([float(t["location_lat"]) if located else 0.0
+                                  for t, located in zip(transactions, has_location)]),
+            "longitude": np.array([float(t["location_lng"]) if located else 0.0
+                                   for t, located in zip(transactions, has_location)]),
+        }
+    
+    def _batch_default_columns(self, transactions: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Every schema column without DB-backed inputs (see _default_features)"""
+        columns = self._batch_basic_columns(transactions)
+        defaults = self._default_features({})
+        for name in FEATURE_ORDER:
+            if name not in columns:
+                columns[name] = np.full(len(transactions), float(defaults[name]))
+        return columns
+    
+    async def _batch_behavioral_columns(self, user_ids: List[str], now: datetime) -> Dict[str, np.ndarray]:
+        """
+        Behavioral features for every user in the batch from one query: the
+        user_behavior_stats rows or, with stats disabled, each user's last
+        USER_HISTORY_LIMIT transactions (grouped with bincount).
+        """
+        users = list(dict.fromkeys(user_ids))
+        position = {user_id: i for i, user_id in enumerate(users)}
+        now_us = np.datetime64(now, "us").astype(np.int64)
+        first_us = np.full(len(users), now_us, dtype=np.int64)
+        last_us = np.full(len(users), now_us, dtype=np.int64)
+        
+        if self.use_behavior_stats:
+            result = await self.db.execute(
+                select(
+                    UserBehaviorStats.user_id,
+                    UserBehaviorStats.transaction_count,
+                    UserBehaviorStats.amount_mean,
+                    UserBehaviorStats.amount_m2,
+                    UserBehaviorStats.first_transaction_time,
+                    UserBehaviorStats.last_transaction_time,
+                ).where(UserBehaviorStats.user_id.in_(users))
+            )
+            counts = np.zeros(len(users))
+            means = np.zeros(len(users))
+            m2 = np.zeros(len(users))
+            for row in result.all():
+                if not row.transaction_count:
+                    continue
+                i = position[str(row.user_id)]
+                counts[i], means[i], m2[i] = row.transaction_count, row.amount_mean, row.amount_m2
+                first_us[i] = np.datetime64(row.first_transaction_time, "us").astype(np.int64)
+                last_us[i] = np.datetime64(row.last_transaction_time, "us").astype(np.int64)
+            variance = np.maximum(m2, 0.0) / np.maximum(counts, 1)
+        else:
+            ranked = (
+                select(
+                    Transaction.user_id,
+                    Transaction.amount,
+                    Transaction.transaction_time,
+                    func.row_number().over(
+                        partition_by=Transaction.user_id,
+                        order_by=desc(Transaction.transaction_time),
+                    ).label("recency"),
+                )
+                .where(Transaction.user_id.in_(users))
+                .subquery("ranked")
+            )
+            result = await self.db.execute(
+                select(ranked.c.user_id, ranked.c.amount, ranked.c.transaction_time)
+                .where(ranked.c.recency <= USER_HISTORY_LIMIT)
+            )
+            rows = result.all()
+            group = np.array([position[str(row.user_id)] for row in rows], dtype=np.intp)
+            amounts = np.array([row.amount for row in rows], dtype=np.float64)
+            times_us = np.array([row.transaction_time for row in rows], dtype="datetime64[us]").astype(np.int64)
+            counts = np.bincount(group, minlength=len(users)).astype(np.float64)
+            means = np.bincount(group, weights=amounts, minlength=len(users)) / np.maximum(counts, 1)
+            # Two-pass population variance per user (matches np.std over the window)
+            variance = (
+                np.bincount(group, weights=(amounts - means[group]) ** 2, minlength=len(users))
+                / np.maximum(counts, 1)
+            )
+            first_us[counts > 0] = np.iinfo(np.int64).max
+            last_us[counts > 0] = np.iinfo(np.int64).min
+            np.minimum.at(first_us, group, times_us)
+            np.maximum.at(last_us, group, times_us)
+        
+        has_history = counts > 0
+        multiple = counts >= 2
+        # Mean gap between consecutive transactions: (last - first) / (n - 1)
+        span_hours = (last_us - first_us) / 3.6e9
+        frequency_hours = np.where(multiple, span_hours / np.maximum(counts - 1, 1), 0.0)
+        index = np.array([position[user_id] for user_id in user_ids], dtype=np.intp)
+        return {
+            "user_transaction_count": counts[index],
+            "user_avg_amount": np.where(has_history, means, 0.0)[index],
+            "user_amount_std": np.where(multiple, np.sqrt(variance), 0.0)[index],
+            "user_frequency_days": (frequency_hours / 24)[index],
+            "is_new_user": (~has_history).astype(np.float64)[index],
+            "time_since_first_transaction": np.where(has_history, (now_us - first_us) / 8.64e10, 0.0)[index],
+        }
+    
+    async def _batch_load_profiles(self, model: Any, cache: profile_cache.AsyncTTLCache,
+                                   entity_ids: List[Optional[str]], snapshot) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Profiles by id (None if unknown): cache hits first, the rest in one IN query (joining loads in flight)"""
+        profiles: Dict[str, Optional[Dict[str, Any]]] = {}
+        claims: Dict[str, Any] = {}
+        to_load, joined = [], []
+        for entity_id in dict.fromkeys(e for e in entity_ids if e):
+            state, value = self._claim_cache(cache, entity_id)
+            if state == "hit":
+                profiles[entity_id] = value
+            elif state == "loading":
+                joined.append(entity_id)
+            else:
+                to_load.append(entity_id)
+                if state == "claimed":
+                    claims[entity_id] = value
+        if to_load:
+            try:
+                result = await self.db.execute(select(model).where(model.id.in_(to_load)))
+                loaded = {obj.id: snapshot(obj) for obj in result.scalars()}
+            except BaseException as e:
+                self._settle_claims(cache, claims, error=e)
+                raise
+            for entity_id in to_load:
+                profiles[entity_id] = loaded.get(entity_id)
+            self._settle_claims(cache, claims, profiles)
+        
+        async def load(entity_id):
+            result = await self.db.execute(select(model).where(model.id == entity_id))
+            obj = result.scalar_one_or_none()
+            return snapshot(obj) if obj else None
+        
+        for entity_id in joined:
+            profiles[entity_id] = await self._cached(cache, entity_id, lambda: load(entity_id))
+        return profiles
+    
+    async def _batch_shared_device_counts(self, device_ids: List[Optional[str]], user_ids: List[str]) -> np.ndarray:
+        """shared_device_count per transaction: sketch estimates, or transaction counts with sketches disabled"""
+        devices = list(dict.fromkeys(d for d in device_ids if d))
+        if not devices:
+            return np.zeros(len(device_ids))
+        
+        if not self.use_sketches:
+            result = await self.db.execute(
+                select(Transaction.device_id, Transaction.user_id, func.count(Transaction.id))
+                .where(Transaction.device_id.in_(devices))
+                .group_by(Transaction.device_id, Transaction.user_id)
+            )
+            return self._other_user_counts(result.all(), device_ids, user_ids)
+        
+        result = await self.db.execute(
+            select(EntitySketch.entity_id, EntitySketch.sketch)
+            .where(and_(EntitySketch.kind == "device_users", EntitySketch.entity_id.in_([str(d) for d in devices])))
+        )
+        sketches = {entity_id: entity_sketches.HyperLogLog.from_bytes(data) for entity_id, data in result.all()}
+        estimates: Dict[Tuple[str, str], int] = {}
+        shared = np.zeros(len(device_ids))
+        for i, (device_id, user_id) in enumerate(zip(device_ids, user_ids)):
+            if not device_id:
+                continue
+            key = (str(device_id), user_id)
+            if key not in estimates:
+                estimates[key] = entity_sketches.distinct_features(
+                    {"device_users": sketches.get(key[0])}, {"device_users": key}
+                )["shared_device_count"]
+            shared[i] = estimates[key]
+        return shared
+    
+    async def _batch_merchant_activity(self, merchant_ids: List[Optional[str]], user_ids: List[str],
+                                       now: datetime) -> np.ndarray:
+        """merchant_activity_24h per transaction: other users' transactions at the merchant in the last 24h"""
+        merchants = list(dict.fromkeys(m for m in merchant_ids if m))
+        if not merchants:
+            return np.zeros(len(merchant_ids))
+        result = await self.db.execute(
+            select(Transaction.merchant_id, Transaction.user_id, func.count(Transaction.id))
+            .where(
+                and_(
+                    Transaction.merchant_id.in_(merchants),
+                    Transaction.transaction_time >= now - timedelta(hours=24),
+                )
+            )
+            .group_by(Transaction.merchant_id, Transaction.user_id)
+        )
+        return self._other_user_counts(result.all(), merchant_ids, user_ids)
+    
+    @staticmethod
+    def _other_user_counts(rows: List[Tuple[Any, Any, int]], entity_ids: List[Optional[str]],
+                           user_ids: List[str]) -> np.ndarray:
+        """
+        Per transaction, the count for its entity minus the user's own, from
+        (entity_id, user_id, count) groups. Matches `user_id != :uid`, which
+        never counts NULL user ids.
+        """
+        totals: Dict[Any, int] = defaultdict(int)
+        own: Dict[Tuple[Any, str], int] = {}
+        for entity_id, user_id, count in rows:
+            if user_id is None:
+                continue
+            totals[entity_id] += count
+            own[(entity_id, str(user_id))] = count
+        return np.array([
+            totals.get(entity_id, 0) - own.get((entity_id, user_id), 0) if entity_id else 0
+            for entity_id, user_id in zip(entity_ids, user_ids)
+        ], dtype=np.float64)
     
     def _extract_basic_features(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract basic transaction features"""
@@ -96,13 +836,16 @@ class FeatureExtractor:
         try:
             from sqlalchemy import select
             
-            # Get user's transaction history
-            query = select(Transaction).where(
-                Transaction.user_id == user_id
-            ).order_by(desc(Transaction.transaction_time)).limit(100)
+            if self.use_behavior_stats:
+                result = await self.db.execute(
+                    select(UserBehaviorStats).where(UserBehaviorStats.user_id == user_id)
+                )
+                stats = result.scalar_one_or_none()
+                features.update(self._behavioral_from_stats(stats, transaction_data))
+                return features
             
-            result = await self.db.execute(query)
-            user_transactions = result.scalars().all()
+            # Get user's transaction history (projected columns only)
+            user_transactions = await queries.user_history(self.db, user_id, USER_HISTORY_LIMIT)
             
             if not user_transactions:
                 # New user features
@@ -128,43 +871,88 @@ class FeatureExtractor:
             else:
                 avg_frequency = 0
             
-            # Amount statistics
-            avg_amount = np.mean(amounts)
-            amount_std = np.std(amounts) if len(amounts) > 1 else 0
-            
-            # Current transaction comparison
-            current_amount = float(transaction_data.get("amount", 0))
-            amount_ratio = current_amount / avg_amount if avg_amount > 0 else 1.0
-            
-            # Time since last transaction
-            last_transaction_time = transaction_times[0]
-            current_time = datetime.now()
-            hours_since_last = (current_time - last_transaction_time).total_seconds() / 3600
-            
-            features.update({
-                "user_transaction_count": len(user_transactions),
-                "user_avg_amount": float(avg_amount),
-                "user_amount_std": float(amount_std),
-                "user_frequency_days": float(avg_frequency / 24),
-                "amount_ratio": float(amount_ratio),
-                "amount_deviation": float((current_amount - avg_amount) / amount_std) if amount_std > 0 else 0.0,
-                "hours_since_last_transaction": float(hours_since_last),
-                "is_new_user": 0,
-                "time_since_first_transaction": float((current_time - transaction_times[-1]).total_seconds() / 86400),
-                "user_fraud_rate": sum(1 for t in user_transactions if t.is_fraudulent) / len(user_transactions) if user_transactions else 0,
-                "user_avg_risk_score": np.mean([t.risk_score for t in user_transactions]) if user_transactions else 0.0,
-            })
+            features.update(self._behavioral_from_aggregates(
+                transaction_data,
+                transaction_count=len(user_transactions),
+                avg_amount=np.mean(amounts),
+                amount_std=np.std(amounts) if len(amounts) > 1 else 0,
+                avg_frequency_hours=avg_frequency,
+                last_transaction_time=transaction_times[0],
+                first_transaction_time=transaction_times[-1],
+                fraud_count=sum(1 for t in user_transactions if t.is_fraudulent),
+                avg_risk_score=np.mean([t.risk_score for t in user_transactions]),
+            ))
             
         except Exception as e:
             logger.warning(f"Behavioral feature extraction failed: {e}")
             await self.db.rollback()
-            features.update({
+            features.update(self._behavioral_from_stats(None, transaction_data))
+        return features
+    
+    def _behavioral_from_aggregates(
+        self,
+        transaction_data: Dict[str, Any],
+        transaction_count: int,
+        avg_amount: float,
+        amount_std: float,
+        avg_frequency_hours: float,
+        last_transaction_time: datetime,
+        first_transaction_time: datetime,
+        fraud_count: int,
+        avg_risk_score: float,
+    ) -> Dict[str, Any]:
+        """Behavioral features for a user with history, from pre-aggregated statistics"""
+        # Current transaction comparison
+        current_amount = float(transaction_data.get("amount", 0))
+        amount_ratio = current_amount / avg_amount if avg_amount > 0 else 1.0
+        
+        # Time since last transaction
+        current_time = datetime.now()
+        hours_since_last = (current_time - last_transaction_time).total_seconds() / 3600
+        
+        return {
+            "user_transaction_count": transaction_count,
+            "user_avg_amount": float(avg_amount),
+            "user_amount_std": float(amount_std),
+            "user_frequency_days": float(avg_frequency_hours / 24),
+            "amount_ratio": float(amount_ratio),
+            "amount_deviation": float((current_amount - avg_amount) / amount_std) if amount_std > 0 else 0.0,
+            "hours_since_last_transaction": float(hours_since_last),
+            "is_new_user": 0,
+            "time_since_first_transaction": float((current_time - first_transaction_time).total_seconds() / 86400),
+            "user_fraud_rate": fraud_count / transaction_count,
+            "user_avg_risk_score": avg_risk_score if avg_risk_score is not None else 0.0,
+        }
+    
+    def _behavioral_from_stats(self, stats: Any, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Behavioral features from a user_behavior_stats row (None for new
+        users). These cover the user's whole history, where
+        _extract_behavioral_features covers the last USER_HISTORY_LIMIT
+        transactions; the two agree up to that many.
+        """
+        if stats is None or not stats.transaction_count:
+            return {
                 "user_transaction_count": 0,
                 "user_avg_amount": 0.0,
                 "user_amount_std": 0.0,
                 "user_frequency_days": 0.0,
                 "is_new_user": 1,
-            })
+                "time_since_first_transaction": 0.0,
+            }
+        features = self._behavioral_from_aggregates(
+            transaction_data,
+            transaction_count=stats.transaction_count,
+            avg_amount=stats.amount_mean,
+            amount_std=behavior_stats.amount_std(stats),
+            avg_frequency_hours=behavior_stats.mean_interarrival_hours(stats),
+            last_transaction_time=stats.last_transaction_time,
+            first_transaction_time=stats.first_transaction_time,
+            fraud_count=stats.fraud_count,
+            avg_risk_score=stats.risk_score_sum / stats.transaction_count,
+        )
+        features["user_recent_avg_amount"] = float(stats.decayed_amount_mean)
+        features["user_recent_avg_risk_score"] = float(stats.decayed_risk_score_mean)
         return features
     
     async def _extract_merchant_features(self, merchant_id: Optional[str]) -> Dict[str, Any]:
@@ -172,52 +960,17 @@ class FeatureExtractor:
         features = {}
         
         if not merchant_id:
-            features.update({
-                "merchant_risk_score": 0.5,
-                "merchant_transaction_count": 0,
-                "merchant_fraud_rate": 0.0,
-                "merchant_avg_amount": 0.0,
-                "is_known_merchant": 0,
-            })
+            features.update(self._merchant_features_from_profile(None))
             return features
         
         try:
-            from sqlalchemy import select
-            
-            # Get merchant from database
-            query = select(Merchant).where(Merchant.id == merchant_id)
-            result = await self.db.execute(query)
-            merchant = result.scalar_one_or_none()
-            
-            if merchant:
-                features.update({
-                    "merchant_risk_score": float(merchant.risk_score) / 100.0,
-                    "merchant_transaction_count": merchant.total_transactions,
-                    "merchant_fraud_rate": merchant.fraud_count / merchant.total_transactions if merchant.total_transactions > 0 else 0.0,
-                    "merchant_avg_amount": float(merchant.avg_transaction_amount) if merchant.avg_transaction_amount else 0.0,
-                    "is_known_merchant": 1,
-                    "merchant_category": self._encode_category(merchant.category) if merchant.category else 0,
-                })
-            else:
-                # New merchant
-                features.update({
-                    "merchant_risk_score": 0.5,
-                    "merchant_transaction_count": 0,
-                    "merchant_fraud_rate": 0.0,
-                    "merchant_avg_amount": 0.0,
-                    "is_known_merchant": 0,
-                })
+            profile = await self._load_merchant_profile(merchant_id)
+            features.update(self._merchant_features_from_profile(profile))
                 
         except Exception as e:
             logger.warning(f"Merchant feature extraction failed: {e}")
             await self.db.rollback()
-            features.update({
-                "merchant_risk_score": 0.5,
-                "merchant_transaction_count": 0,
-                "merchant_fraud_rate": 0.0,
-                "merchant_avg_amount": 0.0,
-                "is_known_merchant": 0,
-            })
+            features.update(self._merchant_features_from_profile(None))
         
         return features
     
@@ -226,54 +979,144 @@ class FeatureExtractor:
         features = {}
         
         if not device_id:
-            features.update({
-                "device_risk_score": 0.5,
-                "device_transaction_count": 0,
-                "device_associated_accounts": 1,
-                "is_known_device": 0,
-                "device_suspicious": 0,
-            })
+            features.update(self._device_features_from_profile(None, 0))
             return features
         
         try:
-            from sqlalchemy import select
+            profile = await self._load_device_profile(device_id)
             
-            # Get device from database
-            query = select(Device).where(Device.id == device_id)
-            result = await self.db.execute(query)
-            device = result.scalar_one_or_none()
-            
-            if device:
-                features.update({
-                    "device_risk_score": float(device.risk_score) / 100.0,
-                    "device_transaction_count": await self._count_device_transactions(device_id),
-                    "device_associated_accounts": device.associated_accounts,
-                    "is_known_device": 1,
-                    "device_suspicious": 1 if device.is_suspicious else 0,
-                    "device_type": self._encode_device_type(device.device_type) if device.device_type else 0,
-                })
+            if profile:
+                transaction_count = await self._load_device_transaction_count(device_id)
+                features.update(self._device_features_from_profile(profile, transaction_count))
             else:
-                # New device
-                features.update({
-                    "device_risk_score": 0.5,
-                    "device_transaction_count": 0,
-                    "device_associated_accounts": 1,
-                    "is_known_device": 0,
-                    "device_suspicious": 0,
-                })
+                features.update(self._device_features_from_profile(None, 0))
                 
         except Exception as e:
             logger.warning(f"Device feature extraction failed: {e}")
             await self.db.rollback()
-            features.update({
+            features.update(self._device_features_from_profile(None, 0))
+        
+        return features
+    
+    async def _load_merchant_profile(self, merchant_id: str) -> Optional[Dict[str, Any]]:
+        """Merchant profile by primary key, through the profile cache"""
+        async def load():
+            result = await self.db.execute(select(Merchant).where(Merchant.id == merchant_id))
+            merchant = result.scalar_one_or_none()
+            return self._merchant_profile(merchant) if merchant else None
+        
+        return await self._cached(profile_cache.merchant_cache, merchant_id, load)
+    
+    async def _load_device_profile(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Device profile by primary key, through the profile cache"""
+        async def load():
+            result = await self.db.execute(select(Device).where(Device.id == device_id))
+            device = result.scalar_one_or_none()
+            return self._device_profile(device) if device else None
+        
+        return await self._cached(profile_cache.device_cache, device_id, load)
+    
+    async def _load_device_transaction_count(self, device_id: str) -> int:
+        """Device transaction count, through the profile cache"""
+        return await self._cached(
+            profile_cache.device_txn_count_cache, device_id,
+            lambda: self._count_device_transactions(device_id),
+        )
+    
+    async def _cached(self, cache: profile_cache.AsyncTTLCache, entity_id: str, load) -> Any:
+        """Single-flight cached load, or a direct load with the cache disabled"""
+        if not self.use_profile_cache:
+            return await load()
+        return await cache.get_or_load(profile_cache.cache_key(entity_id), load)
+    
+    def _claim_cache(self, cache: profile_cache.AsyncTTLCache, entity_id: Optional[str]) -> Tuple[str, Any]:
+        """cache.claim() for a value loaded by a larger statement; ("load", None) with the cache disabled"""
+        if not self.use_profile_cache or not entity_id:
+            return "load", None
+        return cache.claim(profile_cache.cache_key(entity_id))
+    
+    @staticmethod
+    def _settle_claims(cache: profile_cache.AsyncTTLCache, claims: Dict[str, Any],
+                       values: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None) -> None:
+        """Settle claimed loads (entity id -> claim) with the loaded values, or with the statement's error"""
+        for entity_id, claim in claims.items():
+            key = profile_cache.cache_key(entity_id)
+            if values is not None:
+                cache.settle(key, claim, values[entity_id])
+            elif isinstance(error, Exception):
+                cache.settle(key, claim, error=error)
+            else:
+                cache.settle(key, claim)  # cancelled: waiters load it themselves
+    
+    @staticmethod
+    def _merchant_profile(merchant: Merchant) -> Dict[str, Any]:
+        """Plain-value snapshot of the merchant columns used for features"""
+        return {
+            "risk_score": merchant.risk_score,
+            "total_transactions": merchant.total_transactions,
+            "fraud_count": merchant.fraud_count,
+            "avg_transaction_amount": merchant.avg_transaction_amount,
+            "category": merchant.category,
+        }
+    
+    def _merchant_features_from_profile(self, profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merchant features from a merchant profile (None for unknown merchants)"""
+        if not profile:
+            # New merchant
+            return {
+                "merchant_risk_score": 0.5,
+                "merchant_transaction_count": 0,
+                "merchant_fraud_rate": 0.0,
+                "merchant_avg_amount": 0.0,
+                "is_known_merchant": 0,
+                "merchant_fraud_count": 0,
+                "merchant_total_txn": 0,
+            }
+        total = profile["total_transactions"]
+        return {
+            "merchant_risk_score": float(profile["risk_score"]) / 100.0,
+            "merchant_transaction_count": total,
+            "merchant_fraud_count": profile["fraud_count"] or 0,
+            "merchant_total_txn": total or 0,
+            "merchant_fraud_rate": profile["fraud_count"] / total if total > 0 else 0.0,
+            "merchant_avg_amount": float(profile["avg_transaction_amount"]) if profile["avg_transaction_amount"] else 0.0,
+            "is_known_merchant": 1,
+            "merchant_category": self._encode_category(profile["category"]) if profile["category"] else 0,
+        }
+    
+    @staticmethod
+    def _device_profile(device: Device) -> Dict[str, Any]:
+        """Plain-value snapshot of the device columns used for features"""
+        return {
+            "risk_score": device.risk_score,
+            "associated_accounts": device.associated_accounts,
+            "is_suspicious": device.is_suspicious,
+            "device_type": device.device_type,
+        }
+    
+    def _device_features_from_profile(self, profile: Optional[Dict[str, Any]], transaction_count: int) -> Dict[str, Any]:
+        """Device features from a device profile (None for unknown devices)"""
+        if not profile:
+            # New device
+            return {
                 "device_risk_score": 0.5,
                 "device_transaction_count": 0,
                 "device_associated_accounts": 1,
                 "is_known_device": 0,
                 "device_suspicious": 0,
-            })
-        
-        return features
+                "device_is_suspicious": 0,
+                "device_account_count": 1,
+            }
+        return {
+            "device_risk_score": float(profile["risk_score"]) / 100.0,
+            "device_transaction_count": transaction_count,
+            "device_associated_accounts": profile["associated_accounts"],
+            "is_known_device": 1,
+            "device_suspicious": 1 if profile["is_suspicious"] else 0,
+            "device_is_suspicious": 1 if profile["is_suspicious"] else 0,
+            "device_account_count": profile["associated_accounts"] or 0,
+            "device_type": self._encode_device_type(profile["device_type"]) if profile["device_type"] else 0,
+        }
     
     def _extract_temporal_features(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract temporal features"""
@@ -305,9 +1148,13 @@ class FeatureExtractor:
         try:
             from sqlalchemy import select
             
-            # Get transactions from the same device
+            # Other accounts seen on the same device
             device_id = transaction_data.get("device_id")
-            if device_id:
+            members = self._sketch_members(transaction_data, user_id)
+            if members is not None:
+                sketches = await entity_sketches.load_sketches(self.db, members)
+                features.update(entity_sketches.distinct_features(sketches, members))
+            elif device_id:
                 query = select(func.count(Transaction.id)).where(
                     and_(
                         Transaction.device_id == device_id,
@@ -337,14 +1184,9 @@ class FeatureExtractor:
             else:
                 features["merchant_activity_24h"] = 0
             
-            # Simple graph risk score (simulated)
-            graph_risk = 0.0
-            if features.get("shared_device_count", 0) > 3:
-                graph_risk += 0.3
-            if features.get("merchant_activity_24h", 0) > 10:
-                graph_risk += 0.2
-            
-            features["graph_risk_raw"] = min(graph_risk, 1.0)
+            features.update(self._graph_features_from_counts(
+                features["shared_device_count"], features["merchant_activity_24h"]
+            ))
             
         except Exception as e:
             logger.warning(f"Graph feature extraction failed: {e}")
@@ -357,6 +1199,21 @@ class FeatureExtractor:
         
         return features
     
+    def _graph_features_from_counts(self, shared_device_count: int, merchant_activity_count: int) -> Dict[str, Any]:
+        """Graph features from shared-device and merchant-activity counts"""
+        # Simple graph risk score (simulated)
+        graph_risk = 0.0
+        if shared_device_count > 3:
+            graph_risk += 0.3
+        if merchant_activity_count > 10:
+            graph_risk += 0.2
+        
+        return {
+            "shared_device_count": shared_device_count,
+            "merchant_activity_24h": merchant_activity_count,
+            "graph_risk_raw": min(graph_risk, 1.0),
+        }
+    
     def _create_derived_features(self, features: Dict[str, Any]) -> Dict[str, Any]:
         """Create derived/engineered features"""
         derived = {}
@@ -386,6 +1243,9 @@ class FeatureExtractor:
         if "hours_since_last_transaction" in features:
             derived["rapid_transaction_flag"] = 1 if features["hours_since_last_transaction"] < 1.0 else 0
         
+        # Amount z-score against the user's history (0 without enough history)
+        derived["behavioral_deviation"] = float(features.get("amount_deviation", 0.0))
+        
         return derived
     
     async def _count_device_transactions(self, device_id: str) -> int:
@@ -4,51 +4,153 @@ Client for communicating with the ML service
 
 import json
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Protocol, runtime_checkable
 import httpx
 from loguru import logger
 
 from app.core.config import settings
+from app.services import feature_schema
+from app.services.upstream import UpstreamUnavailable, get_upstream
+
+
+def rows_from_columns(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """A column-oriented /predict_batch response as one /predict-shaped dict per row"""
+    shared = {
+        "features_used": columns.pop("features_used", []),
+        "model_version": columns.pop("model_version", None),
+    }
+    rows = columns.pop("rows")
+    return [
+        # Columns that are off for the batch (e.g. cascade_stages) are null rather than a list
+        {**{name: None if values is None else values[i] for name, values in columns.items()}, **shared}
+        for i in range(rows)
+    ]
+
+
+@runtime_checkable
+class ScoringBackend(Protocol):
+    """What ScoringOrchestrator and the endpoints call on a scoring client (MLClient, EmbeddedMLClient)"""
+
+    async def predict(self, features: Dict[str, Any], transaction_data: Dict[str, Any]) -> Dict[str, Any]: ...
+
+    async def predict_batch(self, feature_matrix, entity_keys=None) -> List[Dict[str, Any]]: ...
+
+    async def get_model_info(self) -> Dict[str, Any]: ...
+
+    async def health_check(self) -> bool: ...
+
+
+def scoring_client() -> ScoringBackend:
+    """
+    The configured scoring backend: an MLClient for SCORING_BACKEND=remote,
+    the process-wide embedded_ml.EmbeddedMLClient for "embedded" (same
+    methods, same result shapes)
+    """
+    if settings.SCORING_BACKEND == "embedded":
+        from app.services.embedded_ml import get_embedded_ml
+        return get_embedded_ml()
+    if settings.SCORING_BACKEND != "remote":
+        raise ValueError(f"SCORING_BACKEND must be 'remote' or 'embedded', got {settings.SCORING_BACKEND!r}")
+    return MLClient()
 
 
 class MLClient:
-    """HTTP client for ML service communication"""
+    """HTTP client for ML service communication (on the shared pooled "ml" upstream)"""
     
     def __init__(self):
         self.base_url = settings.ML_SERVICE_URL
         self.timeout = settings.ML_MODEL_TIMEOUT
+        self.upstream = get_upstream("ml")
         
     async def predict(self, features: Dict[str, Any], transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Send transaction data to ML service for prediction
+        Send the transaction's feature vector to ML service for prediction
+        
+        The features are packed into the shared float32 layout
+        (feature_schema.encode) and posted as a binary body, followed by the
+        transaction's entity keys (user, device, merchant, IP hashes) that
+        place it in the ML service's entity graph. With several ML replicas
+        a slow call is hedged on a second one (see upstream.ReplicaSet). A
+        feature dict missing schema columns, or a service on a different
+        schema version, raises SchemaMismatchError.
         
         Returns:
             Dict containing anomaly_score, graph_risk_score, fraud_type, etc.
         """
+        body = feature_schema.encode_with_entities(
+            feature_schema.to_vector(features), feature_schema.entity_keys(transaction_data)
+        )
+        try:
+            response = await self.upstream.post(
+                "/predict",
+                content=body,
+                headers={"Content-Type": feature_schema.CONTENT_TYPE},
+                hedge=settings.ML_HEDGE_ENABLED,
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result
+            if response.status_code in (415, 422):
+                logger.error(
+                    f"ML service rejected feature schema v{feature_schema.FEATURE_SCHEMA_VERSION} "
+                    f"({feature_schema.FINGERPRINT.hex()}) for transaction "
+                    f"{transaction_data.get('transaction_id')}: {response.text}"
+                )
+                raise feature_schema.SchemaMismatchError(response.text)
+            logger.error(f"ML service error: {response.status_code} - {response.text}")
+            response.raise_for_status()
+                
+        except httpx.TimeoutException as e:
+            logger.error("ML service timeout")
+            raise RuntimeError("ML service timeout") from e
+        except UpstreamUnavailable as e:
+            logger.warning(f"ML service call refused: {e}")
+            raise
+        except (httpx.HTTPStatusError, feature_schema.SchemaMismatchError):
+            raise
+        except Exception as e:
+            logger.error(f"ML service communication failed: {e}")
+            raise RuntimeError(f"ML service unavailable: {e}") from e
+    
+    async def predict_batch(self, feature_matrix, entity_keys=None) -> List[Dict[str, Any]]:
+        """
+        Score an (N, n) float32 matrix in FEATURE_ORDER with one request
+        
+        Posts the matrix (and the rows' (N, 4) entity keys, if given) to
+        /predict_batch, where each model runs once over all rows, and splits
+        the column-oriented response back into one dict per row, shaped
+        like the predict() result.
+        """
+        if entity_keys is None:
+            body = feature_schema.encode(feature_matrix)
+        else:
+            body = feature_schema.encode_with_entities(feature_matrix, entity_keys)
         try:
-            payload = {
-                "features": features,
-                "transaction_data": transaction_data,
-                "timestamp": transaction_data.get("timestamp")
-            }
+            response = await self.upstream.post(
+                "/predict_batch",
+                content=body,
+                headers={"Content-Type": feature_schema.CONTENT_TYPE}
+            )
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/predict",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
+            if response.status_code == 200:
+                return rows_from_columns(response.json())
+            if response.status_code in (415, 422):
+                logger.error(
+                    f"ML service rejected feature schema v{feature_schema.FEATURE_SCHEMA_VERSION} "
+                    f"({feature_schema.FINGERPRINT.hex()}) for a batch of {len(feature_matrix)}: {response.text}"
                 )
+                raise feature_schema.SchemaMismatchError(response.text)
+            logger.error(f"ML service batch error: {response.status_code} - {response.text}")
+            response.raise_for_status()
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result
-                logger.error(f"ML service error: {response.status_code} - {response.text}")
-                response.raise_for_status()
-                    
         except httpx.TimeoutException as e:
             logger.error("ML service timeout")
             raise RuntimeError("ML service timeout") from e
-        except httpx.HTTPStatusError as e:
+        except UpstreamUnavailable as e:
+            logger.warning(f"ML service call refused: {e}")
+            raise
+        except (httpx.HTTPStatusError, feature_schema.SchemaMismatchError):
             raise
         except Exception as e:
             logger.error(f"ML service communication failed: {e}")
@@ -57,12 +159,11 @@ class MLClient:
     async def get_model_info(self) -> Dict[str, Any]:
         """Get information about loaded ML models"""
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(f"{self.base_url}/models")
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return {"error": f"Failed to get model info: {response.status_code}"}
+            response = await self.upstream.get("/models", timeout=10)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {"error": f"Failed to get model info: {response.status_code}"}
         except Exception as e:
             logger.error(f"Failed to get model info: {e}")
             return {"error": str(e)}
@@ -70,18 +171,18 @@ class MLClient:
     async def retrain_model(self, training_data: list) -> Dict[str, Any]:
         """Trigger model retraining with new data"""
         try:
-            async with httpx.AsyncClient(timeout=300) as client:  # Longer timeout for training
-                response = await client.post(
-                    f"{self.base_url}/retrain",
-                    json={"training_data": training_data},
-                    headers={"Content-Type": "application/json"}
-                )
+            response = await self.upstream.post(
+                "/retrain",
+                json={"training_data": training_data},
+                headers={"Content-Type": "application/json"},
+                timeout=300,  # Longer timeout for training
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {"error": f"Retraining failed: {response.status_code}"}
                 
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return {"error": f"Retraining failed: {response.status_code}"}
-                    
         except Exception as e:
             logger.error(f"Model retraining failed: {e}")
             return {"error": str(e)}
@@ -89,8 +190,7 @@ class MLClient:
     async def health_check(self) -> bool:
         """Check if ML service is healthy"""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                response = await client.get(f"{self.base_url}/health")
-                return response.status_code == 200
+            response = await self.upstream.get("/health", guarded=False, timeout=5)
+            return response.status_code == 200
         except Exception:
             return False
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""
+In-process cache for merchant / device profiles and device transaction counts.
+
+Profiles change rarely but are read on every scoring call. Entries are plain
+dicts (never ORM instances, which are bound to the session that loaded them):
+
+- bounded LRU with per-entry TTL (expired entries count as misses)
+- single-flight loading: concurrent misses for one key share a single query,
+  including keys loaded as part of a larger statement (`claim` / `settle`)
+- negative caching: unknown merchants / devices are cached as None
+- invalidation on commit of any ORM write to Merchant / Device; committed
+  Transaction inserts bump cached device transaction counts in place
+
+Writes that bypass the ORM unit of work (Core UPDATE, other processes) are
+only picked up when the entry expires; call `invalidate_merchant` /
+`invalidate_device` after such writes.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Device, Merchant, Transaction
+
+_MISSING = object()
+
+
+class _LeaderCancelled(Exception):
+    """The request loading a key was cancelled; waiters retry the load themselves"""
+
+
+class AsyncTTLCache:
+    """Bounded LRU cache with per-entry TTL and single-flight async loading"""
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Keys invalidated while their load was in flight; the loaded value may predate the write
+        self._stale_inflight: Set[Hashable] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.coalesced = 0
+        self.load_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: Hashable) -> Tuple[bool, Any]:
+        """(found, value) for a fresh entry; counts a hit or a miss"""
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or replace an entry, evicting the least recently used on overflow"""
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, key: Hashable, fn: Callable[[Any], Any]) -> bool:
+        """Apply `fn` to a cached value in place (keeps its expiry). Returns False if absent."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        self._entries[key] = (entry[0], fn(entry[1]))
+        if key in self._inflight:
+            self._stale_inflight.add(key)
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry; an in-flight load for the key is not cached when it finishes"""
+        if self._entries.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+        if key in self._inflight:
+            self._stale_inflight.add(key)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters"""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.invalidations = self.coalesced = self.load_errors = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` on a miss.
+
+        Only one loader runs per key at a time; concurrent callers await its
+        result. Loader errors propagate to every waiter and are not cached.
+        """
+        state, value = self.claim(key)
+        if state == "hit":
+            return value
+        if state == "loading":
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _LeaderCancelled:
+                return await self.get_or_load(key, loader)
+
+        claim = value
+        try:
+            loaded = await loader()
+        except Exception as e:
+            self.settle(key, claim, error=e)
+            raise
+        except BaseException:
+            self.settle(key, claim)
+            raise
+        self.settle(key, claim, loaded)
+        return loaded
+
+    def claim(self, key: Hashable) -> Tuple[str, Any]:
+        """
+        Look up `key` for a caller that loads misses itself (e.g. several keys in
+        one statement) while keeping single-flight with get_or_load:
+
+        - ("hit", value): a fresh entry (counts a hit)
+        - ("loading", None): another caller is loading it; get_or_load joins that load
+        - ("claimed", claim): a miss, now owned by the caller, who must pass
+          the claim to `settle` once loaded; get_or_load callers wait for it
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return "hit", value
+        if key in self._inflight:
+            return "loading", None
+
+        self.misses += 1
+        claim = asyncio.get_running_loop().create_future()
+        # Mark any exception retrieved so an unawaited failure does not log at GC
+        claim.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = claim
+        return "claimed", claim
+
+    def settle(self, key: Hashable, claim: asyncio.Future, value: Any = _MISSING,
+               error: Optional[Exception] = None) -> None:
+        """
+        Finish a claimed load: cache `value` and hand it to the waiters, or hand
+        them `error` (not cached). With neither the load was abandoned (the
+        claimant was cancelled) and waiters retry it themselves.
+        """
+        self._inflight.pop(key, None)
+        stale = key in self._stale_inflight
+        self._stale_inflight.discard(key)
+        if error is not None:
+            self.load_errors += 1
+            claim.set_exception(error)
+        elif value is _MISSING:
+            claim.set_exception(_LeaderCancelled())
+        else:
+            if not stale:
+                self.set(key, value)
+            claim.set_result(value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing: hit rate, evictions, expirations and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "load_errors": self.load_errors,
+        }
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+
+merchant_cache = AsyncTTLCache(
+    "merchant_profile", settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_TTL_SECONDS
+)
+device_cache = AsyncTTLCache(
+    "device_profile", settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_TTL_SECONDS
+)
+device_txn_count_cache = AsyncTTLCache(
+    "device_transaction_count", settings.PROFILE_CACHE_MAX_ENTRIES, settings.DEVICE_COUNT_CACHE_TTL_SECONDS
+)
+
+
+def cache_key(entity_id: Any) -> str:
+    """Normalized key: callers pass ids as str (request payloads) or UUID (ORM rows)"""
+    return str(entity_id)
+
+
+def invalidate_merchant(merchant_id: Any) -> None:
+    """Drop a cached merchant profile"""
+    merchant_cache.invalidate(cache_key(merchant_id))
+
+
+def invalidate_device(device_id: Any) -> None:
+    """Drop a cached device profile and its transaction count"""
+    device_cache.invalidate(cache_key(device_id))
+    device_txn_count_cache.invalidate(cache_key(device_id))
+
+
+def add_invalidation_listener(listener: Callable[[Set[Any], Set[Any]], None]) -> None:
+    """Call `listener(merchant_ids, device_ids)` after each commit that wrote profiles"""
+    _invalidation_listeners.append(listener)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every profile cache, keyed by cache name"""
+    return {cache.name: cache.stats() for cache in (merchant_cache, device_cache, device_txn_count_cache)}
+
+
+def clear_all() -> None:
+    """Empty every profile cache"""
+    for cache in (merchant_cache, device_cache, device_txn_count_cache):
+        cache.clear()
+
+
+# =========================
+# Invalidation hooks
+# =========================
+# Collected at flush, applied only after commit: invalidating earlier would let
+# a concurrent reader re-cache the pre-commit row.
+_PENDING_KEY = "profile_cache_pending"
+_invalidation_listeners: List[Callable[[Set[Any], Set[Any]], None]] = []
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_profile_writes(session: Session, flush_context: Any) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, {"merchants": set(), "devices": set(), "device_txns": []})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Merchant):
+            pending["merchants"].add(obj.id)
+        elif isinstance(obj, Device):
+            pending["devices"].add(obj.id)
+        elif isinstance(obj, Transaction) and obj.device_id is not None:
+            if obj in session.new:
+                pending["device_txns"].append(obj.device_id)
+            elif obj in session.deleted:
+                pending["devices"].add(obj.device_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_profile_writes(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    for merchant_id in pending["merchants"]:
+        invalidate_merchant(merchant_id)
+    for device_id in pending["devices"]:
+        invalidate_device(device_id)
+    for device_id in pending["device_txns"]:
+        device_txn_count_cache.update(cache_key(device_id), lambda count: count + 1)
+    if pending["merchants"] or pending["devices"]:
+        for listener in _invalidation_listeners:
+            try:
+                listener(pending["merchants"], pending["devices"])
+            except Exception as e:
+                logger.warning(f"Profile invalidation listener failed: {e}")
+        logger.debug(
+            f"Profile cache invalidated {len(pending['merchants'])} merchants, "
+            f"{len(pending['devices'])} devices"
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_profile_writes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -1,29 +1,98 @@
 """
 Orchestrator service that coordinates between ML models and explanation service
+
+A transaction is scored in stages (features -> ml -> explanation) under one
+per-request deadline (SCORING_DEADLINE_MS, or process_transaction's
+deadline_ms): each stage may use only what the earlier stages left of it,
+and a stage that runs out substitutes its fallback:
+
+- features:    FeatureExtractor.fallback_features (no DB-backed inputs)
+- ml:          SCORING_FALLBACK_RISK_SCORE for both model scores (by default
+               a "medium" score, i.e. manual review)
+- explanation: none
+
+Results carry a "pipeline" report with per-stage timings and the stages
+that fell back.
 """
 
 import asyncio
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, List, Optional, TypeVar
+import numpy as np
 from loguru import logger
 
 from app.core.config import settings
-from app.services.ml_client import MLClient
+from app.services.ml_client import ScoringBackend, scoring_client
 from app.services.explain_client import ExplainClient
+from app.services.feature_schema import FEATURE_ORDER, SchemaMismatchError, entity_keys
 from app.services.ingestion import FeatureExtractor
+from app.services.upstream import UpstreamUnavailable
+
+T = TypeVar("T")
+
+
+class StageBudget:
+    """A request's deadline, spent by the stages in turn; records their timings and fallbacks"""
+    
+    def __init__(self, deadline_ms: float, clock: Callable[[], float] = time.monotonic):
+        self.deadline_ms = deadline_ms
+        self._clock = clock
+        self._start = clock()
+        self._deadline = self._start + deadline_ms / 1000.0 if deadline_ms > 0 else None
+        self.timings: Dict[str, float] = {}
+        self.fallbacks: List[str] = []
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left (None without a deadline)"""
+        return None if self._deadline is None else max(0.0, self._deadline - self._clock())
+    
+    async def run(self, stage: str, work: Awaitable[T], fallback: Callable[[], T]) -> T:
+        """Await `work` within the remaining budget; on running out, cancel it and return fallback()"""
+        start = self._clock()
+        timeout = self.remaining()
+        try:
+            if timeout == 0.0:
+                if asyncio.iscoroutine(work):
+                    work.close()  # not worth starting
+            else:
+                try:
+                    return await asyncio.wait_for(work, timeout)
+                except asyncio.TimeoutError:
+                    pass
+            logger.warning(f"Scoring stage {stage} ran out of the {self.deadline_ms:.0f} ms deadline; falling back")
+            self.fallbacks.append(stage)
+            return fallback()
+        finally:
+            self.timings[stage] = round((self._clock() - start) * 1000.0, 2)
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": self.deadline_ms or None,
+            "elapsed_ms": round((self._clock() - self._start) * 1000.0, 2),
+            "stages_ms": dict(self.timings),
+            "fallbacks": list(self.fallbacks),
+        }
+
+
+def scored_by_models(result: Dict[str, Any]) -> bool:
+    """False if the ML stage fell back, so the risk score is SCORING_FALLBACK_RISK_SCORE rather than a model score"""
+    return "ml" not in (result.get("pipeline") or {}).get("fallbacks", [])
 
 
 class ScoringOrchestrator:
     """Orchestrates the complete fraud detection pipeline"""
     
-    def __init__(self, db_session, ml_client: Optional[MLClient] = None):
+    def __init__(self, db_session, ml_client: Optional[ScoringBackend] = None):
         self.db = db_session
-        self.ml_client = ml_client or MLClient()
+        self.ml_client = ml_client or scoring_client()
         self.explain_client = ExplainClient()
         self.feature_extractor = FeatureExtractor(db_session)
         
-    async def process_transaction(self, transaction_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    async def process_transaction(
+        self, transaction_data: Dict[str, Any], user_id: str, deadline_ms: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Process a transaction through the complete fraud detection pipeline
         
@@ -33,64 +102,41 @@ class ScoringOrchestrator:
         3. Combine scores
         4. Generate explanation (if needed)
         5. Return complete analysis
+        
+        Steps 1, 2 and 4 share deadline_ms (default SCORING_DEADLINE_MS, 0 for
+        none) and fall back as described in the module docstring.
         """
         try:
             logger.info(f"Processing transaction for user {user_id}")
+            budget = StageBudget(settings.SCORING_DEADLINE_MS if deadline_ms is None else deadline_ms)
             
             # Step 1: Extract features
-            features = await self.feature_extractor.extract_features(
-                transaction_data, user_id
+            features = await budget.run(
+                "features",
+                self.feature_extractor.extract_features(transaction_data, user_id),
+                lambda: self.feature_extractor.fallback_features(transaction_data, user_id),
             )
+            if "features" in budget.fallbacks:
+                # The cancelled extraction may have left the session mid-query
+                await self.db.rollback()
             
             # Add transaction ID if not present
             if "transaction_id" not in transaction_data:
                 transaction_data["transaction_id"] = f"txn_{uuid.uuid4().hex[:16]}"
+            # The ML service links transactions of the same user in its entity graph
+            transaction_data.setdefault("user_id", user_id)
             
             # Step 2: Get ML predictions
-            ml_results = await self.ml_client.predict(
-                features=features,
-                transaction_data=transaction_data
+            ml_results = await budget.run(
+                "ml",
+                self.ml_client.predict(features=features, transaction_data=transaction_data),
+                self._fallback_ml_results,
             )
             
-            # Step 3: Calculate combined risk score
-            risk_score = self._calculate_combined_risk_score(ml_results)
-            risk_level = self._determine_risk_level(risk_score)
-            is_fraudulent = risk_level in ["high", "critical"]
-            
-            # Step 4: Generate explanation for medium/high/critical risk
-            explanation = None
-            if risk_level in ["medium", "high", "critical"]:
-                try:
-                    explanation_data = {
-                        **transaction_data,
-                        "features": features,
-                        "ml_results": ml_results,
-                        "risk_score": risk_score,
-                        "risk_level": risk_level,
-                        "is_fraudulent": is_fraudulent
-                    }
-                    explanation = await self.explain_client.generate_explanation(
-                        transaction_data=explanation_data
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to generate explanation: {e}")
-                    explanation = None
-            
-            # Step 5: Prepare response
-            response = {
-                "transaction_id": transaction_data["transaction_id"],
-                "risk_score": risk_score,
-                "risk_level": risk_level,
-                "is_fraudulent": is_fraudulent,
-                "fraud_type": ml_results.get("fraud_type_prediction"),
-                "confidence_score": ml_results.get("model_confidence", 0.5),
-                "anomaly_score": ml_results.get("anomaly_score", 0.0),
-                "graph_risk_score": ml_results.get("graph_risk_score", 0.0),
-                "features": features,
-                "ml_results": ml_results,
-                "explanation": explanation,
-                "timestamp": datetime.now().isoformat()
-            }
+            # Steps 3-5: Combine scores, explain, prepare response
+            response = await self._build_result(transaction_data, features, ml_results, budget)
+            response["pipeline"] = budget.report()
+            risk_score, risk_level = response["risk_score"], response["risk_level"]
             
             logger.info(f"Transaction processed: risk_score={risk_score}, level={risk_level}")
             return response
@@ -99,24 +145,98 @@ class ScoringOrchestrator:
             logger.error(f"Error in transaction processing: {e}")
             raise
     
-    async def process_batch_transactions(self, transactions: list, user_id: str) -> Dict[str, Any]:
-        """Process multiple transactions in batch"""
-        logger.info(f"Processing batch of {len(transactions)} transactions")
+    def _fallback_ml_results(self) -> Dict[str, Any]:
+        """Model scores that combine to SCORING_FALLBACK_RISK_SCORE"""
+        score = max(0.0, min(1.0, settings.SCORING_FALLBACK_RISK_SCORE / 100.0))
+        return {
+            "anomaly_score": score,
+            "iforest_score": score,
+            "graph_risk_score": score,
+            "model_confidence": 0.0,
+            "fraud_type_prediction": None,
+            "fallback": True,
+        }
+    
+    async def _build_result(
+        self, transaction_data: Dict[str, Any], features: Dict[str, Any], ml_results: Dict[str, Any],
+        budget: Optional[StageBudget] = None,
+    ) -> Dict[str, Any]:
+        """Combined score, risk level and explanation (medium and above) for one scored transaction"""
+        # Step 3: Calculate combined risk score
+        risk_score = self._calculate_combined_risk_score(ml_results)
+        risk_level = self._determine_risk_level(risk_score)
+        is_fraudulent = risk_level in ["high", "critical"]
         
-        results = []
-        for transaction in transactions:
+        # Step 4: Generate explanation for medium/high/critical risk
+        explanation = None
+        if risk_level in ["medium", "high", "critical"]:
             try:
-                result = await self.process_transaction(transaction, user_id)
-                results.append(result)
+                explanation_data = {
+                    **transaction_data,
+                    "features": features,
+                    "ml_results": ml_results,
+                    "risk_score": risk_score,
+                    "risk_level": risk_level,
+                    "is_fraudulent": is_fraudulent
+                }
+                explanation = self.explain_client.generate_explanation(transaction_data=explanation_data)
+                if budget is not None:
+                    explanation = await budget.run("explanation", explanation, lambda: None)
+                else:
+                    explanation = await explanation
             except Exception as e:
-                logger.error(f"Failed to process transaction in batch: {e}")
-                results.append({
-                    "transaction_id": transaction.get("transaction_id", "unknown"),
-                    "error": str(e),
-                    "risk_score": 0.0,
-                    "risk_level": "low",
-                    "is_fraudulent": False
-                })
+                logger.warning(f"Failed to generate explanation: {e}")
+                explanation = None
+        
+        # Step 5: Prepare response
+        return {
+            "transaction_id": transaction_data["transaction_id"],
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "is_fraudulent": is_fraudulent,
+            "fraud_type": ml_results.get("fraud_type_prediction"),
+            "confidence_score": ml_results.get("model_confidence", 0.5),
+            "anomaly_score": ml_results.get("anomaly_score", 0.0),
+            "graph_risk_score": ml_results.get("graph_risk_score", 0.0),
+            "features": features,
+            "ml_results": ml_results,
+            "explanation": explanation,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    async def process_batch_transactions(self, transactions: list, user_id: str) -> Dict[str, Any]:
+        """
+        Process multiple transactions in batch
+        
+        Features come from one extract_features_batch call and scores from
+        one /predict_batch request; risk levels and explanations are then
+        per transaction, as in process_transaction. If the batch request
+        fails the extracted rows are scored one request each, and if batch
+        extraction fails every transaction goes through process_transaction.
+        A schema mismatch or an unavailable ML upstream is raised instead of
+        falling back to per-row requests.
+        """
+        logger.info(f"Processing batch of {len(transactions)} transactions")
+        
+        try:
+            matrix = await self.feature_extractor.extract_features_batch(transactions, user_id)
+        except Exception as e:
+            logger.warning(f"Batch feature extraction failed, processing transactions individually: {e}")
+            matrix = None
+        
+        if matrix is not None:
+            for transaction in transactions:
+                transaction.setdefault("user_id", user_id)
+            results = await self._score_batch(transactions, matrix)
+        else:
+            results = []
+            for transaction in transactions:
+                try:
+                    result = await self.process_transaction(transaction, user_id)
+                    results.append(result)
+                except Exception as e:
+                    logger.error(f"Failed to process transaction in batch: {e}")
+                    results.append(self._batch_error_result(transaction, e))
         
         # Calculate batch statistics
         stats = self._calculate_batch_stats(results)
@@ -130,6 +250,49 @@ class ScoringOrchestrator:
             "timestamp": datetime.now().isoformat()
         }
     
+    async def _score_batch(self, transactions: list, matrix) -> List[Dict[str, Any]]:
+        """Score extracted feature rows with one /predict_batch request (concurrent per-row requests if it fails transiently)"""
+        ml_results = None
+        if len(transactions):
+            try:
+                keys = np.stack([entity_keys(transaction) for transaction in transactions])
+                ml_results = await self.ml_client.predict_batch(matrix, entity_keys=keys)
+                if len(ml_results) != len(transactions):
+                    raise RuntimeError(f"ML service scored {len(ml_results)} of {len(transactions)} transactions")
+            except (SchemaMismatchError, UpstreamUnavailable):
+                # Every per-row request would fail the same way (or pile onto a saturated upstream)
+                raise
+            except Exception as e:
+                logger.warning(f"Batch prediction failed, scoring transactions individually: {e}")
+                ml_results = None
+        
+        async def finish(i: int, transaction_data: Dict[str, Any], row: List[float]) -> Dict[str, Any]:
+            if "transaction_id" not in transaction_data:
+                transaction_data["transaction_id"] = f"txn_{uuid.uuid4().hex[:16]}"
+            features = dict(zip(FEATURE_ORDER, row))
+            try:
+                if ml_results is not None:
+                    row_results = ml_results[i]
+                else:
+                    row_results = await self.ml_client.predict(features=features, transaction_data=transaction_data)
+                return await self._build_result(transaction_data, features, row_results)
+            except Exception as e:
+                logger.error(f"Failed to process transaction in batch: {e}")
+                return self._batch_error_result(transaction_data, e)
+        
+        # Rows are independent: their fallback requests and explanations run concurrently
+        rows = enumerate(zip(transactions, matrix.tolist()))
+        return list(await asyncio.gather(*(finish(i, transaction_data, row) for i, (transaction_data, row) in rows)))
+    
+    def _batch_error_result(self, transaction: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        return {
+            "transaction_id": transaction.get("transaction_id", "unknown"),
+            "error": str(error),
+            "risk_score": 0.0,
+            "risk_level": "low",
+            "is_fraudulent": False
+        }
+    
     def _calculate_combined_risk_score(self, ml_results: Dict[str, Any]) -> float:
         """
         Combined fraud risk score 0-100 from ML outputs.
@@ -0,0 +1,552 @@
+"""
+Long-lived, pooled HTTP clients for the ML and explanation services.
+
+One httpx.AsyncClient per upstream keeps TCP connections alive between
+calls (pool limits from settings), so a scored transaction does not pay
+connection setup. Clients are opened in the app lifespan (or on first use
+outside it) and closed on shutdown.
+
+Each upstream has a circuit breaker: after UPSTREAM_BREAKER_FAILURES
+consecutive failures (transport errors, timeouts, 5xx) calls fail fast
+with CircuitOpenError for UPSTREAM_BREAKER_RESET_SECONDS, then a single
+probe call decides whether it closes again. Health checks bypass the
+breaker, so they keep reporting the upstream's actual state.
+
+The ML service may run as several replicas (ML_SERVICE_URLS): a
+ReplicaSet balances calls over one client per replica with power-of-two
+choices on outstanding requests, and can hedge a call that outlives the
+ML_HEDGE_PERCENTILE latency by sending a duplicate to a second replica and
+taking whichever answers first. Hedges are not sent while
+ML_HEDGE_MAX_OUTSTANDING calls are in flight, so hedging cannot amplify an
+overload.
+
+Calls to each upstream also pass an AdaptiveLimiter: an AIMD cap on calls
+in flight, lowered when latency rises well above the recent minimum (or
+calls fail) and raised slowly while calls stay fast. Calls over the cap
+wait up to UPSTREAM_LIMIT_QUEUE_TIMEOUT_MS for a slot, then are shed with
+ConcurrencyLimitExceeded, so an overloaded upstream is not buried under a
+growing backlog.
+
+stats() reports per-upstream (per-replica) connection reuse (requests vs
+new connections, from httpcore's trace events) and breaker state.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Union
+
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+class UpstreamUnavailable(RuntimeError):
+    """The call was refused locally, without reaching the upstream"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """The upstream's circuit breaker is open: the call was not attempted"""
+
+
+class ConcurrencyLimitExceeded(UpstreamUnavailable):
+    """The upstream's concurrency limit stayed full for the whole queue timeout: the call was shed"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open (fail fast) → half-open (one probe) → closed"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go out now"""
+        if self.state == "open" and self._clock() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "open" or (self.state == "half_open" and self._probing):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit open; failing fast")
+        if self.state == "half_open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+                logger.warning(f"{self.name} circuit open after {self.failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = self._clock()
+
+    def available(self) -> bool:
+        """Whether before_call() would let a call through now (without claiming the probe)"""
+        if self.state == "open":
+            return self._clock() - self.opened_at >= self.reset_seconds
+        return not (self.state == "half_open" and self._probing)
+
+    def release(self) -> None:
+        """A call ended without an outcome (cancelled): let the next call probe"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with a bounded wait queue.
+
+    A call that fails or takes more than `latency_tolerance` x the minimum
+    of the last `window` latencies multiplies the limit by `backoff` (at
+    most once per such latency, so one slow burst counts once). A fast
+    call while at least half the limit is in use adds 1 / limit, about +1
+    per limit's worth of calls. Calls refused before reaching the upstream
+    (an open circuit) release their slot without adapting the limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_tolerance: float,
+        backoff: float,
+        queue_timeout: float,
+        max_queue: int,
+        window: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._clock = clock
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = float("-inf")
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.decreases = 0
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting up to queue_timeout; raise ConcurrencyLimitExceeded otherwise"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue or self.queue_timeout <= 0:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded(f"{self.name} concurrency limit {int(self.limit)} reached")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return  # handed a slot just as the wait timed out
+            waiter.cancel()
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded(
+                f"{self.name} concurrency limit {int(self.limit)} reached; waited {self.queue_timeout * 1000:.0f} ms"
+            ) from None
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)  # cancelled after being handed a slot: pass it on
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: Optional[float], ok: bool = True) -> None:
+        """Free a slot and adapt the limit to the call's outcome (latency None: no outcome, e.g. cancelled)"""
+        self.in_flight -= 1
+        if latency is not None:
+            self._adapt(latency, ok)
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+
+    def _adapt(self, latency: float, ok: bool) -> None:
+        baseline = min(self._latencies) if self._latencies else latency
+        self._latencies.append(latency)
+        now = self._clock()
+        if not ok or latency > baseline * self.latency_tolerance:
+            if now - self._last_decrease >= latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif self.in_flight + 1 >= self.limit / 2:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "decreases": self.decreases,
+            "min_latency_ms": round(min(self._latencies) * 1000.0, 2) if self._latencies else None,
+        }
+
+
+def _limiter(name: str) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        name,
+        initial_limit=settings.UPSTREAM_LIMIT_INITIAL,
+        min_limit=settings.UPSTREAM_LIMIT_MIN,
+        max_limit=settings.UPSTREAM_LIMIT_MAX,
+        latency_tolerance=settings.UPSTREAM_LIMIT_LATENCY_TOLERANCE,
+        backoff=settings.UPSTREAM_LIMIT_BACKOFF,
+        queue_timeout=settings.UPSTREAM_LIMIT_QUEUE_TIMEOUT_MS / 1000.0,
+        max_queue=settings.UPSTREAM_LIMIT_MAX_QUEUE,
+    )
+
+
+async def _limited(limiter: Optional[AdaptiveLimiter], call: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """Run `call` in a slot of `limiter` (if any), reporting its latency and whether it succeeded"""
+    if limiter is None:
+        return await call()
+    await limiter.acquire()
+    start = time.monotonic()
+    try:
+        response = await call()
+    except UpstreamUnavailable:
+        # Refused before reaching the upstream (open circuit): not an outcome to adapt to
+        limiter.release(None)
+        raise
+    except Exception:
+        limiter.release(time.monotonic() - start, ok=False)
+        raise
+    except BaseException:
+        limiter.release(None)
+        raise
+    limiter.release(time.monotonic() - start, ok=response.status_code < 500)
+    return response
+
+
+class UpstreamClient:
+    """A pooled keep-alive AsyncClient for one upstream service, behind a circuit breaker"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker(
+            name, settings.UPSTREAM_BREAKER_FAILURES, settings.UPSTREAM_BREAKER_RESET_SECONDS
+        )
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            transport=transport,
+        )
+        self.requests = 0
+        self.connections_opened = 0
+        self.outstanding = 0
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def request(self, method: str, path: str, guarded: bool = True, **kwargs: Any) -> httpx.Response:
+        """
+        `method` base_url + `path` on the pooled client. With `guarded`, the
+        limiter (if any) and the breaker may refuse the call
+        (ConcurrencyLimitExceeded, CircuitOpenError) and record its outcome.
+        """
+        if guarded and self.limiter is not None:
+            if not self.breaker.available():
+                self.breaker.before_call()  # fails fast without taking a limiter slot
+            return await _limited(self.limiter, lambda: self._send(method, path, guarded, **kwargs))
+        return await self._send(method, path, guarded, **kwargs)
+
+    async def _send(self, method: str, path: str, guarded: bool, **kwargs: Any) -> httpx.Response:
+        if guarded:
+            self.breaker.before_call()
+        self.requests += 1
+        self.outstanding += 1
+        try:
+            response = await getattr(self.client, method.lower())(
+                f"{self.base_url}{path}", extensions={"trace": self._trace}, **kwargs
+            )
+        except httpx.TransportError:  # connect errors, timeouts, dropped connections
+            if guarded:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            if guarded:
+                self.breaker.release()
+            raise
+        finally:
+            self.outstanding -= 1
+        if guarded:
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        return response
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests,
+            "outstanding": self.outstanding,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "breaker": self.breaker.stats(),
+            **({"limiter": self.limiter.stats()} if self.limiter is not None else {}),
+        }
+
+
+class ReplicaSet:
+    """
+    UpstreamClient's interface over several replicas of one service.
+
+    Each call goes to the less loaded of two random replicas whose breaker
+    lets calls through. With `hedge`, a call still unanswered after the
+    hedge delay (the hedge_percentile of recent call latencies, at least
+    min_hedge_delay) is duplicated on another replica; the first non-5xx
+    answer wins and the other call is cancelled.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        replicas: Sequence[UpstreamClient],
+        hedge_percentile: float,
+        min_hedge_delay: float,
+        max_outstanding: int,
+        latency_window: int = 1000,
+        rng: Optional[random.Random] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        if not replicas:
+            raise ValueError("A replica set needs at least one replica")
+        self.name = name
+        self.replicas = list(replicas)
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_outstanding = max_outstanding
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._rng = rng or random.Random()
+        self.limiter = limiter  # one limit for the service, whichever replicas serve it
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_suppressed = 0
+
+    @property
+    def outstanding(self) -> int:
+        return sum(replica.outstanding for replica in self.replicas)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: hedge_percentile of recent latencies, at least min_hedge_delay"""
+        if not self._latencies:
+            return self.min_hedge_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100.0))
+        return max(self.min_hedge_delay, ordered[index])
+
+    def _pick(self, exclude: Optional[UpstreamClient] = None) -> Optional[UpstreamClient]:
+        """Power of two choices on outstanding requests among replicas accepting calls"""
+        candidates = [r for r in self.replicas if r is not exclude and r.breaker.available()]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = self._rng.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    async def _timed(self, replica: UpstreamClient, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        start = time.monotonic()
+        response = await replica.request(method, path, **kwargs)
+        self._latencies.append(time.monotonic() - start)
+        return response
+
+    async def request(
+        self, method: str, path: str, guarded: bool = True, hedge: bool = False, **kwargs: Any,
+    ) -> httpx.Response:
+        if guarded and self.limiter is not None:
+            if not any(replica.breaker.available() for replica in self.replicas):
+                self.replicas[0].breaker.before_call()  # every circuit is open: fail fast without a limiter slot
+            return await _limited(self.limiter, lambda: self._send(method, path, guarded, hedge, **kwargs))
+        return await self._send(method, path, guarded, hedge, **kwargs)
+
+    async def _send(self, method: str, path: str, guarded: bool, hedge: bool, **kwargs: Any) -> httpx.Response:
+        primary = self._pick()
+        if primary is None:
+            primary = self.replicas[0]  # every circuit is open: let its breaker fail fast
+        first = asyncio.ensure_future(self._timed(primary, method, path, guarded=guarded, **kwargs))
+        if not hedge or len(self.replicas) < 2:
+            return await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay())
+            if done:
+                return first.result()
+            secondary = self._pick(exclude=primary)
+            if secondary is None or self.outstanding >= self.max_outstanding:
+                self.hedges_suppressed += 1
+                return await first
+            self.hedges += 1
+            second = asyncio.ensure_future(self._timed(secondary, method, path, guarded=guarded, **kwargs))
+            return await self._first_answer(first, second)
+        finally:
+            first.cancel()
+
+    async def _first_answer(self, first: "asyncio.Future", second: "asyncio.Future") -> httpx.Response:
+        """The first non-5xx response of the two calls; else the primary's outcome"""
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            return first.result()
+        finally:
+            second.cancel()
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def close(self) -> None:
+        for replica in self.replicas:
+            await replica.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "outstanding": self.outstanding,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000.0, 2),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_suppressed": self.hedges_suppressed,
+            **({"limiter": self.limiter.stats()} if self.limiter is not None else {}),
+        }
+
+
+Upstream = Union[UpstreamClient, ReplicaSet]
+
+_upstreams: Dict[str, Upstream] = {}
+
+
+def ml_service_urls() -> List[str]:
+    """ML_SERVICE_URLS (comma-separated replicas), else ML_SERVICE_URL"""
+    urls = [url.strip().rstrip("/") for url in settings.ML_SERVICE_URLS.split(",") if url.strip()]
+    return urls or [settings.ML_SERVICE_URL]
+
+
+def _build(name: str) -> Upstream:
+    if name == "ml":
+        replicas = [
+            UpstreamClient(
+                f"ml[{url}]", url, settings.ML_MODEL_TIMEOUT,
+                settings.ML_POOL_MAX_CONNECTIONS, settings.ML_POOL_MAX_KEEPALIVE,
+            )
+            for url in ml_service_urls()
+        ]
+        return ReplicaSet(
+            "ml", replicas, settings.ML_HEDGE_PERCENTILE, settings.ML_HEDGE_MIN_DELAY_MS / 1000.0,
+            settings.ML_HEDGE_MAX_OUTSTANDING, limiter=_limiter("ml") if settings.UPSTREAM_LIMIT_ENABLED else None,
+        )
+    if name == "explain":
+        return UpstreamClient(
+            "explain", settings.EXPLAIN_SERVICE_URL, settings.EXPLAIN_TIMEOUT,
+            settings.EXPLAIN_POOL_MAX_CONNECTIONS, settings.EXPLAIN_POOL_MAX_KEEPALIVE,
+            limiter=_limiter("explain") if settings.UPSTREAM_LIMIT_ENABLED else None,
+        )
+    raise KeyError(f"Unknown upstream {name!r}")
+
+
+def get_upstream(name: str) -> Upstream:
+    """Process-wide client for `name` ("ml" or "explain"), created on first use"""
+    client = _upstreams.get(name)
+    if client is None:
+        client = _upstreams[name] = _build(name)
+    return client
+
+
+def open_upstreams() -> None:
+    """Create every upstream client (app startup)"""
+    for name in ("ml", "explain"):
+        get_upstream(name)
+
+
+async def close_upstreams() -> None:
+    """Close every upstream's connection pool (app shutdown)"""
+    clients = list(_upstreams.values())
+    _upstreams.clear()
+    for client in clients:
+        await client.close()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: client.stats() for name, client in _upstreams.items()}
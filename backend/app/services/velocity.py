@@ -0,0 +1,247 @@
+"""
+In-memory multi-window velocity counters.
+
+Transaction counts and amount sums over the last 1m, 10m, 1h and 24h per
+user, device, merchant and IP. Each key holds two ring buffers:
+
+- 60 per-minute buckets, serving the 1m / 10m / 1h windows at minute granularity
+- 24 per-hour buckets, serving the 24h window at hour granularity (it covers
+  the current partial hour plus the previous 23, so it can lag by < 1h)
+
+Running window totals are adjusted as buckets rotate, so record and read are
+O(1) amortized (a key idle for longer than a ring is reset, not replayed).
+Keys live in an LRU bounded by VELOCITY_MAX_KEYS; keys idle for
+VELOCITY_IDLE_TTL_SECONDS are evicted (with the default of 25h every window
+of an evicted key is already empty). One key costs about 1.5 KB.
+
+Counters are per process; each backend replica counts the traffic it scores.
+
+The per-window counts and sums are not model inputs (they are not in
+FEATURE_ORDER); they go into the features dict, and so into explanations
+and the stored transaction features. Scoring sees them through burst_risk:
+a card-testing burst on the user, device or IP adds VELOCITY_BURST_RISK to
+graph_risk_raw, the schema's rule-based risk input.
+"""
+
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+from app.core.config import settings
+
+WINDOWS = ("1m", "10m", "1h", "24h")
+ENTITY_KINDS = {
+    "user": "user_id",
+    "device": "device_id",
+    "merchant": "merchant_id",
+    "ip": "ip_address",
+}
+
+_MINUTES = 60
+_HOURS = 24
+
+
+class _WindowSeries:
+    """Ring buffers and running window totals for one key"""
+
+    __slots__ = (
+        "minute", "minute_counts", "minute_sums", "hour_counts", "hour_sums",
+        "count_10m", "sum_10m", "count_1h", "sum_1h", "count_24h", "sum_24h", "last_seen",
+    )
+
+    def __init__(self, minute: int, now: float):
+        self.minute = minute
+        self.minute_counts = array("l", bytes(8 * _MINUTES))
+        self.minute_sums = array("d", bytes(8 * _MINUTES))
+        self.hour_counts = array("l", bytes(8 * _HOURS))
+        self.hour_sums = array("d", bytes(8 * _HOURS))
+        self.count_10m = self.count_1h = self.count_24h = 0
+        self.sum_10m = self.sum_1h = self.sum_24h = 0.0
+        self.last_seen = now
+
+    def advance(self, minute: int) -> None:
+        """Rotate buckets forward to `minute`, expiring what falls out of each window"""
+        if minute <= self.minute:
+            return
+        if minute - self.minute >= _MINUTES:
+            for i in range(_MINUTES):
+                self.minute_counts[i] = 0
+                self.minute_sums[i] = 0.0
+            self.count_10m = self.count_1h = 0
+            self.sum_10m = self.sum_1h = 0.0
+        else:
+            for m in range(self.minute + 1, minute + 1):
+                # Minute m - 10 leaves the 10m window (zero if it was never written)
+                old = (m - 10) % _MINUTES
+                self.count_10m -= self.minute_counts[old]
+                self.sum_10m -= self.minute_sums[old]
+                # Bucket m still holds minute m - 60, which leaves the 1h window
+                i = m % _MINUTES
+                self.count_1h -= self.minute_counts[i]
+                self.sum_1h -= self.minute_sums[i]
+                self.minute_counts[i] = 0
+                self.minute_sums[i] = 0.0
+
+        hour, new_hour = self.minute // _MINUTES, minute // _MINUTES
+        if new_hour - hour >= _HOURS:
+            for i in range(_HOURS):
+                self.hour_counts[i] = 0
+                self.hour_sums[i] = 0.0
+            self.count_24h = 0
+            self.sum_24h = 0.0
+        else:
+            for h in range(hour + 1, new_hour + 1):
+                i = h % _HOURS
+                self.count_24h -= self.hour_counts[i]
+                self.sum_24h -= self.hour_sums[i]
+                self.hour_counts[i] = 0
+                self.hour_sums[i] = 0.0
+
+        # Running float sums drift; snap to zero once a window is empty
+        if not self.count_10m:
+            self.sum_10m = 0.0
+        if not self.count_1h:
+            self.sum_1h = 0.0
+        if not self.count_24h:
+            self.sum_24h = 0.0
+        self.minute = minute
+
+    def add(self, amount: float) -> None:
+        i = self.minute % _MINUTES
+        h = (self.minute // _MINUTES) % _HOURS
+        self.minute_counts[i] += 1
+        self.minute_sums[i] += amount
+        self.hour_counts[h] += 1
+        self.hour_sums[h] += amount
+        self.count_10m += 1
+        self.sum_10m += amount
+        self.count_1h += 1
+        self.sum_1h += amount
+        self.count_24h += 1
+        self.sum_24h += amount
+
+    def totals(self) -> Dict[str, Tuple[int, float]]:
+        i = self.minute % _MINUTES
+        return {
+            "1m": (self.minute_counts[i], self.minute_sums[i]),
+            "10m": (self.count_10m, self.sum_10m),
+            "1h": (self.count_1h, self.sum_1h),
+            "24h": (self.count_24h, self.sum_24h),
+        }
+
+
+class VelocityTracker:
+    """Bounded LRU of per-key window series with idle-key eviction"""
+
+    def __init__(
+        self,
+        max_keys: int,
+        idle_ttl_seconds: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        if max_keys <= 0:
+            raise ValueError("max_keys must be positive")
+        self.max_keys = max_keys
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._clock = clock
+        self._series: "OrderedDict[Hashable, _WindowSeries]" = OrderedDict()
+        self.evictions = 0
+        self.idle_evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def record(self, key: Hashable, amount: float, now: Optional[float] = None) -> Dict[str, Tuple[int, float]]:
+        """Count one event for `key` and return its window totals (including it)"""
+        now = self._clock() if now is None else now
+        series = self._touch(key, now, create=True)
+        series.add(float(amount))
+        return series.totals()
+
+    def read(self, key: Hashable, now: Optional[float] = None) -> Dict[str, Tuple[int, float]]:
+        """Window totals for `key` without counting an event"""
+        now = self._clock() if now is None else now
+        series = self._touch(key, now, create=False)
+        if series is None:
+            return {window: (0, 0.0) for window in WINDOWS}
+        return series.totals()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._series),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+        }
+
+    def clear(self) -> None:
+        self._series.clear()
+        self.evictions = self.idle_evictions = 0
+
+    def _touch(self, key: Hashable, now: float, create: bool) -> Optional[_WindowSeries]:
+        minute = int(now // 60)
+        series = self._series.get(key)
+        if series is None:
+            if not create:
+                return None
+            series = self._series[key] = _WindowSeries(minute, now)
+        else:
+            self._series.move_to_end(key)
+            series.advance(minute)
+        series.last_seen = now
+        self._evict(now)
+        return series
+
+    def _evict(self, now: float) -> None:
+        # Least recently used first: stop at the first key that is neither over capacity nor idle
+        while self._series:
+            key, oldest = next(iter(self._series.items()))
+            if len(self._series) > self.max_keys:
+                self.evictions += 1
+            elif now - oldest.last_seen > self.idle_ttl_seconds:
+                self.idle_evictions += 1
+            else:
+                break
+            del self._series[key]
+
+
+tracker = VelocityTracker(settings.VELOCITY_MAX_KEYS, settings.VELOCITY_IDLE_TTL_SECONDS)
+
+
+def observe_transaction(
+    transaction_data: Dict[str, Any],
+    user_id: Any,
+    now: Optional[float] = None,
+) -> Dict[str, float]:
+    """
+    Record a scored transaction for each of its entities and return velocity
+    features, e.g. `device_txn_count_10m` / `device_amount_sum_10m`. Counts
+    include the transaction itself; absent entities get zeros.
+    """
+    amount = float(transaction_data.get("amount", 0) or 0)
+    features: Dict[str, float] = {}
+    for kind, field in ENTITY_KINDS.items():
+        entity_id = user_id if kind == "user" else transaction_data.get(field)
+        if entity_id:
+            totals = tracker.record((kind, str(entity_id)), amount, now)
+        else:
+            totals = {window: (0, 0.0) for window in WINDOWS}
+        for window, (count, total) in totals.items():
+            features[f"{kind}_txn_count_{window}"] = count
+            features[f"{kind}_amount_sum_{window}"] = float(total)
+    return features
+
+
+def burst_risk(features: Mapping[str, float]) -> float:
+    """
+    graph_risk_raw contribution of observe_transaction's `features`:
+    VELOCITY_BURST_RISK if the user, device or IP reached VELOCITY_BURST_1M
+    transactions in the last minute or VELOCITY_BURST_10M in the last ten
+    (merchants see bursts of unrelated customers and are not counted), else 0
+    """
+    for kind in ("user", "device", "ip"):
+        if (features.get(f"{kind}_txn_count_1m", 0) >= settings.VELOCITY_BURST_1M
+                or features.get(f"{kind}_txn_count_10m", 0) >= settings.VELOCITY_BURST_10M):
+            return settings.VELOCITY_BURST_RISK
+    return 0.0
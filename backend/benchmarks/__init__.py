@@ -0,0 +1 @@
+"""Latency and throughput benchmarks. Run from backend/: python -m benchmarks.<name>"""
@@ -0,0 +1,135 @@
+"""
+Benchmark per-transaction vs batch feature extraction against a seeded database.
+
+Seeds the same data as bench_feature_extraction, then scores one batch of
+transactions two ways with a single session, the way
+ScoringOrchestrator.process_batch_transactions uses it:
+
+- per-row: extract_features for each transaction, vectorized into FEATURE_ORDER
+- batch:   extract_features_batch over the whole batch (IN queries + NumPy)
+
+for the default configuration (fused, behavior stats, sketches) and the
+window configuration (history scan, transaction counts). The profile cache
+is disabled so both sides query Postgres. Also checks that both produce
+the same matrix.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch_features --batch-size 1000
+    python -m benchmarks.bench_batch_features --database-url postgresql+asyncpg://... --cleanup
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.models import Base
+from app.services.feature_schema import FEATURE_INDEX, to_vector
+from app.services.ingestion import FeatureExtractor
+from benchmarks.bench_feature_extraction import cleanup, seed
+
+CONFIGS = {
+    "default": {"fused": True, "use_behavior_stats": True, "use_sketches": True},
+    "window": {"fused": True, "use_behavior_stats": False, "use_sketches": False},
+}
+
+# Derived from datetime.now(); drifts while the per-row loop runs
+TIME_DEPENDENT = [FEATURE_INDEX["time_since_first_transaction"]]
+
+
+def make_batch(samples: List[Dict[str, Any]], size: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+    rng = random.Random(7)
+    batch = []
+    for _ in range(size):
+        sample = dict(rng.choice(samples))
+        sample["amount"] = round(rng.lognormvariate(4, 1), 2)
+        batch.append(sample)
+    return batch, [t.pop("user_id") for t in batch]
+
+
+def extractor(session: AsyncSession, config: Dict[str, bool]) -> FeatureExtractor:
+    return FeatureExtractor(session, use_profile_cache=False, use_velocity=False, **config)
+
+
+async def per_row(session_factory, config, batch, user_ids) -> Tuple[float, np.ndarray]:
+    async with session_factory() as session:
+        fe = extractor(session, config)
+        start = time.perf_counter()
+        rows = [to_vector(await fe.extract_features(dict(t), uid)) for t, uid in zip(batch, user_ids)]
+        elapsed = time.perf_counter() - start
+    return elapsed, np.vstack(rows)
+
+
+async def batched(session_factory, config, batch, user_ids) -> Tuple[float, np.ndarray]:
+    async with session_factory() as session:
+        fe = extractor(session, config)
+        start = time.perf_counter()
+        matrix = await fe.extract_features_batch(batch, user_ids)
+        elapsed = time.perf_counter() - start
+    return elapsed, matrix
+
+
+def mismatched_rows(expected: np.ndarray, actual: np.ndarray) -> int:
+    exact = np.ones(expected.shape[1], dtype=bool)
+    exact[TIME_DEPENDENT] = False
+    close = np.isclose(expected[:, exact], actual[:, exact], rtol=1e-5, atol=1e-5).all(axis=1)
+    close &= np.isclose(expected[:, ~exact], actual[:, ~exact], rtol=1e-3, atol=1e-3).all(axis=1)
+    return int((~close).sum())
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.database_url, pool_size=5, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await cleanup(session_factory)
+
+        print(f"Seeding {args.users} users x {args.txns_per_user} transactions...")
+        samples = await seed(session_factory, args.users, args.merchants, args.devices, args.txns_per_user)
+        batch, user_ids = make_batch(samples, args.batch_size)
+
+        for name, config in CONFIGS.items():
+            # Warm connections and statement caches
+            await per_row(session_factory, config, batch[:20], user_ids[:20])
+            await batched(session_factory, config, batch[:20], user_ids[:20])
+
+            row_times, batch_times = [], []
+            for _ in range(args.repeats):
+                row_elapsed, expected = await per_row(session_factory, config, batch, user_ids)
+                batch_elapsed, matrix = await batched(session_factory, config, batch, user_ids)
+                row_times.append(row_elapsed)
+                batch_times.append(batch_elapsed)
+
+            row_s, batch_s = statistics.median(row_times), statistics.median(batch_times)
+            print(f"{name:<8} batch={args.batch_size} per-row {row_s * 1000:.1f}ms "
+                  f"({args.batch_size / row_s:.0f} txn/s)  batch {batch_s * 1000:.1f}ms "
+                  f"({args.batch_size / batch_s:.0f} txn/s)  speedup {row_s / batch_s:.1f}x  "
+                  f"mismatching rows {mismatched_rows(expected, matrix)}")
+    finally:
+        if args.cleanup:
+            await cleanup(session_factory)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--merchants", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--txns-per-user", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--cleanup", action="store_true", help="Delete seeded rows afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,266 @@
+"""
+Benchmark sequential vs fused FeatureExtractor against a seeded database.
+
+Seeds users, merchants, devices, transactions and behavior stats (tagged
+with a "bench_" prefix), then times extract_features per mode with a fresh
+session per call, the same way request handlers use it:
+
+- sequential:   one query per input, behavioral window over recent history
+- fused:        one statement, behavioral window in a CTE
+- fused+stats:  one statement, behavioral features from user_behavior_stats
+- fused+stats+cache: as fused+stats, merchant / device inputs from the profile cache
+- fused+stats+cache+sketches: as above, graph features from HyperLogLog sketches
+
+Also checks that sequential and fused return the same feature dict, with
+and without sketches.
+
+Usage (from backend/):
+    python -m benchmarks.bench_feature_extraction --users 200 --txns-per-user 150
+    python -m benchmarks.bench_feature_extraction --database-url postgresql+asyncpg://... --cleanup
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from loguru import logger
+from sqlalchemy import String, cast, delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.models import (
+    Alert, Base, Device, EntitySketch, Explanation, Merchant, Transaction, User, UserBehaviorStats,
+)
+from app.services.behavior_stats import apply_transaction, new_stats
+from app.services.entity_sketches import HyperLogLog, sketch_members
+from app.services import profile_cache
+from app.services.ingestion import FeatureExtractor
+
+PREFIX = "bench_"
+
+# Features derived from datetime.now(); they drift between the two calls
+TIME_DEPENDENT = {"hours_since_last_transaction", "time_since_first_transaction"}
+
+
+async def seed(session_factory, users: int, merchants: int, devices: int, txns_per_user: int) -> List[Dict[str, Any]]:
+    """Insert benchmark rows and return one sample transaction per user."""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    merchant_ids = [f"{PREFIX}m_{i}" for i in range(merchants)]
+    device_ids = [f"{PREFIX}d_{i}" for i in range(devices)]
+
+    async with session_factory() as session:
+        await session.execute(insert(User), [
+            {"id": uid, "email": f"{PREFIX}{uid.hex}@example.com", "username": f"{PREFIX}{uid.hex[:12]}"}
+            for uid in user_ids
+        ])
+        await session.execute(insert(Merchant), [
+            {
+                "id": mid,
+                "name": mid,
+                "category": rng.choice(["groceries", "electronics", "travel", "dining"]),
+                "risk_score": rng.uniform(0, 100),
+                "fraud_count": rng.randint(0, 20),
+                "total_transactions": rng.randint(20, 5000),
+                "avg_transaction_amount": rng.uniform(10, 500),
+            }
+            for mid in merchant_ids
+        ])
+        await session.execute(insert(Device), [
+            {
+                "id": did,
+                "device_type": rng.choice(["mobile", "desktop", "tablet"]),
+                "risk_score": rng.uniform(0, 100),
+                "is_suspicious": rng.random() < 0.05,
+                "associated_accounts": rng.randint(1, 4),
+            }
+            for did in device_ids
+        ])
+        rows = []
+        for uid in user_ids:
+            for _ in range(txns_per_user):
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "transaction_id": f"{PREFIX}{uuid.uuid4().hex}",
+                    "user_id": uid,
+                    "merchant_id": rng.choice(merchant_ids),
+                    "device_id": rng.choice(device_ids),
+                    "amount": round(rng.lognormvariate(4, 1), 2),
+                    "currency": "USD",
+                    "risk_score": rng.uniform(0, 100),
+                    "is_fraudulent": rng.random() < 0.02,
+                    "features": {"amount": 1.0, "padding": [0.0] * 40},
+                    "transaction_time": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+                })
+        for i in range(0, len(rows), 5000):
+            await session.execute(insert(Transaction), rows[i:i + 5000])
+
+        stats = {uid: new_stats(uid) for uid in user_ids}
+        for row in rows:
+            apply_transaction(stats[row["user_id"]], row["amount"], row["transaction_time"],
+                              row["is_fraudulent"], row["risk_score"])
+        columns = [c.name for c in UserBehaviorStats.__table__.c if c.name != "updated_at"]
+        await session.execute(insert(UserBehaviorStats), [
+            {name: getattr(s, name) for name in columns} for s in stats.values()
+        ])
+
+        sketches: Dict[Any, HyperLogLog] = {}
+        for row in rows:
+            for kind, (entity_id, member) in sketch_members(row["user_id"], row["merchant_id"],
+                                                            row["device_id"], None).items():
+                sketches.setdefault((kind, entity_id), HyperLogLog()).add(member)
+        await session.execute(insert(EntitySketch), [
+            {"kind": kind, "entity_id": entity_id, "sketch": sketch.to_bytes()}
+            for (kind, entity_id), sketch in sketches.items()
+        ])
+        await session.commit()
+
+    return [
+        {
+            "user_id": str(uid),
+            "amount": round(rng.lognormvariate(4, 1), 2),
+            "currency": "USD",
+            "transaction_type": "purchase",
+            "category": "electronics",
+            "merchant_id": rng.choice(merchant_ids),
+            "device_id": rng.choice(device_ids),
+        }
+        for uid in user_ids
+    ]
+
+
+async def cleanup(session_factory) -> None:
+    async with session_factory() as session:
+        bench_users = select(User.id).where(User.email.like(f"{PREFIX}%"))
+        bench_txns = select(Transaction.id).where(Transaction.transaction_id.like(f"{PREFIX}%"))
+        await session.execute(delete(Alert).where(Alert.transaction_id.in_(bench_txns)))
+        await session.execute(delete(Explanation).where(Explanation.transaction_id.in_(bench_txns)))
+        await session.execute(delete(UserBehaviorStats).where(UserBehaviorStats.user_id.in_(bench_users)))
+        await session.execute(delete(EntitySketch).where(or_(
+            EntitySketch.entity_id.like(f"{PREFIX}%"),
+            EntitySketch.entity_id.in_(select(cast(User.id, String)).where(User.email.like(f"{PREFIX}%"))),
+        )))
+        await session.execute(delete(Transaction).where(Transaction.transaction_id.like(f"{PREFIX}%")))
+        await session.execute(delete(Merchant).where(Merchant.id.like(f"{PREFIX}%")))
+        await session.execute(delete(Device).where(Device.id.like(f"{PREFIX}%")))
+        await session.execute(delete(User).where(User.email.like(f"{PREFIX}%")))
+        await session.commit()
+
+
+async def run_mode(session_factory, samples: List[Dict[str, Any]], fused: bool, iterations: int,
+                   use_behavior_stats: bool = False, use_profile_cache: bool = False,
+                   use_sketches: bool = False) -> List[float]:
+    latencies = []
+    for i in range(iterations):
+        sample = samples[i % len(samples)]
+        async with session_factory() as session:
+            extractor = FeatureExtractor(session, fused=fused, use_behavior_stats=use_behavior_stats,
+                                         use_profile_cache=use_profile_cache, use_velocity=False,
+                                         use_sketches=use_sketches)
+            start = time.perf_counter()
+            await extractor.extract_features(dict(sample), sample["user_id"])
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def check_parity(session_factory, samples: List[Dict[str, Any]], n: int, use_sketches: bool) -> int:
+    mismatches = 0
+    for sample in samples[:n]:
+        async with session_factory() as session:
+            sequential = await FeatureExtractor(session, fused=False, use_behavior_stats=False,
+                                                use_profile_cache=False, use_velocity=False,
+                                                use_sketches=use_sketches).extract_features(
+                dict(sample), sample["user_id"])
+        async with session_factory() as session:
+            fused = await FeatureExtractor(session, fused=True, use_behavior_stats=False,
+                                           use_profile_cache=False, use_velocity=False,
+                                           use_sketches=use_sketches).extract_features(
+                dict(sample), sample["user_id"])
+        if sequential.keys() != fused.keys():
+            mismatches += 1
+            continue
+        for key, value in sequential.items():
+            tolerance = 1e-3 if key in TIME_DEPENDENT else 1e-6
+            if abs(float(value) - float(fused[key])) > tolerance * max(1.0, abs(float(value))):
+                mismatches += 1
+                break
+    return mismatches
+
+
+def summarize(name: str, latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    pct = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    stats = {
+        "mean": statistics.fmean(ordered),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+    print(f"{name:<26} mean={stats['mean']:.2f}ms p50={stats['p50']:.2f}ms "
+          f"p95={stats['p95']:.2f}ms p99={stats['p99']:.2f}ms (n={len(ordered)})")
+    return stats
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.database_url, pool_size=5, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await cleanup(session_factory)
+
+        print(f"Seeding {args.users} users x {args.txns_per_user} transactions...")
+        samples = await seed(session_factory, args.users, args.merchants, args.devices, args.txns_per_user)
+
+        for use_sketches in (False, True):
+            mismatches = await check_parity(session_factory, samples, min(len(samples), 50), use_sketches)
+            print(f"Parity (sketches={use_sketches}): {mismatches} mismatching feature dicts "
+                  f"out of {min(len(samples), 50)}")
+
+        modes = [
+            ("sequential", False, False, False, False),
+            ("fused", True, False, False, False),
+            ("fused+stats", True, True, False, False),
+            ("fused+stats+cache", True, True, True, False),
+            ("fused+stats+cache+sketches", True, True, True, True),
+        ]
+        # Warm connections and statement caches
+        for _, fused, use_stats, use_cache, use_sketches in modes:
+            await run_mode(session_factory, samples, fused, 20, use_stats, use_cache, use_sketches)
+
+        results = {
+            name: summarize(name, await run_mode(session_factory, samples, fused, args.iterations,
+                                                 use_stats, use_cache, use_sketches))
+            for name, fused, use_stats, use_cache, use_sketches in modes
+        }
+        print(f"Profile cache: {profile_cache.cache_stats()}")
+        baseline = results["sequential"]
+        for name, stats in results.items():
+            if name != "sequential":
+                print(f"{name} speedup: mean {baseline['mean'] / stats['mean']:.2f}x, "
+                      f"p99 {baseline['p99'] / stats['p99']:.2f}x")
+    finally:
+        if args.cleanup:
+            await cleanup(session_factory)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--merchants", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--txns-per-user", type=int, default=150)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--cleanup", action="store_true", help="Delete seeded rows afterwards")
+    asyncio.run(main(parser.parse_args()))
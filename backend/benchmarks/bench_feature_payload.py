@@ -0,0 +1,118 @@
+"""
+Benchmark the /predict request body: JSON feature dicts vs the binary
+feature_schema vector.
+
+Builds the feature dict the extractor produces for a transaction (every
+schema column plus the extra behavioral / velocity / graph keys) and
+times both halves of a request for each encoding:
+
+- json:   json.dumps of {features, transaction_data, timestamp} on the
+          backend; json.loads, pydantic validation and the dict merge into
+          FEATURE_ORDER on the ML side (the previous contract)
+- binary: feature_schema.to_vector + encode on the backend; decode (a
+          zero-copy view) on the ML side
+
+Usage (from backend/):
+    PYTHONPATH=.. python -m benchmarks.bench_feature_payload --requests 20000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+from app.services import feature_schema, velocity
+from app.services.ingestion import FeatureExtractor
+
+
+class PredictRequest(BaseModel):
+    """Request model of the JSON contract"""
+    features: Dict[str, Any] = {}
+    transaction_data: Dict[str, Any] = {}
+    timestamp: Optional[str] = None
+
+
+def sample_request() -> tuple:
+    transaction_data = {
+        "transaction_id": "txn_5f1c0e9a2b7d4c31",
+        "amount": 245.75,
+        "currency": "EUR",
+        "merchant_id": "merchant_0042",
+        "device_id": "device_0107",
+        "ip_address": "10.20.30.40",
+        "location_lat": 52.52,
+        "location_lng": 13.405,
+        "transaction_type": "purchase",
+        "category": "electronics",
+        "timestamp": datetime.now().isoformat(),
+    }
+    extractor = FeatureExtractor(None, use_velocity=False)
+    features = extractor._default_features(transaction_data)
+    features.update(extractor._behavioral_from_aggregates(
+        transaction_data, transaction_count=87, avg_amount=61.2, amount_std=40.3,
+        avg_frequency_hours=19.5, last_transaction_time=datetime(2024, 5, 1),
+        first_transaction_time=datetime(2023, 1, 1), fraud_count=1, avg_risk_score=18.0,
+    ))
+    features.update(extractor._create_derived_features(features))
+    features.update(velocity.observe_transaction(transaction_data, "user_0001"))
+    return features, transaction_data
+
+
+def time_us(fn: Callable[[], Any], repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return statistics.median(samples) / 1000
+
+
+def main(args: argparse.Namespace) -> None:
+    from ml.pipelines.feature_builder import build_features_from_transaction
+
+    features, transaction_data = sample_request()
+    payload = {"features": features, "transaction_data": transaction_data,
+               "timestamp": transaction_data["timestamp"]}
+    json_body = json.dumps(payload, default=float).encode()
+    binary_body = feature_schema.encode(feature_schema.to_vector(features))
+
+    def json_client():
+        return json.dumps(payload, default=float).encode()
+
+    def json_server():
+        request = PredictRequest(**json.loads(json_body))
+        return build_features_from_transaction(request.transaction_data, request.features)
+
+    def binary_client():
+        return feature_schema.encode(feature_schema.to_vector(features))
+
+    def binary_server():
+        return feature_schema.decode(binary_body)
+
+    rows = {
+        "json": (len(json_body), time_us(json_client, args.requests), time_us(json_server, args.requests)),
+        "binary": (len(binary_body), time_us(binary_client, args.requests), time_us(binary_server, args.requests)),
+    }
+    print(f"{len(features)} extracted features, {len(feature_schema.FEATURE_ORDER)} schema columns, "
+          f"schema v{feature_schema.FEATURE_SCHEMA_VERSION} ({feature_schema.FINGERPRINT.hex()})")
+    for name, (size, client_us, server_us) in rows.items():
+        print(f"{name:<7} body {size:>5} B  backend encode {client_us:7.2f}us  "
+              f"ml decode {server_us:7.2f}us  total {client_us + server_us:7.2f}us")
+    json_size, json_client_us, json_server_us = rows["json"]
+    binary_size, binary_client_us, binary_server_us = rows["binary"]
+    print(f"binary/json: size {binary_size / json_size:.1%}, "
+          f"cpu {(binary_client_us + binary_server_us) / (json_client_us + json_server_us):.1%}")
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    main(parser.parse_args())
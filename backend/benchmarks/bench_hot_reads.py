@@ -0,0 +1,224 @@
+"""
+Benchmark ORM entity reads vs the projection-only queries in app.db.queries.
+
+Seeds the same data as bench_feature_extraction plus alerts and
+explanations for a share of the transactions, then runs each hot read the
+way its request handler does (fresh session per request) in two modes:
+
+- orm:  the previous handler code, select(Model) loading full entities
+        (features JSON included; one extra query per alert / explanation)
+- core: the app.db.queries statement, projected columns as Row tuples
+
+and reports rows/sec plus, per request, the traced allocation peak and the
+memory still held by the result and session (tracemalloc, in a separate
+pass so it does not skew the timings). A bare SELECT 1 is shown for
+reference: most of its peak is driver buffers every read pays.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hot_reads --requests 300
+    python -m benchmarks.bench_hot_reads --database-url postgresql+asyncpg://... --cleanup
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from loguru import logger
+from sqlalchemy import and_, desc, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db import queries
+from app.db.models import Alert, Base, Explanation, Transaction
+from app.services.ingestion import USER_HISTORY_LIMIT
+from benchmarks.bench_feature_extraction import PREFIX, cleanup, seed
+
+PAGE_SIZE = 100
+ALERT_LIMIT = 20
+
+
+async def seed_alerts(session_factory, share: float) -> List[str]:
+    """Alerts and explanations for a share of the bench transactions; returns explained transaction ids"""
+    rng = random.Random(11)
+    async with session_factory() as session:
+        rows = (await session.execute(
+            select(Transaction.id, Transaction.transaction_id).where(Transaction.transaction_id.like(f"{PREFIX}%"))
+        )).all()
+        picked = [row for row in rows if rng.random() < share]
+        await session.execute(insert(Alert), [
+            {"id": uuid.uuid4(), "transaction_id": pk, "alert_type": "fraud", "severity": "warning",
+             "message": "High risk transaction", "status": "pending",
+             "created_at": datetime.utcnow()}
+            for pk, _ in picked
+        ])
+        await session.execute(insert(Explanation), [
+            {"id": uuid.uuid4(), "transaction_id": pk, "summary": "Unusual amount for this user",
+             "reasons": [{"factor": "amount", "weight": 0.7, "description": "3x user average"}],
+             "suggested_actions": [{"action": "verify", "priority": "medium"}], "confidence": 0.8}
+            for pk, _ in picked
+        ])
+        await session.commit()
+    return [transaction_id for _, transaction_id in picked]
+
+
+# Previous handler code, kept verbatim apart from response building
+async def orm_history(db: AsyncSession, user_id, _txn) -> Sequence[Any]:
+    result = await db.execute(
+        select(Transaction).where(Transaction.user_id == user_id)
+        .order_by(desc(Transaction.transaction_time)).limit(USER_HISTORY_LIMIT)
+    )
+    return result.scalars().all()
+
+
+async def orm_page(db: AsyncSession, user_id, _txn) -> Sequence[Any]:
+    q = select(Transaction).where(Transaction.user_id == user_id)
+    await db.execute(select(func.count()).select_from(q.subquery()))
+    result = await db.execute(q.order_by(desc(Transaction.transaction_time)).offset(0).limit(PAGE_SIZE))
+    return result.scalars().all()
+
+
+async def orm_detail(db: AsyncSession, user_id, transaction_id) -> Sequence[Any]:
+    result = await db.execute(select(Transaction).where(
+        and_(Transaction.transaction_id == transaction_id, Transaction.user_id == user_id)
+    ))
+    t = result.scalar_one_or_none()
+    explanation = await db.execute(select(Explanation).where(Explanation.transaction_id == t.id))
+    return [(t, explanation.scalar_one_or_none())]
+
+
+async def orm_alerts(db: AsyncSession, user_id, _txn) -> Sequence[Any]:
+    result = await db.execute(
+        select(Alert).join(Transaction, Alert.transaction_id == Transaction.id)
+        .where(and_(Transaction.user_id == user_id, Alert.status == "pending"))
+        .order_by(desc(Alert.created_at)).limit(ALERT_LIMIT)
+    )
+    out = []
+    for alert in result.scalars().all():
+        t = await db.execute(select(Transaction).where(Transaction.id == alert.transaction_id))
+        out.append((alert, t.scalar_one_or_none()))
+    return out
+
+
+async def orm_graph(db: AsyncSession, user_id, _txn) -> Sequence[Any]:
+    result = await db.execute(select(Transaction).where(Transaction.user_id == user_id))
+    return result.scalars().all()
+
+
+async def core_page(db: AsyncSession, user_id, _txn) -> Sequence[Any]:
+    _, rows = await queries.transaction_page(db, user_id, 0, PAGE_SIZE)
+    return rows
+
+
+async def core_detail(db: AsyncSession, user_id, transaction_id) -> Sequence[Any]:
+    return [await queries.transaction_detail(db, user_id, transaction_id)]
+
+
+async def select_one(db: AsyncSession, _user, _txn) -> Sequence[Any]:
+    return (await db.execute(text("SELECT 1"))).all()
+
+
+READS: Dict[str, Dict[str, Callable[..., Awaitable[Sequence[Any]]]]] = {
+    "history": {"orm": orm_history, "core": lambda db, u, _: queries.user_history(db, u, USER_HISTORY_LIMIT)},
+    "list_transactions": {"orm": orm_page, "core": core_page},
+    "get_transaction": {"orm": orm_detail, "core": core_detail},
+    "recent_alerts": {"orm": orm_alerts, "core": lambda db, u, _: queries.recent_alerts(db, u, ALERT_LIMIT)},
+    "gnn_clusters": {"orm": orm_graph, "core": lambda db, u, _: queries.user_graph_edges(db, u)},
+}
+
+
+async def run(session_factory, read, targets, traced: bool) -> Dict[str, float]:
+    rows = 0
+    elapsed = 0.0
+    peaks, held = [], []
+    for user_id, transaction_id in targets:
+        async with session_factory() as session:
+            await session.connection()  # pool checkout is not part of the read
+            if traced:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = await read(session, user_id, transaction_id)
+            elapsed += time.perf_counter() - start
+            if traced:
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                held.append(current - before)
+            rows += len(result)
+            del result  # freed before the next request's baseline
+    stats = {"rows": rows, "elapsed": elapsed}
+    if traced:
+        stats["peak_kib"] = sum(peaks) / len(peaks) / 1024
+        stats["held_kib"] = sum(held) / len(held) / 1024
+    return stats
+
+
+async def traced_run(session_factory, read, targets) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        return await run(session_factory, read, targets, traced=True)
+    finally:
+        tracemalloc.stop()
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.database_url, pool_size=5, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await cleanup(session_factory)
+
+        print(f"Seeding {args.users} users x {args.txns_per_user} transactions...")
+        await seed(session_factory, args.users, args.merchants, args.devices, args.txns_per_user)
+        explained = await seed_alerts(session_factory, args.alert_share)
+        async with session_factory() as session:
+            owners = dict((await session.execute(
+                select(Transaction.transaction_id, Transaction.user_id)
+                .where(Transaction.transaction_id.in_(explained))
+            )).all())
+        rng = random.Random(5)
+        targets = [(owners[t], t) for t in (rng.choice(explained) for _ in range(args.requests))]
+
+        print(f"{'read':<18}{'mode':<6}{'rows/s':>12}{'ms/req':>9}{'peak KiB':>10}{'held KiB':>10}")
+        await traced_run(session_factory, select_one, targets[:20])
+        floor = await traced_run(session_factory, select_one, targets[:args.traced_requests])
+        print(f"{'SELECT 1':<24}{'':>21}{floor['peak_kib']:>10.1f}{floor['held_kib']:>10.1f}")
+        for name, modes in READS.items():
+            results = {}
+            for mode, read in modes.items():
+                await run(session_factory, read, targets[:20], traced=False)  # warm statement caches
+                timed = await run(session_factory, read, targets, traced=False)
+                traced = await traced_run(session_factory, read, targets[:args.traced_requests])
+                results[mode] = (timed, traced)
+                print(f"{name:<18}{mode:<6}{timed['rows'] / timed['elapsed']:>12.0f}"
+                      f"{timed['elapsed'] / len(targets) * 1000:>9.2f}"
+                      f"{traced['peak_kib']:>10.1f}{traced['held_kib']:>10.1f}")
+            (orm, orm_traced), (core, core_traced) = results["orm"], results["core"]
+            print(f"{'':<18}core vs orm: {orm['elapsed'] / core['elapsed']:.1f}x faster, "
+                  f"{core_traced['held_kib'] / max(orm_traced['held_kib'], 1e-9):.0%} of held memory")
+    finally:
+        if args.cleanup:
+            await cleanup(session_factory)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--merchants", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--txns-per-user", type=int, default=150)
+    parser.add_argument("--alert-share", type=float, default=0.1)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--traced-requests", type=int, default=50)
+    parser.add_argument("--cleanup", action="store_true", help="Delete seeded rows afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,168 @@
+"""
+Benchmark the two scoring backends behind ScoringOrchestrator.
+
+Scores the same extracted feature dict with each SCORING_BACKEND:
+
+- remote:   MLClient.predict, the binary feature body posted over the pooled
+            keep-alive client to `uvicorn server:app` started in a subprocess
+            (or --ml-url), which runs ml.inference there
+- embedded: EmbeddedMLClient.predict, ml.inference called in this process
+            on its thread pool
+
+at each --concurrency (that many concurrent callers, --requests calls each)
+and prints calls/s and p50 / p99 latency per backend. Both sides use the
+models in --model-path, or stand-ins trained on synthetic rows
+(ml.benchmarks.bench_predict_batch.stand_in_models) when none is given.
+
+Usage (from backend/):
+    PYTHONPATH=.. python -m benchmarks.bench_scoring_backend --requests 500
+    PYTHONPATH=.. python -m benchmarks.bench_scoring_backend --concurrency 1 16 64 --model-path ../ml/models
+    PYTHONPATH=.. python -m benchmarks.bench_scoring_backend --backends embedded
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from benchmarks.bench_feature_payload import sample_request
+
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(client: Any, concurrency: int, requests: int) -> Dict[str, float]:
+    features, transaction_data = sample_request()
+    latencies: List[float] = []
+
+    async def caller() -> None:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.predict(features, transaction_data)
+            latencies.append(time.perf_counter() - start)
+
+    await client.predict(features, transaction_data)  # connect / load before timing
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000.0
+    return {
+        "calls_s": len(latencies) / elapsed,
+        "p50": float(np.percentile(ms, 50)),
+        "p99": float(np.percentile(ms, 99)),
+    }
+
+
+async def wait_ready(url: str, server: Optional[subprocess.Popen], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(f"ML service exited with code {server.returncode}")
+            try:
+                if (await client.get(f"{url}/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"ML service at {url} not ready after {timeout:.0f}s")
+
+
+async def run_remote(
+    args: argparse.Namespace, url: str, server: Optional[subprocess.Popen],
+) -> Dict[int, Dict[str, float]]:
+    from app.services import upstream
+    from app.services.ml_client import MLClient
+
+    settings.ML_SERVICE_URL, settings.ML_SERVICE_URLS = url, ""
+    await wait_ready(url, server)
+    upstream.open_upstreams()
+    try:
+        client = MLClient()
+        return {c: await drive(client, c, args.requests) for c in args.concurrency}
+    finally:
+        await upstream.close_upstreams()
+
+
+async def run_embedded(args: argparse.Namespace) -> Dict[int, Dict[str, float]]:
+    from app.services.embedded_ml import EmbeddedMLClient
+
+    client = EmbeddedMLClient()
+    client.start()
+    await client._warming
+    try:
+        return {c: await drive(client, c, args.requests) for c in args.concurrency}
+    finally:
+        await client.close()
+
+
+def main(args: argparse.Namespace) -> None:
+    import joblib
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_path
+        if model_dir is None:
+            from ml.benchmarks.bench_predict_batch import stand_in_models
+            for name, model in stand_in_models(np.random.default_rng(0)).items():
+                joblib.dump(model, os.path.join(tmp, name))
+            model_dir = tmp
+        model_dir = os.path.abspath(model_dir)
+        os.environ["MODEL_PATH"] = model_dir  # read by ml.inference at import (embedded side)
+
+        results = {}
+        if "remote" in args.backends:
+            server = None
+            url = args.ml_url
+            if url is None:
+                port = free_port()
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+                    cwd=ML_DIR, env={**os.environ, "MODEL_PATH": model_dir},
+                )
+                url = f"http://127.0.0.1:{port}"
+            try:
+                results["remote"] = asyncio.run(run_remote(args, url, server))
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait(timeout=10)
+        if "embedded" in args.backends:
+            results["embedded"] = asyncio.run(run_embedded(args))
+
+    print(f"{args.requests} calls per caller; ML workers: embedded {settings.ML_EMBEDDED_WORKERS} threads")
+    print(f"{'backend':<10}{'callers':>8}{'calls/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for backend, by_concurrency in results.items():
+        for concurrency, r in by_concurrency.items():
+            print(f"{backend:<10}{concurrency:>8}{r['calls_s']:>10.0f}{r['p50']:>9.2f}{r['p99']:>9.2f}")
+    for concurrency in args.concurrency if len(results) == 2 else []:
+        remote, embedded = results["remote"][concurrency], results["embedded"][concurrency]
+        print(f"{concurrency} callers: embedded/remote p50 {embedded['p50'] / remote['p50']:.1%}, "
+              f"throughput {embedded['calls_s'] / remote['calls_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="calls per concurrent caller")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--backends", nargs="+", choices=["remote", "embedded"], default=["remote", "embedded"])
+    parser.add_argument("--model-path", default=None, help="model directory (default: synthetic stand-ins)")
+    parser.add_argument("--ml-url", default=None, help="existing ML service (default: start one)")
+    main(parser.parse_args())
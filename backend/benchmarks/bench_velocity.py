@@ -0,0 +1,56 @@
+"""
+Benchmark the in-memory velocity counters.
+
+Replays a synthetic stream (a few hot keys plus a long tail, timestamps
+advancing ~1s per event) through VelocityTracker and reports per-operation
+latency at growing key counts; flat numbers confirm O(1) record / read.
+
+Usage (from backend/):
+    python -m benchmarks.bench_velocity --events 200000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.services.velocity import VelocityTracker
+
+
+def run(keys: int, events: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    tracker = VelocityTracker(max_keys=keys, idle_ttl_seconds=90000)
+    hot = [f"hot_{i}" for i in range(10)]
+    now = 1_700_000_000.0
+    record_ns, read_ns = [], []
+    for _ in range(events):
+        now += rng.expovariate(1.0)
+        key = rng.choice(hot) if rng.random() < 0.2 else f"key_{rng.randrange(keys * 2)}"
+        amount = rng.lognormvariate(4, 1)
+        start = time.perf_counter_ns()
+        tracker.record(key, amount, now)
+        record_ns.append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        tracker.read(rng.choice(hot), now)
+        read_ns.append(time.perf_counter_ns() - start)
+    return {
+        "keys": len(tracker),
+        "evictions": tracker.evictions,
+        "record_us": statistics.fmean(record_ns) / 1000,
+        "record_p99_us": sorted(record_ns)[int(0.99 * len(record_ns))] / 1000,
+        "read_us": statistics.fmean(read_ns) / 1000,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    for keys in args.keys:
+        r = run(keys, args.events)
+        print(f"max_keys={keys:<8} live={r['keys']:<8} evictions={r['evictions']:<8} "
+              f"record={r['record_us']:.2f}us (p99 {r['record_p99_us']:.2f}us) read={r['read_us']:.2f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--keys", type=int, nargs="+", default=[1000, 10000, 100000])
+    main(parser.parse_args())
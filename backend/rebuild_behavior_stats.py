@@ -0,0 +1,87 @@
+"""
+Rebuild user_behavior_stats from the transactions table.
+Run once after upgrading (or any time stats are suspected to have drifted):
+    python rebuild_behavior_stats.py
+"""
+import argparse
+import asyncio
+import sys
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.models import Base, Transaction, UserBehaviorStats
+from app.core.config import settings
+from app.services.behavior_stats import new_stats, apply_transaction
+
+STATS_COLUMNS = [c.name for c in UserBehaviorStats.__table__.c if c.name != "updated_at"]
+
+
+def _row(stats: UserBehaviorStats) -> dict:
+    return {name: getattr(stats, name) for name in STATS_COLUMNS}
+
+
+async def rebuild(batch_size: int = 1000) -> int:
+    """Recompute every user's stats in one DB transaction. Returns the number of users."""
+    engine = create_async_engine(settings.DATABASE_URL)
+    users = 0
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with engine.begin() as conn:
+            # Block concurrent stats writers until the rebuilt rows are committed;
+            # transactions they insert meanwhile apply on top once we release the lock.
+            await conn.execute(text("LOCK TABLE user_behavior_stats IN EXCLUSIVE MODE"))
+            await conn.execute(delete(UserBehaviorStats))
+
+            query = (
+                select(
+                    Transaction.user_id,
+                    Transaction.amount,
+                    Transaction.transaction_time,
+                    Transaction.is_fraudulent,
+                    Transaction.risk_score,
+                )
+                .where(Transaction.user_id.isnot(None))
+                .order_by(Transaction.user_id, Transaction.transaction_time)
+            )
+            pending = []
+            current = None
+            result = await conn.stream(query)
+            async for row in result:
+                if current is None or row.user_id != current.user_id:
+                    if current is not None:
+                        pending.append(_row(current))
+                    current = new_stats(row.user_id)
+                    users += 1
+                apply_transaction(current, row.amount, row.transaction_time, row.is_fraudulent, row.risk_score)
+                if len(pending) >= batch_size:
+                    await conn.execute(insert(UserBehaviorStats), pending)
+                    pending = []
+            if current is not None:
+                pending.append(_row(current))
+            if pending:
+                await conn.execute(insert(UserBehaviorStats), pending)
+    finally:
+        await engine.dispose()
+    return users
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild user_behavior_stats from transactions")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Rebuilding user behavior stats...")
+    try:
+        users = await rebuild(args.batch_size)
+        print(f"✅ Rebuilt behavior stats for {users} users")
+    except Exception as e:
+        print(f"\n❌ Error during rebuild: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
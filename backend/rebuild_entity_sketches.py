@@ -0,0 +1,87 @@
+"""
+Rebuild entity_sketches from the transactions table.
+Run once after upgrading (or any time sketches are suspected to have drifted):
+    python rebuild_entity_sketches.py
+
+Transactions do not store the client IP, so ip_users sketches are left as
+they are and only fill up from new traffic.
+"""
+import argparse
+import asyncio
+import sys
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.models import Base, EntitySketch, Transaction
+from app.core.config import settings
+from app.services.entity_sketches import HyperLogLog
+
+# kind -> (entity column, member column)
+REBUILT_KINDS = {
+    "device_users": (Transaction.device_id, Transaction.user_id),
+    "merchant_users": (Transaction.merchant_id, Transaction.user_id),
+    "user_devices": (Transaction.user_id, Transaction.device_id),
+}
+
+
+async def rebuild(batch_size: int = 1000) -> int:
+    """Recompute every device, merchant and user sketch in one DB transaction. Returns the number of sketches."""
+    engine = create_async_engine(settings.DATABASE_URL)
+    sketches = 0
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with engine.begin() as conn:
+            # Block concurrent sketch writers until the rebuilt rows are committed;
+            # transactions they insert meanwhile apply on top once we release the lock.
+            await conn.execute(text("LOCK TABLE entity_sketches IN EXCLUSIVE MODE"))
+            await conn.execute(delete(EntitySketch).where(EntitySketch.kind.in_(list(REBUILT_KINDS))))
+
+            for kind, (entity_column, member_column) in REBUILT_KINDS.items():
+                query = (
+                    select(entity_column.label("entity_id"), member_column.label("member"))
+                    .where(entity_column.isnot(None), member_column.isnot(None))
+                    .distinct()
+                    .order_by(entity_column)
+                )
+                pending = []
+                entity_id, sketch = None, None
+                result = await conn.stream(query)
+                async for row in result:
+                    if sketch is None or row.entity_id != entity_id:
+                        if sketch is not None:
+                            pending.append({"kind": kind, "entity_id": str(entity_id), "sketch": sketch.to_bytes()})
+                        entity_id, sketch = row.entity_id, HyperLogLog()
+                        sketches += 1
+                    sketch.add(str(row.member))
+                    if len(pending) >= batch_size:
+                        await conn.execute(insert(EntitySketch), pending)
+                        pending = []
+                if sketch is not None:
+                    pending.append({"kind": kind, "entity_id": str(entity_id), "sketch": sketch.to_bytes()})
+                if pending:
+                    await conn.execute(insert(EntitySketch), pending)
+    finally:
+        await engine.dispose()
+    return sketches
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild entity_sketches from transactions")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Rebuilding entity sketches...")
+    try:
+        sketches = await rebuild(args.batch_size)
+        print(f"✅ Rebuilt {sketches} entity sketches")
+    except Exception as e:
+        print(f"\n❌ Error during rebuild: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+"""
+Dynamic micro-batching for single-row inference.
+Concurrent /predict calls each submit one feature row; a scheduler task
+coalesces whatever arrives within max_wait_ms (up to max_batch_size rows)
+into one (N, n) matrix, scores it with one predict_batch call and fans
+the per-row results back out to the waiting requests. With an
+InferenceExecutor, batches are scored in its pool, so the next batch can
+form (and run on another worker) while one is computing.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+try:
+    from ml.executor import InferenceExecutor
+except ModuleNotFoundError as e:  # ML service container: ml/ is the working directory
+    if e.name != "ml":
+        raise
+    from executor import InferenceExecutor
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+QUEUE_WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus-style: a value counts in the first bucket >= it)"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {
+            "buckets": cumulative,
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row submits into batches.
+    score_batch takes an (N, n) matrix and returns predict_batch-style
+    columns (one list of N values per key; features_used shared). When a
+    row comes with entity keys, the batch's keys (zeros for rows without)
+    are passed too: score_batch(matrix, entity_keys).
+    A batch is scored when it reaches max_batch_size rows or when its first
+    row has waited max_wait_ms, whichever comes first. If the executor is
+    saturated, every row of the batch gets ExecutorSaturated.
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[np.ndarray], Dict[str, Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        executor: Optional[InferenceExecutor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, row: np.ndarray, entity_keys: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Score one (1, n) row (and its (1, k) entity keys) in the next batch; returns that row's result dict"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._start(loop)
+        future = loop.create_future()
+        await self._queue.put((row, future, time.perf_counter(), entity_keys))
+        return await future
+
+    def _start(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Bound to the running loop on first use (test clients may run one loop per request)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run(self._queue))
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, *self._inflight) if t is not None and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + max(0.0, self.max_wait - (time.perf_counter() - batch[0][2]))
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = loop.create_task(self._execute(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            # Let the batch start (and earlier results fan out) before collecting the next one
+            await asyncio.sleep(0)
+
+    async def _execute(self, batch: List[Tuple[np.ndarray, asyncio.Future, float, Optional[np.ndarray]]]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued, _ in batch:
+            self.queue_wait_ms.observe((started - enqueued) * 1000.0)
+        self.batch_size.observe(len(batch))
+        try:
+            args = (np.vstack([row for row, _, _, _ in batch]),)
+            keys = [entity_keys for _, _, _, entity_keys in batch]
+            if any(k is not None for k in keys):
+                width = next(k for k in keys if k is not None).shape[-1]
+                args += (np.vstack([k if k is not None else np.zeros((1, width), np.uint64) for k in keys]),)
+            if self.executor is not None:
+                columns = await self.executor.run(self.score_batch, *args)
+            else:
+                columns = self.score_batch(*args)
+            rows = split_columns(columns, len(batch))
+        except Exception as e:
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _, _), result in zip(batch, rows):
+            if not future.done():  # caller may have gone away
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+
+SHARED_COLUMNS = ("features_used", "model_version")
+
+
+def split_columns(columns: Dict[str, Any], rows: int) -> List[Dict[str, Any]]:
+    """predict_batch columns → one result dict per row (features_used and model_version shared)"""
+    shared = {name: columns[name] for name in SHARED_COLUMNS if name in columns}
+    per_row = {name: values for name, values in columns.items() if name not in SHARED_COLUMNS}
+    return [{**{name: values[i] for name, values in per_row.items()}, **shared} for i in range(rows)]
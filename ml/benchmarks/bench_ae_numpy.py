@@ -0,0 +1,76 @@
+"""
+Benchmark the NumPy autoencoder export against the model it was exported from.
+
+Scores the same rows through inference._ae_scores two ways, at several
+batch sizes: the original model (scaler.transform + model.predict) and the
+NumpyAutoencoder export (scaler folded in). The original is the synthetic
+MLPRegressor stand-in unless --model-dir holds autoencoder.pkl (a Keras
+model then, if TensorFlow is installed). Also reports the import time and
+RSS growth of the original model's framework vs NumPy alone.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_ae_numpy --sizes 1 32 2048
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ml import inference
+from ml.benchmarks.bench_predict_batch import stand_in_models
+from ml.numpy_autoencoder import NumpyAutoencoder
+
+IMPORT_PROBE = (
+    "import time; t = time.perf_counter(); import {module}; elapsed = time.perf_counter() - t; "
+    "rss = [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmRSS')][0]; "
+    "print(elapsed, rss)"
+)
+
+
+def import_cost(module: str) -> str:
+    result = subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(module=module)], capture_output=True, text=True)
+    if result.returncode != 0:
+        return "not installed"
+    seconds, rss_kb = result.stdout.split()
+    return f"{float(seconds):.2f}s, RSS {int(rss_kb) / 1024:.0f} MB"
+
+
+def rows_per_sec(model, scaler, matrix: np.ndarray, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(matrix), size):
+        inference._ae_scores(matrix[i:i + size], model, scaler)
+    return len(matrix) / (time.perf_counter() - start)
+
+
+def main(args: argparse.Namespace) -> None:
+    import joblib
+
+    rng = np.random.default_rng(0)
+    if args.model_dir:
+        model = joblib.load(os.path.join(args.model_dir, "autoencoder.pkl"))
+        scaler = joblib.load(os.path.join(args.model_dir, "ae_scaler.pkl"))
+    else:
+        models = stand_in_models(rng)
+        model, scaler = models["autoencoder.pkl"], models["ae_scaler.pkl"]
+    exported = NumpyAutoencoder.from_model(model, scaler)
+    matrix = rng.normal(size=(args.rows, exported.input_dim)).astype(np.float32)
+
+    framework = "tensorflow" if hasattr(model, "layers") else "sklearn.neural_network"
+    print(f"import {framework}: {import_cost(framework)}; import numpy: {import_cost('numpy')}")
+    print(f"{'batch':>6}{'model rows/s':>14}{'numpy rows/s':>14}{'speedup':>9}")
+    for size in args.sizes:
+        original = rows_per_sec(model, scaler, matrix, size)
+        numpy_rate = rows_per_sec(exported, None, matrix, size)
+        print(f"{size:>6}{original:>14.0f}{numpy_rate:>14.0f}{numpy_rate / original:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=4096)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 32, 256, 2048])
+    parser.add_argument("--model-dir", help="Benchmark autoencoder.pkl / ae_scaler.pkl from this directory")
+    main(parser.parse_args())
@@ -0,0 +1,158 @@
+"""
+Load test the ML service's inference executor.
+
+Starts `uvicorn server:app` in a subprocess per configuration (stand-in
+models written to a temporary MODEL_PATH unless --model-path is given),
+drives it with --concurrency clients posting single-row /predict bodies
+for --seconds, and probes GET /health every 20 ms meanwhile. Reports:
+
+- predict rows/s, p50 / p99 latency and 503 rejections (executor full)
+- /health p50 / max latency under that load
+
+Configurations: inline (INFERENCE_WORKERS=0, models on the event loop,
+the pre-executor behaviour), then thread and process pools with each of
+--workers. Micro-batching is off (MICROBATCH_MAX_SIZE=1) unless
+--microbatch, so rows/s reflects executor scaling alone; it grows with
+workers up to the number of cores.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_executor_load --workers 1 2 4 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from ml.benchmarks.bench_predict_batch import stand_in_models
+from ml.pipelines import feature_schema
+
+ML_DIR = Path(__file__).resolve().parents[1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("ML service did not start")
+
+
+async def drive(base_url: str, bodies: List[bytes], concurrency: int, seconds: float) -> Dict[str, float]:
+    headers = {"Content-Type": feature_schema.CONTENT_TYPE}
+    latencies, health, rejected, errors = [], [], 0, 0
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        await wait_ready(client)
+        await client.post("/predict", content=bodies[0], headers=headers)  # load models
+        stop = time.perf_counter() + seconds
+
+        async def worker(offset: int) -> None:
+            nonlocal rejected, errors
+            i = offset
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                response = await client.post("/predict", content=bodies[i % len(bodies)], headers=headers)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                elif response.status_code == 503:
+                    rejected += 1
+                    await asyncio.sleep(0.005)
+                else:
+                    errors += 1
+                i += concurrency
+
+        async def prober() -> None:
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - start)
+                await asyncio.sleep(0.02)
+
+        start = time.perf_counter()
+        await asyncio.gather(prober(), *(worker(c) for c in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    ms = np.array(latencies or [0.0]) * 1000.0
+    health_ms = np.array(health or [0.0]) * 1000.0
+    return {
+        "rows_s": len(latencies) / elapsed,
+        "p50": float(np.percentile(ms, 50)),
+        "p99": float(np.percentile(ms, 99)),
+        "rejected": rejected,
+        "errors": errors,
+        "health_p50": float(np.percentile(health_ms, 50)),
+        "health_max": float(health_ms.max()),
+    }
+
+
+def run_config(args: argparse.Namespace, model_dir: str, bodies: List[bytes], kind: str, workers: int) -> Dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "MODEL_PATH": model_dir,
+        "INFERENCE_EXECUTOR": kind,
+        "INFERENCE_WORKERS": str(workers),
+        "MICROBATCH_MAX_SIZE": "64" if args.microbatch else "1",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ML_DIR, env=env,
+    )
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}", bodies, args.concurrency, args.seconds))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(args: argparse.Namespace) -> None:
+    import joblib
+
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(512, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+    bodies = [feature_schema.encode(rows[i]) for i in range(len(rows))]
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_path
+        if model_dir is None:
+            for name, model in stand_in_models(rng).items():
+                joblib.dump(model, os.path.join(tmp, name))
+            model_dir = tmp
+        configs = [("inline", 0)] + [(kind, w) for kind in ("thread", "process") for w in args.workers]
+        print(f"{os.cpu_count()} cores; {args.concurrency} clients for {args.seconds:.0f}s per config; "
+              f"micro-batching {'on' if args.microbatch else 'off'}")
+        print(f"{'executor':<10}{'workers':>8}{'rows/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'503s':>7}"
+              f"{'health p50':>12}{'health max':>12}")
+        for kind, workers in configs:
+            r = run_config(args, model_dir, bodies, "thread" if kind == "inline" else kind, workers)
+            print(f"{kind:<10}{workers:>8}{r['rows_s']:>9.0f}{r['p50']:>9.1f}{r['p99']:>9.1f}{r['rejected']:>7}"
+                  f"{r['health_p50']:>11.1f}ms{r['health_max']:>10.1f}ms"
+                  + (f"  ({r['errors']} errors)" if r["errors"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--microbatch", action="store_true", help="Keep micro-batching on (MICROBATCH_MAX_SIZE=64)")
+    parser.add_argument("--model-path", help="Serve these models instead of synthetic stand-ins")
+    main(parser.parse_args())
@@ -0,0 +1,133 @@
+"""
+Measure serving latency while model versions are hot-reloaded.
+
+Writes two stand-in model versions (MODEL_PATH/versions/v1, v2), starts
+`uvicorn server:app` on them, and drives --concurrency clients posting
+single-row /predict bodies in two phases of --seconds each:
+
+- steady: no reloads
+- reload: POST /admin/reload alternating v1 / v2 every --reload-every s
+
+Reports p50 / p99 / max latency per phase, 503 rejections (executor full),
+other errors, and how many responses each model_version served (every
+response must name one). Exits non-zero
+when reload-phase p99 exceeds --max-p99-ratio x steady p99 or a request
+fails during reloads.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_hot_reload --seconds 10 --reload-every 2
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from ml.benchmarks.bench_executor_load import ML_DIR, free_port, wait_ready
+from ml.benchmarks.bench_predict_batch import stand_in_models
+from ml.pipelines import feature_schema
+
+TOKEN = "bench-reload"
+
+
+async def phase(client: httpx.AsyncClient, bodies: List[bytes], args: argparse.Namespace, reload: bool) -> Dict:
+    headers = {"Content-Type": feature_schema.CONTENT_TYPE}
+    latencies, versions, rejected, errors, reloads = [], Counter(), 0, 0, []
+    stop = time.perf_counter() + args.seconds
+
+    async def worker(offset: int) -> None:
+        nonlocal rejected, errors
+        i = offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = await client.post("/predict", content=bodies[i % len(bodies)], headers=headers)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+                versions[response.json().get("model_version")] += 1
+            elif response.status_code == 503:
+                rejected += 1
+                await asyncio.sleep(0.005)
+            else:
+                errors += 1
+            i += args.concurrency
+
+    async def reloader() -> None:
+        target = "v2"
+        while time.perf_counter() + args.reload_every < stop:
+            await asyncio.sleep(args.reload_every)
+            start = time.perf_counter()
+            response = await client.post(f"/admin/reload?version={target}", headers={"X-Admin-Token": TOKEN})
+            reloads.append((response.status_code, time.perf_counter() - start))
+            target = "v1" if target == "v2" else "v2"
+
+    tasks = [worker(c) for c in range(args.concurrency)] + ([reloader()] if reload else [])
+    await asyncio.gather(*tasks)
+    ms = np.array(latencies or [0.0]) * 1000.0
+    return {
+        "requests": len(latencies), "rejected": rejected, "errors": errors, "versions": dict(versions), "reloads": reloads,
+        "p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99)), "max": float(ms.max()),
+    }
+
+
+async def drive(base_url: str, bodies: List[bytes], args: argparse.Namespace) -> Dict[str, Dict]:
+    limits = httpx.Limits(max_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        await wait_ready(client)
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.1)
+        return {"steady": await phase(client, bodies, args, False), "reload": await phase(client, bodies, args, True)}
+
+
+def main(args: argparse.Namespace) -> int:
+    import joblib
+
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(512, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+    bodies = [feature_schema.encode(rows[i]) for i in range(len(rows))]
+    with tempfile.TemporaryDirectory() as model_dir:
+        for version in ("v1", "v2"):
+            path = os.path.join(model_dir, "versions", version)
+            os.makedirs(path)
+            for name, model in stand_in_models(rng).items():
+                joblib.dump(model, os.path.join(path, name))
+        with open(os.path.join(model_dir, "CURRENT"), "w") as f:
+            f.write("v1")
+        port = free_port()
+        env = {**os.environ, "MODEL_PATH": model_dir, "MODEL_ADMIN_TOKEN": TOKEN}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ML_DIR, env=env,
+        )
+        try:
+            results = asyncio.run(drive(f"http://127.0.0.1:{port}", bodies, args))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"{os.cpu_count()} cores; {args.concurrency} clients, {args.seconds:.0f}s per phase")
+    print(f"{'phase':<8}{'requests':>9}{'503s':>7}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}  versions")
+    for name, r in results.items():
+        print(f"{name:<8}{r['requests']:>9}{r['rejected']:>7}{r['errors']:>8}{r['p50']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}  {r['versions']}")
+    reloads = results["reload"]["reloads"]
+    print(f"reloads: {[status for status, _ in reloads]}, "
+          f"{np.mean([seconds for _, seconds in reloads] or [0]):.2f}s each (load + warmup + swap)")
+    ratio = results["reload"]["p99"] / max(results["steady"]["p99"], 1e-9)
+    print(f"p99 reload / steady: {ratio:.2f}x (bound {args.max_p99_ratio:.2f}x)")
+    return 0 if ratio <= args.max_p99_ratio and not results["reload"]["errors"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--reload-every", type=float, default=2.0)
+    parser.add_argument("--max-p99-ratio", type=float, default=2.0)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""
+Benchmark the compiled Isolation Forest against sklearn's score_samples.
+
+Fits a forest like train_isolation_forest.py (200 trees, contamination
+0.01) on synthetic rows, or loads --model-dir/isolation_forest.pkl, and
+reports:
+
+- single-row latency (p50) and rows/s at several batch sizes, sklearn vs
+  CompiledIsolationForest (scores checked to be identical)
+- load time and size: the joblib pickle vs the .npz export, and the
+  compiled node arrays in memory
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_iforest_compiled --sizes 1 32 2048
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ml.compiled_iforest import CompiledIsolationForest
+from ml.pipelines import feature_schema
+
+
+def rows_per_sec(score, matrix: np.ndarray, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(matrix), size):
+        score(matrix[i:i + size])
+    return len(matrix) / (time.perf_counter() - start)
+
+
+def p50_ms(score, row: np.ndarray, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        score(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000.0
+
+
+def timed(load, path: str):
+    start = time.perf_counter()
+    loaded = load(path)
+    return loaded, time.perf_counter() - start
+
+
+def main(args: argparse.Namespace) -> None:
+    import joblib
+    from sklearn.ensemble import IsolationForest
+
+    rng = np.random.default_rng(0)
+    n = len(feature_schema.FEATURE_ORDER)
+    if args.model_dir:
+        model = joblib.load(os.path.join(args.model_dir, "isolation_forest.pkl"))
+        n = model.n_features_in_
+    else:
+        model = IsolationForest(n_estimators=200, contamination=0.01, random_state=42)
+        model.fit(rng.normal(size=(20000, n)))
+    compiled = CompiledIsolationForest.from_sklearn(model)
+    matrix = rng.normal(scale=2.0, size=(args.rows, n))
+    assert np.array_equal(compiled.score_samples(matrix), model.score_samples(matrix))
+
+    print(f"{len(model.estimators_)} trees, {len(compiled.feature)} nodes, max depth {compiled.max_depth}")
+    print(f"single row p50: sklearn {p50_ms(model.score_samples, matrix[:1], 50):.2f} ms, "
+          f"compiled {p50_ms(compiled.score_samples, matrix[:1], 500):.3f} ms")
+    print(f"{'batch':>6}{'sklearn rows/s':>16}{'compiled rows/s':>17}{'speedup':>9}")
+    for size in args.sizes:
+        subset = matrix[:max(size * 4, 256)] if size < 32 else matrix
+        original = rows_per_sec(model.score_samples, subset, size)
+        fast = rows_per_sec(compiled.score_samples, subset, size)
+        print(f"{size:>6}{original:>16.0f}{fast:>17.0f}{fast / original:>8.1f}x")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl, npz = os.path.join(tmp, "isolation_forest.pkl"), os.path.join(tmp, "isolation_forest.npz")
+        joblib.dump(model, pkl)
+        compiled.export(npz)
+        _, pkl_seconds = timed(joblib.load, pkl)
+        _, npz_seconds = timed(CompiledIsolationForest.load, npz)
+        print(f"pickle {os.path.getsize(pkl) / 1e6:.1f} MB, load {pkl_seconds * 1000:.0f} ms; "
+              f"npz {os.path.getsize(npz) / 1e6:.1f} MB, load {npz_seconds * 1000:.0f} ms; "
+              f"compiled arrays {compiled.nbytes / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=4096)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 32, 256, 2048])
+    parser.add_argument("--model-dir", help="Benchmark isolation_forest.pkl from this directory")
+    main(parser.parse_args())
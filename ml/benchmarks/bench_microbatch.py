@@ -0,0 +1,76 @@
+"""
+Benchmark concurrent single-row scoring with and without micro-batching.
+
+C concurrent clients each score R single rows back to back, the way
+concurrent /predict calls reach the ML service:
+
+- direct:      predict_vector per row (the pre-batching /predict path)
+- microbatch:  MicroBatcher.submit per row, coalesced into predict_batch
+               calls of up to --max-batch-size rows / --max-wait-ms
+
+and reports rows/s, per-request p50/p99 latency and the scheduler's
+batch-size / queue-wait histograms. Models as in bench_predict_batch.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_microbatch --clients 64 --requests 20
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+from ml import inference
+from ml.batching import MicroBatcher
+from ml.benchmarks.bench_predict_batch import install_stand_in_models
+from ml.pipelines import feature_schema
+
+
+async def run(score: Callable[[np.ndarray], Awaitable[object]], matrix: np.ndarray, clients: int, requests: int):
+    latencies: List[float] = []
+
+    async def client(offset: int) -> None:
+        for i in range(requests):
+            row = matrix[(offset * requests + i) % len(matrix)][None, :]
+            start = time.perf_counter()
+            await score(row)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000.0
+    return len(latencies) / elapsed, np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    models = install_stand_in_models(rng)
+    matrix = rng.normal(size=(4096, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+    inference.predict_batch(matrix[:64])  # warm up
+
+    async def direct(row):
+        return inference.predict_vector(row)
+
+    batcher = MicroBatcher(inference.predict_batch, args.max_batch_size, args.max_wait_ms)
+    print(f"models: {models}; {args.clients} clients x {args.requests} single-row requests")
+    print(f"{'mode':<12}{'rows/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, score in (("direct", direct), ("microbatch", batcher.submit)):
+        rate, p50, p99 = await run(score, matrix, args.clients, args.requests)
+        print(f"{name:<12}{rate:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+    await batcher.stop()
+    stats = batcher.stats()
+    print(f"batch size: mean {stats['batch_size']['mean']:.1f} over {stats['batch_size']['count']} batches, "
+          f"cumulative {stats['batch_size']['buckets']}")
+    print(f"queue wait ms: mean {stats['queue_wait_ms']['mean']:.2f}, cumulative {stats['queue_wait_ms']['buckets']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
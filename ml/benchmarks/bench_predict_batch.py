@@ -0,0 +1,121 @@
+"""
+Benchmark per-row inference vs predict_batch at several batch sizes.
+
+For each batch size B, scores the same rows two ways:
+
+- loop:  predict_vector on each (1, n) row (what N /predict calls cost)
+- batch: predict_batch on (B, n) chunks, one call per model per chunk
+
+and optionally (--http) the same over HTTP against the FastAPI app with
+the TestClient, /predict per row vs /predict_batch per chunk.
+
+Uses the models in MODEL_PATH when they load; otherwise trains stand-ins
+on synthetic rows (IsolationForest + StandardScaler, an MLPRegressor
+autoencoder) so the per-call model overhead is representative.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.bench_predict_batch --rows 2048
+    python -m ml.benchmarks.bench_predict_batch --sizes 1 32 256 2048 --http
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from ml import inference
+from ml.pipelines import feature_schema
+
+
+def stand_in_models(rng: np.random.Generator) -> dict:
+    """MODEL_PATH file name → model, trained on synthetic rows"""
+    from sklearn.ensemble import IsolationForest
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    n = len(feature_schema.FEATURE_ORDER)
+    train = rng.normal(size=(2000, n)).astype(np.float32)
+    scaler = StandardScaler().fit(train)
+    scaled = scaler.transform(train)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ae = MLPRegressor(hidden_layer_sizes=(16, 8, 16), max_iter=30, random_state=0).fit(scaled, scaled)
+    return {
+        "autoencoder.pkl": ae,
+        "ae_scaler.pkl": scaler,
+        "isolation_forest.pkl": IsolationForest(n_estimators=100, random_state=0).fit(scaled),
+        "if_scaler.pkl": scaler,
+    }
+
+
+def install_stand_in_models(rng: np.random.Generator) -> str:
+    """Synthetic-data models for the loaders that find nothing in MODEL_PATH"""
+    loaded = []
+    models = stand_in_models(rng)
+    if inference._load_ae()[0] is None:
+        inference.registry.put("autoencoder", models["autoencoder.pkl"], models["ae_scaler.pkl"])
+    else:
+        loaded.append("autoencoder")
+    if inference._load_iforest()[0] is None:
+        inference.registry.put("isolation_forest", models["isolation_forest.pkl"], models["if_scaler.pkl"])
+    else:
+        loaded.append("isolation_forest")
+    if inference._load_gnn()[0] is not None:
+        loaded.append("gnn")
+    return ", ".join(loaded) or "none (stand-ins)"
+
+
+def rows_per_sec(score: Callable[[np.ndarray], object], matrix: np.ndarray, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(matrix), size):
+        score(matrix[i:i + size])
+    return len(matrix) / (time.perf_counter() - start)
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    models = install_stand_in_models(rng)
+    matrix = rng.normal(size=(args.rows, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+
+    def loop(chunk):
+        for i in range(len(chunk)):
+            inference.predict_vector(chunk[i:i + 1])
+
+    modes = {"loop": loop, "batch": inference.predict_batch}
+    if args.http:
+        sys.path.insert(0, str(Path(inference.__file__).parent))
+        sys.modules["inference"] = inference  # server's `from inference import` sees the same models
+        from fastapi.testclient import TestClient
+        import server
+
+        client = TestClient(server.app)
+        headers = {"Content-Type": feature_schema.CONTENT_TYPE}
+
+        def http_loop(chunk):
+            for i in range(len(chunk)):
+                client.post("/predict", content=feature_schema.encode(chunk[i:i + 1]), headers=headers)
+
+        def http_batch(chunk):
+            client.post("/predict_batch", content=feature_schema.encode(chunk), headers=headers)
+
+        modes.update({"http loop": http_loop, "http batch": http_batch})
+
+    print(f"models: {models}; {args.rows} rows x {matrix.shape[1]} features")
+    inference.predict_batch(matrix[:64])  # warm up
+    print(f"{'batch':>6}" + "".join(f"{name + ' rows/s':>18}" for name in modes) + f"{'speedup':>10}")
+    for size in args.sizes:
+        rates = {name: rows_per_sec(score, matrix, size) for name, score in modes.items()}
+        print(f"{size:>6}" + "".join(f"{rate:>18.0f}" for rate in rates.values())
+              + f"{rates['batch'] / rates['loop']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2048)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 32, 256, 2048])
+    parser.add_argument("--http", action="store_true", help="Also time /predict vs /predict_batch")
+    main(parser.parse_args())
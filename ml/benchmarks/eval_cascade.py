@@ -0,0 +1,117 @@
+"""
+Evaluate cascade scoring (CASCADE_MODE) against full scoring on labeled rows.
+
+Scores the rows with every model (full), then with the cascade at each
+--margins value (CASCADE_MARGIN, score points below RISK_SCORE_MEDIUM),
+and reports per margin:
+
+- exit rate: rows that skipped the GNN (and, for the first exit, the AE)
+- compute saved: predict_batch wall time relative to full scoring
+- recall at RISK_SCORE_MEDIUM of full and cascade scoring, and the recall
+  lost (labeled frauds that full scoring flags and the cascade does not)
+
+The smallest margin with acceptable recall lost is the one to deploy.
+
+--data is a CSV with FEATURE_ORDER columns (missing ones are 0) and a 0/1
+--label column; without it, synthetic rows with 2% outlying "frauds" are
+used. Uses the models in MODEL_PATH when they load, otherwise stand-ins
+(see bench_predict_batch). Rows carry no entity keys, so the GNN scores
+each one as an isolated node.
+
+Usage (from the repository root):
+    python -m ml.benchmarks.eval_cascade --data labeled.csv --margins 0 10 20 30
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ml import inference
+from ml.benchmarks.bench_predict_batch import install_stand_in_models
+from ml.pipelines import feature_schema
+
+
+def install_stand_in_gnn() -> None:
+    """An untrained FraudGNN when MODEL_PATH has none: the GNN's cost, not its scores, is what the cascade saves"""
+    if inference._load_gnn()[0] is not None:
+        return
+    try:
+        from ml.training.train_gnn import FraudGNN
+    except ImportError:
+        return  # no torch / torch_geometric: the cascade can only skip the AE
+    n = len(feature_schema.FEATURE_ORDER)
+    inference.registry.put("gnn", FraudGNN(n).eval(), n)
+
+
+def load_rows(args: argparse.Namespace, rng: np.random.Generator):
+    """(N, n) float32 matrix in FEATURE_ORDER and (N,) bool labels"""
+    if args.data:
+        import pandas as pd
+
+        df = pd.read_csv(args.data)
+        matrix = df.reindex(columns=feature_schema.FEATURE_ORDER, fill_value=0.0).to_numpy(dtype=np.float32)
+        return matrix, df[args.label].to_numpy().astype(bool)
+    matrix = rng.normal(size=(args.rows, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+    labels = rng.random(args.rows) < 0.02
+    matrix[labels] *= 4.0
+    return matrix, labels
+
+
+def timed_scores(matrix: np.ndarray, batch_size: int):
+    """(fraud_score array, cascade_stages or None, seconds) of predict_batch over the rows in chunks"""
+    scores, stages = [], []
+    start = time.perf_counter()
+    for i in range(0, len(matrix), batch_size):
+        result = inference.predict_batch(matrix[i:i + batch_size])
+        scores.extend(result["fraud_score"])
+        stages.extend(result.get("cascade_stages", []))
+    return np.asarray(scores), stages or None, time.perf_counter() - start
+
+
+def recall(flagged: np.ndarray, labels: np.ndarray) -> float:
+    return float(flagged[labels].mean()) if labels.any() else float("nan")
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    models = install_stand_in_models(rng)
+    install_stand_in_gnn()
+    matrix, labels = load_rows(args, rng)
+    medium = inference.RISK_SCORE_MEDIUM
+    print(f"models: {models}; {len(matrix)} rows, {int(labels.sum())} labeled fraud; "
+          f"cascade order {','.join(inference.CASCADE_ORDER)}")
+
+    inference.CASCADE_MODE = False
+    inference.predict_batch(matrix[:64])  # warm up
+    full, _, full_seconds = timed_scores(matrix, args.batch_size)
+    full_flagged = full >= medium
+    full_recall = recall(full_flagged, labels)
+    print(f"full: {len(matrix) / full_seconds:.0f} rows/s, {full_flagged.mean():.1%} flagged, "
+          f"recall@{medium:g} {full_recall:.4f}")
+
+    print(f"{'margin':>7}{'exit@1':>9}{'no gnn':>9}{'saved':>8}{'recall':>9}{'lost':>9}{'missed':>8}")
+    inference.CASCADE_MODE = True
+    try:
+        for margin in args.margins:
+            inference.CASCADE_MARGIN = margin
+            cascade, stages, seconds = timed_scores(matrix, args.batch_size)
+            flagged = cascade >= medium
+            first_exit = np.mean([len(row) == 1 for row in stages])
+            no_gnn = np.mean(["gnn" not in row for row in stages])
+            missed = int((full_flagged & ~flagged & labels).sum())
+            cascade_recall = recall(flagged, labels)
+            print(f"{margin:>7g}{first_exit:>9.1%}{no_gnn:>9.1%}{1.0 - seconds / full_seconds:>8.1%}"
+                  f"{cascade_recall:>9.4f}{full_recall - cascade_recall:>9.4f}{missed:>8}")
+    finally:
+        inference.CASCADE_MODE = False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", help="Labeled CSV (FEATURE_ORDER columns + --label)")
+    parser.add_argument("--label", default="is_fraud")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic rows without --data")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 10.0, 20.0, 30.0])
+    main(parser.parse_args())
@@ -0,0 +1,143 @@
+"""
+Memory-mapped cache of GNN node embeddings.
+Row i holds the first GAT layer's output (after ELU) for the transaction
+in entity_graph slot i, so the graph's per-entity histories (user, device,
+merchant, IP → slots) double as the id → row index. Online scoring then
+runs the first layer for the new rows only and the final layers over
+cached neighbor embeddings instead of a whole k-hop subgraph.
+
+A node's first-layer embedding depends only on its one-hop neighborhood,
+so it goes stale exactly when entity_graph reports that neighborhood
+changed (mark()); such rows, and newly added nodes, are queued oldest
+change first for the background refresh (pending() → put()). Serving
+another model (bind()) queues every stored node.
+
+Two counters per row keep a refresh that raced with the graph honest:
+`node` changes when the slot holds a new transaction (the computed
+embedding is discarded), `version` on any change (the embedding is kept
+but the row stays queued). Embeddings from a model that is no longer
+bound are discarded too.
+
+The matrix is an np.memmap on an unnamed temporary file (in `directory`,
+default the system temp dir), so it lives in the page cache rather than
+on the Python heap.
+"""
+
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Thread-safe (capacity, dim) float32 embedding rows with staleness tracking"""
+
+    def __init__(self, capacity: int, directory: Optional[str] = None):
+        self.capacity = capacity
+        self.directory = directory
+        self.dim = 0
+        self.embeddings: Optional[np.memmap] = None
+        self.owner: Any = None  # model the embeddings were computed with
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self.discarded = 0
+        self.invalidations = 0
+        self._file = None
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._node = np.zeros(capacity, dtype=np.int64)
+        self._version = np.zeros(capacity, dtype=np.int64)
+        self._changed_at = np.zeros(capacity)
+        self._pending: Dict[int, None] = {}  # ordered set, oldest change first
+        self._lock = threading.Lock()
+
+    def bind(self, owner: Any, dim: int, rows: Iterable[int]) -> bool:
+        """Serve embeddings computed by `owner`; a new owner invalidates and queues `rows` (the stored nodes)"""
+        with self._lock:
+            if owner is self.owner:
+                return False
+            if dim != self.dim or self.embeddings is None:
+                self._allocate(dim)
+            self.owner = owner
+            self._valid[:] = False
+            self._queue(rows, time.monotonic())
+            self.invalidations += 1
+            return True
+
+    def _allocate(self, dim: int) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = tempfile.TemporaryFile(prefix="gnn_embeddings_", dir=self.directory)
+        self.embeddings = np.memmap(self._file, dtype=np.float32, mode="w+", shape=(self.capacity, dim))
+        self.dim = dim
+
+    def _queue(self, rows: Iterable[int], now: float) -> None:
+        for slot in rows:
+            self._version[slot] += 1
+            if slot not in self._pending:
+                self._pending[slot] = None
+                self._changed_at[slot] = now
+
+    def mark(self, added: List[int], touched: Set[int]) -> None:
+        """entity_graph listener: `added` slots hold new nodes, `touched` nodes have new neighborhoods"""
+        with self._lock:
+            self._valid[added] = False
+            self._node[added] += 1
+            self._queue(added, time.monotonic())
+            self._queue(touched, time.monotonic())
+
+    def pending(self, limit: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Up to `limit` queued slots, oldest change first, with their node / version counters for put()"""
+        with self._lock:
+            slots = np.fromiter(self._pending, dtype=np.int64, count=min(limit, len(self._pending)))
+            return slots, self._node[slots], self._version[slots]
+
+    def counters(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Node / version counters of `slots`, for a put() outside the refresh queue (a cache miss)"""
+        with self._lock:
+            return self._node[slots], self._version[slots]
+
+    def get(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(len(slots), dim) embeddings (copied) and which of them are valid"""
+        with self._lock:
+            valid = self._valid[slots]
+            self.hits += int(valid.sum())
+            self.misses += len(slots) - int(valid.sum())
+            return np.array(self.embeddings[slots]), valid
+
+    def put(
+        self, owner: Any, slots: np.ndarray, nodes: np.ndarray, versions: np.ndarray, embeddings: np.ndarray,
+    ) -> int:
+        """Store embeddings `owner` computed for the node counters pending() returned; returns how many were kept"""
+        with self._lock:
+            same_node = (self._node[slots] == nodes) & (owner is self.owner)
+            kept = slots[same_node]
+            self.embeddings[kept] = embeddings[same_node]
+            self._valid[kept] = True
+            for slot in slots[same_node & (self._version[slots] == versions)].tolist():
+                self._pending.pop(slot, None)
+            self.refreshed += len(kept)
+            self.discarded += len(slots) - len(kept)
+            return len(kept)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = next(iter(self._pending), None)
+            return {
+                "enabled": True,
+                "rows": int(self._valid.sum()),
+                "dim": self.dim,
+                "pending": len(self._pending),
+                "stale": int(self._valid[list(self._pending)].sum()),  # served, but older than their neighborhood
+                "max_staleness_seconds": (
+                    round(time.monotonic() - self._changed_at[oldest], 3) if oldest is not None else 0.0
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshed": self.refreshed,
+                "discarded": self.discarded,
+                "invalidations": self.invalidations,
+                "bytes": self.embeddings.nbytes if self.embeddings is not None else 0,
+            }
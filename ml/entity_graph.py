@@ -0,0 +1,208 @@
+"""
+In-memory entity graph for neighborhood-aware GNN scoring.
+Scored transactions are stored as nodes (their feature rows) in a ring
+buffer of `capacity` slots; two transactions are neighbors when they share
+an entity (user, device, merchant or IP, as feature_schema entity keys).
+Each entity remembers its `entity_history` most recent transactions.
+
+subgraph_batch() builds, for every row of a batch, a k-hop neighborhood
+around the (not yet stored) transaction and joins them into one
+disjoint-union graph, so concurrent requests share one GAT call. Sampling
+is capped per hop (`fanout`): hop h takes at most fanout[h] new neighbors
+per node, most recent first, alternating between the node's entities so
+one busy merchant cannot crowd out the user's own history. A row's
+subgraph therefore has at most 1 + f1 + f1 * f2 + ... nodes, whatever the
+entity degrees, which bounds GNN latency.
+
+Edges point from a sampled neighbor to the node that sampled it, so each
+GAT layer passes messages one hop towards the scored transaction.
+
+Listeners (subscribe()) are told which slots each add() filled and which
+stored nodes' one-hop neighborhoods it changed (a new transaction sharing
+their entity, or an evicted one), e.g. to refresh cached node embeddings.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+class EntityGraph:
+    """Thread-safe transaction / entity graph with bounded neighbor sampling"""
+
+    def __init__(
+        self,
+        n_features: int,
+        n_kinds: int,
+        capacity: int = 100_000,
+        entity_history: int = 50,
+        fanout: Sequence[int] = (10, 5),
+    ):
+        if capacity < 1 or entity_history < 1 or any(f < 0 for f in fanout):
+            raise ValueError("capacity and entity_history must be >= 1 and fanout >= 0")
+        self.capacity = capacity
+        self.entity_history = entity_history
+        self.fanout = tuple(fanout)
+        self.features = np.zeros((capacity, n_features), dtype=np.float32)
+        self.keys = np.zeros((capacity, n_kinds), dtype=np.uint64)
+        self.size = 0
+        self.added = 0
+        self._next = 0
+        self._entities: Dict[int, Deque[int]] = {}
+        self._listeners: List[Callable[[List[int], Set[int]], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def max_subgraph_nodes(self) -> int:
+        total, width = 1, 1
+        for f in self.fanout:
+            width *= f
+            total += width
+        return total
+
+    def subscribe(self, listener: Callable[[List[int], Set[int]], None]) -> None:
+        """Call listener(added slots, stored slots whose neighborhood changed) after every add(), under the lock"""
+        self._listeners.append(listener)
+
+    def add(self, rows: np.ndarray, keys: np.ndarray) -> None:
+        """Store scored rows; rows without any entity key are skipped"""
+        with self._lock:
+            added: List[int] = []
+            touched: Optional[Set[int]] = set() if self._listeners else None
+            for row, row_keys in zip(rows, keys):
+                if not row_keys.any():
+                    continue
+                slot = self._next
+                if self.size == self.capacity:
+                    self._evict(slot, touched)
+                else:
+                    self.size += 1
+                self.features[slot] = row
+                self.keys[slot] = row_keys
+                for key in row_keys:
+                    if key:
+                        history = self._entities.get(int(key))
+                        if history is None:
+                            history = self._entities[int(key)] = deque(maxlen=self.entity_history)
+                        elif touched is not None:
+                            touched.update(history)
+                        history.append(slot)
+                self._next = (slot + 1) % self.capacity
+                self.added += 1
+                added.append(slot)
+            if added and touched is not None:
+                touched.difference_update(added)
+                for listener in self._listeners:
+                    listener(added, touched)
+
+    def _evict(self, slot: int, touched: Optional[Set[int]] = None) -> None:
+        # The oldest slot is the oldest entry of every history that still holds it
+        for key in self.keys[slot]:
+            history = self._entities.get(int(key)) if key else None
+            if history and history[0] == slot:
+                history.popleft()
+                if not history:
+                    del self._entities[int(key)]
+                elif touched is not None:
+                    touched.update(history)
+
+    def _neighbors(self, keys: np.ndarray, limit: int, seen: set) -> List[int]:
+        """Up to `limit` unseen slots sharing an entity with `keys`, newest first, round-robin over entities"""
+        iterators = [reversed(self._entities[int(k)]) for k in keys if k and int(k) in self._entities]
+        picked: List[int] = []
+        while iterators and len(picked) < limit:
+            for it in list(iterators):
+                slot = next(it, None)
+                if slot is None:
+                    iterators.remove(it)
+                elif slot not in seen:
+                    seen.add(slot)
+                    picked.append(slot)
+                    if len(picked) == limit:
+                        break
+        return picked
+
+    def sample(self, keys: np.ndarray) -> Tuple[List[int], List[Tuple[int, int]]]:
+        """
+        Stored slots around a transaction with entity `keys` and the edges
+        between them, as (neighbor position, parent position) into
+        [transaction] + slots (the transaction itself is position 0).
+        """
+        with self._lock:
+            return self._sample(keys, self.fanout)
+
+    def _sample(
+        self, keys: np.ndarray, fanout: Sequence[int], exclude: Optional[int] = None,
+    ) -> Tuple[List[int], List[Tuple[int, int]]]:
+        slots: List[int] = []
+        edges: List[Tuple[int, int]] = []
+        seen: set = set() if exclude is None else {exclude}
+        frontier = [(0, keys)]
+        for limit in fanout:
+            next_frontier = []
+            for position, node_keys in frontier:
+                for slot in self._neighbors(node_keys, limit, seen):
+                    slots.append(slot)
+                    edges.append((len(slots), position))
+                    next_frontier.append((len(slots), self.keys[slot]))
+            frontier = next_frontier
+        return slots, edges
+
+    def subgraph_batch(self, rows: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Disjoint union of every row's sampled neighborhood.
+        Returns node features (M, n), edge_index (2, E) int64 and the node
+        index of each input row (N,).
+        """
+        return self.neighborhood_batch(rows, keys)[:3]
+
+    def neighborhood_batch(
+        self, rows: np.ndarray, keys: np.ndarray, fanout: Optional[Sequence[int]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        subgraph_batch() sampled with `fanout` (default: the graph's), plus
+        the stored slot behind every node (M,), -1 for the input rows.
+        """
+        with self._lock:  # slots are read before a concurrent add() can reuse them
+            return self._union(rows, keys, self.fanout if fanout is None else fanout)
+
+    def stored_neighborhoods(
+        self, slots: Sequence[int], fanout: Sequence[int],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """neighborhood_batch() around stored nodes, each excluded from its own neighborhood"""
+        with self._lock:
+            slots = np.asarray(slots, dtype=np.int64)
+            return self._union(self.features[slots], self.keys[slots], fanout, slots)
+
+    def _union(
+        self, rows: np.ndarray, keys: np.ndarray, fanout: Sequence[int], exclude: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        parts, edge_parts, targets, node_slots = [], [], [], []
+        offset = 0
+        for i, (row, row_keys) in enumerate(zip(rows, keys)):
+            own = None if exclude is None else int(exclude[i])
+            slots, edges = self._sample(row_keys, fanout, own) if row_keys.any() else ([], [])
+            parts.append(row.reshape(1, -1))
+            node_slots.append(-1 if own is None else own)
+            if slots:
+                parts.append(self.features[slots])
+                node_slots.extend(slots)
+            if edges:
+                edge_parts.append(np.asarray(edges, dtype=np.int64).T + offset)
+            targets.append(offset)
+            offset += 1 + len(slots)
+        x = np.vstack(parts).astype(np.float32, copy=False)
+        edge_index = np.hstack(edge_parts) if edge_parts else np.zeros((2, 0), dtype=np.int64)
+        return x, edge_index, np.asarray(targets, dtype=np.int64), np.asarray(node_slots, dtype=np.int64)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nodes": self.size,
+            "capacity": self.capacity,
+            "entities": len(self._entities),
+            "added": self.added,
+            "fanout": list(self.fanout),
+            "max_subgraph_nodes": self.max_subgraph_nodes,
+        }
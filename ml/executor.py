@@ -0,0 +1,99 @@
+"""
+Inference executor: runs CPU-bound model calls off the event loop.
+A thread pool (Keras / torch / NumPy release the GIL) or a process pool
+(for GIL-bound parts such as sklearn tree traversal), with a bounded
+number of pending jobs. When the bound is reached, new jobs are rejected
+with ExecutorSaturated instead of queueing without limit, so the event
+loop (and /health) stays responsive under overload.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when max_pending jobs are already queued or running"""
+
+
+class InferenceExecutor:
+    """
+    Bounded pool for model calls.
+    workers=0 runs jobs inline on the event loop (pre-executor behaviour,
+    for comparison). Process-pool jobs must be picklable module-level
+    functions; each worker process loads its own copy of the models
+    (pass the warmup function as initializer to preload them).
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        kind: str = "thread",
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Executor kind must be one of {EXECUTOR_KINDS}, got {kind!r}")
+        self.kind = kind
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending if max_pending is not None else max(1, self.workers) * 4
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.initializer = initializer
+        self._pool: Optional[Executor] = None
+        if self.workers > 0:
+            self._pool = self._new_pool()
+
+    def _new_pool(self, *initargs: Any) -> Executor:
+        pool_cls = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+        return pool_cls(max_workers=self.workers, initializer=self.initializer, initargs=initargs)
+
+    def recycle(self, *initargs: Any) -> None:
+        """
+        Replace the pool's workers, e.g. so process workers load a new model
+        version (initializer(*initargs)). Jobs already submitted finish on the
+        old workers; new jobs go to the new pool.
+        """
+        if self._pool is None:
+            return
+        old, self._pool = self._pool, self._new_pool(*initargs)
+        old.shutdown(wait=False)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) in the pool; raises ExecutorSaturated when max_pending jobs are in flight"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(f"Inference executor saturated ({self.pending} pending jobs)")
+        self.pending += 1
+        try:
+            if self._pool is None:
+                result = fn(*args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind if self.workers > 0 else "inline",
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
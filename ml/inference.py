@@ -2,116 +2,219 @@
 Single predict(transaction) interface for fraud detection.
 Uses Autoencoder (reconstruction error → 0-1), Isolation Forest (decision_function → 0-1),
 GNN (sigmoid output 0-1). Falls back to heuristics in 0-1 when models unavailable.
+predict_vector() scores a float32 row in feature_schema.FEATURE_ORDER, as
+sent by the backend; predict() builds that row from feature dicts.
+predict_batch() scores an (N, n) matrix with one call per model.
+Models are loaded once through `registry` (see registry.ModelRegistry);
+warm_up() preloads them at service startup.
+GNN neighborhoods come from `entity_graph`; with `embedding_cache` the
+neighbors' first-layer embeddings are precomputed by a background thread
+(refresh_embeddings()) instead of recomputed per request.
+With CASCADE_MODE=1, rows whose IF / AE scores are clearly low risk exit
+before the GNN runs (see _cascade); results then name the stages each row ran.
+With MODEL_PARALLEL=1 the models of one prediction run concurrently (see
+_run_models), and a model that overruns its timeout (MODEL_TIMEOUT_MS, or
+AE_ / IF_ / GNN_TIMEOUT_MS) is scored as not loaded.
 """
 
 import os
 import math
-from typing import Dict, Any, Optional, Tuple
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Callable, Dict, Any, Optional, Tuple
+
+try:
+    from ml.pipelines import feature_builder, feature_schema
+    from ml.batching import split_columns
+    from ml.compiled_iforest import CompiledIsolationForest
+    from ml.embedding_cache import EmbeddingCache
+    from ml.entity_graph import EntityGraph
+    from ml.numpy_autoencoder import NumpyAutoencoder
+    from ml.registry import ModelRegistry
+except ModuleNotFoundError as e:  # ML service container: ml/ is the working directory
+    if e.name != "ml":
+        raise  # a missing dependency (pandas, ...), not the package layout
+    from pipelines import feature_builder, feature_schema
+    from batching import split_columns
+    from compiled_iforest import CompiledIsolationForest
+    from embedding_cache import EmbeddingCache
+    from entity_graph import EntityGraph
+    from numpy_autoencoder import NumpyAutoencoder
+    from registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
 
 MODEL_DIR = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(__file__), "models"))
 
-_ae = None
-_ae_scaler = None
-_iforest = None
-_if_scaler = None
-_gnn = None
-_gnn_input_dim = None
 
-
-def _load_ae() -> Tuple[Optional[Any], Optional[Any]]:
-    global _ae, _ae_scaler
-    if _ae is not None:
-        return _ae, _ae_scaler
-    path = os.path.join(MODEL_DIR, "autoencoder.pkl")
-    scaler_path = os.path.join(MODEL_DIR, "ae_scaler.pkl")
+def _read_ae(model_dir: str) -> Optional[Tuple[Any, Optional[Any]]]:
+    """Prefers the NumPy export (autoencoder.npz, scaler folded in) over the Keras pickle"""
+    export_path = os.path.join(model_dir, "autoencoder.npz")
+    if os.path.isfile(export_path):
+        return NumpyAutoencoder.load(export_path), None
+    path = os.path.join(model_dir, "autoencoder.pkl")
+    scaler_path = os.path.join(model_dir, "ae_scaler.pkl")
     if not os.path.isfile(path):
-        return None, None
-    try:
-        import joblib
-        _ae = joblib.load(path)
-        _ae_scaler = joblib.load(scaler_path) if os.path.isfile(scaler_path) else None
-        return _ae, _ae_scaler
-    except Exception:
-        return None, None
-
-
-def _load_iforest() -> Tuple[Optional[Any], Optional[Any]]:
-    global _iforest, _if_scaler
-    if _iforest is not None:
-        return _iforest, _if_scaler
-    path = os.path.join(MODEL_DIR, "isolation_forest.pkl")
-    scaler_path = os.path.join(MODEL_DIR, "if_scaler.pkl")
-    if not os.path.isfile(path):
-        return None, None
-    try:
-        import joblib
-        _iforest = joblib.load(path)
-        _if_scaler = joblib.load(scaler_path) if os.path.isfile(scaler_path) else None
-        return _iforest, _if_scaler
-    except Exception:
-        return None, None
+        return None
+    import joblib
+    return joblib.load(path), joblib.load(scaler_path) if os.path.isfile(scaler_path) else None
 
 
-def _load_gnn() -> Tuple[Optional[Any], Optional[int]]:
-    """Returns (model, input_dim or None)."""
-    global _gnn, _gnn_input_dim
-    if _gnn is not None:
-        return _gnn, getattr(_gnn, "_input_dim", _gnn_input_dim)
-    for name in ("gnn_gat.pt", "gnn.pt"):
-        path = os.path.join(MODEL_DIR, name)
-        if not os.path.isfile(path):
-            continue
+def _read_iforest(model_dir: str) -> Optional[Tuple[Any, Optional[Any]]]:
+    """
+    Serves a CompiledIsolationForest: isolation_forest.npz if exported, else
+    the pickled sklearn forest compiled at load (IFOREST_COMPILE=0 keeps it as is)
+    """
+    path = os.path.join(model_dir, "isolation_forest.pkl")
+    export_path = os.path.join(model_dir, "isolation_forest.npz")
+    scaler_path = os.path.join(model_dir, "if_scaler.pkl")
+    if not os.path.isfile(path) and not os.path.isfile(export_path):
+        return None
+    import joblib
+    scaler = joblib.load(scaler_path) if os.path.isfile(scaler_path) else None
+    if os.path.isfile(export_path):
+        return CompiledIsolationForest.load(export_path), scaler
+    model = joblib.load(path)
+    if os.getenv("IFOREST_COMPILE", "1") == "1" and hasattr(model, "estimators_features_"):
+        try:
+            return CompiledIsolationForest.from_sklearn(model), scaler
+        except Exception as e:
+            logger.warning("Compiling the Isolation Forest failed, scoring with sklearn: %s", e)
+    return model, scaler
+
+
+def _read_gnn(model_dir: str) -> Optional[Tuple[Any, int]]:
+    """Returns (model, input_dim)."""
+    paths = [os.path.join(model_dir, name) for name in ("gnn_gat.pt", "gnn.pt")]
+    paths = [path for path in paths if os.path.isfile(path)]
+    if not paths:
+        return None
+    import torch
+    from torch.nn import Linear
+    import torch.nn.functional as F
+    from torch_geometric.nn import GATConv
+
+    class FraudGNN(torch.nn.Module):
+        def __init__(self, input_dim):
+            super().__init__()
+            self.gat1 = GATConv(input_dim, 32, heads=2, concat=True)
+            self.gat2 = GATConv(64, 16, heads=1)
+            self.out = Linear(16, 1)
+        def forward(self, x, edge_index):
+            x = self.gat1(x, edge_index)
+            x = F.elu(x)
+            x = self.gat2(x, edge_index)
+            x = F.elu(x)
+            return torch.sigmoid(self.out(x))
+
+    error = None
+    for path in paths:
         try:
-            import torch
-            from torch.nn import Linear
-            import torch.nn.functional as F
-            try:
-                from torch_geometric.nn import GATConv
-            except ImportError:
-                GATConv = None
-            if GATConv is None:
-                return None, None
-            class FraudGNN(torch.nn.Module):
-                def __init__(self, input_dim):
-                    super().__init__()
-                    self.gat1 = GATConv(input_dim, 32, heads=2, concat=True)
-                    self.gat2 = GATConv(64, 16, heads=1)
-                    self.out = Linear(16, 1)
-                def forward(self, x, edge_index):
-                    x = self.gat1(x, edge_index)
-                    x = F.elu(x)
-                    x = self.gat2(x, edge_index)
-                    x = F.elu(x)
-                    return torch.sigmoid(self.out(x))
             state = torch.load(path, map_location="cpu", weights_only=True)
             # Infer input_dim from first layer weight
             for k, v in state.items():
                 if "gat1" in k and "weight" in k:
-                    _gnn_input_dim = v.shape[1]
+                    input_dim = v.shape[1]
                     break
             else:
-                _gnn_input_dim = 24
-            _gnn = FraudGNN(input_dim=_gnn_input_dim)
-            _gnn.load_state_dict(state, strict=False)
-            _gnn.eval()
-            _gnn._input_dim = _gnn_input_dim
-            return _gnn, _gnn_input_dim
-        except Exception:
-            continue
-    return None, None
+                input_dim = 24
+            gnn = FraudGNN(input_dim=input_dim)
+            gnn.load_state_dict(state, strict=False)
+            gnn.eval()
+            gnn._input_dim = input_dim
+            return gnn, input_dim
+        except Exception as e:
+            error = e
+    raise error
+
+
+registry = ModelRegistry(MODEL_DIR, {
+    "autoencoder": _read_ae,
+    "isolation_forest": _read_iforest,
+    "gnn": _read_gnn,
+}, trace_allocations=os.getenv("MODEL_TRACE_ALLOCATIONS", "0") == "1")
+
+
+# Transactions scored with entity keys, for the GNN's neighborhoods (per process)
+entity_graph = EntityGraph(
+    n_features=len(feature_schema.FEATURE_ORDER),
+    n_kinds=len(feature_schema.ENTITY_KINDS),
+    capacity=int(os.getenv("GNN_GRAPH_CAPACITY", "100000")),
+    entity_history=int(os.getenv("GNN_ENTITY_HISTORY", "50")),
+    fanout=[int(f) for f in os.getenv("GNN_FANOUT", "10,5").split(",") if f.strip()],
+)
+
+# First-layer GNN embeddings of entity_graph nodes, refreshed in the background (per process)
+GNN_EMBEDDING_REFRESH_INTERVAL = float(os.getenv("GNN_EMBEDDING_REFRESH_INTERVAL", "1.0"))
+GNN_EMBEDDING_REFRESH_BATCH = int(os.getenv("GNN_EMBEDDING_REFRESH_BATCH", "1024"))
+embedding_cache = (
+    EmbeddingCache(entity_graph.capacity, os.getenv("GNN_EMBEDDING_DIR") or None)
+    if os.getenv("GNN_EMBEDDING_CACHE", "1") == "1" else None
+)
+if embedding_cache is not None:
+    entity_graph.subscribe(embedding_cache.mark)
+_refresher: Optional[threading.Thread] = None
+_refresher_lock = threading.Lock()
+
+# Cascade scoring (CASCADE_MODE=1): later, costlier models only run on rows that may still reach medium risk
+CASCADE_MODE = os.getenv("CASCADE_MODE", "0") == "1"
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "20.0"))
+CASCADE_ORDER = [name.strip() for name in os.getenv("CASCADE_ORDER", "iforest,autoencoder").split(",") if name.strip()]
+RISK_SCORE_MEDIUM = float(os.getenv("RISK_SCORE_MEDIUM", "50.0"))
+
+# Per-model parallelism inside one prediction (MODEL_PARALLEL=1); NumPy, sklearn and torch release the GIL
+MODEL_PARALLEL = os.getenv("MODEL_PARALLEL", "0") == "1"
+# Three models per prediction, for each of the server's concurrent predictions
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+MODEL_PARALLEL_WORKERS = int(os.getenv("MODEL_PARALLEL_WORKERS", str(3 * max(1, INFERENCE_WORKERS))))
+MODEL_TIMEOUT_MS = float(os.getenv("MODEL_TIMEOUT_MS", "0"))  # 0: wait for every model
+# Per-model overrides of MODEL_TIMEOUT_MS
+MODEL_TIMEOUTS_MS: Dict[str, float] = {
+    name: float(os.environ[var])
+    for name, var in (("autoencoder", "AE_TIMEOUT_MS"), ("isolation_forest", "IF_TIMEOUT_MS"), ("gnn", "GNN_TIMEOUT_MS"))
+    if os.getenv(var)
+}
+_model_pool: Optional[ThreadPoolExecutor] = None
+_model_pool_lock = threading.Lock()
+model_timeouts: Dict[str, int] = {"autoencoder": 0, "isolation_forest": 0, "gnn": 0}
+model_queue_timeouts: Dict[str, int] = dict.fromkeys(model_timeouts, 0)  # of those, never started
+
+
+def _load_ae() -> Tuple[Optional[Any], Optional[Any]]:
+    return registry.get("autoencoder")
+
+
+def _load_iforest() -> Tuple[Optional[Any], Optional[Any]]:
+    return registry.get("isolation_forest")
+
+
+def _load_gnn() -> Tuple[Optional[Any], Optional[int]]:
+    """Returns (model, input_dim or None)."""
+    return registry.get("gnn")
+
+
+def _warmup_calls(batch_size: int = 32):
+    import numpy as np
+    rows = np.random.default_rng(0).normal(size=(batch_size, len(feature_schema.FEATURE_ORDER))).astype(np.float32)
+    return [lambda: predict_vector(rows[:1]), lambda: predict_batch(rows)]
+
+
+def warm_up(version: Optional[str] = None) -> float:
+    """Load every model and score synthetic rows once (single-row and batch paths); marks the registry ready"""
+    return registry.warmup(*_warmup_calls(), version=version)
+
+
+def reload_models(version: Optional[str] = None, force: bool = False) -> str:
+    """Load + warm `version` (default: MODEL_PATH/CURRENT) beside the serving models, then swap; returns the version"""
+    return registry.reload(version, _warmup_calls(), force=force).version
 
 
 def _build_feature_vector(transaction_data: Dict[str, Any], features: Dict[str, Any]) -> Any:
     """Build numeric feature vector for AE/IF/GNN. Returns (1, n) array."""
-    try:
-        from ml.pipelines.feature_builder import build_features_from_transaction
-        import numpy as np
-        arr = build_features_from_transaction(transaction_data, features)
-        return arr.reshape(1, -1)
-    except Exception:
-        import numpy as np
-        amount = float(transaction_data.get("amount", 0))
-        return np.array([[amount, math.log1p(amount), 0] + [0.0] * 21], dtype=np.float32)[:, :24]
+    arr = feature_builder.build_features_from_transaction(transaction_data, features)
+    return arr.reshape(1, -1)
 
 
 def _sigmoid(x: float) -> float:
@@ -121,167 +224,542 @@ def _sigmoid(x: float) -> float:
         return 0.0
 
 
-def _anomaly_from_ae(feature_vec, ae, scaler) -> float:
-    """Reconstruction error → 0-1 using log-scaled + sigmoid calibration.
+def _sigmoid_array(x):
+    """Elementwise _sigmoid (overflow saturates to 0 / 1)"""
+    import numpy as np
+    with np.errstate(over="ignore"):
+        return 1.0 / (1.0 + np.exp(-x))
+
+
+def _ae_scores(X, ae, scaler):
+    """Per-row reconstruction error → 0-1 for an (N, n) matrix, one model call.
 
-    Uses configurable scaling via environment variables to avoid compressing
-    scores into a narrow band in the common case.
+    Log-scaled + sigmoid calibration with configurable scaling via
+    environment variables to avoid compressing scores into a narrow band in
+    the common case. A NumpyAutoencoder export computes the error itself
+    (its scaler is folded in); other models reconstruct via predict().
     """
     import numpy as np
-    try:
-        X = scaler.transform(feature_vec) if scaler is not None else feature_vec
+    if hasattr(ae, "reconstruction_error"):
+        mse = ae.reconstruction_error(X)
+    else:
+        X = scaler.transform(X) if scaler is not None else X
         pred = ae.predict(X)
-        mse = float(np.mean((X - pred) ** 2))
-        # Log transform to reduce impact of outliers
-        raw = math.log1p(mse)
-        # Configurable sigmoid parameters
-        k = float(os.getenv("AE_SIGMOID_K", "8.0"))
-        loc = float(os.getenv("AE_SIGMOID_LOC", "0.7"))
-        score = _sigmoid(k * (raw - loc))
-        return float(max(0.0, min(1.0, score)))
-    except Exception:
-        return 0.0
+        mse = np.mean((X - pred) ** 2, axis=1)
+    # Log transform to reduce impact of outliers
+    raw = np.log1p(mse)
+    # Configurable sigmoid parameters
+    k = float(os.getenv("AE_SIGMOID_K", "8.0"))
+    loc = float(os.getenv("AE_SIGMOID_LOC", "0.7"))
+    return np.clip(_sigmoid_array(k * (raw - loc)), 0.0, 1.0)
 
 
-def _anomaly_from_iforest(feature_vec, model, scaler) -> float:
-    """Isolation Forest score → 0-1. More anomalous → probability near 1.
+def _iforest_scores(X, model, scaler):
+    """Per-row Isolation Forest score → 0-1 for an (N, n) matrix. More anomalous → near 1.
 
     Prefer using score_samples (if available) or decision_function. We invert
     scores so larger positive values indicate more anomalous, then apply a
     sigmoid with configurable steepness to expand the dynamic range.
     """
     import numpy as np
-    try:
-        X = scaler.transform(feature_vec) if scaler is not None else feature_vec
-        # Prefer score_samples if available (sklearn semantics: lower -> anomaly)
-        if hasattr(model, "score_samples"):
-            raw_score = model.score_samples(X)
-            raw = float(raw_score[0]) if hasattr(raw_score, "__len__") else float(raw_score)
-            # invert so anomalies are positive: inverted = -raw
-            inverted = -raw
+    X = scaler.transform(X) if scaler is not None else X
+    # Prefer score_samples if available (sklearn semantics: lower -> anomaly)
+    if hasattr(model, "score_samples"):
+        raw = model.score_samples(X)
+    else:
+        raw = model.decision_function(X)
+    # invert so anomalies are positive: inverted = -raw
+    inverted = -np.asarray(raw, dtype=np.float64).reshape(-1)
+    # Configurable sigmoid parameters
+    k = float(os.getenv("IF_SIGMOID_K", "8.0"))
+    loc = float(os.getenv("IF_SIGMOID_LOC", "0.0"))
+    return np.clip(_sigmoid_array(k * (inverted - loc)), 0.0, 1.0)
+
+
+def _gnn_scores(X, gnn, expected_dim: Optional[int] = None, entity_keys=None):
+    """GNN forward → per-row probability 0-1.
+
+    Without entity keys each row is an isolated node (no edges). With keys
+    (N, len(ENTITY_KINDS)), every row is scored on its sampled neighborhood
+    in entity_graph, all rows in one disjoint-union graph; with
+    embedding_cache, on its one-hop neighbors' cached embeddings instead.
+    """
+    import torch
+    import numpy as np
+    if entity_keys is not None and embedding_cache is not None and _has_layers(gnn):
+        return _sharpen(_gnn_scores_cached(np.asarray(X, dtype=np.float32), gnn, expected_dim, entity_keys))
+    if entity_keys is not None:
+        x, edges, targets = entity_graph.subgraph_batch(np.asarray(X, dtype=np.float32), entity_keys)
+    else:
+        x, edges, targets = X, np.zeros((2, 0), dtype=np.int64), None
+    x = torch.tensor(_fit_width(x, expected_dim), dtype=torch.float32)
+    edge_index = torch.from_numpy(edges)
+    with torch.no_grad():
+        out = gnn(x, edge_index)
+    if targets is not None:
+        out = out[torch.from_numpy(targets)]
+    return _sharpen(out.reshape(-1).double().numpy())
+
+
+def _fit_width(x, expected_dim: Optional[int]):
+    """Zero-pad or truncate rows to the GNN's input width"""
+    import numpy as np
+    n = x.shape[1]
+    if expected_dim is not None and n != expected_dim:
+        if n < expected_dim:
+            pad = np.zeros((x.shape[0], expected_dim - n), dtype=np.float32)
+            x = np.hstack([x, pad])
         else:
-            df = model.decision_function(X)
-            raw = float(df[0]) if hasattr(df, "__len__") else float(df)
-            inverted = -raw
-        # Configurable sigmoid parameters
-        k = float(os.getenv("IF_SIGMOID_K", "8.0"))
-        loc = float(os.getenv("IF_SIGMOID_LOC", "0.0"))
-        prob = _sigmoid(k * (inverted - loc))
-        return float(max(0.0, min(1.0, prob)))
+            x = x[:, :expected_dim]
+    return np.asarray(x, dtype=np.float32)
+
+
+def _sharpen(p):
+    import numpy as np
+    # Optional sharpening: gamma>1 pushes probabilities towards 0/1
+    gamma = float(os.getenv("GNN_GAMMA", "1.0"))
+    if gamma != 1.0:
+        inner = (p > 0.0) & (p < 1.0)
+        pg, qg = p ** gamma, (1.0 - p) ** gamma
+        p = np.where(inner, pg / np.where(inner, pg + qg, 1.0), p)
+    return np.clip(p, 0.0, 1.0)
+
+
+def _has_layers(gnn) -> bool:
+    """FraudGNN-shaped: gat1 → ELU → gat2 → ELU → out → sigmoid, so the first layer can be cached"""
+    return all(hasattr(gnn, name) for name in ("gat1", "gat2", "out"))
+
+
+def _gnn_hidden(gnn, x, edges):
+    """First GAT layer (+ ELU) over float32 rows: the embeddings embedding_cache stores"""
+    import torch
+    import torch.nn.functional as F
+    with torch.no_grad():
+        return F.elu(gnn.gat1(torch.from_numpy(x), torch.from_numpy(edges)))
+
+
+def _gnn_head(gnn, h, edges):
+    """The layers after the first: per-node probability"""
+    import torch
+    import torch.nn.functional as F
+    with torch.no_grad():
+        return torch.sigmoid(gnn.out(F.elu(gnn.gat2(h, torch.from_numpy(edges)))))
+
+
+def _neighbor_fanout():
+    """Hops sampled around a stored neighbor for its embedding: the graph's second-hop width"""
+    return entity_graph.fanout[1:2] or entity_graph.fanout[:1]
+
+
+def _bind_embeddings(gnn, expected_dim: Optional[int]) -> None:
+    """Point embedding_cache at `gnn`; a different model queues every stored node for recomputation"""
+    import numpy as np
+    if embedding_cache.owner is gnn:
+        return
+    probe = np.zeros((1, expected_dim or len(feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    dim = _gnn_hidden(gnn, probe, np.zeros((2, 0), dtype=np.int64)).shape[1]
+    if embedding_cache.bind(gnn, dim, range(entity_graph.size)):
+        logger.info("GNN embedding cache bound to a new model; %d nodes queued", entity_graph.size)
+
+
+def _embed_slots(gnn, expected_dim: Optional[int], slots, nodes, versions):
+    """First-layer embeddings of stored nodes over their own neighborhoods; stored in embedding_cache"""
+    x, edges, targets, _ = entity_graph.stored_neighborhoods(slots, _neighbor_fanout())
+    h = _gnn_hidden(gnn, _fit_width(x, expected_dim), edges)[targets].numpy()
+    embedding_cache.put(gnn, slots, nodes, versions, h)
+    return h
+
+
+def _gnn_scores_cached(X, gnn, expected_dim: Optional[int], entity_keys):
+    """
+    Each row with its one-hop neighbors: the first layer runs on raw
+    features (for the new rows), then the neighbors' rows are replaced by
+    their cached embeddings (computed inline on a miss) and only the
+    remaining layers run.
+    """
+    import torch
+    import numpy as np
+    _ensure_refresher()
+    _bind_embeddings(gnn, expected_dim)
+    x, edges, targets, node_slots = entity_graph.neighborhood_batch(X, entity_keys, entity_graph.fanout[:1])
+    h = _gnn_hidden(gnn, _fit_width(x, expected_dim), edges)
+    stored = np.flatnonzero(node_slots >= 0)
+    if len(stored):
+        cached, valid = embedding_cache.get(node_slots[stored])
+        if not valid.all():
+            missing = node_slots[stored[~valid]]
+            cached[~valid] = _embed_slots(gnn, expected_dim, missing, *embedding_cache.counters(missing))
+        h[torch.from_numpy(stored)] = torch.from_numpy(cached)
+    return _gnn_head(gnn, h, edges)[torch.from_numpy(targets)].reshape(-1).double().numpy()
+
+
+def refresh_embeddings(limit: Optional[int] = None) -> int:
+    """Recompute up to `limit` new or stale node embeddings with the serving GNN; returns how many were stored"""
+    if embedding_cache is None:
+        return 0
+    with registry.pinned():
+        gnn, expected_dim = _load_gnn()
+        if gnn is None or not _has_layers(gnn):
+            return 0
+        _bind_embeddings(gnn, expected_dim)
+        slots, nodes, versions = embedding_cache.pending(limit or GNN_EMBEDDING_REFRESH_BATCH)
+        if not len(slots):
+            return 0
+        _embed_slots(gnn, expected_dim, slots, nodes, versions)
+        return len(slots)
+
+
+def _refresh_loop() -> None:
+    while True:
+        try:
+            while refresh_embeddings() >= GNN_EMBEDDING_REFRESH_BATCH:
+                pass  # drain a backlog before sleeping
+        except Exception as e:
+            logger.warning("GNN embedding refresh failed: %s", e)
+        time.sleep(GNN_EMBEDDING_REFRESH_INTERVAL)
+
+
+def _ensure_refresher() -> None:
+    """Start this process's refresh thread on first use (process-pool workers each keep their own graph)"""
+    global _refresher
+    if _refresher is not None or GNN_EMBEDDING_REFRESH_INTERVAL <= 0:
+        return
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="gnn-embedding-refresh", daemon=True)
+            _refresher.start()
+
+
+def _anomaly_from_ae(feature_vec, ae, scaler) -> float:
+    """Reconstruction error → 0-1 for a single row (see _ae_scores)."""
+    try:
+        return float(_ae_scores(feature_vec, ae, scaler)[0])
     except Exception:
         return 0.0
 
 
-def _risk_from_gnn(feature_vec, gnn, expected_dim: Optional[int] = None) -> float:
-    """GNN forward on single-node graph → probability 0-1 with optional sharpening."""
+def _anomaly_from_iforest(feature_vec, model, scaler) -> float:
+    """Isolation Forest score → 0-1 for a single row (see _iforest_scores)."""
     try:
-        import torch
-        import numpy as np
-        n = feature_vec.shape[1]
-        if expected_dim is not None and n != expected_dim:
-            if n < expected_dim:
-                pad = np.zeros((1, expected_dim - n), dtype=np.float32)
-                feature_vec = np.hstack([feature_vec, pad])
-            else:
-                feature_vec = feature_vec[:, :expected_dim]
-        x = torch.tensor(feature_vec, dtype=torch.float32)
-        edge_index = torch.zeros((2, 0), dtype=torch.long)
-        with torch.no_grad():
-            out = gnn(x, edge_index)
-        p = float(out.squeeze().item())
-        # Optional sharpening: gamma>1 pushes probabilities towards 0/1
-        gamma = float(os.getenv("GNN_GAMMA", "1.0"))
-        if gamma != 1.0:
-            p = (p ** gamma) / ((p ** gamma) + ((1.0 - p) ** gamma)) if 0.0 < p < 1.0 else p
-        return float(max(0.0, min(1.0, p)))
+        return float(_iforest_scores(feature_vec, model, scaler)[0])
     except Exception:
         return 0.0
 
 
+def _risk_from_gnn(feature_vec, gnn, expected_dim: Optional[int] = None, entity_keys=None) -> float:
+    """GNN forward for a single row → probability 0-1 (see _gnn_scores)."""
+    try:
+        return float(_gnn_scores(feature_vec, gnn, expected_dim, entity_keys)[0])
+    except Exception:
+        return 0.0
+
+
+def _batch_scores(scores_fn, X, *model_args):
+    """Per-row scores from one model call; zeros if the model fails (as the single-row helpers)"""
+    import numpy as np
+    try:
+        return scores_fn(X, *model_args)
+    except Exception:
+        return np.zeros(X.shape[0])
+
+
+def _model_executor() -> ThreadPoolExecutor:
+    """This process's model pool, created on first use (process-pool workers each get their own)"""
+    global _model_pool
+    if _model_pool is None:
+        with _model_pool_lock:
+            if _model_pool is None:
+                _model_pool = ThreadPoolExecutor(MODEL_PARALLEL_WORKERS, thread_name_prefix="model")
+    return _model_pool
+
+
+def _model_timeout_ms(name: str) -> float:
+    return MODEL_TIMEOUTS_MS.get(name, MODEL_TIMEOUT_MS)
+
+
+def _run_models(calls: Dict[str, Optional[Callable[[], Any]]]) -> Dict[str, Any]:
+    """
+    Model name → scorer call (None: not loaded) → model name → its scores.
+
+    With MODEL_PARALLEL the calls run concurrently on the model pool, each
+    waited for at most its timeout (_model_timeout_ms) from submission, so
+    time queued behind other predictions' models counts against it. A
+    model that overruns (or never got a pool thread) maps to None, so
+    _combine uses the same heuristic as when it is not loaded. A queued
+    call is dropped; a running one cannot be interrupted: it finishes in
+    the background and holds its pool thread until then.
+    """
+    if not MODEL_PARALLEL:
+        return {name: call() if call is not None else None for name, call in calls.items()}
+    pool = _model_executor()
+    submitted = time.monotonic()
+    futures = {name: pool.submit(call) for name, call in calls.items() if call is not None}
+    results: Dict[str, Any] = dict.fromkeys(calls)
+    for name, future in futures.items():
+        timeout_ms = _model_timeout_ms(name)
+        try:
+            if timeout_ms > 0:
+                results[name] = future.result(max(0.0, submitted + timeout_ms / 1000.0 - time.monotonic()))
+            else:
+                results[name] = future.result()
+        except FuturesTimeout:
+            queued = future.cancel()  # only succeeds for a call still waiting for a thread
+            with _model_pool_lock:
+                model_timeouts[name] += 1
+                if queued:
+                    model_queue_timeouts[name] += 1
+            logger.warning(
+                "Model %s %s %.0f ms; scoring without it", name, "queued for" if queued else "overran", timeout_ms,
+            )
+    return results
+
+
+def parallel_stats() -> Dict[str, Any]:
+    with _model_pool_lock:
+        return {
+            "enabled": MODEL_PARALLEL,
+            "workers": MODEL_PARALLEL_WORKERS,
+            "timeout_ms": {name: _model_timeout_ms(name) for name in model_timeouts},
+            "timeouts": dict(model_timeouts),
+            "queue_timeouts": dict(model_queue_timeouts),
+        }
+
+
+def cascade_exits(anomaly, margin: Optional[float] = None):
+    """
+    Rows whose partial fraud score (anomaly so far, GNN replaced by its
+    anomaly-based fallback as in _combine) is more than `margin` points
+    (default CASCADE_MARGIN) below RISK_SCORE_MEDIUM
+    """
+    import numpy as np
+    anomaly = np.clip(np.asarray(anomaly, dtype=np.float64), 0.0, 1.0)
+    partial = 100.0 * (0.4 * anomaly + 0.6 * _graph_fallback(anomaly))
+    return partial < RISK_SCORE_MEDIUM - (CASCADE_MARGIN if margin is None else margin)
+
+
+def _cascade(X, ae, ae_scaler, iforest, if_scaler, gnn, gnn_input_dim, entity_keys=None):
+    """
+    Cascade scoring of an (N, n) matrix: the anomaly models in CASCADE_ORDER
+    (cheapest first), then the GNN, each on the rows no earlier stage let
+    exit (see cascade_exits). An exited row's skipped anomaly score repeats
+    the partial anomaly and its GNN score is the fallback,
+    so _combine scores it on the partial anomaly. Returns the three score
+    arrays (None for models not loaded) and the stages each row ran.
+    """
+    import numpy as np
+    n = X.shape[0]
+    stages = [[] for _ in range(n)]
+    live = np.arange(n)
+    scores = {}
+    anomaly = None
+    models = {"iforest": (_iforest_scores, iforest, if_scaler), "autoencoder": (_ae_scores, ae, ae_scaler)}
+    for name in CASCADE_ORDER:
+        fn, model, scaler = models[name]
+        if model is None:
+            continue
+        # Exited rows keep the partial anomaly: averaging it with itself leaves it unchanged
+        stage = np.zeros(n) if anomaly is None else anomaly.copy()
+        stage[live] = _batch_scores(fn, X[live], model, scaler)
+        anomaly = stage if anomaly is None else (anomaly + stage) / 2.0
+        scores[name] = stage
+        for i in live.tolist():
+            stages[i].append(name)
+        live = live[~cascade_exits(anomaly[live])]
+    graph = None
+    if gnn is not None:
+        graph = np.zeros(n) if anomaly is None else _graph_fallback(np.clip(anomaly, 0.0, 1.0))
+        if len(live):
+            keys = entity_keys[live] if entity_keys is not None else None
+            graph[live] = _batch_scores(_gnn_scores, X[live], gnn, gnn_input_dim, keys)
+        for i in live.tolist():
+            stages[i].append("gnn")
+    return scores.get("autoencoder"), scores.get("iforest"), graph, stages
+
+
 def predict(
     transaction_data: Dict[str, Any],
     features: Dict[str, Any],
 ) -> Dict[str, Any]:
     """
-    Run fraud inference. Returns anomaly_score, graph_risk_score, iforest_score in [0, 1].
+    Run fraud inference from feature dicts (missing features are 0).
+    Returns anomaly_score, graph_risk_score, iforest_score in [0, 1].
+    """
+    return predict_vector(_build_feature_vector(transaction_data, features))
+
+
+def predict_vector(feature_vec, entity_keys=None) -> Dict[str, Any]:
+    """
+    Run fraud inference on one (1, n) float32 row in FEATURE_ORDER.
+    Returns anomaly_score, graph_risk_score, iforest_score in [0, 1].
     Uses real models when loaded; otherwise heuristics in 0-1.
+    model_version names the registry version that scored the row.
+    With (1, len(ENTITY_KINDS)) entity keys the GNN sees the row's
+    neighborhood, and the row is then added to entity_graph.
+    """
+    _check_shape(feature_vec)
+    if CASCADE_MODE:
+        return split_columns(predict_batch(feature_vec, entity_keys), 1)[0]
+    with registry.pinned() as models:
+        ae, ae_scaler = _load_ae()
+        iforest, if_scaler = _load_iforest()
+        gnn, gnn_input_dim = _load_gnn()
+        gnn_args = (gnn, gnn_input_dim) if entity_keys is None else (gnn, gnn_input_dim, entity_keys)
+        scores = _run_models({
+            "autoencoder": (lambda: [_anomaly_from_ae(feature_vec, ae, ae_scaler)]) if ae is not None else None,
+            "isolation_forest": (
+                (lambda: [_anomaly_from_iforest(feature_vec, iforest, if_scaler)]) if iforest is not None else None
+            ),
+            "gnn": (lambda: [_risk_from_gnn(feature_vec, *gnn_args)]) if gnn is not None else None,
+        })
+        result = _combine(feature_vec, scores["autoencoder"], scores["isolation_forest"], scores["gnn"])
+    if entity_keys is not None:
+        entity_graph.add(feature_vec, entity_keys)
+    result["model_version"] = models.version
+    return split_columns(result, 1)[0]
+
+
+def predict_batch(matrix, entity_keys=None) -> Dict[str, Any]:
+    """
+    Run fraud inference on an (N, n) float32 matrix in FEATURE_ORDER.
+
+    Each loaded model (AE, IF, GNN) runs once over the whole matrix.
+    Returns columns: every key of predict_vector's result maps to a list of
+    N per-row values (row i equals predict_vector(matrix[i:i + 1])), except
+    features_used and model_version, which are shared (one version scores
+    the whole batch). Entity keys are used as in predict_vector; rows of
+    one batch are added to entity_graph after the batch is scored.
+    With CASCADE_MODE, models run as in _cascade and the cascade_stages
+    column lists the models each row ran.
     """
     import numpy as np
-    feature_vec = _build_feature_vector(transaction_data, features)
-    n_features = feature_vec.shape[1]
+    _check_shape(matrix, rows=None)
+    X = np.asarray(matrix, dtype=np.float32)
+    with registry.pinned() as models:
+        if X.shape[0] == 0:
+            result = _combine(X, None, None, None)
+        else:
+            ae, ae_scaler = _load_ae()
+            iforest, if_scaler = _load_iforest()
+            gnn, gnn_input_dim = _load_gnn()
+            if CASCADE_MODE:
+                ae_scores, if_scores, gnn_scores, stages = _cascade(
+                    X, ae, ae_scaler, iforest, if_scaler, gnn, gnn_input_dim, entity_keys,
+                )
+                result = _combine(X, ae_scores, if_scores, gnn_scores)
+                result["cascade_stages"] = stages
+            else:
+                scores = _run_models({
+                    "autoencoder": (lambda: _batch_scores(_ae_scores, X, ae, ae_scaler)) if ae is not None else None,
+                    "isolation_forest": (
+                        (lambda: _batch_scores(_iforest_scores, X, iforest, if_scaler)) if iforest is not None else None
+                    ),
+                    "gnn": (
+                        (lambda: _batch_scores(_gnn_scores, X, gnn, gnn_input_dim, entity_keys))
+                        if gnn is not None else None
+                    ),
+                })
+                result = _combine(X, scores["autoencoder"], scores["isolation_forest"], scores["gnn"])
+    if entity_keys is not None:
+        entity_graph.add(X, entity_keys)
+    result["model_version"] = models.version
+    return result
+
+
+def combined_risk_score(anomaly: float, gnn: float) -> float:
+    """40% anomaly + 60% GNN on a 0-100 scale"""
+    combined = (0.4 * anomaly + 0.6 * gnn) * 100.0
+    return round(max(0.0, min(100.0, combined)), 2)
+
+
+def predict_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A predict_vector result as the /predict response (the backend's embedded mode returns the same dict)"""
+    anomaly = float(result.get("anomaly_score", 0.0))
+    gnn = float(result.get("graph_risk_score", 0.0))
+    return {
+        "anomaly_score": anomaly,
+        "iforest_score": result.get("iforest_score", anomaly),
+        "graph_risk_score": gnn,
+        "combined_risk_score": combined_risk_score(anomaly, gnn),
+        "risk_level": result.get("risk_level", "low"),
+        "features_used": result.get("features_used", []),
+        "model_confidence": result.get("model_confidence", 0.5),
+        "fraud_type_prediction": result.get("fraud_type_prediction"),
+        "model_version": result.get("model_version"),
+        "cascade_stages": result.get("cascade_stages"),
+    }
 
-    # Autoencoder: reconstruction error → 0-1
-    ae, ae_scaler = _load_ae()
-    if ae is not None:
-        try:
-            ae_score = _anomaly_from_ae(feature_vec, ae, ae_scaler)
-        except Exception:
-            ae_score = None
-    else:
-        ae_score = None
 
-    # Isolation Forest → 0-1
-    iforest, if_scaler = _load_iforest()
-    if iforest is not None:
-        try:
-            iforest_score = _anomaly_from_iforest(feature_vec, iforest, if_scaler)
-        except Exception:
-            iforest_score = None
-    else:
-        iforest_score = None
+def predict_batch_response(result: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    """A predict_batch result over `rows` rows as the column-oriented /predict_batch response"""
+    return {
+        "rows": rows,
+        "anomaly_score": result["anomaly_score"],
+        "iforest_score": result["iforest_score"],
+        "graph_risk_score": result["graph_risk_score"],
+        "combined_risk_score": [
+            combined_risk_score(anomaly, gnn)
+            for anomaly, gnn in zip(result["anomaly_score"], result["graph_risk_score"])
+        ],
+        "risk_level": result["risk_level"],
+        "features_used": result["features_used"],
+        "model_confidence": result["model_confidence"],
+        "fraud_type_prediction": result["fraud_type_prediction"],
+        "model_version": result.get("model_version"),
+        "cascade_stages": result.get("cascade_stages"),
+    }
+
+
+def _check_shape(matrix, rows: Optional[int] = 1) -> None:
+    n = len(feature_schema.FEATURE_ORDER)
+    if matrix.ndim != 2 or matrix.shape[1] != n or (rows is not None and matrix.shape[0] != rows):
+        expected = f"({rows}, {n})" if rows is not None else f"(N, {n})"
+        raise feature_schema.SchemaMismatchError(f"Expected a {expected} feature matrix, got {matrix.shape}")
+
 
+def _combine(X, ae_scores, iforest_scores, gnn_scores) -> Dict[str, Any]:
+    """Per-row model scores (None for models not loaded) → result columns"""
+    import numpy as np
     # Combined anomaly: average of AE and IF when both available
-    if ae_score is not None and iforest_score is not None:
-        anomaly_score = (ae_score + iforest_score) / 2.0
-    elif ae_score is not None:
-        anomaly_score = ae_score
-    elif iforest_score is not None:
-        anomaly_score = iforest_score
+    if ae_scores is not None and iforest_scores is not None:
+        anomaly = (np.asarray(ae_scores, dtype=np.float64) + np.asarray(iforest_scores, dtype=np.float64)) / 2.0
+    elif ae_scores is not None:
+        anomaly = np.asarray(ae_scores, dtype=np.float64)
+    elif iforest_scores is not None:
+        anomaly = np.asarray(iforest_scores, dtype=np.float64)
     else:
-        amount = float(transaction_data.get("amount", 0))
-        anomaly_score = min(1.0, amount / 5000.0) * 0.5 + 0.1
+        amount = X[:, feature_schema.FEATURE_INDEX["amount"]].astype(np.float64)
+        anomaly = np.minimum(1.0, amount / 5000.0) * 0.5 + 0.1
 
     # GNN → 0-1 (already sigmoid)
-    gnn, gnn_input_dim = _load_gnn()
-    if gnn is not None:
-        try:
-            graph_risk_score = _risk_from_gnn(feature_vec, gnn, gnn_input_dim)
-        except Exception:
-            graph_risk_score = anomaly_score * 0.8
-    else:
-        graph_risk_score = anomaly_score * 0.8
+    graph_risk = np.asarray(gnn_scores, dtype=np.float64) if gnn_scores is not None else _graph_fallback(anomaly)
 
-    anomaly_score = max(0.0, min(1.0, anomaly_score))
-    if iforest_score is None:
-        iforest_score = anomaly_score
-    else:
-        iforest_score = max(0.0, min(1.0, iforest_score))
-    graph_risk_score = max(0.0, min(1.0, graph_risk_score))
+    anomaly = np.clip(anomaly, 0.0, 1.0)
+    iforest = anomaly if iforest_scores is None else np.clip(np.asarray(iforest_scores, dtype=np.float64), 0.0, 1.0)
+    graph_risk = np.clip(graph_risk, 0.0, 1.0)
 
     # Combined fraud score 0-100 per spec
-    combined_raw = 0.4 * anomaly_score + 0.6 * graph_risk_score
-    fraud_score = max(0.0, min(100.0, combined_raw * 100.0))
+    combined_raw = 0.4 * anomaly + 0.6 * graph_risk
+    fraud = np.clip(combined_raw * 100.0, 0.0, 100.0)
 
     # Risk level thresholds (aligned with backend defaults)
-    risk_level = "low"
-    if fraud_score >= 75.0:
-        risk_level = "high"
-    elif fraud_score >= 50.0:
-        risk_level = "medium"
-
-    features_used = list(features.keys())[:20] if features else []
+    risk_level = np.where(fraud >= 75.0, "high", np.where(fraud >= 50.0, "medium", "low")).tolist()
     return {
-        "anomaly_score": round(anomaly_score, 4),
-        "iforest_score": round(iforest_score, 4),
-        "graph_risk_score": round(graph_risk_score, 4),
-        "fraud_score": round(fraud_score, 2),
+        "anomaly_score": [round(v, 4) for v in anomaly.tolist()],
+        "iforest_score": [round(v, 4) for v in iforest.tolist()],
+        "graph_risk_score": [round(v, 4) for v in graph_risk.tolist()],
+        "fraud_score": [round(v, 2) for v in fraud.tolist()],
         "risk_level": risk_level,
-        "model_confidence": 0.7,
-        "features_used": features_used,
-        "fraud_type_prediction": "suspicious" if risk_level == "high" else None,
+        "model_confidence": [0.7] * len(risk_level),
+        "fraud_type_prediction": ["suspicious" if level == "high" else None for level in risk_level],
+        "features_used": list(feature_schema.FEATURE_ORDER),
     }
 
 
+def _graph_fallback(anomaly):
+    """Graph risk assumed without a GNN score"""
+    return anomaly * 0.8
+
+
 def fraud_score(features_vec) -> float:
     """Legacy: single score from feature vector. Prefer predict()."""
     return 0.5
@@ -0,0 +1,140 @@
+"""
+Framework-free autoencoder forward pass.
+The autoencoder is a small stack of dense layers, so scoring it only needs
+a few matrix products: NumpyAutoencoder holds the layer weights in plain
+arrays and computes per-row reconstruction error with no TensorFlow
+import (or model.predict overhead per call).
+
+The ae_scaler is folded into the weights at export time. For a
+StandardScaler (mean m, scale s) the scaled input is (x - m) / s, so
+
+    first layer:  W0' = W0 / s[:, None],  b0' = b0 - (m / s) @ W0
+    residual:     (x - m) / s - out = x / s - (out + m / s)
+    last layer:   bL' = bL + m / s
+
+leaving one elementwise x * (1 / s) per row. export() writes the result to
+an .npz (no pickled objects); load() reads it back.
+"""
+
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0.0),
+    "linear": lambda x: x,
+    "identity": lambda x: x,
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "logistic": lambda x: 1.0 / (1.0 + np.exp(-x)),
+}
+
+
+class NumpyAutoencoder:
+    """
+    Dense autoencoder with the input scaler folded in.
+    weights[i] is (fan_in, fan_out); activations name one ACTIVATIONS entry
+    per layer; inv_scale is 1 / scaler.scale_ (ones without a scaler).
+    """
+
+    def __init__(
+        self,
+        weights: Sequence[np.ndarray],
+        biases: Sequence[np.ndarray],
+        activations: Sequence[str],
+        inv_scale: np.ndarray,
+        dtype: Any = np.float32,
+    ):
+        if not (len(weights) == len(biases) == len(activations)) or not weights:
+            raise ValueError("Need one weight matrix, bias and activation per layer")
+        unknown = [a for a in activations if a not in ACTIVATIONS]
+        if unknown:
+            raise ValueError(f"Unsupported activations {unknown}")
+        self.dtype = np.dtype(dtype)
+        self.weights = [np.ascontiguousarray(w, dtype=self.dtype) for w in weights]
+        self.biases = [np.asarray(b, dtype=self.dtype) for b in biases]
+        self.activations = list(activations)
+        self.inv_scale = np.asarray(inv_scale, dtype=self.dtype)
+        self.input_dim = self.weights[0].shape[0]
+        if self.weights[-1].shape[1] != self.input_dim or self.inv_scale.shape != (self.input_dim,):
+            raise ValueError("Output layer and scaler must match the input width")
+
+    @classmethod
+    def from_layers(
+        cls,
+        weights: Sequence[np.ndarray],
+        biases: Sequence[np.ndarray],
+        activations: Sequence[str],
+        scaler: Optional[Any] = None,
+        dtype: Any = np.float32,
+    ) -> "NumpyAutoencoder":
+        """Fold a fitted StandardScaler (or None) into unscaled layer weights"""
+        weights = [np.asarray(w, dtype=np.float64) for w in weights]
+        biases = [np.asarray(b, dtype=np.float64) for b in biases]
+        n = weights[0].shape[0]
+        mean = getattr(scaler, "mean_", None)
+        scale = getattr(scaler, "scale_", None)
+        mean = np.zeros(n) if mean is None else np.asarray(mean, dtype=np.float64)
+        inv_scale = np.ones(n) if scale is None else 1.0 / np.asarray(scale, dtype=np.float64)
+        shift = mean * inv_scale
+        weights[0], biases[0] = weights[0] * inv_scale[:, None], biases[0] - shift @ weights[0]
+        biases[-1] = biases[-1] + shift
+        return cls(weights, biases, activations, inv_scale, dtype=dtype)
+
+    @classmethod
+    def from_keras(cls, model: Any, scaler: Optional[Any] = None, **kwargs: Any) -> "NumpyAutoencoder":
+        """Sequential / functional Keras model of Dense layers (Input layers are skipped)"""
+        weights, biases, activations = [], [], []
+        for layer in model.layers:
+            params = layer.get_weights()
+            if not params:
+                continue
+            if len(params) != 2:
+                raise ValueError(f"Layer {layer.name} is not a Dense layer with a bias")
+            weights.append(params[0])
+            biases.append(params[1])
+            activations.append(layer.get_config().get("activation", "linear"))
+        return cls.from_layers(weights, biases, activations, scaler, **kwargs)
+
+    @classmethod
+    def from_mlp(cls, model: Any, scaler: Optional[Any] = None, **kwargs: Any) -> "NumpyAutoencoder":
+        """sklearn MLPRegressor trained to reconstruct its input"""
+        activations = [model.activation] * (len(model.coefs_) - 1) + [model.out_activation_]
+        return cls.from_layers(model.coefs_, model.intercepts_, activations, scaler, **kwargs)
+
+    @classmethod
+    def from_model(cls, model: Any, scaler: Optional[Any] = None, **kwargs: Any) -> "NumpyAutoencoder":
+        if hasattr(model, "coefs_"):
+            return cls.from_mlp(model, scaler, **kwargs)
+        if hasattr(model, "layers"):
+            return cls.from_keras(model, scaler, **kwargs)
+        raise TypeError(f"Cannot export {type(model).__name__}: expected a Keras model or MLPRegressor")
+
+    def reconstruction_error(self, X: np.ndarray) -> np.ndarray:
+        """Per-row mean squared error in scaler space for an (N, n) matrix"""
+        X = np.asarray(X, dtype=self.dtype).reshape(-1, self.input_dim)
+        h = X
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            h = ACTIVATIONS[activation](h @ w + b)
+        residual = X * self.inv_scale - h
+        return np.mean(residual * residual, axis=1)
+
+    def export(self, path: str) -> None:
+        arrays = {"format_version": np.array(FORMAT_VERSION), "inv_scale": self.inv_scale,
+                  "activations": np.array(self.activations)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"w{i}"], arrays[f"b{i}"] = w, b
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyAutoencoder":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported autoencoder export format {int(data['format_version'])} in {path}")
+            activations: List[str] = [str(a) for a in data["activations"]]
+            weights = [data[f"w{i}"] for i in range(len(activations))]
+            biases = [data[f"b{i}"] for i in range(len(activations))]
+            return cls(weights, biases, activations, data["inv_scale"], dtype=weights[0].dtype)
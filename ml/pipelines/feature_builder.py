@@ -7,17 +7,10 @@ import numpy as np
 import pandas as pd
 from typing import Dict, Any, List
 
-# Fixed feature order for AE/IF models (must match training)
-FEATURE_ORDER = [
-    "amount", "amount_log", "currency", "transaction_type", "category",
-    "has_location", "latitude", "longitude",
-    "user_transaction_count", "user_avg_amount", "user_amount_std",
-    "user_frequency_days", "is_new_user", "time_since_first_transaction",
-    "merchant_risk_score", "merchant_fraud_count", "merchant_total_txn",
-    "device_risk_score", "device_is_suspicious", "device_account_count",
-    "hour_of_day", "day_of_week", "is_weekend",
-    "graph_risk_raw", "behavioral_deviation",
-]
+from .feature_schema import FEATURE_ORDER as _SCHEMA_ORDER
+
+# Fixed feature order for AE/IF models (must match training); defined in feature_schema
+FEATURE_ORDER = list(_SCHEMA_ORDER)
 
 
 def build_features(df: pd.DataFrame) -> pd.DataFrame:
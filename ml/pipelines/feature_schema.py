@@ -0,0 +1,171 @@
+"""
+Versioned feature-vector contract between the backend and the ML service.
+
+The services are built from separate Docker contexts, so this module exists
+twice: backend/app/services/feature_schema.py and
+ml/pipelines/feature_schema.py. A test keeps the two files identical; change
+both together and bump FEATURE_SCHEMA_VERSION when the columns change.
+
+A feature vector is float32 with one column per FEATURE_ORDER name (the
+column order the autoencoder / isolation forest models were trained on).
+On the wire a batch of vectors is a fixed header followed by the raw rows:
+
+    magic        b"FGFV"
+    version      uint16
+    columns      uint16
+    rows         uint32
+    fingerprint  8 bytes, sha256 over the version and column names
+    data         rows x columns float32, row-major
+
+All fields are little-endian. `decode` rejects any body whose version,
+column count or fingerprint differ from this copy, so mismatched services
+fail instead of scoring shifted or zero-filled columns.
+
+The rows may be followed by an entity-key block naming each transaction's
+user, device, merchant and IP (ENTITY_KINDS), for the ML service's entity
+graph. Keys are 64-bit hashes of "<kind>:<id>" (0 = absent), so raw
+identifiers never leave the backend:
+
+    magic        b"FGEK"
+    kinds        uint16
+    rows         uint32, equal to the feature rows
+    keys         rows x kinds uint64, row-major
+
+`decode_with_entities` returns the keys, or None for a body without them.
+"""
+
+import hashlib
+import struct
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+FEATURE_SCHEMA_VERSION = 2
+CONTENT_TYPE = "application/x-finguard-features"
+
+FEATURE_ORDER = (
+    "amount", "amount_log", "currency", "transaction_type", "category",
+    "has_location", "latitude", "longitude",
+    "user_transaction_count", "user_avg_amount", "user_amount_std",
+    "user_frequency_days", "is_new_user", "time_since_first_transaction",
+    "merchant_risk_score", "merchant_fraud_count", "merchant_total_txn",
+    "device_risk_score", "device_is_suspicious", "device_account_count",
+    "hour_of_day", "day_of_week", "is_weekend",
+    "graph_risk_raw", "behavioral_deviation",
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_ORDER)}
+FINGERPRINT = hashlib.sha256(
+    f"{FEATURE_SCHEMA_VERSION}:{','.join(FEATURE_ORDER)}".encode()
+).digest()[:8]
+
+_MAGIC = b"FGFV"
+_HEADER = struct.Struct("<4sHHI8s")
+_DTYPE = np.dtype("<f4")
+
+ENTITY_KINDS = {
+    "user": "user_id",
+    "device": "device_id",
+    "merchant": "merchant_id",
+    "ip": "ip_address",
+}
+_ENTITY_MAGIC = b"FGEK"
+_ENTITY_HEADER = struct.Struct("<4sHI")
+_KEY_DTYPE = np.dtype("<u8")
+
+
+class SchemaMismatchError(ValueError):
+    """A feature vector or payload does not match this schema"""
+
+
+def schema_info() -> Dict[str, Any]:
+    """Version and fingerprint, as reported by health endpoints"""
+    return {
+        "version": FEATURE_SCHEMA_VERSION,
+        "fingerprint": FINGERPRINT.hex(),
+        "columns": len(FEATURE_ORDER),
+    }
+
+
+def to_vector(features: Mapping[str, Any]) -> np.ndarray:
+    """One feature dict as a float32 row in FEATURE_ORDER; every column must be present"""
+    missing = [name for name in FEATURE_ORDER if features.get(name) is None]
+    if missing:
+        raise SchemaMismatchError(f"Features missing from schema v{FEATURE_SCHEMA_VERSION}: {missing}")
+    return np.array([float(features[name]) for name in FEATURE_ORDER], dtype=np.float32)
+
+
+def encode(matrix: np.ndarray) -> bytes:
+    """Header plus raw rows for a (rows, columns) matrix or a single row"""
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2 or matrix.shape[1] != len(FEATURE_ORDER):
+        raise SchemaMismatchError(
+            f"Expected (rows, {len(FEATURE_ORDER)}) features for schema v{FEATURE_SCHEMA_VERSION}, "
+            f"got shape {matrix.shape}"
+        )
+    header = _HEADER.pack(_MAGIC, FEATURE_SCHEMA_VERSION, matrix.shape[1], matrix.shape[0], FINGERPRINT)
+    return header + np.ascontiguousarray(matrix, dtype=_DTYPE).tobytes()
+
+
+def decode(body: bytes) -> np.ndarray:
+    """(rows, columns) float32 matrix from an encoded body (read-only view, no copy)"""
+    if len(body) < _HEADER.size:
+        raise SchemaMismatchError(f"Feature payload too short ({len(body)} bytes)")
+    magic, version, columns, rows, fingerprint = _HEADER.unpack_from(body)
+    if magic != _MAGIC:
+        raise SchemaMismatchError("Not a feature payload")
+    if (version, columns, fingerprint) != (FEATURE_SCHEMA_VERSION, len(FEATURE_ORDER), FINGERPRINT):
+        raise SchemaMismatchError(
+            f"Feature schema mismatch: payload v{version} ({columns} columns, {fingerprint.hex()}), "
+            f"expected v{FEATURE_SCHEMA_VERSION} ({len(FEATURE_ORDER)} columns, {FINGERPRINT.hex()})"
+        )
+    expected = _HEADER.size + rows * columns * _DTYPE.itemsize
+    if len(body) != expected:
+        raise SchemaMismatchError(f"Feature payload is {len(body)} bytes, expected {expected}")
+    return np.frombuffer(body, dtype=_DTYPE, offset=_HEADER.size).reshape(rows, columns)
+
+
+def entity_keys(transaction: Mapping[str, Any]) -> np.ndarray:
+    """uint64 key per ENTITY_KINDS entry for one transaction dict (0 where the id is missing)"""
+    keys = np.zeros(len(ENTITY_KINDS), dtype=_KEY_DTYPE)
+    for i, (kind, field) in enumerate(ENTITY_KINDS.items()):
+        value = transaction.get(field)
+        if value not in (None, ""):
+            digest = hashlib.blake2b(f"{kind}:{value}".encode(), digest_size=8).digest()
+            keys[i] = int.from_bytes(digest, "little") or 1
+    return keys
+
+
+def encode_with_entities(matrix: np.ndarray, keys: np.ndarray) -> bytes:
+    """encode(matrix) followed by the (rows, len(ENTITY_KINDS)) entity-key block"""
+    body = encode(matrix)
+    keys = np.asarray(keys, dtype=_KEY_DTYPE).reshape(-1, len(ENTITY_KINDS))
+    rows = _HEADER.unpack_from(body)[3]
+    if keys.shape[0] != rows:
+        raise SchemaMismatchError(f"{keys.shape[0]} entity-key rows for {rows} feature rows")
+    return body + _ENTITY_HEADER.pack(_ENTITY_MAGIC, len(ENTITY_KINDS), rows) + np.ascontiguousarray(keys).tobytes()
+
+
+def decode_with_entities(body: bytes) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(features, entity keys or None) from a body with or without the entity-key block"""
+    if len(body) < _HEADER.size:
+        raise SchemaMismatchError(f"Feature payload too short ({len(body)} bytes)")
+    _, _, columns, rows, _ = _HEADER.unpack_from(body)
+    end = _HEADER.size + rows * columns * _DTYPE.itemsize
+    if len(body) <= end:
+        return decode(body), None
+    matrix = decode(body[:end])
+    if len(body) < end + _ENTITY_HEADER.size:
+        raise SchemaMismatchError("Truncated entity-key block")
+    magic, kinds, key_rows = _ENTITY_HEADER.unpack_from(body, end)
+    if magic != _ENTITY_MAGIC or kinds != len(ENTITY_KINDS) or key_rows != rows:
+        raise SchemaMismatchError(
+            f"Entity-key block mismatch: {kinds} kinds x {key_rows} rows, "
+            f"expected {len(ENTITY_KINDS)} x {rows}"
+        )
+    expected = end + _ENTITY_HEADER.size + rows * kinds * _KEY_DTYPE.itemsize
+    if len(body) != expected:
+        raise SchemaMismatchError(f"Feature payload is {len(body)} bytes, expected {expected}")
+    keys = np.frombuffer(body, dtype=_KEY_DTYPE, offset=end + _ENTITY_HEADER.size).reshape(rows, kinds)
+    return matrix, keys
@@ -0,0 +1,297 @@
+"""
+Model registry: loads every model once, up front, and remembers the outcome.
+Each model has a reader (model_dir → (model, aux) or None when its file is
+absent). The registry runs each reader at most once: successes, missing
+files and load failures are all cached, so requests never retry imports or
+file checks. load_all() + warmup at service startup move the cost of
+imports, deserialisation and first-call initialisation out of the first
+request; `ready` gates the readiness endpoint until that is done.
+
+Versions: with a MODEL_PATH/versions/<version>/ layout the active version
+is named by MODEL_PATH/CURRENT (else the last version in sort order); a flat
+MODEL_PATH is served as version "unversioned". The models of one version
+form a ModelSet. reload() builds and warms the next set off to the side and
+then swaps `current` in one assignment; a request pins the set it started
+with (pinned()), so in-flight requests finish on the old version and every
+result names exactly one version.
+"""
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Reader = Callable[[str], Optional[Tuple[Any, Any]]]
+
+UNVERSIONED = "unversioned"
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+class ModelReloadError(RuntimeError):
+    """A new model version failed to load or warm up; the current version keeps serving"""
+
+
+class ReloadInProgress(RuntimeError):
+    """Another reload is already running"""
+
+
+@dataclass
+class ModelEntry:
+    """Outcome of loading one model: status is loaded, missing or failed"""
+    name: str
+    status: str
+    model: Any = None
+    aux: Any = None
+    error: Optional[str] = None
+    load_seconds: float = 0.0
+    traced_bytes: Optional[int] = None
+    rss_bytes: Optional[int] = None
+    loaded_at: float = field(default_factory=time.time)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "load_seconds": round(self.load_seconds, 4),
+            "traced_bytes": self.traced_bytes,
+            "rss_bytes": self.rss_bytes,
+        }
+
+
+@dataclass
+class ModelSet:
+    """The models of one version; not modified once current (apart from lazy first loads)"""
+    version: str
+    path: str
+    entries: Dict[str, ModelEntry] = field(default_factory=dict)
+    warmup_seconds: Optional[float] = None
+    activated_at: Optional[float] = None
+
+
+_pinned: contextvars.ContextVar[Optional[ModelSet]] = contextvars.ContextVar("pinned_model_set", default=None)
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Thread-safe cache of model load outcomes, keyed by model name.
+    Memory per model is the RSS growth while it loads; trace_allocations
+    adds tracemalloc's count of Python / NumPy bytes still held, at the
+    cost of several times slower loading.
+    """
+
+    def __init__(self, model_dir: str, readers: Dict[str, Reader], trace_allocations: bool = False):
+        self.model_dir = model_dir
+        self.readers = dict(readers)
+        self.trace_allocations = trace_allocations
+        self.ready = False
+        try:
+            self.current = ModelSet(*self.resolve())
+        except (OSError, ValueError) as e:
+            logger.error("Cannot resolve the model version to serve: %s", e)
+            self.current = ModelSet("unresolved", os.path.join(model_dir, "versions", ".unresolved"))
+        self.reloads: Dict[str, Any] = {
+            "succeeded": 0, "failed": 0, "last_error": None, "failed_version": None, "last_seconds": None,
+        }
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+
+    @property
+    def warmup_seconds(self) -> Optional[float]:
+        return self.current.warmup_seconds
+
+    def resolve(self, version: Optional[str] = None) -> Tuple[str, str]:
+        """(version, directory) to load: the given version, else CURRENT, else the newest"""
+        versions_dir = os.path.join(self.model_dir, "versions")
+        if not os.path.isdir(versions_dir):
+            if version not in (None, UNVERSIONED):
+                raise FileNotFoundError(f"No versions/ directory in {self.model_dir}")
+            return UNVERSIONED, self.model_dir
+        if version is None:
+            version = self.current_file_version()
+        if version is None:
+            available = sorted(
+                name for name in os.listdir(versions_dir) if os.path.isdir(os.path.join(versions_dir, name))
+            )
+            if not available:
+                raise FileNotFoundError(f"No model versions in {versions_dir}")
+            version = available[-1]
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid model version {version!r}")
+        path = os.path.join(versions_dir, version)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Model version {version!r} not found in {versions_dir}")
+        return version, path
+
+    def current_file_version(self) -> Optional[str]:
+        """Version named by MODEL_PATH/CURRENT, if that file exists"""
+        try:
+            with open(os.path.join(self.model_dir, "CURRENT")) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @contextmanager
+    def pinned(self, models: Optional[ModelSet] = None) -> Iterator[ModelSet]:
+        """Serve every get() in this block (this thread / task) from one ModelSet"""
+        models = models or _pinned.get() or self.current
+        token = _pinned.set(models)
+        try:
+            yield models
+        finally:
+            _pinned.reset(token)
+
+    def get(self, name: str) -> Tuple[Optional[Any], Optional[Any]]:
+        """(model, aux) if loaded, else (None, None); loads on first use only"""
+        models = _pinned.get() or self.current
+        entry = models.entries.get(name)
+        if entry is None:
+            with self._lock:
+                entry = models.entries.get(name) or self._load(models, name)
+        if entry.status != "loaded":
+            return None, None
+        return entry.model, entry.aux
+
+    def load_all(self, models: Optional[ModelSet] = None) -> Dict[str, ModelEntry]:
+        with self.pinned(models) as models:
+            for name in self.readers:
+                self.get(name)
+        return dict(models.entries)
+
+    def put(self, name: str, model: Any, aux: Any = None) -> None:
+        """Install an already built model in the current version (stand-ins, tests)"""
+        with self._lock:
+            self.current.entries[name] = ModelEntry(name=name, status="loaded", model=model, aux=aux)
+
+    def clear(self, version: Optional[str] = None) -> None:
+        """Forget every outcome (including cached failures) and re-resolve; the next get() reloads"""
+        with self._lock:
+            self.current = ModelSet(*self.resolve(version))
+            self.ready = False
+
+    def warmup(self, *calls: Callable[[], Any], version: Optional[str] = None) -> float:
+        """Load everything, run the warmup calls, then mark the registry ready"""
+        if version is not None and version != self.current.version:
+            self.clear(version)
+        models = self.current
+        start = time.perf_counter()
+        with self.pinned(models):
+            self.load_all(models)
+            for call in calls:
+                try:
+                    call()
+                except Exception as e:
+                    logger.warning("Warmup call failed: %s", e)
+        models.warmup_seconds = time.perf_counter() - start
+        models.activated_at = models.activated_at or time.time()
+        self.ready = True
+        return models.warmup_seconds
+
+    def reload(
+        self, version: Optional[str] = None, warmup_calls: Sequence[Callable[[], Any]] = (), force: bool = False,
+    ) -> ModelSet:
+        """
+        Load and warm `version` (default: CURRENT / newest) beside the serving
+        set, then make it current. Raises ModelReloadError, leaving the current
+        version serving, if a model fails to load, one the current version
+        serves is missing, or a warmup call fails.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise ReloadInProgress("A model reload is already running")
+        try:
+            version, path = self.resolve(version)
+            if version == self.current.version and not force:
+                return self.current
+            start = time.perf_counter()
+            try:
+                models = self._prepare(ModelSet(version, path), warmup_calls)
+            except ModelReloadError as e:
+                self.reloads.update(failed=self.reloads["failed"] + 1, last_error=str(e), failed_version=version)
+                raise
+            previous, self.current = self.current, models
+            models.activated_at = time.time()
+            self.reloads.update(
+                succeeded=self.reloads["succeeded"] + 1, last_error=None, failed_version=None,
+                last_seconds=round(time.perf_counter() - start, 4),
+            )
+            logger.info("Model version %s -> %s", previous.version, version)
+            return models
+        finally:
+            self._reload_lock.release()
+
+    def _prepare(self, models: ModelSet, warmup_calls: Sequence[Callable[[], Any]]) -> ModelSet:
+        entries = self.load_all(models)
+        failed = {name: e.error for name, e in entries.items() if e.status == "failed"}
+        lost = [
+            name for name, e in entries.items()
+            if e.status == "missing" and name in self.current.entries and self.current.entries[name].status == "loaded"
+        ]
+        if failed or lost:
+            raise ModelReloadError(f"Model version {models.version} rejected: failed={failed} missing={lost}")
+        start = time.perf_counter()
+        with self.pinned(models):
+            for call in warmup_calls:
+                try:
+                    call()
+                except Exception as e:
+                    raise ModelReloadError(f"Model version {models.version} failed warmup: {e}") from e
+        models.warmup_seconds = time.perf_counter() - start
+        return models
+
+    def _load(self, models: ModelSet, name: str) -> ModelEntry:
+        reader = self.readers[name]
+        tracing = self.trace_allocations and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        try:
+            loaded = reader(models.path)
+            if loaded is None:
+                entry = ModelEntry(name=name, status="missing")
+            else:
+                entry = ModelEntry(name=name, status="loaded", model=loaded[0], aux=loaded[1])
+        except Exception as e:
+            logger.warning("Loading model %s (version %s) failed: %s", name, models.version, e)
+            entry = ModelEntry(name=name, status="failed", error=f"{type(e).__name__}: {e}")
+        entry.load_seconds = time.perf_counter() - start
+        if self.trace_allocations:
+            entry.traced_bytes = max(0, tracemalloc.get_traced_memory()[0] - traced_before)
+        rss_after = _rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            entry.rss_bytes = max(0, rss_after - rss_before)
+        if tracing:
+            tracemalloc.stop()
+        models.entries[name] = entry
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        models = self.current
+        return {
+            "ready": self.ready,
+            "version": models.version,
+            "activated_at": models.activated_at,
+            "warmup_seconds": round(models.warmup_seconds, 4) if models.warmup_seconds is not None else None,
+            "model_dir": models.path,
+            "models": {
+                name: models.entries[name].info() if name in models.entries else {"status": "not_loaded"}
+                for name in self.readers
+            },
+            "reloads": dict(self.reloads),
+        }
@@ -1,56 +1,168 @@
 """
 ML inference HTTP service.
 Stateless at inference time. No frontend imports.
-Exposes: POST /predict, GET /health, GET /models.
+Exposes: POST /predict, POST /predict_batch, GET /health, GET /ready, GET /models, GET /metrics,
+POST /admin/reload.
+/predict takes a feature_schema-encoded float32 row (binary body);
+/predict_batch takes an (N, n) matrix in the same encoding.
+Concurrent /predict rows are micro-batched (batching.MicroBatcher) into
+one predict_batch call; MICROBATCH_MAX_SIZE=1 scores each row directly.
+Model calls run in executor.InferenceExecutor, off the event loop, so
+/health answers while inference is busy; when its pending-job bound is
+reached, /predict and /predict_batch return 503 instead of queueing.
+Models are preloaded and warmed up in the background at startup; /health
+is liveness, /ready returns 503 until warmup has finished.
+A new model version (MODEL_PATH/versions/<version>/) is loaded and warmed
+beside the serving one and swapped in atomically, on POST /admin/reload or
+when the MODEL_PATH/CURRENT watcher sees it change; every response names
+the model_version that scored it.
+A body may carry feature_schema entity keys (user, device, merchant, IP);
+those rows are scored by the GNN on their neighborhood in the in-memory
+entity graph (inference.entity_graph) and then added to it.
 """
 
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Request
 from typing import Dict, Any, Optional
 
-from inference import predict as ml_predict
+from batching import MicroBatcher
+from executor import ExecutorSaturated, InferenceExecutor
+from inference import (
+    embedding_cache, entity_graph, parallel_stats, predict_batch as predict_matrix, predict_batch_response,
+    predict_response, predict_vector, registry, reload_models, warm_up,
+)
+from registry import ModelReloadError, ReloadInProgress
+from pipelines import feature_schema
+
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "4096"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "2.0"))
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", str(max(1, INFERENCE_WORKERS) * 4)))
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+
+logger = logging.getLogger(__name__)
+
+executor = InferenceExecutor(
+    INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_EXECUTOR,
+    # Process workers hold their own models: warm each one as it starts
+    initializer=warm_up if INFERENCE_EXECUTOR == "process" else None,
+)
+batcher = (
+    MicroBatcher(predict_matrix, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS, executor)
+    if MICROBATCH_MAX_SIZE > 1 else None
+)
+
+
+async def _reload(version: Optional[str] = None, force: bool = False) -> str:
+    """Load + warm in a background thread (serving continues on the current version), then swap"""
+    loop = asyncio.get_running_loop()
+    previous = registry.current.version
+    loaded = await loop.run_in_executor(None, reload_models, version, force)
+    if loaded != previous and executor.kind == "process":
+        # Process workers hold their own copies: replace them with workers warmed on the new version
+        executor.recycle(loaded)
+    return loaded
+
+
+async def _watch_current(interval: float) -> None:
+    """Reload when MODEL_PATH/CURRENT names a new version (a version that failed is skipped until CURRENT changes)"""
+    while True:
+        await asyncio.sleep(interval)
+        target = registry.current_file_version()
+        if target in (None, registry.current.version, registry.reloads["failed_version"]):
+            continue
+        try:
+            await _reload(target)
+        except Exception as e:
+            logger.warning("Model reload to %s failed: %s", target, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers while models load
+    warming = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    watcher = asyncio.create_task(_watch_current(MODEL_WATCH_INTERVAL)) if MODEL_WATCH_INTERVAL > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await warming
+    if batcher is not None:
+        await batcher.stop()
+    executor.shutdown()
+
 
 app = FastAPI(
     title="FinGuard ML Service",
     description="Fraud inference (AE + IF + GNN)",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
-class PredictRequest(BaseModel):
-    features: Dict[str, Any] = {}
-    transaction_data: Dict[str, Any] = {}
-    timestamp: Optional[str] = None
+async def _decode_body(request: Request):
+    """feature_schema-encoded request body → ((N, n) float32 matrix, entity keys or None) (415 / 422 otherwise)"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != feature_schema.CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected {feature_schema.CONTENT_TYPE}, got {content_type!r}")
+    try:
+        return feature_schema.decode_with_entities(await request.body())
+    except feature_schema.SchemaMismatchError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": str(e), "feature_schema": feature_schema.schema_info()},
+        )
 
 
 @app.post("/predict")
-async def predict(request: PredictRequest) -> Dict[str, Any]:
+async def predict(request: Request) -> Dict[str, Any]:
     """
     Run fraud inference for one transaction.
-    Input: features (from backend FeatureExtractor), transaction_data.
+    Input: one feature row encoded with feature_schema (Content-Type
+    application/x-finguard-features). A body from another schema version
+    is rejected with 422 rather than scored.
     Output: fraud_score (0-1), risk_label, model-wise scores.
     """
+    matrix, entity_keys = await _decode_body(request)
+    if matrix.shape[0] != 1:
+        raise HTTPException(status_code=422, detail=f"Expected 1 feature row, got {matrix.shape[0]}")
     try:
-        result = ml_predict(
-            transaction_data=request.transaction_data,
-            features=request.features,
-        )
-        anomaly = float(result.get("anomaly_score", 0.0))
-        gnn = float(result.get("graph_risk_score", 0.0))
-        combined = (0.4 * anomaly + 0.6 * gnn) * 100.0
-        combined = max(0.0, min(100.0, combined))
-        return {
-            "anomaly_score": anomaly,
-            "iforest_score": result.get("iforest_score", anomaly),
-            "graph_risk_score": gnn,
-            "combined_risk_score": round(combined, 2),
-            "risk_level": result.get("risk_level", "low"),
-            "features_used": result.get("features_used", []),
-            "model_confidence": result.get("model_confidence", 0.5),
-            "fraud_type_prediction": result.get("fraud_type_prediction"),
-        }
+        if batcher is not None:
+            result = await batcher.submit(matrix, entity_keys)
+        else:
+            args = (matrix,) if entity_keys is None else (matrix, entity_keys)
+            result = await executor.run(predict_vector, *args)
+        return predict_response(result)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request) -> Dict[str, Any]:
+    """
+    Run fraud inference for N transactions in one call.
+    Input: an (N, n) feature matrix encoded with feature_schema; each model
+    runs once over the whole matrix. At most MAX_BATCH_ROWS rows (413).
+    Output: column-oriented, one list of N values per /predict field
+    (row i equals /predict on row i), plus rows and the shared features_used.
+    """
+    matrix, entity_keys = await _decode_body(request)
+    if matrix.shape[0] > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch, got {matrix.shape[0]}")
+    try:
+        args = (matrix,) if entity_keys is None else (matrix, entity_keys)
+        result = await executor.run(predict_matrix, *args)
+        return predict_batch_response(result, int(matrix.shape[0]))
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -60,6 +172,56 @@ async def health() -> Dict[str, Any]:
     return {
         "status": "healthy",
         "service": "FinGuard ML",
+        "feature_schema": feature_schema.schema_info(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+@app.get("/ready")
+async def ready() -> Dict[str, Any]:
+    """Readiness: 200 once models are loaded and warmed up (failed models are reported, not retried)"""
+    stats = registry.stats()
+    if not stats["ready"]:
+        raise HTTPException(status_code=503, detail=stats)
+    return stats
+
+
+@app.post("/admin/reload")
+async def admin_reload(
+    version: Optional[str] = None,
+    force: bool = False,
+    x_admin_token: str = Header(default=""),
+) -> Dict[str, Any]:
+    """
+    Load and warm a model version (default: the one MODEL_PATH/CURRENT names)
+    beside the serving one, then swap it in. Requires X-Admin-Token to match
+    MODEL_ADMIN_TOKEN; disabled (403) when that is unset.
+    409 while another reload runs, 404 for an unknown version, 422 when the
+    version fails to load or warm up (the current version keeps serving).
+    """
+    if not MODEL_ADMIN_TOKEN or x_admin_token != MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model admin is disabled or the token is wrong")
+    previous = registry.current.version
+    try:
+        loaded = await _reload(version, force)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelReloadError as e:
+        raise HTTPException(status_code=422, detail={"error": str(e), "model_version": previous})
+    return {"previous_version": previous, "model_version": loaded, "registry": registry.stats()}
+
+
+@app.get("/metrics")
+async def metrics() -> Dict[str, Any]:
+    """Micro-batching histograms (rows per batch, per-row queue wait ms), executor load, entity graph size, GNN embedding cache staleness and model timeouts"""
+    return {
+        "microbatching": batcher.stats() if batcher is not None else {"enabled": False},
+        "executor": executor.stats(),
+        "entity_graph": entity_graph.stats(),
+        "gnn_embeddings": embedding_cache.stats() if embedding_cache is not None else {"enabled": False},
+        "model_parallel": parallel_stats(),
         "timestamp": datetime.now().isoformat(),
     }
 
@@ -67,12 +229,14 @@ async def health() -> Dict[str, Any]:
 @app.get("/models")
 async def models() -> Dict[str, Any]:
     model_dir = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(__file__), "models"))
-    ae_path = os.path.join(model_dir, "autoencoder.pkl")
-    if_path = os.path.join(model_dir, "isolation_forest.pkl")
+    ae_paths = [os.path.join(model_dir, name) for name in ("autoencoder.npz", "autoencoder.pkl")]
+    if_paths = [os.path.join(model_dir, name) for name in ("isolation_forest.npz", "isolation_forest.pkl")]
     gnn_paths = [os.path.join(model_dir, "gnn_gat.pt"), os.path.join(model_dir, "gnn.pt")]
     return {
-        "autoencoder": os.path.isfile(ae_path),
-        "isolation_forest": os.path.isfile(if_path),
+        "autoencoder": any(os.path.isfile(p) for p in ae_paths),
+        "isolation_forest": any(os.path.isfile(p) for p in if_paths),
         "gnn": any(os.path.isfile(p) for p in gnn_paths),
         "model_path": model_dir,
+        "feature_schema": feature_schema.schema_info(),
+        "registry": registry.stats(),
     }
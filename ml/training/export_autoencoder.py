@@ -0,0 +1,68 @@
+"""
+Export the trained autoencoder to a framework-free .npz.
+
+Reads autoencoder.pkl (Keras model or MLPRegressor) and ae_scaler.pkl from
+--model-dir, folds the scaler into the weights (see ml.numpy_autoencoder)
+and writes autoencoder.npz beside them. The ML service prefers the .npz, so
+it scores the autoencoder without importing TensorFlow. The export is
+checked against the original model on --check-rows synthetic rows and
+rejected if reconstruction errors differ by more than --rtol.
+
+Usage (from the repository root):
+    python -m ml.training.export_autoencoder --model-dir ml/models
+"""
+
+import argparse
+import os
+import sys
+from typing import Any, Optional
+
+import joblib
+import numpy as np
+
+from ml.numpy_autoencoder import NumpyAutoencoder
+
+
+def reference_error(model: Any, scaler: Optional[Any], X: np.ndarray) -> np.ndarray:
+    """Reconstruction error the way inference computed it before the export"""
+    X_scaled = scaler.transform(X) if scaler is not None else X
+    pred = model.predict(X_scaled, verbose=0) if hasattr(model, "layers") else model.predict(X_scaled)
+    return np.mean((X_scaled - pred) ** 2, axis=1)
+
+
+def export_autoencoder(
+    model: Any, scaler: Optional[Any], path: str, check_rows: int = 1000, rtol: float = 1e-4,
+) -> float:
+    """Write the export to `path`; returns the largest relative error difference on the check rows"""
+    exported = NumpyAutoencoder.from_model(model, scaler)
+    rng = np.random.default_rng(0)
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    X = rng.normal(size=(check_rows, exported.input_dim))
+    X = X * (1.0 if scale is None else scale) + (0.0 if mean is None else mean)
+    expected = reference_error(model, scaler, X)
+    actual = exported.reconstruction_error(X)
+    worst = float(np.max(np.abs(actual - expected) / np.maximum(np.abs(expected), 1e-6)))
+    if worst > rtol:
+        raise ValueError(f"Export differs from the model: max relative error {worst:.2e} > {rtol:.0e}")
+    exported.export(path)
+    return worst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default="ml/models")
+    parser.add_argument("--output", help="Default: <model-dir>/autoencoder.npz")
+    parser.add_argument("--check-rows", type=int, default=1000)
+    parser.add_argument("--rtol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    scaler_path = os.path.join(args.model_dir, "ae_scaler.pkl")
+    model = joblib.load(os.path.join(args.model_dir, "autoencoder.pkl"))
+    scaler = joblib.load(scaler_path) if os.path.isfile(scaler_path) else None
+    output = args.output or os.path.join(args.model_dir, "autoencoder.npz")
+    try:
+        worst = export_autoencoder(model, scaler, output, args.check_rows, args.rtol)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"💾 Exported {output} (max relative error vs model {worst:.2e})")
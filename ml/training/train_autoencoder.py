@@ -9,12 +9,14 @@ from tensorflow.keras.layers import Input, Dense
 from tensorflow.keras.callbacks import EarlyStopping
 
 from ml.pipelines.feature_builder import build_features
+from ml.training.export_autoencoder import export_autoencoder
 
 # -------------------------------
 # CONFIG
 # -------------------------------
 DATA_PATH = "data/raw/Credit Card-Fraud Detection.csv"
 MODEL_PATH = "ml/models/autoencoder.pkl"
+EXPORT_PATH = "ml/models/autoencoder.npz"
 
 SAMPLE_ROWS = 50000      # ⬅ prevents OOM
 EPOCHS = 20              # ⬅ dev-safe
@@ -95,4 +97,7 @@ autoencoder.fit(
 # -------------------------------
 joblib.dump(autoencoder, MODEL_PATH)
 
+# NumPy export (scaler folded in) so the ML service scores without TensorFlow
+export_autoencoder(autoencoder, scaler, EXPORT_PATH)
+
 print("💾 AutoEncoder training complete & saved!")
@@ -4,10 +4,12 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
 from ml.pipelines.feature_builder import build_features
+from ml.training.export_isolation_forest import export_isolation_forest
 
 DATA_PATH = "data/raw/Credit Card-Fraud Detection.csv"
 MODEL_PATH = "ml/models/isolation_forest.pkl"
 SCALER_PATH = "ml/models/if_scaler.pkl"
+EXPORT_PATH = "ml/models/isolation_forest.npz"
 
 if __name__ == "__main__":
     print("📥 Loading dataset...")
@@ -34,5 +36,7 @@ if __name__ == "__main__":
     print("💾 Saving model...")
     joblib.dump(if_model, MODEL_PATH)
     joblib.dump(scaler, SCALER_PATH)
+    # Flat-array export (if_scaler.pkl still applies), scored without sklearn's per-tree overhead
+    export_isolation_forest(if_model, EXPORT_PATH)
 
     print("✅ Isolation Forest trained & saved!")
@@ -0,0 +1,30 @@
+"""
+Fixtures shared by the backend tests
+"""
+
+import pytest
+
+from app.services import profile_cache
+
+
+class FakeClock:
+    """Monotonic clock for the services' `clock` arguments; tests set `now`"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(autouse=True)
+def clear_profile_caches():
+    """The profile caches are process-wide; start and leave every test with them empty"""
+    profile_cache.clear_all()
+    yield
+    profile_cache.clear_all()
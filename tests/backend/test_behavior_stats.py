@@ -0,0 +1,118 @@
+"""
+Incremental user behavior stats: parity with the windowed history computation
+"""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.behavior_stats import apply_transaction, new_stats
+from app.services.ingestion import FeatureExtractor
+
+
+def _history(n, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = [
+        SimpleNamespace(
+            amount=round(rng.lognormvariate(4, 1), 2),
+            transaction_time=now - timedelta(minutes=rng.randint(1, 60 * 24 * 30)),
+            is_fraudulent=rng.random() < 0.1,
+            risk_score=rng.uniform(0, 100),
+        )
+        for _ in range(n)
+    ]
+    # The windowed query returns newest first
+    rows.sort(key=lambda t: t.transaction_time, reverse=True)
+    return rows
+
+
+class TestBehaviorStats:
+    """Test user_behavior_stats maintenance and feature parity"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("n", [1, 2, 37, 100])
+    async def test_parity_with_windowed_computation(self, n):
+        rows = _history(n)
+        result = MagicMock()
+        result.all.return_value = rows
+        mock_db = AsyncMock()
+        mock_db.execute.return_value = result
+        transaction_data = {"amount": 250.0}
+
+        windowed = await FeatureExtractor(mock_db, fused=False, use_behavior_stats=False)._extract_behavioral_features(
+            "user_123", transaction_data
+        )
+
+        stats = new_stats("user_123")
+        # Write order must not matter
+        for t in random.Random(1).sample(rows, len(rows)):
+            apply_transaction(stats, t.amount, t.transaction_time, t.is_fraudulent, t.risk_score)
+        incremental = FeatureExtractor(mock_db)._behavioral_from_stats(stats, transaction_data)
+
+        assert set(windowed) <= set(incremental)
+        for key, value in windowed.items():
+            assert incremental[key] == pytest.approx(value, rel=1e-6, abs=1e-6), key
+
+    @pytest.mark.asyncio
+    async def test_stats_cover_the_whole_history_past_the_window(self):
+        """Past USER_HISTORY_LIMIT transactions the stats describe all of them, the scan only the newest 100"""
+        rows = _history(150)
+        result = MagicMock()
+        result.all.return_value = rows[:100]  # what the LIMIT 100 query returns
+        mock_db = AsyncMock()
+        mock_db.execute.return_value = result
+        transaction_data = {"amount": 250.0}
+
+        windowed = await FeatureExtractor(mock_db, fused=False, use_behavior_stats=False)._extract_behavioral_features(
+            "user_123", transaction_data
+        )
+        stats = new_stats("user_123")
+        for t in rows:
+            apply_transaction(stats, t.amount, t.transaction_time, t.is_fraudulent, t.risk_score)
+        incremental = FeatureExtractor(mock_db)._behavioral_from_stats(stats, transaction_data)
+
+        assert windowed["user_transaction_count"] == 100
+        assert incremental["user_transaction_count"] == 150
+        assert incremental["user_avg_amount"] == pytest.approx(sum(t.amount for t in rows) / 150)
+        oldest = min(t.transaction_time for t in rows)
+        assert incremental["time_since_first_transaction"] == pytest.approx(
+            (datetime.now() - oldest).total_seconds() / 86400, rel=1e-3
+        )
+        assert incremental["time_since_first_transaction"] >= windowed["time_since_first_transaction"]
+        # The last transaction is among the newest 100 either way
+        assert incremental["hours_since_last_transaction"] == pytest.approx(
+            windowed["hours_since_last_transaction"], rel=1e-3
+        )
+
+    def test_new_user(self):
+        features = FeatureExtractor(AsyncMock())._behavioral_from_stats(None, {"amount": 10.0})
+        assert features["is_new_user"] == 1
+        assert features["user_transaction_count"] == 0
+
+    def test_decayed_average_halves_old_weight(self):
+        start = datetime(2025, 1, 1)
+        stats = new_stats("user_123")
+        apply_transaction(stats, 100.0, start, False, 10.0, halflife_hours=24.0)
+        apply_transaction(stats, 300.0, start + timedelta(hours=24), True, 90.0, halflife_hours=24.0)
+
+        assert stats.decayed_weight == pytest.approx(1.5)
+        assert stats.decayed_amount_mean == pytest.approx((100.0 * 0.5 + 300.0) / 1.5)
+        assert stats.decayed_risk_score_mean == pytest.approx((10.0 * 0.5 + 90.0) / 1.5)
+        assert stats.amount_mean == pytest.approx(200.0)
+        assert stats.fraud_count == 1
+
+    def test_late_event_is_decayed_by_its_age(self):
+        start = datetime(2025, 1, 1)
+        in_order, late = new_stats("user_123"), new_stats("user_123")
+        apply_transaction(in_order, 100.0, start, False, 10.0, halflife_hours=24.0)
+        apply_transaction(in_order, 300.0, start + timedelta(hours=24), True, 90.0, halflife_hours=24.0)
+        apply_transaction(late, 300.0, start + timedelta(hours=24), True, 90.0, halflife_hours=24.0)
+        apply_transaction(late, 100.0, start, False, 10.0, halflife_hours=24.0)  # a day late: half weight
+
+        for name in ("decayed_weight", "decayed_amount_mean", "decayed_risk_score_mean"):
+            assert getattr(late, name) == pytest.approx(getattr(in_order, name)), name
+        assert late.decayed_at == start + timedelta(hours=24)
@@ -0,0 +1,96 @@
+"""
+Embedded scoring: ml.inference called in-process returns the ML service's
+result shapes, off the event loop, and refuses calls past its pending bound
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import embedded_ml, feature_schema
+from app.services.ml_client import MLClient, ScoringBackend, scoring_client
+from app.services.upstream import UpstreamUnavailable
+
+
+def _features(amount):
+    features = dict.fromkeys(feature_schema.FEATURE_ORDER, 0.0)
+    features["amount"] = amount
+    return features
+
+
+@pytest.fixture
+def scorer():
+    scorer = embedded_ml.EmbeddedMLClient(workers=2, max_pending=4)
+    yield scorer
+    scorer.executor.shutdown()
+
+
+class TestEmbeddedMLClient:
+    """Test EmbeddedMLClient against the ML service's response shapes"""
+
+    @pytest.mark.asyncio
+    async def test_predict_matches_the_predict_response(self, scorer):
+        result = await scorer.predict(_features(5000.0), {"transaction_id": "t1"})
+
+        assert set(result) == set(scorer.inference.predict_response({}))
+        # Heuristic path (no models in the test tree) reads the amount column, as /predict does
+        assert result["anomaly_score"] == 0.6
+        assert result["features_used"] == list(feature_schema.FEATURE_ORDER)
+
+    @pytest.mark.asyncio
+    async def test_batch_rows_equal_single_predictions(self, scorer):
+        amounts = [10.0, 5000.0, 250.0]
+        matrix = np.stack([feature_schema.to_vector(_features(amount)) for amount in amounts])
+
+        rows = await scorer.predict_batch(matrix)
+
+        assert len(rows) == 3
+        for amount, row in zip(amounts, rows):
+            single = await scorer.predict(_features(amount), {})
+            assert row["anomaly_score"] == single["anomaly_score"]
+            assert row["combined_risk_score"] == single["combined_risk_score"]
+            assert set(row) == set(single)
+
+    @pytest.mark.asyncio
+    async def test_inference_runs_off_the_event_loop_and_is_bounded(self, scorer):
+        release = threading.Event()
+        threads = []
+
+        def blocking(*args):
+            threads.append(threading.get_ident())
+            release.wait(1.0)
+            return {}
+
+        scorer.inference = type("Inference", (), {
+            "predict_vector": staticmethod(blocking),
+            "predict_response": staticmethod(lambda result: result),
+        })
+        calls = [asyncio.ensure_future(scorer.predict(_features(1.0), {})) for _ in range(4)]
+        await asyncio.sleep(0.05)  # the loop is free while all four run or wait
+        with pytest.raises(UpstreamUnavailable):
+            await scorer.predict(_features(1.0), {})
+        release.set()
+        await asyncio.gather(*calls)
+
+        assert threading.get_ident() not in threads
+        assert scorer.executor.stats()["rejected"] == 1
+
+
+def test_scoring_client_follows_the_setting(monkeypatch):
+    monkeypatch.setattr(settings, "SCORING_BACKEND", "remote")
+    assert isinstance(scoring_client(), MLClient)
+
+    monkeypatch.setattr(settings, "SCORING_BACKEND", "embedded")
+    monkeypatch.setattr(embedded_ml, "_scorer", None)
+    client = scoring_client()
+    assert isinstance(client, embedded_ml.EmbeddedMLClient)
+    assert isinstance(client, ScoringBackend) and isinstance(MLClient(), ScoringBackend)
+    assert scoring_client() is client
+    client.executor.shutdown()
+
+    monkeypatch.setattr(settings, "SCORING_BACKEND", "local")
+    with pytest.raises(ValueError):
+        scoring_client()
@@ -0,0 +1,140 @@
+"""
+HyperLogLog entity sketches: accuracy, serialization and graph feature wiring
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services import entity_sketches
+from app.services.entity_sketches import HyperLogLog, distinct_features, sketch_members
+from app.services.ingestion import FeatureExtractor
+
+
+def _sketch(members):
+    sketch = HyperLogLog()
+    for member in members:
+        sketch.add(member)
+    return sketch
+
+
+class TestHyperLogLog:
+    """Test estimates and the storage format"""
+
+    def test_small_counts_are_exact(self):
+        for n in (1, 2, 5, 20, 50):
+            assert round(_sketch(f"user_{i}" for i in range(n)).count()) == n
+
+    @pytest.mark.parametrize("n", [1000, 20000])
+    def test_large_counts_within_error_bound(self, n):
+        estimate = _sketch(f"user_{i}" for i in range(n)).count()
+        # 1.04 / sqrt(4096) ~= 1.6% standard error; allow 3 sigma
+        assert abs(estimate - n) / n < 0.05
+
+    def test_duplicates_do_not_change_the_sketch(self):
+        sketch = _sketch(["a", "b", "c"])
+        before = bytes(sketch.registers)
+        assert not sketch.add("b")
+        assert bytes(sketch.registers) == before
+
+    def test_serialization_round_trip(self):
+        for n in (0, 10, 5000):
+            sketch = _sketch(range(n))
+            restored = HyperLogLog.from_bytes(sketch.to_bytes())
+            assert restored.registers == sketch.registers
+
+    def test_storage_is_bounded(self):
+        assert len(_sketch(range(10)).to_bytes()) == 2 + 3 * 10
+        assert len(_sketch(range(100000)).to_bytes()) == 2 + 4096
+
+    def test_merge_is_union(self):
+        left, right = _sketch(range(0, 600)), _sketch(range(400, 1000))
+        left.merge(right)
+        assert left.registers == _sketch(range(1000)).registers
+
+    def test_count_with_leaves_sketch_unchanged(self):
+        sketch = _sketch(["a", "b"])
+        assert round(sketch.count_with("c")) == 3
+        assert round(sketch.count_with("a")) == 2
+        assert round(sketch.count()) == 2
+
+
+class TestDistinctFeatures:
+    """Test feature semantics"""
+
+    def test_shared_device_count_is_other_distinct_users(self):
+        members = sketch_members("u1", "m1", "d1", "10.0.0.1")
+        sketches = {
+            # u2 transacted 50 times on the device: still one other account
+            "device_users": _sketch(["u1", "u2", "u3"] + ["u2"] * 50),
+            "merchant_users": _sketch(["u2"]),
+            "user_devices": None,
+            "ip_users": None,
+        }
+
+        features = distinct_features(sketches, members)
+
+        assert features == {
+            "device_distinct_users": 3,
+            "merchant_distinct_users": 2,
+            "user_distinct_devices": 1,
+            "ip_distinct_users": 1,
+            "shared_device_count": 2,
+        }
+
+    def test_absent_entities_are_zero(self):
+        features = distinct_features({}, sketch_members("u1", None, None, None))
+        assert features["device_distinct_users"] == 0
+        assert features["shared_device_count"] == 0
+
+
+class TestFeatureExtractorSketches:
+    """Test the fused and sequential extraction paths"""
+
+    @pytest.mark.asyncio
+    async def test_fused_and_sequential_agree(self, monkeypatch):
+        txn = {"amount": 80.0, "merchant_id": "m1", "device_id": "d1", "ip_address": "10.0.0.1"}
+        stored = {
+            "device_users": _sketch(["u2", "u3", "u4", "u5"]),
+            "merchant_users": _sketch(["u2"]),
+            "user_devices": _sketch(["d0"]),
+            "ip_users": None,
+        }
+
+        row = SimpleNamespace(
+            transaction_count=0,
+            merchant_pk=None, merchant_risk_score=None, merchant_total_transactions=None,
+            merchant_fraud_count=None, merchant_avg_transaction_amount=None, merchant_category=None,
+            device_pk=None, device_risk_score=None, device_associated_accounts=None,
+            device_is_suspicious=None, device_type=None,
+            device_txn_count=0, merchant_activity_24h=0,
+            **{f"sketch_{kind}": s.to_bytes() if s else None for kind, s in stored.items()},
+        )
+        fused_result = MagicMock()
+        fused_result.one.return_value = row
+        fused_db = AsyncMock()
+        fused_db.execute.return_value = fused_result
+        fused = await FeatureExtractor(fused_db, fused=True, use_behavior_stats=True, use_profile_cache=False,
+                                       use_velocity=False, use_sketches=True).extract_features(dict(txn), "u1")
+
+        extractor = FeatureExtractor(AsyncMock(), fused=False, use_behavior_stats=True, use_profile_cache=False,
+                                     use_velocity=False, use_sketches=True)
+        extractor._extract_behavioral_features = AsyncMock(return_value={})
+        extractor._extract_merchant_features = AsyncMock(return_value={})
+        extractor._extract_device_features = AsyncMock(return_value={})
+        monkeypatch.setattr(entity_sketches, "load_sketches", AsyncMock(return_value=stored))
+        activity = MagicMock()
+        activity.scalar.return_value = 0
+        extractor.db.execute.return_value = activity
+        sequential = await extractor.extract_features(dict(txn), "u1")
+
+        fused_db.execute.assert_awaited_once()
+        # Only the merchant activity query runs; the device count query is gone
+        extractor.db.execute.assert_awaited_once()
+        for name in ("device_distinct_users", "merchant_distinct_users", "user_distinct_devices",
+                     "ip_distinct_users", "shared_device_count", "graph_risk_raw"):
+            assert fused[name] == sequential[name], name
+        assert fused["shared_device_count"] == 4
+        assert fused["user_distinct_devices"] == 2
+        assert fused["graph_risk_raw"] == pytest.approx(0.3)
@@ -0,0 +1,100 @@
+"""
+Feature vector contract shared with the ML service
+"""
+
+import struct
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.services import feature_schema
+from app.services.feature_schema import FEATURE_ORDER, SchemaMismatchError, decode, encode, to_vector
+from app.services.ingestion import FeatureExtractor
+from ml.pipelines import feature_builder
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _features(**overrides):
+    features = {name: float(i) for i, name in enumerate(FEATURE_ORDER)}
+    features.update(overrides)
+    return features
+
+
+class TestFeatureSchema:
+    """Test the backend copy against the ML service"""
+
+    def test_backend_and_ml_copies_are_identical(self):
+        backend = (ROOT / "backend/app/services/feature_schema.py").read_bytes()
+        ml = (ROOT / "ml/pipelines/feature_schema.py").read_bytes()
+        assert backend == ml
+
+    def test_feature_order_matches_ml_service(self):
+        assert list(FEATURE_ORDER) == feature_builder.FEATURE_ORDER
+
+    def test_to_vector_matches_ml_feature_builder(self):
+        features = _features(amount=120.5, is_new_user=True, hour_of_day=13, category="3")
+        expected = feature_builder.build_features_from_transaction({}, {**features, "category": 3.0})[0]
+        np.testing.assert_array_equal(to_vector(features), expected)
+
+    def test_to_vector_rejects_missing_features(self):
+        features = _features()
+        del features["device_account_count"]
+        with pytest.raises(SchemaMismatchError, match="device_account_count"):
+            to_vector(features)
+        with pytest.raises(SchemaMismatchError, match="behavioral_deviation"):
+            to_vector(_features(behavioral_deviation=None))
+
+    def test_encode_decode_round_trip(self):
+        matrix = np.random.default_rng(0).normal(size=(5, len(FEATURE_ORDER))).astype(np.float32)
+        body = encode(matrix)
+        assert len(body) == 20 + matrix.nbytes
+        np.testing.assert_array_equal(decode(body), matrix)
+        np.testing.assert_array_equal(decode(encode(matrix[0])), matrix[:1])
+
+    def test_decode_rejects_other_schemas(self):
+        body = encode(to_vector(_features()))
+        header, data = body[:20], body[20:]
+        magic, version, columns, rows, fingerprint = struct.unpack("<4sHHI8s", header)
+
+        other_version = struct.pack("<4sHHI8s", magic, version + 1, columns, rows, fingerprint) + data
+        with pytest.raises(SchemaMismatchError, match="schema mismatch"):
+            decode(other_version)
+        # Same width, different column names
+        other_fingerprint = struct.pack("<4sHHI8s", magic, version, columns, rows, b"\0" * 8) + data
+        with pytest.raises(SchemaMismatchError, match="schema mismatch"):
+            decode(other_fingerprint)
+        with pytest.raises(SchemaMismatchError):
+            decode(body[:-4])
+        with pytest.raises(SchemaMismatchError):
+            decode(b'{"features": {}}')
+        with pytest.raises(SchemaMismatchError):
+            encode(np.zeros((1, len(FEATURE_ORDER) - 1)))
+
+    def test_entity_keys_round_trip(self):
+        matrix = np.ones((2, len(FEATURE_ORDER)), dtype=np.float32)
+        keys = np.stack([
+            feature_schema.entity_keys({"user_id": "u1", "merchant_id": "m1", "ip_address": ""}),
+            feature_schema.entity_keys({"user_id": "u1", "device_id": "d1"}),
+        ])
+        assert keys[0, 0] == keys[1, 0] != 0
+        assert keys[0, 1] == 0 and keys[0, 3] == 0  # absent and empty ids
+        body = feature_schema.encode_with_entities(matrix, keys)
+
+        decoded, decoded_keys = feature_schema.decode_with_entities(body)
+        np.testing.assert_array_equal(decoded, matrix)
+        np.testing.assert_array_equal(decoded_keys, keys)
+        assert feature_schema.decode_with_entities(encode(matrix))[1] is None
+        with pytest.raises(SchemaMismatchError):
+            feature_schema.decode_with_entities(body[:-8])
+        with pytest.raises(SchemaMismatchError):
+            feature_schema.encode_with_entities(matrix, keys[:1])
+
+    def test_extractor_fallback_covers_schema(self):
+        features = FeatureExtractor(AsyncMock())._default_features({"amount": 50.0, "device_id": "d1"})
+        vector = to_vector(features)
+        assert vector[feature_schema.FEATURE_INDEX["amount"]] == 50.0
+        assert vector[feature_schema.FEATURE_INDEX["is_new_user"]] == 1.0
+        assert vector[feature_schema.FEATURE_INDEX["device_account_count"]] == 1.0
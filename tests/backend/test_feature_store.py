@@ -0,0 +1,355 @@
+"""
+Online feature store: pipelined reads, backfill and write-through against an in-process fake Redis
+"""
+
+import fnmatch
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.behavior_stats import apply_transaction, new_stats
+from app.services.entity_sketches import HyperLogLog, sketch_members
+from app.services import feature_store
+from app.services.feature_store import OnlineFeatureStore
+from app.services.ingestion import FeatureExtractor
+
+
+class FakeRedis:
+    """Dict-backed subset of redis.asyncio.Redis (decode_responses=True) used by the store"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def exists(self, *keys):
+        self.round_trips += 1
+        return self._exists(*keys)
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        return self._delete(*keys)
+
+    async def aclose(self):
+        pass
+
+    def keys(self, pattern="*"):
+        return sorted(k for k in self.data if fnmatch.fnmatch(k, pattern))
+
+    # Commands
+    def _exists(self, *keys):
+        return sum(1 for k in keys if k in self.data)
+
+    def _delete(self, *keys):
+        removed = 0
+        for k in keys:
+            removed += self.data.pop(k, None) is not None
+            self.ttl.pop(k, None)
+        return removed
+
+    def _hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def _hmget(self, key, fields):
+        h = self.data.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def _hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+        return len(mapping)
+
+    def _hincrby(self, key, field, amount=1):
+        h = self.data.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + amount)
+        return int(h[field])
+
+    def _expire(self, key, seconds):
+        if key in self.data:
+            self.ttl[key] = seconds
+            return True
+        return False
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _set(self, key, value, ex=None):
+        self.data[key] = str(value)
+        if ex:
+            self.ttl[key] = ex
+        return True
+
+    def _eval(self, script, numkeys, *args):
+        """The store's Lua scripts, emulated"""
+        (key,), (ttl, version, *rest) = args[:numkeys], args[numkeys:]
+        if script == feature_store._WRITE_USER_STATS:
+            stored = self.data.get(key, {}).get("transaction_count")
+            if stored is not None and int(stored) > int(version):
+                return 0
+            self._delete(key)
+            self._hset(key, dict(zip(rest[::2], rest[1::2])))
+            self._expire(key, ttl)
+            return 1
+        if script == feature_store._WRITE_SKETCH:
+            stored = self.data.get(key)
+            prefix = stored.partition(":")[0] if stored is not None and ":" in stored else ""
+            if prefix.isdigit() and int(prefix) > int(version):
+                return 0
+            return self._set(key, rest[0], ex=ttl)
+        raise NotImplementedError(script)
+
+    def _zadd(self, key, mapping):
+        z = self.data.setdefault(key, {})
+        added = sum(1 for m in mapping if m not in z)
+        z.update({m: float(s) for m, s in mapping.items()})
+        return added
+
+    @staticmethod
+    def _bound(value, default):
+        if value in ("-inf", "+inf"):
+            return float(value), False
+        if isinstance(value, str) and value.startswith("("):
+            return float(value[1:]), True
+        return float(value), False
+
+    def _in_range(self, score, low, high):
+        lo, lo_open = self._bound(low, "-inf")
+        hi, hi_open = self._bound(high, "+inf")
+        return (score > lo if lo_open else score >= lo) and (score < hi if hi_open else score <= hi)
+
+    def _zcount(self, key, low, high):
+        return sum(1 for s in self.data.get(key, {}).values() if self._in_range(s, low, high))
+
+    def _zremrangebyscore(self, key, low, high):
+        z = self.data.get(key, {})
+        doomed = [m for m, s in z.items() if self._in_range(s, low, high)]
+        for m in doomed:
+            del z[m]
+        if key in self.data and not z:
+            self._delete(key)
+        return len(doomed)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, f"_{name}")
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+NOW = datetime.now()
+
+
+def _stats_row(user_id="user_123"):
+    stats = new_stats(user_id)
+    for hours, amount in ((30, 40.0), (10, 60.0), (2, 80.0)):
+        apply_transaction(stats, amount, NOW - timedelta(hours=hours), hours == 2, 35.0)
+    return SimpleNamespace(**{c: getattr(stats, c) for c in (
+        "transaction_count", "amount_mean", "amount_m2", "fraud_count", "risk_score_sum",
+        "first_transaction_time", "last_transaction_time", "decayed_weight",
+        "decayed_amount_mean", "decayed_risk_score_mean", "decayed_at",
+    )})
+
+
+def _device_users_sketch():
+    sketch = HyperLogLog()
+    for uid in ("user_123", "user_456", "user_789"):
+        sketch.add(uid)
+    return sketch
+
+
+def _fused_row():
+    return SimpleNamespace(
+        **vars(_stats_row()),
+        merchant_pk="m1", merchant_risk_score=20.0, merchant_total_transactions=10,
+        merchant_fraud_count=2, merchant_avg_transaction_amount=55.0, merchant_category="travel",
+        device_pk="d1", device_risk_score=70.0, device_associated_accounts=3,
+        device_is_suspicious=True, device_type="mobile",
+        device_txn_count=6, shared_device_count=4, merchant_activity_24h=2,
+        sketch_device_users=_device_users_sketch().to_bytes(), sketch_merchant_users=None, sketch_user_devices=None,
+    )
+
+
+def _mock_db():
+    fused = MagicMock()
+    fused.one.return_value = _fused_row()
+    device_counts = MagicMock()
+    device_counts.all.return_value = [("user_123", 2), ("user_456", 4)]
+    activity = MagicMock()
+    activity.all.return_value = [
+        ("t1", "user_456", NOW - timedelta(hours=1)),
+        ("t2", "user_789", NOW - timedelta(hours=5)),
+        ("t3", "user_123", NOW - timedelta(hours=3)),
+    ]
+    db = AsyncMock()
+    db.execute.side_effect = [fused, device_counts, activity]
+    return db
+
+
+@pytest.fixture
+def store():
+    return OnlineFeatureStore(FakeRedis(), prefix="test")
+
+
+TXN = {"amount": 120.0, "merchant_id": "m1", "device_id": "d1"}
+
+
+class TestOnlineFeatureStore:
+    """Test the store and its FeatureExtractor integration"""
+
+    @pytest.mark.asyncio
+    async def test_empty_store_reports_every_input_missing(self, store):
+        inputs = await store.read("user_123", "m1", "d1")
+        assert store.missing(inputs) == {
+            "user_stats", "merchant_profile", "merchant_activity_24h", "device_profile", "device_txn_count",
+        }
+        assert store.client.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_miss_backfills_then_hits_without_postgres(self, store):
+        db = _mock_db()
+        extractor = FeatureExtractor(db, fused=True, use_behavior_stats=True,
+                                     use_profile_cache=False, feature_store=store, use_velocity=False)
+
+        from_postgres = await extractor.extract_features(dict(TXN), "user_123")
+        assert db.execute.await_count == 3
+
+        store.client.round_trips = 0
+        from_store = await extractor.extract_features(dict(TXN), "user_123")
+
+        assert db.execute.await_count == 3
+        assert store.client.round_trips == 1
+        assert from_store.keys() == from_postgres.keys()
+        for key, value in from_postgres.items():
+            assert from_store[key] == pytest.approx(value, rel=1e-6, abs=1e-3), key
+
+    @pytest.mark.asyncio
+    async def test_backfilled_counts_match_postgres_semantics(self, store):
+        await FeatureExtractor(_mock_db(), fused=True, use_behavior_stats=True,
+                               use_profile_cache=False, feature_store=store, use_velocity=False).extract_features(dict(TXN), "user_123")
+
+        inputs = await store.read("user_123", "m1", "d1")
+        assert inputs["device_txn_count"] == 6
+        assert inputs["shared_device_count"] == 4
+        # Other users' transactions at the merchant in the last 24h
+        assert inputs["merchant_activity_24h"] == 2
+        assert inputs["device_profile"] == {
+            "risk_score": 70.0, "associated_accounts": 3, "is_suspicious": True, "device_type": "mobile",
+        }
+
+    @pytest.mark.asyncio
+    async def test_write_through_after_persist(self, store):
+        await FeatureExtractor(_mock_db(), fused=True, use_behavior_stats=True,
+                               use_profile_cache=False, feature_store=store, use_velocity=False).extract_features(dict(TXN), "user_123")
+        stats = _stats_row()
+        apply_transaction(stats, 500.0, NOW, False, 90.0)
+
+        await store.record_transaction("t4", "user_456", "m1", "d1", NOW, stats)
+        await store.record_transaction("t5", "user_123", "m1", "d1", NOW, stats)
+
+        inputs = await store.read("user_123", "m1", "d1")
+        assert inputs["user_stats"].transaction_count == 4
+        assert inputs["user_stats"].last_transaction_time == NOW
+        assert inputs["merchant_activity_24h"] == 3
+        assert inputs["device_txn_count"] == 8
+        assert inputs["shared_device_count"] == 5
+
+    @pytest.mark.asyncio
+    async def test_sketches_backfilled_and_written_through(self, store):
+        await FeatureExtractor(_mock_db(), fused=True, use_behavior_stats=True,
+                               use_profile_cache=False, feature_store=store, use_velocity=False).extract_features(dict(TXN), "user_123")
+        members = sketch_members("user_123", "m1", "d1", None)
+
+        inputs = await store.read("user_123", "m1", "d1", sketch_members=members)
+        assert store.missing(inputs, with_sketches=True) == set()
+        assert round(inputs["sketches"]["device_users"].count()) == 3
+        assert inputs["sketches"]["merchant_users"] is None
+
+        updated = _device_users_sketch()
+        updated.add("user_999")
+        await store.record_transaction("t4", "user_999", "m1", "d1", NOW, _stats_row("user_999"),
+                                       sketches={"device_users": ("d1", updated)})
+
+        inputs = await store.read("user_123", "m1", "d1", sketch_members=members)
+        assert round(inputs["sketches"]["device_users"].count()) == 4
+
+    @pytest.mark.asyncio
+    async def test_out_of_order_write_through_keeps_the_newer_snapshot(self, store):
+        """Test a write committed first but arriving last does not replace newer stats or sketches"""
+        older_stats, older_sketch = _stats_row(), _device_users_sketch()
+        newer_stats, newer_sketch = _stats_row(), _device_users_sketch()
+        apply_transaction(newer_stats, 500.0, NOW, False, 90.0)
+        newer_sketch.add("user_999")
+
+        await store.record_transaction("t5", "user_123", None, None, NOW, newer_stats,
+                                       sketches={"device_users": ("d1", newer_sketch)})
+        await store.record_transaction("t4", "user_123", None, None, NOW, older_stats,
+                                       sketches={"device_users": ("d1", older_sketch)})
+
+        members = sketch_members("user_123", None, "d1", None)
+        inputs = await store.read("user_123", None, None, sketch_members={"device_users": members["device_users"]})
+        assert inputs["user_stats"].transaction_count == 4
+        assert round(inputs["sketches"]["device_users"].count()) == 4
+
+    @pytest.mark.asyncio
+    async def test_transaction_without_stats_leaves_them(self, store):
+        """Test a transaction not folded into the stats (ML fallback score) keeps the stored stats"""
+        stats = _stats_row()
+        await store.record_transaction("t4", "user_123", None, None, NOW, stats)
+        await store.record_transaction("t5", "user_123", None, None, NOW, None)
+
+        inputs = await store.read("user_123", None, None)
+        assert inputs["user_stats"].transaction_count == stats.transaction_count
+
+    @pytest.mark.asyncio
+    async def test_missing_sketch_is_reported(self, store):
+        inputs = await store.read("user_123", None, "d1", sketch_members=sketch_members("user_123", None, "d1", None))
+        assert "sketches" in store.missing(inputs, with_sketches=True)
+        assert "sketches" not in store.missing(inputs)
+
+    @pytest.mark.asyncio
+    async def test_write_through_does_not_create_partial_device_counts(self, store):
+        await store.record_transaction("t1", "user_123", None, "d9", NOW, _stats_row())
+
+        inputs = await store.read("user_123", None, "d9")
+        assert "device_txn_count" not in inputs
+        assert store.client.keys("test:device:*") == []
+
+    @pytest.mark.asyncio
+    async def test_activity_outside_window_expires(self, store):
+        store.client._set("test:merchant:m1:activity_since", "x")
+        await store.record_transaction("old", "user_456", "m1", None, NOW - timedelta(hours=30), _stats_row())
+        await store.record_transaction("new", "user_456", "m1", None, NOW, _stats_row())
+
+        inputs = await store.read("user_123", "m1", None)
+        assert inputs["merchant_activity_24h"] == 1
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_falls_back_to_postgres(self, store):
+        store.read = AsyncMock(side_effect=ConnectionError("redis down"))
+        db = _mock_db()
+
+        features = await FeatureExtractor(db, fused=True, use_behavior_stats=True,
+                                          use_profile_cache=False, feature_store=store, use_velocity=False).extract_features(dict(TXN), "user_123")
+
+        assert db.execute.await_count == 1
+        assert features["is_known_device"] == 1
+        assert features["user_transaction_count"] == 3
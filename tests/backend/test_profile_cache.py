@@ -0,0 +1,251 @@
+"""
+In-process profile cache: LRU/TTL bounds, single-flight loading and invalidation
+"""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.db.models import Merchant, Transaction
+from app.services import profile_cache
+from app.services.ingestion import FeatureExtractor
+from app.services.profile_cache import AsyncTTLCache
+
+
+class TestAsyncTTLCache:
+    """Test cache bounds, expiry and counters"""
+
+    def test_lru_eviction(self):
+        cache = AsyncTTLCache("test", maxsize=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.peek("a") == (True, 1)  # "b" is now least recently used
+        cache.set("c", 3)
+
+        assert cache.peek("b") == (False, None)
+        assert cache.peek("a") == (True, 1)
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["size"] == 2
+        assert stats["hits"] == 2 and stats["misses"] == 1
+
+    def test_ttl_expiry(self, clock):
+        cache = AsyncTTLCache("test", maxsize=10, ttl_seconds=30, clock=clock)
+        cache.set("a", None)
+        clock.now = 29.9
+        assert cache.peek("a") == (True, None)
+        clock.now = 30.0
+        assert cache.peek("a") == (False, None)
+        assert cache.stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_single_flight(self):
+        cache = AsyncTTLCache("test", maxsize=10, ttl_seconds=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"risk_score": 10.0}
+
+        tasks = [asyncio.create_task(cache.get_or_load("m1", load)) for _ in range(20)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert all(r == {"risk_score": 10.0} for r in results)
+        assert cache.stats()["coalesced"] == 19
+        assert await cache.get_or_load("m1", load) == {"risk_score": 10.0}
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_load_error_is_shared_and_not_cached(self):
+        cache = AsyncTTLCache("test", maxsize=10, ttl_seconds=60)
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("db down")
+
+        tasks = [asyncio.create_task(cache.get_or_load("m1", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(cache) == 0
+        assert cache.stats()["load_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_hands_off_to_waiter(self):
+        cache = AsyncTTLCache("test", maxsize=10, ttl_seconds=60)
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return 7
+
+        leader = asyncio.create_task(cache.get_or_load("k", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await waiter == 7
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_load_skips_caching(self):
+        cache = AsyncTTLCache("test", maxsize=10, ttl_seconds=60)
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return "old"
+
+        task = asyncio.create_task(cache.get_or_load("k", load))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        release.set()
+
+        assert await task == "old"
+        assert cache.peek("k") == (False, None)
+
+
+class TestProfileCacheIntegration:
+    """Test FeatureExtractor lookups and commit-time invalidation"""
+
+    @pytest.mark.asyncio
+    async def test_sequential_merchant_lookup_hits_cache(self):
+        merchant = SimpleNamespace(
+            risk_score=20.0, total_transactions=10, fraud_count=2,
+            avg_transaction_amount=55.0, category="travel",
+        )
+        result = MagicMock()
+        result.scalar_one_or_none.return_value = merchant
+        mock_db = AsyncMock()
+        mock_db.execute.return_value = result
+        extractor = FeatureExtractor(mock_db, fused=False)
+
+        first = await extractor._extract_merchant_features("m1")
+        second = await extractor._extract_merchant_features("m1")
+
+        assert first == second
+        assert mock_db.execute.await_count == 1
+        assert profile_cache.merchant_cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fused_statement_omits_cached_profiles(self):
+        profile_cache.merchant_cache.set("m1", None)
+        profile_cache.device_cache.set("d1", None)
+        profile_cache.device_txn_count_cache.set("d1", 4)
+        extractor = FeatureExtractor(AsyncMock(), fused=True)
+
+        query = extractor._build_fused_query(
+            "user_123", "m1", "d1", load_merchant=False, load_device=False, load_device_count=False
+        )
+        names = set(query.selected_columns.keys())
+
+        assert "merchant_pk" not in names
+        assert "device_pk" not in names
+        assert "device_txn_count" not in names
+        assert {"shared_device_count", "merchant_activity_24h"} <= names
+
+    @staticmethod
+    def _blocked_fused_db(release, statements, error=None):
+        row = SimpleNamespace(
+            transaction_count=0, merchant_pk="m1", merchant_risk_score=20.0, merchant_total_transactions=10,
+            merchant_fraud_count=2, merchant_avg_transaction_amount=55.0, merchant_category="travel",
+            device_pk=None, device_txn_count=0, merchant_activity_24h=0, shared_device_count=0,
+        )
+
+        async def execute(statement):
+            statements.append(statement)
+            await release.wait()
+            if error is not None:
+                raise error
+            result = MagicMock()
+            result.one.return_value = row
+            return result
+
+        db = AsyncMock()
+        db.execute.side_effect = execute
+        return FeatureExtractor(db, fused=True, use_behavior_stats=True, use_sketches=False)
+
+    @pytest.mark.asyncio
+    async def test_fused_misses_are_single_flight(self):
+        release, statements = asyncio.Event(), []
+        extractor = self._blocked_fused_db(release, statements)
+        txn = {"amount": 10.0, "merchant_id": "m1"}
+
+        first = asyncio.create_task(extractor._fetch_fused_inputs(txn, "u1"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(extractor._fetch_fused_inputs(txn, "u2"))
+        sequential = asyncio.create_task(extractor._load_merchant_profile("m1"))
+        await asyncio.sleep(0)
+        release.set()
+        first, second, sequential = await asyncio.gather(first, second, sequential)
+
+        # The merchant is selected once; the second statement leaves it out and the lookup waits for it
+        assert len(statements) == 2
+        assert "merchant_pk" in statements[0].selected_columns.keys()
+        assert "merchant_pk" not in statements[1].selected_columns.keys()
+        assert first["merchant_profile"] == second["merchant_profile"] == sequential
+        assert sequential["risk_score"] == 20.0
+        stats = profile_cache.merchant_cache.stats()
+        assert stats["misses"] == 1 and stats["coalesced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fused_statement_error_reaches_waiters_and_is_not_cached(self):
+        release, statements = asyncio.Event(), []
+        extractor = self._blocked_fused_db(release, statements, error=ConnectionError("db down"))
+
+        fused = asyncio.create_task(extractor._fetch_fused_inputs({"amount": 10.0, "merchant_id": "m1"}, "u1"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(extractor._load_merchant_profile("m1"))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(fused, waiter, return_exceptions=True)
+
+        assert all(isinstance(r, ConnectionError) for r in results)
+        assert len(statements) == 1
+        assert profile_cache.merchant_cache.peek("m1") == (False, None)
+        assert profile_cache.merchant_cache.stats()["load_errors"] == 1
+
+    def test_commit_invalidates_written_profiles(self):
+        merchant_id = uuid.uuid4()
+        device_id = uuid.uuid4()
+        profile_cache.merchant_cache.set(profile_cache.cache_key(merchant_id), {"risk_score": 1.0})
+        profile_cache.device_txn_count_cache.set(profile_cache.cache_key(device_id), 4)
+
+        merchant = Merchant(id=merchant_id)
+        txn = Transaction(device_id=device_id)
+        session = SimpleNamespace(info={}, new=[txn], dirty=[merchant], deleted=[])
+        profile_cache._collect_profile_writes(session, None)
+
+        # Nothing changes before commit
+        assert len(profile_cache.merchant_cache) == 1
+        profile_cache._apply_profile_writes(session)
+
+        assert profile_cache.merchant_cache.peek(profile_cache.cache_key(merchant_id)) == (False, None)
+        assert profile_cache.device_txn_count_cache.peek(profile_cache.cache_key(device_id)) == (True, 5)
+
+    def test_rollback_discards_pending_writes(self):
+        merchant_id = uuid.uuid4()
+        profile_cache.merchant_cache.set(profile_cache.cache_key(merchant_id), None)
+        session = SimpleNamespace(info={}, new=[], dirty=[Merchant(id=merchant_id)], deleted=[])
+
+        profile_cache._collect_profile_writes(session, None)
+        profile_cache._discard_profile_writes(session)
+        profile_cache._apply_profile_writes(session)
+
+        assert profile_cache.merchant_cache.peek(profile_cache.cache_key(merchant_id)) == (True, None)
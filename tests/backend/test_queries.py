@@ -0,0 +1,124 @@
+"""
+Projection-only hot read queries and the endpoints built on them
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.api.v1.endpoints import gnn, transactions
+from app.db import queries
+
+STATEMENTS = {
+    "history": queries.USER_HISTORY,
+    "count": queries.USER_TRANSACTION_COUNT,
+    "page": queries.TRANSACTION_PAGE,
+    "detail": queries.TRANSACTION_DETAIL,
+    "alerts": queries.RECENT_ALERTS,
+    "graph": queries.USER_GRAPH_EDGES,
+}
+USER = SimpleNamespace(id=uuid4())
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+def _db(*results):
+    db = AsyncMock()
+    mocks = []
+    for rows in results:
+        result = MagicMock()
+        result.all.return_value = rows
+        result.first.return_value = rows[0] if rows else None
+        result.scalar.return_value = rows
+        mocks.append(result)
+    db.execute.side_effect = mocks
+    return db
+
+
+class TestStatements:
+    """Test the compiled SQL"""
+
+    @pytest.mark.parametrize("name", sorted(STATEMENTS))
+    def test_never_selects_feature_blob(self, name):
+        sql = str(STATEMENTS[name].compile(dialect=asyncpg.dialect()))
+        assert "transactions.features" not in sql
+        assert "transactions.id," not in sql
+
+    def test_values_are_bound_not_rendered(self):
+        sql = str(queries.TRANSACTION_PAGE.compile(dialect=asyncpg.dialect()))
+        # Same text for every user / page, so the prepared statement is reused
+        assert "LIMIT $" in sql and "OFFSET $" in sql
+        assert "user_id = $" in sql
+
+
+class TestHotReadEndpoints:
+    """Test endpoints issue one statement per result set"""
+
+    @pytest.mark.asyncio
+    async def test_recent_alerts_single_join(self):
+        alert = SimpleNamespace(alert_id=uuid4(), alert_type="fraud", severity="critical", message="m",
+                                created_at=NOW, status="pending", transaction_id="txn_1", amount=10.0,
+                                merchant_id="m1", risk_score=91.0, risk_level=None)
+        db = _db([alert, alert])
+
+        out = await transactions.get_recent_alerts(limit=5, db=db, current_user=USER)
+
+        db.execute.assert_awaited_once()
+        assert db.execute.await_args.args[1] == {"user_id": USER.id, "limit": 5}
+        assert [a.transaction_id for a in out] == ["txn_1", "txn_1"]
+        assert out[0].risk_level == "low"
+
+    @pytest.mark.asyncio
+    async def test_transaction_detail_with_and_without_explanation(self):
+        row = dict(transaction_id="txn_1", amount=10.0, currency=None, merchant_id="m1", device_id=None,
+                   transaction_time=NOW, risk_score=60.0, risk_level="medium", is_fraudulent=False,
+                   confidence_score=None, created_at=NOW)
+        action = {"action": "verify", "priority": "medium", "description": None}
+        explained = SimpleNamespace(**row, explanation_id=uuid4(), summary="s", reasons=None,
+                                    suggested_actions=[action], explanation_confidence=0.8, model_used="llm")
+        plain = SimpleNamespace(**row, explanation_id=None, summary=None, reasons=None, suggested_actions=None,
+                                explanation_confidence=None, model_used=None)
+
+        response = await transactions.get_transaction("txn_1", db=_db([explained]), current_user=USER)
+        assert response.explanation.transaction_id == "txn_1"
+        assert response.explanation.confidence == 0.8
+        assert response.explanation.suggested_actions[0].action == "verify"
+        response = await transactions.get_transaction("txn_1", db=_db([plain]), current_user=USER)
+        assert response.explanation is None
+        assert response.currency == "USD"
+
+        with pytest.raises(Exception) as exc:
+            await transactions.get_transaction("missing", db=_db([]), current_user=USER)
+        assert exc.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_list_transactions_page(self):
+        row = SimpleNamespace(transaction_id="txn_1", amount=10.0, currency="EUR", merchant_id="m1",
+                              transaction_time=NOW, risk_score=5.0, risk_level="low", is_fraudulent=False)
+        db = AsyncMock()
+        count, page = MagicMock(), MagicMock()
+        count.scalar.return_value = 3
+        page.all.return_value = [row]
+        db.execute.side_effect = [count, page]
+
+        response = await transactions.list_transactions(skip=2, limit=1, db=db, current_user=USER)
+
+        assert db.execute.await_args.args[1] == {"user_id": USER.id, "offset": 2, "limit": 1}
+        assert response.total == 3
+        assert response.items[0].currency == "EUR"
+        assert not response.has_more
+
+    @pytest.mark.asyncio
+    async def test_gnn_clusters_from_projected_rows(self):
+        rows = [SimpleNamespace(user_id=USER.id, device_id="d1", merchant_id="m1", risk_score=r,
+                                location_city="Berlin", location_country="DE") for r in (40.0, 60.0)]
+
+        out = await gnn.get_gnn_clusters(db=_db(rows), current_user=USER)
+
+        assert len(out["nodes"]) == 3
+        assert len(out["edges"]) == 2
+        assert out["clusters"][0] == {"id": "0", "type": "user-cluster", "users": 1, "devices": 1,
+                                      "location": "Berlin", "risk": 50.0}
@@ -4,14 +4,18 @@ Service layer tests for FinGuard AI
 
 import pytest
 import asyncio
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 from datetime import datetime, timedelta
 
-from app.services.scoring_orchestrator import ScoringOrchestrator
+import numpy as np
+
+from app.services.scoring_orchestrator import ScoringOrchestrator, scored_by_models
 from app.services.ml_client import MLClient
 from app.services.explain_client import ExplainClient
 from app.services.alerting import AlertingService
+from app.services.feature_schema import ENTITY_KINDS, FEATURE_INDEX, FEATURE_ORDER, SchemaMismatchError, decode, entity_keys
 from app.services.ingestion import FeatureExtractor
+from app.services.upstream import CircuitOpenError
 
 
 class TestScoringOrchestrator:
@@ -75,6 +79,120 @@ class TestScoringOrchestrator:
         assert result["risk_level"] == "low"
         assert "error" in result.get("ml_results", {})
     
+    @pytest.mark.asyncio
+    async def test_process_batch_single_ml_request(self, orchestrator):
+        """Test batch processing scores all rows with one predict_batch call"""
+        matrix = np.zeros((3, len(FEATURE_ORDER)), dtype=np.float32)
+        matrix[:, FEATURE_INDEX["amount"]] = [10.0, 20.0, 30.0]
+        orchestrator.feature_extractor.extract_features_batch = AsyncMock(return_value=matrix)
+        orchestrator.ml_client.predict_batch = AsyncMock(return_value=[
+            {"anomaly_score": a, "graph_risk_score": g} for a, g in ((0.1, 0.1), (0.2, 0.2), (0.9, 0.9))
+        ])
+        orchestrator.explain_client.generate_explanation = AsyncMock(return_value={"summary": "x"})
+        transactions = [{"transaction_id": "t0"}, {"transaction_id": "t1"}, {"amount": 30.0}]
+        
+        batch = await orchestrator.process_batch_transactions(transactions, "user_123")
+        
+        orchestrator.ml_client.predict_batch.assert_awaited_once_with(matrix, entity_keys=ANY)
+        keys = orchestrator.ml_client.predict_batch.await_args.kwargs["entity_keys"]
+        assert keys.shape == (3, len(ENTITY_KINDS))
+        assert (keys[:, 0] == entity_keys({"user_id": "user_123"})[0]).all()
+        orchestrator.ml_client.predict.assert_not_awaited()
+        results = batch["results"]
+        assert [r["risk_score"] for r in results] == [10.0, 20.0, 90.0]
+        assert results[2]["transaction_id"].startswith("txn_")
+        assert results[1]["features"]["amount"] == 20.0
+        orchestrator.explain_client.generate_explanation.assert_awaited_once()
+        assert batch["statistics"]["fraudulent_detected"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_process_batch_falls_back_to_row_requests(self, orchestrator):
+        """Test a failed batch request scores the extracted rows one by one"""
+        matrix = np.zeros((2, len(FEATURE_ORDER)), dtype=np.float32)
+        orchestrator.feature_extractor.extract_features_batch = AsyncMock(return_value=matrix)
+        orchestrator.ml_client.predict_batch = AsyncMock(side_effect=RuntimeError("ML service unavailable"))
+        orchestrator.ml_client.predict = AsyncMock(side_effect=[
+            {"anomaly_score": 0.2, "graph_risk_score": 0.2}, RuntimeError("ML service timeout"),
+        ])
+        orchestrator.feature_extractor.extract_features = AsyncMock()
+        
+        batch = await orchestrator.process_batch_transactions([{"transaction_id": "t0"}, {"transaction_id": "t1"}], "u")
+        
+        # Features are not extracted twice (velocity counters observe each transaction once)
+        orchestrator.feature_extractor.extract_features.assert_not_awaited()
+        assert batch["results"][0]["risk_score"] == 20.0
+        assert batch["results"][1]["error"] == "ML service timeout"
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [SchemaMismatchError("schema v2 != v3"), CircuitOpenError("ml circuit open")])
+    async def test_process_batch_does_not_fan_out_on_permanent_errors(self, orchestrator, error):
+        """Test a schema mismatch or unavailable upstream is raised, not retried as N row requests"""
+        matrix = np.zeros((2, len(FEATURE_ORDER)), dtype=np.float32)
+        orchestrator.feature_extractor.extract_features_batch = AsyncMock(return_value=matrix)
+        orchestrator.ml_client.predict_batch = AsyncMock(side_effect=error)
+        orchestrator.ml_client.predict = AsyncMock()
+        
+        with pytest.raises(type(error)):
+            await orchestrator.process_batch_transactions([{"transaction_id": "t0"}, {"transaction_id": "t1"}], "u")
+        
+        orchestrator.ml_client.predict.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_deadline_substitutes_fallbacks_for_slow_stages(self, orchestrator):
+        """Test a stage past the request deadline is cancelled and replaced by its fallback"""
+        async def slow_predict(**kwargs):
+            await asyncio.sleep(1.0)
+        
+        orchestrator.feature_extractor.extract_features = AsyncMock(return_value={"amount": 10.0})
+        orchestrator.ml_client.predict = slow_predict
+        orchestrator.explain_client.generate_explanation = AsyncMock(return_value={"summary": "x"})
+        
+        with patch("app.services.scoring_orchestrator.settings.SCORING_FALLBACK_RISK_SCORE", 60.0):
+            result = await asyncio.wait_for(
+                orchestrator.process_transaction({"transaction_id": "t1"}, "user_123", deadline_ms=50), timeout=0.5,
+            )
+        
+        # ML fell back to a review score; the explanation had no budget left
+        assert result["risk_score"] == 60.0 and result["risk_level"] == "medium"
+        assert result["ml_results"]["fallback"] is True
+        assert result["explanation"] is None
+        orchestrator.explain_client.generate_explanation.assert_not_awaited()
+        pipeline = result["pipeline"]
+        assert pipeline["fallbacks"] == ["ml", "explanation"]
+        assert set(pipeline["stages_ms"]) == {"features", "ml", "explanation"}
+        assert 40.0 <= pipeline["stages_ms"]["ml"] < 500.0
+        assert not scored_by_models(result)  # kept out of the user's behavior stats
+    
+    @pytest.mark.asyncio
+    async def test_slow_feature_extraction_falls_back_to_default_features(self, orchestrator):
+        """Test feature extraction past the deadline yields schema defaults, rolls back and leaves no ML budget"""
+        async def slow_extract(transaction_data, user_id):
+            await asyncio.sleep(1.0)
+        
+        orchestrator.feature_extractor.extract_features = slow_extract
+        orchestrator.ml_client.predict = AsyncMock(return_value={"anomaly_score": 0.1, "graph_risk_score": 0.1})
+        
+        result = await orchestrator.process_transaction({"transaction_id": "t1", "amount": 42.0}, "u", deadline_ms=20)
+        
+        assert set(FEATURE_ORDER) <= set(result["features"])
+        assert result["features"]["amount"] == 42.0
+        assert result["pipeline"]["fallbacks"] == ["features", "ml", "explanation"]
+        orchestrator.db.rollback.assert_awaited_once()
+        orchestrator.ml_client.predict.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_no_deadline_reports_timings_without_fallbacks(self, orchestrator):
+        orchestrator.feature_extractor.extract_features = AsyncMock(return_value={})
+        orchestrator.ml_client.predict = AsyncMock(return_value={"anomaly_score": 0.1, "graph_risk_score": 0.1})
+        
+        with patch("app.services.scoring_orchestrator.settings.SCORING_DEADLINE_MS", 0.0):
+            result = await orchestrator.process_transaction({}, "user_123")
+        
+        assert result["pipeline"]["deadline_ms"] is None
+        assert result["pipeline"]["fallbacks"] == []
+        assert set(result["pipeline"]["stages_ms"]) == {"features", "ml"}
+        assert scored_by_models(result)
+    
     def test_calculate_combined_risk_score(self, orchestrator):
         """Test risk score calculation"""
         ml_results = {
@@ -137,6 +255,25 @@ class TestMLClient:
             assert "error" in result
 
 
+    @pytest.mark.asyncio
+    async def test_predict_batch_splits_columns(self, ml_client):
+        """Test the column-oriented batch response becomes one dict per row"""
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "rows": 2, "anomaly_score": [0.1, 0.9], "graph_risk_score": [0.2, 0.8],
+            "risk_level": ["low", "high"], "features_used": list(FEATURE_ORDER),
+        }
+        matrix = np.ones((2, len(FEATURE_ORDER)), dtype=np.float32)
+        with patch("httpx.AsyncClient.post", AsyncMock(return_value=response)) as mock_post:
+            rows = await ml_client.predict_batch(matrix)
+        
+        assert mock_post.await_args.args[0].endswith("/predict_batch")
+        np.testing.assert_array_equal(decode(mock_post.await_args.kwargs["content"]), matrix)
+        assert rows[1]["anomaly_score"] == 0.9
+        assert rows[1]["risk_level"] == "high"
+        assert rows[0]["features_used"] == list(FEATURE_ORDER)
+
+
 class TestExplainClient:
     """Test explanation client service"""
     
@@ -241,6 +378,63 @@ class TestFeatureExtractor:
         assert "transaction_type" in features
         assert features["amount"] == 150.0
     
+    @pytest.mark.asyncio
+    async def test_failed_extraction_still_counts_velocity(self):
+        """Test a failed extraction returns the same fallback features as a timed-out one, velocity included"""
+        extractor = FeatureExtractor(AsyncMock(), fused=False, use_velocity=True)
+        extractor._extract_features_sequential = AsyncMock(side_effect=RuntimeError("connection reset"))
+        
+        with patch("app.services.ingestion.velocity.observe_transaction", return_value={"user_txn_count_1m": 3.0}) as observe:
+            features = await extractor.extract_features({"amount": 5.0}, "user_123")
+        
+        observe.assert_called_once_with({"amount": 5.0}, "user_123")
+        assert features["user_txn_count_1m"] == 3.0
+        extractor.db.rollback.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_extract_features_fused_matches_window_statistics(self):
+        """Fused aggregates reproduce the per-row window statistics"""
+        import numpy as np
+        from types import SimpleNamespace
+        
+        now = datetime.now()
+        amounts = [10.0, 20.0, 60.0]
+        times = [now - timedelta(hours=1), now - timedelta(hours=5), now - timedelta(hours=25)]
+        row = SimpleNamespace(
+            txn_count=3,
+            avg_amount=np.mean(amounts),
+            avg_amount_sq=np.mean(np.square(amounts)),
+            first_time=times[-1],
+            last_time=times[0],
+            fraud_count=1,
+            avg_risk_score=40.0,
+            merchant_pk="m1", merchant_risk_score=20.0, merchant_total_transactions=10,
+            merchant_fraud_count=2, merchant_avg_transaction_amount=55.0, merchant_category="travel",
+            device_pk=None, device_risk_score=None, device_associated_accounts=None,
+            device_is_suspicious=None, device_type=None,
+            device_txn_count=0, shared_device_count=5, merchant_activity_24h=2,
+        )
+        result = MagicMock()
+        result.one.return_value = row
+        mock_db = AsyncMock()
+        mock_db.execute.return_value = result
+        
+        extractor = FeatureExtractor(mock_db, fused=True, use_behavior_stats=False, use_profile_cache=False,
+                                     use_velocity=False, use_sketches=False)
+        features = await extractor.extract_features(
+            {"amount": 30.0, "merchant_id": "m1", "device_id": "d1"}, "user_123"
+        )
+        
+        mock_db.execute.assert_awaited_once()
+        assert features["user_transaction_count"] == 3
+        assert features["user_amount_std"] == pytest.approx(np.std(amounts))
+        assert features["user_frequency_days"] == pytest.approx(np.mean([4.0, 20.0]) / 24)
+        assert features["user_fraud_rate"] == pytest.approx(1 / 3)
+        assert features["merchant_fraud_rate"] == pytest.approx(0.2)
+        assert features["is_known_device"] == 0
+        assert features["shared_device_count"] == 5
+        assert features["graph_risk_raw"] == pytest.approx(0.3)
+    
     def test_extract_temporal_features(self, feature_extractor):
         """Test temporal feature extraction"""
         features = feature_extractor._extract_temporal_features({})
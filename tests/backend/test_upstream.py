@@ -0,0 +1,293 @@
+"""
+Pooled upstream clients: circuit breaker transitions, fail-fast calls,
+balanced, hedged calls over ML replicas and adaptive concurrency limits
+"""
+
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from app.services import upstream
+from app.services.upstream import (
+    AdaptiveLimiter, CircuitBreaker, CircuitOpenError, ConcurrencyLimitExceeded, ReplicaSet, UpstreamClient,
+)
+
+
+def _client(handler, clock=None):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10, clock=clock or (lambda: 0.0))
+    return UpstreamClient(
+        "test", "http://upstream", timeout=1, max_connections=4, max_keepalive_connections=2,
+        breaker=breaker, transport=httpx.MockTransport(handler),
+    )
+
+
+class TestCircuitBreaker:
+    """Test closed -> open -> half-open -> closed"""
+
+    def test_opens_after_consecutive_failures_and_probes_once(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        breaker.record_success()  # resets the streak
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        clock.now = 10.0
+        breaker.before_call()  # the probe
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "trips": 1, "rejected": 2}
+
+    def test_failed_probe_reopens(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+        breaker.before_call()
+        breaker.record_failure()
+        clock.now = 15.0
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+
+class TestUpstreamClient:
+    """Test the breaker around real httpx calls"""
+
+    @pytest.mark.asyncio
+    async def test_server_errors_open_the_circuit_and_calls_fail_fast(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503)
+
+        client = _client(handler)
+        for _ in range(2):
+            assert (await client.post("/predict")).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await client.post("/predict")
+        # Health checks bypass the breaker
+        assert (await client.get("/health", guarded=False)).status_code == 503
+
+        assert calls == ["/predict", "/predict", "/health"]
+        stats = client.stats()
+        assert stats["requests"] == 3
+        assert stats["breaker"]["state"] == "open" and stats["breaker"]["rejected"] == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_transport_errors_count_and_client_errors_do_not(self):
+        responses = iter([httpx.Response(422), httpx.ConnectError("refused"), httpx.Response(200)])
+
+        def handler(request):
+            outcome = next(responses)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        client = _client(handler)
+        assert (await client.post("/predict")).status_code == 422
+        assert client.breaker.failures == 0
+        with pytest.raises(httpx.ConnectError):
+            await client.post("/predict")
+        assert client.breaker.failures == 1
+        assert (await client.post("/predict")).status_code == 200
+        assert client.breaker.failures == 0
+        await client.close()
+
+
+def _stub_replica(name, latency, calls, status=200):
+    """A replica whose stub ML server answers after `latency` seconds"""
+    async def handler(request):
+        calls.append(name)
+        await asyncio.sleep(latency)
+        return httpx.Response(status, json={"replica": name})
+
+    return UpstreamClient(
+        name, f"http://{name}", timeout=5, max_connections=4, max_keepalive_connections=2,
+        breaker=CircuitBreaker(name, failure_threshold=5, reset_seconds=10), transport=httpx.MockTransport(handler),
+    )
+
+
+def _replica_set(replicas, max_outstanding=10):
+    return ReplicaSet(
+        "ml", replicas, hedge_percentile=95.0, min_hedge_delay=0.01, max_outstanding=max_outstanding,
+        rng=random.Random(0),
+    )
+
+
+class TestReplicaSet:
+    """Test least-outstanding picks and hedged calls across stub ML replicas"""
+
+    @pytest.mark.asyncio
+    async def test_calls_go_to_the_less_loaded_replica(self):
+        calls = []
+        replicas = _replica_set([_stub_replica("a", 0.05, calls), _stub_replica("b", 0.05, calls)])
+        replicas.replicas[0].outstanding = 3  # "a" is busy
+
+        response = await replicas.post("/predict")
+
+        assert response.json() == {"replica": "b"}
+        await replicas.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_replica_is_hedged_on_another(self):
+        calls = []
+        slow, fast = _stub_replica("slow", 1.0, calls), _stub_replica("fast", 0.0, calls)
+        replicas = _replica_set([slow, fast])
+        fast.outstanding = 1  # the first pick is the idle slow replica
+
+        response = await asyncio.wait_for(replicas.post("/predict", hedge=True), timeout=0.5)
+
+        assert response.json() == {"replica": "fast"}
+        assert calls == ["slow", "fast"]
+        assert replicas.hedges == 1 and replicas.hedge_wins == 1
+        await asyncio.sleep(0)
+        assert slow.outstanding == 0  # the losing call was cancelled
+        await replicas.close()
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_past_the_outstanding_cap(self):
+        calls = []
+        slow, fast = _stub_replica("slow", 0.05, calls), _stub_replica("fast", 0.0, calls)
+        replicas = _replica_set([slow, fast], max_outstanding=1)
+        fast.outstanding = 1
+
+        response = await replicas.post("/predict", hedge=True)
+
+        assert response.json() == {"replica": "slow"}
+        assert calls == ["slow"]
+        assert replicas.hedges == 0 and replicas.hedges_suppressed == 1
+        await replicas.close()
+
+    @pytest.mark.asyncio
+    async def test_replicas_with_open_circuits_are_skipped(self):
+        calls = []
+        down, up = _stub_replica("down", 0.0, calls, status=503), _stub_replica("up", 0.0, calls)
+        replicas = _replica_set([down, up])
+        for _ in range(5):
+            down.breaker.record_failure()
+
+        for _ in range(3):
+            assert (await replicas.post("/predict")).json() == {"replica": "up"}
+        assert calls == ["up"] * 3
+        await replicas.close()
+
+    def test_hedge_delay_follows_the_latency_percentile(self):
+        replicas = _replica_set([_stub_replica("a", 0.0, [])])
+        assert replicas.hedge_delay() == 0.01
+        replicas._latencies.extend([0.001] * 95 + [0.5] * 5)
+        assert replicas.hedge_delay() == 0.5
+
+
+def _limiter(initial=4, queue_timeout=0.05, max_queue=10, clock=None):
+    return AdaptiveLimiter(
+        "test", initial_limit=initial, min_limit=2, max_limit=8, latency_tolerance=2.0, backoff=0.5,
+        queue_timeout=queue_timeout, max_queue=max_queue, clock=clock or (lambda: 0.0),
+    )
+
+
+class TestAdaptiveLimiter:
+    """Test AIMD limit changes, queueing and shedding"""
+
+    def test_slow_and_failed_calls_shrink_the_limit_fast_calls_grow_it(self, clock):
+        limiter = _limiter(clock=clock)
+        limiter.in_flight = 2  # two calls held throughout
+        for _ in range(4):
+            limiter.in_flight += 1
+            limiter.release(0.01)  # fast calls at half the limit or more
+        assert limiter.limit > 4.0
+
+        limiter.release(0.1)  # 10x the baseline
+        limit = limiter.limit
+        assert limit < 4.0
+        limiter.in_flight += 1
+        limiter.release(0.1, ok=False)  # same slow burst: no second decrease yet
+        assert limiter.limit == limit
+
+        clock.now = 1.0
+        for _ in range(5):
+            limiter.in_flight += 1
+            limiter.release(0.01, ok=False)
+            clock.now += 1.0
+        assert limiter.limit == 2.0  # floored at min_limit
+        assert limiter.stats()["min_latency_ms"] == 10.0
+
+    @pytest.mark.asyncio
+    async def test_excess_calls_wait_then_are_shed(self):
+        limiter = _limiter(initial=2, max_queue=1)
+        await limiter.acquire()
+        await limiter.acquire()
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire()  # the queue is full
+        limiter.release(None)
+        await waiting  # handed the freed slot
+        assert limiter.in_flight == 2
+
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire()  # nothing frees up within the queue timeout
+        stats = limiter.stats()
+        assert stats["rejected"] == 2 and stats["queued"] == 2 and stats["waiting"] == 0
+
+    @pytest.mark.asyncio
+    async def test_client_calls_past_the_limit_are_refused(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request.url.path)
+            await asyncio.sleep(0.1)
+            return httpx.Response(200)
+
+        client = _client(handler)
+        client.limiter = _limiter(initial=2, queue_timeout=0.01)
+        results = await asyncio.gather(*(client.post("/predict") for _ in range(3)), return_exceptions=True)
+
+        assert [type(r) for r in results].count(ConcurrencyLimitExceeded) == 1
+        assert len(calls) == 2
+        # Health checks are not limited
+        assert (await client.get("/health", guarded=False)).status_code == 200
+        assert client.stats()["limiter"]["rejected"] == 1
+        assert client.limiter.in_flight == 0
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_rejections_do_not_adapt_the_limit(self):
+        client = _client(lambda request: httpx.Response(503))
+        client.limiter = _limiter(initial=4)
+        for _ in range(2):
+            assert (await client.post("/predict")).status_code == 503
+        limit, baseline = client.limiter.limit, client.limiter.stats()["min_latency_ms"]
+
+        for _ in range(10):
+            with pytest.raises(CircuitOpenError):
+                await client.post("/predict")
+
+        stats = client.stats()
+        assert stats["breaker"]["rejected"] == 10
+        assert client.limiter.limit == limit
+        assert stats["limiter"]["min_latency_ms"] == baseline
+        assert stats["limiter"]["in_flight"] == 0
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_refusals_inside_a_limiter_slot_release_it_without_an_outcome(self):
+        limiter = _limiter(initial=4)
+
+        async def refused():
+            raise CircuitOpenError("test circuit open")
+
+        with pytest.raises(CircuitOpenError):
+            await upstream._limited(limiter, refused)
+
+        assert limiter.in_flight == 0 and limiter.limit == 4.0
+        assert limiter.stats()["min_latency_ms"] is None
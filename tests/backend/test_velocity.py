@@ -0,0 +1,115 @@
+"""
+Multi-window velocity counters: window expiry, bounded memory and feature output
+"""
+
+import random
+
+import pytest
+
+from app.services import velocity
+from app.services.velocity import VelocityTracker
+
+T0 = 1_700_000_000.0 - (1_700_000_000.0 % 3600)  # start of an hour
+
+
+def _brute_force(events, now):
+    """Counts / sums over the bucketed windows, computed from the raw event list"""
+    minute, hour = int(now // 60), int(now // 3600)
+    spans = {"1m": 1, "10m": 10, "1h": 60}
+    result = {}
+    for window, span in spans.items():
+        selected = [a for t, a in events if minute - span < int(t // 60) <= minute]
+        result[window] = (len(selected), sum(selected))
+    selected = [a for t, a in events if hour - 24 < int(t // 3600) <= hour]
+    result["24h"] = (len(selected), sum(selected))
+    return result
+
+
+class TestVelocityTracker:
+    """Test window maintenance and eviction"""
+
+    def test_windows_expire(self):
+        tracker = VelocityTracker(max_keys=10, idle_ttl_seconds=90000)
+        tracker.record("k", 10.0, T0)
+        tracker.record("k", 5.0, T0 + 30)
+
+        assert tracker.read("k", T0 + 59)["1m"] == (2, 15.0)
+        assert tracker.read("k", T0 + 60)["1m"] == (0, 0.0)
+        assert tracker.read("k", T0 + 9 * 60)["10m"] == (2, 15.0)
+        assert tracker.read("k", T0 + 10 * 60)["10m"] == (0, 0.0)
+        assert tracker.read("k", T0 + 3599)["1h"] == (2, 15.0)
+        assert tracker.read("k", T0 + 3600)["1h"] == (0, 0.0)
+        assert tracker.read("k", T0 + 23 * 3600 + 3599)["24h"] == (2, 15.0)
+        assert tracker.read("k", T0 + 24 * 3600)["24h"] == (0, 0.0)
+
+    @pytest.mark.parametrize("mean_gap", [0.5, 20.0, 400.0])
+    def test_matches_brute_force(self, mean_gap):
+        rng = random.Random(3)
+        tracker = VelocityTracker(max_keys=10, idle_ttl_seconds=10 ** 9)
+        events, now = [], T0
+        for _ in range(600):
+            now += rng.expovariate(1 / mean_gap)
+            amount = round(rng.uniform(1, 500), 2)
+            events.append((now, amount))
+            totals = tracker.record("k", amount, now)
+            expected = _brute_force(events, now)
+            for window in velocity.WINDOWS:
+                assert totals[window][0] == expected[window][0], window
+                assert totals[window][1] == pytest.approx(expected[window][1]), window
+
+    def test_capacity_evicts_least_recently_used(self):
+        tracker = VelocityTracker(max_keys=2, idle_ttl_seconds=90000)
+        tracker.record("a", 1.0, T0)
+        tracker.record("b", 1.0, T0 + 1)
+        tracker.record("a", 1.0, T0 + 2)
+        tracker.record("c", 1.0, T0 + 3)
+
+        assert len(tracker) == 2
+        assert tracker.read("b", T0 + 4)["1h"] == (0, 0.0)
+        assert tracker.read("a", T0 + 4)["1h"] == (2, 2.0)
+        assert tracker.stats()["evictions"] == 1
+
+    def test_idle_keys_are_evicted(self):
+        tracker = VelocityTracker(max_keys=100, idle_ttl_seconds=600)
+        tracker.record("idle", 1.0, T0)
+        tracker.record("busy", 1.0, T0 + 500)
+        tracker.record("busy", 1.0, T0 + 601)
+
+        assert len(tracker) == 1
+        assert tracker.stats()["idle_evictions"] == 1
+
+
+class TestVelocityFeatures:
+    """Test feature output per entity kind"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_tracker(self, monkeypatch):
+        monkeypatch.setattr(velocity, "tracker", VelocityTracker(max_keys=100, idle_ttl_seconds=90000))
+
+    def test_card_testing_burst(self):
+        txn = {"amount": 1.0, "device_id": "d1", "merchant_id": "m1", "ip_address": "10.0.0.1"}
+        for i in range(5):
+            features = velocity.observe_transaction(txn, f"user_{i}", now=T0 + i)
+
+        # Five users on one device / IP within a minute
+        assert features["device_txn_count_1m"] == 5
+        assert features["ip_txn_count_1m"] == 5
+        assert features["merchant_amount_sum_10m"] == pytest.approx(5.0)
+        assert features["user_txn_count_1m"] == 1
+
+    def test_burst_adds_graph_risk(self):
+        txn = {"amount": 1.0, "device_id": "d1", "merchant_id": "m1"}
+        risks = [velocity.burst_risk(velocity.observe_transaction(txn, f"user_{i}", now=T0 + i)) for i in range(5)]
+
+        # The fifth transaction on one device within a minute is a burst (VELOCITY_BURST_1M)
+        assert risks == [0.0, 0.0, 0.0, 0.0, pytest.approx(0.3)]
+        # Busy merchants alone are not
+        assert velocity.burst_risk({"merchant_txn_count_1m": 100}) == 0.0
+
+    def test_missing_entities_get_zeros(self):
+        features = velocity.observe_transaction({"amount": 20.0}, "user_1", now=T0)
+
+        assert len(features) == len(velocity.ENTITY_KINDS) * len(velocity.WINDOWS) * 2
+        assert features["user_txn_count_24h"] == 1
+        assert features["ip_txn_count_24h"] == 0
+        assert features["device_amount_sum_1h"] == 0.0
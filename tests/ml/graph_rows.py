@@ -0,0 +1,15 @@
+"""
+Feature rows and entity keys for the entity-graph and embedding-cache tests
+"""
+
+import numpy as np
+
+N_FEATURES = 3
+
+
+def entity_keys(user=0, device=0, merchant=0, ip=0):
+    return np.array([user, device, merchant, ip], dtype=np.uint64)
+
+
+def add_row(graph, value, keys):
+    graph.add(np.full((1, N_FEATURES), value, dtype=np.float32), keys.reshape(1, -1))
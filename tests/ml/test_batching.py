@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ml.batching import Histogram, MicroBatcher, split_columns
+
+
+def _score(calls):
+    def score_batch(matrix):
+        calls.append(len(matrix))
+        return {"amount": matrix[:, 0].tolist(), "features_used": ["amount"]}
+    return score_batch
+
+
+def _row(value):
+    return np.array([[value, 0.0]], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_rows_share_batches():
+    calls = []
+    batcher = MicroBatcher(_score(calls), max_batch_size=4, max_wait_ms=50)
+    try:
+        results = await asyncio.gather(*(batcher.submit(_row(i)) for i in range(10)))
+    finally:
+        await batcher.stop()
+
+    assert calls == [4, 4, 2]
+    # Each caller gets its own row back
+    assert [r["amount"] for r in results] == list(range(10))
+    assert results[0]["features_used"] == ["amount"]
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == 3
+    assert stats["batch_size"]["buckets"]["4"] == 3
+    assert stats["queue_wait_ms"]["count"] == 10
+
+
+@pytest.mark.asyncio
+async def test_lone_row_flushes_after_max_wait():
+    calls = []
+    batcher = MicroBatcher(_score(calls), max_batch_size=64, max_wait_ms=5)
+    try:
+        result = await asyncio.wait_for(batcher.submit(_row(7.0)), timeout=1.0)
+    finally:
+        await batcher.stop()
+    assert result["amount"] == 7.0
+    assert calls == [1]
+    assert batcher.stats()["queue_wait_ms"]["sum"] >= 4.0
+
+
+@pytest.mark.asyncio
+async def test_scoring_error_reaches_every_caller():
+    def broken(matrix):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(broken, max_batch_size=8, max_wait_ms=5)
+    try:
+        results = await asyncio.gather(*(batcher.submit(_row(i)) for i in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # The scheduler keeps serving after a failed batch
+        batcher.score_batch = _score([])
+        assert (await batcher.submit(_row(1.0)))["amount"] == 1.0
+    finally:
+        await batcher.stop()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 2, 4))
+    for value in (1, 2, 3, 9):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 1, "2": 2, "4": 3, "+Inf": 4}
+    assert snapshot["sum"] == 15 and snapshot["count"] == 4
+
+
+def test_split_columns():
+    rows = split_columns({"a": [1, 2], "b": ["x", "y"], "features_used": ["f"]}, 2)
+    assert rows == [{"a": 1, "b": "x", "features_used": ["f"]}, {"a": 2, "b": "y", "features_used": ["f"]}]
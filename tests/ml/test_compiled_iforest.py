@@ -0,0 +1,66 @@
+import pickle
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from ml import inference
+from ml.compiled_iforest import CompiledIsolationForest
+from ml.training.export_isolation_forest import export_isolation_forest
+
+N_FEATURES = 10
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(600, N_FEATURES)), rng.normal(scale=3.0, size=(400, N_FEATURES))
+
+
+@pytest.mark.parametrize("params", [
+    {"n_estimators": 200, "contamination": 0.01},
+    {"n_estimators": 40, "max_features": 0.5},
+    {"n_estimators": 40, "max_samples": 16, "bootstrap": True},
+    {"n_estimators": 10, "max_samples": 1},
+])
+def test_scores_are_bit_identical(rows, params):
+    train, X = rows
+    X[3, 2] = np.nan
+    model = IsolationForest(random_state=42, **params).fit(train)
+    compiled = CompiledIsolationForest.from_sklearn(model)
+
+    assert np.array_equal(compiled.score_samples(X), model.score_samples(X))
+    assert np.array_equal(compiled.decision_function(X), model.decision_function(X))
+    assert np.array_equal(compiled.score_samples(X[:1]), model.score_samples(X[:1]))
+
+
+def test_smaller_than_the_pickled_forest(rows):
+    model = IsolationForest(n_estimators=200, random_state=0).fit(rows[0])
+    assert CompiledIsolationForest.from_sklearn(model).nbytes < len(pickle.dumps(model))
+
+
+def test_rejects_wrong_width(rows):
+    compiled = CompiledIsolationForest.from_sklearn(IsolationForest(n_estimators=5, random_state=0).fit(rows[0]))
+    with pytest.raises(ValueError):
+        compiled.score_samples(np.zeros((2, N_FEATURES + 1)))
+
+
+def test_loader_serves_export_or_compiles_pickle(tmp_path, monkeypatch, rows):
+    train, X = rows
+    model = IsolationForest(n_estimators=30, random_state=0).fit(train)
+    joblib.dump(model, tmp_path / "isolation_forest.pkl")
+    expected = inference._iforest_scores(X, model, None)
+
+    compiled, _ = inference._read_iforest(str(tmp_path))
+    assert isinstance(compiled, CompiledIsolationForest)
+    assert np.array_equal(inference._iforest_scores(X, compiled, None), expected)
+
+    monkeypatch.setenv("IFOREST_COMPILE", "0")
+    assert isinstance(inference._read_iforest(str(tmp_path))[0], IsolationForest)
+
+    export_isolation_forest(model, str(tmp_path / "isolation_forest.npz"))
+    (tmp_path / "isolation_forest.pkl").unlink()
+    exported, _ = inference._read_iforest(str(tmp_path))
+    assert isinstance(exported, CompiledIsolationForest)
+    assert np.array_equal(inference._iforest_scores(X, exported, None), expected)
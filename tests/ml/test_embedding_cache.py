@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from ml import inference
+from ml.embedding_cache import EmbeddingCache
+from ml.entity_graph import EntityGraph
+
+from graph_rows import N_FEATURES, add_row, entity_keys
+
+
+def _cache(graph):
+    cache = EmbeddingCache(graph.capacity)
+    graph.subscribe(cache.mark)
+    return cache
+
+
+def _refresh(cache, owner="model"):
+    slots, nodes, versions = cache.pending(100)
+    return cache.put(owner, slots, nodes, versions, np.stack([np.full(2, s, np.float32) for s in slots]))
+
+
+def test_graph_reports_added_nodes_and_changed_neighborhoods():
+    graph = EntityGraph(N_FEATURES, 4, capacity=4, fanout=(4,))
+    calls = []
+    graph.subscribe(lambda added, touched: calls.append((added, sorted(touched))))
+
+    add_row(graph, 0, entity_keys(user=1))
+    add_row(graph, 1, entity_keys(user=1, merchant=2))
+    add_row(graph, 2, entity_keys(merchant=2))
+    for i in range(2):
+        add_row(graph, 3 + i, entity_keys(ip=9))  # the second evicts slot 0
+
+    assert calls == [([0], []), ([1], [0]), ([2], [1]), ([3], []), ([0], [1, 3])]
+
+
+def test_refresh_fills_the_cache_and_clears_the_queue():
+    graph = EntityGraph(N_FEATURES, 4, fanout=(4,))
+    cache = _cache(graph)
+    cache.bind("model", 2, range(graph.size))
+    for i in range(3):
+        add_row(graph, i, entity_keys(user=1))
+    assert cache.stats()["pending"] == 3
+
+    assert _refresh(cache) == 3
+
+    embeddings, valid = cache.get(np.array([0, 2]))
+    assert valid.all()
+    np.testing.assert_array_equal(embeddings[:, 0], [0.0, 2.0])
+    stats = cache.stats()
+    assert stats["pending"] == 0 and stats["rows"] == 3 and stats["hits"] == 2
+
+
+def test_changed_neighborhood_keeps_serving_the_stale_row_until_refreshed():
+    graph = EntityGraph(N_FEATURES, 4, fanout=(4,))
+    cache = _cache(graph)
+    cache.bind("model", 2, [])
+    add_row(graph, 0, entity_keys(user=1))
+    _refresh(cache)
+
+    add_row(graph, 1, entity_keys(user=1))
+
+    _, valid = cache.get(np.array([0, 1]))
+    assert valid.tolist() == [True, False]
+    stats = cache.stats()
+    assert stats["pending"] == 2 and stats["stale"] == 1
+
+
+def test_put_discards_embeddings_of_reused_slots_and_other_models():
+    graph = EntityGraph(N_FEATURES, 4, capacity=1, fanout=(4,))
+    cache = _cache(graph)
+    cache.bind("model", 2, [])
+    add_row(graph, 0, entity_keys(user=1))
+    slots, nodes, versions = cache.pending(10)
+    add_row(graph, 1, entity_keys(user=2))  # slot 0 now holds another transaction
+
+    assert cache.put("model", slots, nodes, versions, np.zeros((1, 2), np.float32)) == 0
+    assert _refresh(cache, owner="old model") == 0
+    assert cache.get(np.array([0]))[1].tolist() == [False]
+
+    assert cache.bind("new model", 2, range(graph.size))
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_cached_gnn_scores_match_full_neighborhood_scoring(monkeypatch):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("torch_geometric")
+    from ml.training.train_gnn import FraudGNN
+
+    n = len(inference.feature_schema.FEATURE_ORDER)
+    torch.manual_seed(0)
+    gnn = FraudGNN(n).eval()
+    graph = EntityGraph(n, 4, fanout=(10, 5))
+    cache = _cache(graph)
+    monkeypatch.setattr(inference, "entity_graph", graph)
+    monkeypatch.setattr(inference, "GNN_EMBEDDING_REFRESH_INTERVAL", 0.0)
+    rng = np.random.default_rng(0)
+    # A chain query -> a (user 1) -> b (merchant 7): both paths sample the same two hops
+    graph.add(rng.normal(size=(1, n)).astype(np.float32), entity_keys(merchant=7).reshape(1, -1))
+    graph.add(rng.normal(size=(1, n)).astype(np.float32), entity_keys(user=1, merchant=7).reshape(1, -1))
+    X = rng.normal(size=(2, n)).astype(np.float32)
+    keys = np.stack([entity_keys(user=1), entity_keys()])
+
+    monkeypatch.setattr(inference, "embedding_cache", None)
+    full = inference._gnn_scores(X, gnn, n, keys)
+    monkeypatch.setattr(inference, "embedding_cache", cache)
+    missed = inference._gnn_scores(X, gnn, n, keys)
+    hit = inference._gnn_scores(X, gnn, n, keys)
+
+    np.testing.assert_allclose(missed, full, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(hit, full, rtol=1e-5, atol=1e-6)
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
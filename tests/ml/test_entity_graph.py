@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from ml import inference
+from ml.entity_graph import EntityGraph
+
+from graph_rows import N_FEATURES, add_row, entity_keys
+
+
+def test_neighbors_are_newest_first_and_alternate_entities():
+    graph = EntityGraph(N_FEATURES, 4, fanout=(3,))
+    for i in range(5):
+        add_row(graph, i, entity_keys(user=1))        # slots 0-4
+    for i in range(5):
+        add_row(graph, 10 + i, entity_keys(merchant=7))  # slots 5-9
+
+    slots, edges = graph.sample(entity_keys(user=1, merchant=7))
+
+    assert slots == [4, 9, 3]
+    assert edges == [(1, 0), (2, 0), (3, 0)]
+
+
+def test_fanout_bounds_the_subgraph_whatever_the_degree():
+    graph = EntityGraph(N_FEATURES, 4, entity_history=1000, fanout=(4, 2))
+    for i in range(500):
+        add_row(graph, i, entity_keys(user=1 + i % 3, merchant=99, ip=1000 + i))
+
+    slots, edges = graph.sample(entity_keys(user=1, merchant=99))
+
+    assert len(slots) <= graph.max_subgraph_nodes - 1 == 4 + 4 * 2
+    assert len(set(slots)) == len(slots)
+    # Second-hop edges point at first-hop nodes, not at the transaction
+    assert {parent for _, parent in edges} == {0, 1, 2, 3, 4}
+
+
+def test_disjoint_union_offsets_each_neighborhood():
+    graph = EntityGraph(N_FEATURES, 4, fanout=(2,))
+    for i in range(3):
+        add_row(graph, i + 1, entity_keys(user=5))
+    rows = np.array([[100.0] * N_FEATURES, [200.0] * N_FEATURES, [300.0] * N_FEATURES], dtype=np.float32)
+    keys = np.stack([entity_keys(user=5), entity_keys(), entity_keys(user=5)])
+
+    x, edge_index, targets = graph.subgraph_batch(rows, keys)
+
+    assert targets.tolist() == [0, 3, 4]
+    np.testing.assert_array_equal(x[targets], rows)
+    np.testing.assert_array_equal(x[[1, 2, 5, 6], 0], [3.0, 2.0, 3.0, 2.0])
+    assert edge_index.tolist() == [[1, 2, 5, 6], [0, 0, 4, 4]]
+
+
+def test_eviction_drops_old_transactions_and_entities():
+    graph = EntityGraph(N_FEATURES, 4, capacity=4, fanout=(10,))
+    for i in range(10):
+        add_row(graph, i, entity_keys(user=1, ip=100 + i))
+    graph.add(np.zeros((1, N_FEATURES), np.float32), entity_keys().reshape(1, -1))  # no entity: skipped
+
+    stats = graph.stats()
+    assert stats["nodes"] == 4 and stats["added"] == 10
+    assert stats["entities"] == 1 + 4  # the user and the four live IPs
+    slots, _ = graph.sample(entity_keys(user=1))
+    assert sorted(graph.features[slots, 0].tolist()) == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_gnn_scores_each_row_on_its_neighborhood(monkeypatch):
+    torch = pytest.importorskip("torch")
+    graph = EntityGraph(len(inference.feature_schema.FEATURE_ORDER), 4, fanout=(5,))
+    monkeypatch.setattr(inference, "entity_graph", graph)
+    X = np.zeros((2, len(inference.feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    keys = np.stack([entity_keys(device=3), entity_keys(device=4)])
+    for _ in range(3):
+        graph.add(X[:1], keys[:1])
+
+    def in_degree_gnn(x, edge_index):
+        degree = torch.zeros(x.shape[0]).index_add_(0, edge_index[1], torch.ones(edge_index.shape[1]))
+        return (degree / 10.0).reshape(-1, 1)
+
+    np.testing.assert_allclose(inference._gnn_scores(X, in_degree_gnn, None, keys), [0.3, 0.0])
+    np.testing.assert_allclose(inference._gnn_scores(X, in_degree_gnn), [0.0, 0.0])
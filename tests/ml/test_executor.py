@@ -0,0 +1,101 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+
+from ml.executor import ExecutorSaturated, InferenceExecutor
+
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
+
+import server  # noqa: E402
+from pipelines import feature_schema  # noqa: E402
+
+HEADERS = {"Content-Type": feature_schema.CONTENT_TYPE}
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_off_the_event_loop():
+    executor = InferenceExecutor(workers=2, max_pending=2)
+    try:
+        job = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        # The loop was free while the job slept in the pool
+        assert time.perf_counter() - start < 0.2
+        await job
+        assert executor.stats()["completed"] == 1
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_saturated():
+    release = threading.Event()
+    executor = InferenceExecutor(workers=1, max_pending=1)
+    try:
+        job = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(sum, [1, 2])
+        release.set()
+        assert await job
+        assert await executor.run(sum, [1, 2]) == 3
+        assert executor.stats()["rejected"] == 1
+        assert executor.stats()["pending"] == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_runs_module_functions():
+    executor = InferenceExecutor(workers=1, kind="process")
+    try:
+        assert await executor.run(pow, 2, 10) == 1024
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_health_answers_while_inference_is_busy(monkeypatch):
+    release = threading.Event()
+
+    def blocked_predict(matrix):
+        release.wait(5)
+        return {"anomaly_score": [0.1], "iforest_score": [0.1], "graph_risk_score": [0.1], "risk_level": ["low"],
+                "model_confidence": [0.7], "fraud_type_prediction": [None], "features_used": []}
+
+    monkeypatch.setattr(server, "predict_matrix", blocked_predict)
+    body = feature_schema.encode(np.zeros((1, len(feature_schema.FEATURE_ORDER)), dtype=np.float32))
+    async with httpx.AsyncClient(app=server.app, base_url="http://ml") as client:
+        scoring = asyncio.ensure_future(client.post("/predict_batch", content=body, headers=HEADERS))
+        await asyncio.sleep(0.05)
+        health = await asyncio.wait_for(client.get("/health"), timeout=1.0)
+        assert health.status_code == 200
+        assert not scoring.done()
+        release.set()
+        assert (await scoring).status_code == 200
+
+
+def test_saturated_executor_returns_503(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    # The server's own module copy, so its except clause matches
+    full = server.InferenceExecutor(workers=1, max_pending=0)
+    monkeypatch.setattr(server, "executor", full)
+    monkeypatch.setattr(server.batcher, "executor", full)
+    client = TestClient(server.app)
+    body = feature_schema.encode(np.zeros((1, len(feature_schema.FEATURE_ORDER)), dtype=np.float32))
+    for path in ("/predict", "/predict_batch"):
+        response = client.post(path, content=body, headers=HEADERS)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    assert client.get("/metrics").json()["executor"]["rejected"] == 2
+    full.shutdown()
@@ -0,0 +1,140 @@
+import sys
+import threading
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from ml.registry import ModelRegistry, ModelReloadError, ReloadInProgress
+
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
+
+import inference as service_inference  # noqa: E402  (the module server.py uses)
+import server  # noqa: E402
+from pipelines import feature_schema  # noqa: E402
+
+
+def _versions(tmp_path, *names, current=None):
+    for name in names:
+        (tmp_path / "versions" / name).mkdir(parents=True)
+    if current:
+        (tmp_path / "CURRENT").write_text(current + "\n")
+    return tmp_path
+
+
+def _marker_reader(model_dir):
+    # "Model" is the version directory it came from; a BROKEN file fails the load
+    if (Path(model_dir) / "BROKEN").exists():
+        raise EOFError("truncated artifact")
+    return Path(model_dir).name, None
+
+
+def test_resolve_versions(tmp_path):
+    registry = ModelRegistry(str(_versions(tmp_path, "v1", "v2", current="v1")), {"ae": _marker_reader})
+    assert registry.current.version == "v1"
+    (tmp_path / "CURRENT").unlink()
+    assert registry.resolve()[0] == "v2"
+    with pytest.raises(ValueError):
+        registry.resolve("../v1")
+    with pytest.raises(FileNotFoundError):
+        registry.resolve("v9")
+    assert ModelRegistry(str(tmp_path / "versions" / "v1"), {}).current.version == "unversioned"
+
+
+def test_reload_swaps_while_pinned_requests_finish_on_old_version(tmp_path):
+    registry = ModelRegistry(str(_versions(tmp_path, "v1", "v2", current="v1")), {"ae": _marker_reader})
+    registry.warmup()
+
+    with registry.pinned() as in_flight:
+        assert registry.get("ae")[0] == "v1"
+        registry.reload("v2")
+        # Same request after the swap: still the version it started with
+        assert registry.get("ae")[0] == "v1"
+        assert in_flight.version == "v1"
+    assert registry.get("ae")[0] == "v2"
+    assert registry.stats()["version"] == "v2"
+    assert registry.stats()["reloads"]["succeeded"] == 1
+    # Reloading the serving version is a no-op unless forced
+    assert registry.reload("v2") is registry.current
+
+
+def test_broken_version_is_rejected_and_current_keeps_serving(tmp_path):
+    registry = ModelRegistry(str(_versions(tmp_path, "v1", "v2", current="v1")), {"ae": _marker_reader})
+    registry.warmup()
+    (tmp_path / "versions" / "v2" / "BROKEN").touch()
+
+    with pytest.raises(ModelReloadError, match="truncated artifact"):
+        registry.reload("v2")
+    assert registry.get("ae")[0] == "v1"
+    reloads = registry.stats()["reloads"]
+    assert reloads["failed"] == 1 and reloads["failed_version"] == "v2"
+
+    def failing_warmup():
+        raise RuntimeError("NaN scores")
+
+    (tmp_path / "versions" / "v2" / "BROKEN").unlink()
+    with pytest.raises(ModelReloadError, match="NaN scores"):
+        registry.reload("v2", warmup_calls=[failing_warmup])
+    assert registry.current.version == "v1"
+
+
+def test_one_reload_at_a_time(tmp_path):
+    registry = ModelRegistry(str(_versions(tmp_path, "v1", "v2", "v3", current="v1")), {"ae": _marker_reader})
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_warmup():
+        entered.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=registry.reload, args=("v2", [slow_warmup]))
+    thread.start()
+    entered.wait(5)
+    try:
+        with pytest.raises(ReloadInProgress):
+            registry.reload("v3")
+    finally:
+        release.set()
+        thread.join()
+    assert registry.current.version == "v2"
+
+
+@pytest.fixture
+def versioned_models(tmp_path, monkeypatch):
+    from sklearn.ensemble import IsolationForest
+
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(200, len(feature_schema.FEATURE_ORDER)))
+    for version, seed in (("v1", 0), ("v2", 1)):
+        path = tmp_path / "versions" / version
+        path.mkdir(parents=True)
+        joblib.dump(IsolationForest(n_estimators=5, random_state=seed).fit(train), path / "isolation_forest.pkl")
+    (tmp_path / "CURRENT").write_text("v1")
+    registry = ModelRegistry(str(tmp_path), {
+        "autoencoder": service_inference._read_ae,
+        "isolation_forest": service_inference._read_iforest,
+        "gnn": service_inference._read_gnn,
+    })
+    monkeypatch.setattr(service_inference, "registry", registry)
+    monkeypatch.setattr(server, "registry", registry)
+    monkeypatch.setattr(server, "MODEL_ADMIN_TOKEN", "s3cret")
+    return registry
+
+
+def test_admin_reload_and_responses_report_version(versioned_models):
+    client = TestClient(server.app)
+    headers = {"Content-Type": feature_schema.CONTENT_TYPE}
+    row = feature_schema.encode(np.zeros((1, len(feature_schema.FEATURE_ORDER)), dtype=np.float32))
+
+    assert client.post("/predict", content=row, headers=headers).json()["model_version"] == "v1"
+    assert client.post("/admin/reload?version=v2").status_code == 403
+    response = client.post("/admin/reload?version=v2", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json()["previous_version"] == "v1"
+    assert response.json()["model_version"] == "v2"
+    assert client.post("/predict", content=row, headers=headers).json()["model_version"] == "v2"
+    assert client.post("/predict_batch", content=row, headers=headers).json()["model_version"] == "v2"
+    assert client.post("/admin/reload?version=v7", headers={"X-Admin-Token": "s3cret"}).status_code == 404
@@ -1,6 +1,7 @@
 import math
 import types
 import numpy as np
+import pytest
 from ml import inference
 
 
@@ -69,3 +70,145 @@ def test_combined_fraud_score_range():
         inference._load_ae = orig_load_ae
         inference._load_iforest = orig_load_if
         inference._load_gnn = orig_load_gnn
+
+
+@pytest.mark.filterwarnings("ignore::sklearn.exceptions.ConvergenceWarning")
+def test_predict_batch_matches_predict_vector(monkeypatch):
+    from sklearn.ensemble import IsolationForest
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(0)
+    n = len(inference.feature_schema.FEATURE_ORDER)
+    train = rng.normal(size=(300, n)).astype(np.float32)
+    scaler = StandardScaler().fit(train)
+    ae = MLPRegressor(hidden_layer_sizes=(8,), max_iter=50, random_state=0).fit(scaler.transform(train), scaler.transform(train))
+    iforest = IsolationForest(n_estimators=20, random_state=0).fit(scaler.transform(train))
+    monkeypatch.setattr(inference, "_load_ae", lambda: (ae, scaler))
+    monkeypatch.setattr(inference, "_load_iforest", lambda: (iforest, scaler))
+    monkeypatch.setattr(inference, "_load_gnn", lambda: (None, None))
+
+    matrix = np.vstack([train[:5], rng.normal(scale=6.0, size=(3, n))]).astype(np.float32)
+    batch = inference.predict_batch(matrix)
+
+    assert len(batch["fraud_score"]) == len(matrix)
+    for i in range(len(matrix)):
+        row = inference.predict_vector(matrix[i:i + 1])
+        for name in ("anomaly_score", "iforest_score", "graph_risk_score", "fraud_score"):
+            assert math.isclose(batch[name][i], row[name], abs_tol=1e-4)
+        assert batch["risk_level"][i] == row["risk_level"]
+    assert inference.predict_batch(matrix[:0])["fraud_score"] == []
+
+
+def test_predict_batch_model_failure_scores_zero(monkeypatch):
+    class Broken:
+        def predict(self, X):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(inference, "_load_ae", lambda: (Broken(), None))
+    monkeypatch.setattr(inference, "_load_iforest", lambda: (None, None))
+    monkeypatch.setattr(inference, "_load_gnn", lambda: (None, None))
+    matrix = np.ones((4, len(inference.feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    # Same as the single-row path: a failing model contributes 0.0
+    assert inference.predict_batch(matrix)["anomaly_score"] == [0.0] * 4
+    assert inference.predict_vector(matrix[:1])["anomaly_score"] == 0.0
+
+
+def test_cascade_skips_later_stages_for_clearly_low_risk_rows(monkeypatch):
+    seen = {}
+
+    def stage(name, column):
+        def scores(X, *args):
+            seen[name] = X[:, 0].tolist()
+            return X[:, column].astype(np.float64)
+        return scores
+
+    monkeypatch.setattr(inference, "_iforest_scores", stage("iforest", 1))
+    monkeypatch.setattr(inference, "_ae_scores", stage("autoencoder", 2))
+    monkeypatch.setattr(inference, "_gnn_scores", stage("gnn", 3))
+    monkeypatch.setattr(inference, "_load_ae", lambda: (object(), None))
+    monkeypatch.setattr(inference, "_load_iforest", lambda: (object(), None))
+    monkeypatch.setattr(inference, "_load_gnn", lambda: (object(), None))
+    monkeypatch.setattr(inference, "CASCADE_MODE", True)
+    monkeypatch.setattr(inference, "CASCADE_MARGIN", 20.0)
+    # Exit while the partial score (88 x anomaly) is below 50 - 20 points
+    matrix = np.zeros((3, len(inference.feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    matrix[:, 0] = [0, 1, 2]                # row id
+    matrix[:, 1] = [0.1, 0.4, 0.9]          # IF
+    matrix[:, 2] = [0.9, 0.2, 0.9]          # AE
+    matrix[:, 3] = [0.9, 0.9, 0.9]          # GNN
+
+    batch = inference.predict_batch(matrix)
+
+    assert seen == {"iforest": [0, 1, 2], "autoencoder": [1, 2], "gnn": [2]}
+    assert batch["cascade_stages"] == [["iforest"], ["iforest", "autoencoder"], ["iforest", "autoencoder", "gnn"]]
+    assert batch["anomaly_score"] == [0.1, 0.3, 0.9]
+    assert batch["graph_risk_score"] == [0.08, 0.24, 0.9]
+    assert all(score < inference.RISK_SCORE_MEDIUM for score in batch["fraud_score"][:2])
+    assert inference.predict_vector(matrix[:1])["cascade_stages"] == ["iforest"]
+
+
+def test_parallel_models_replace_an_overrunning_model_with_the_fallback(monkeypatch):
+    import threading
+
+    release = threading.Event()
+
+    def slow_gnn(X, *args):
+        release.wait(5)
+        return np.ones(X.shape[0])
+
+    monkeypatch.setattr(inference, "_iforest_scores", lambda X, *args: np.full(X.shape[0], 0.5))
+    monkeypatch.setattr(inference, "_gnn_scores", slow_gnn)
+    monkeypatch.setattr(inference, "_load_ae", lambda: (None, None))
+    monkeypatch.setattr(inference, "_load_iforest", lambda: (object(), None))
+    monkeypatch.setattr(inference, "_load_gnn", lambda: (object(), None))
+    monkeypatch.setattr(inference, "MODEL_PARALLEL", True)
+    monkeypatch.setattr(inference, "MODEL_TIMEOUT_MS", 50.0)
+    before = inference.parallel_stats()["timeouts"]["gnn"]
+    matrix = np.zeros((2, len(inference.feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    try:
+        batch = inference.predict_batch(matrix)
+        row = inference.predict_vector(matrix[:1])
+    finally:
+        release.set()
+
+    assert batch["iforest_score"] == [0.5, 0.5]
+    assert batch["graph_risk_score"] == [0.4, 0.4]  # anomaly x 0.8, as without a GNN
+    assert row["graph_risk_score"] == 0.4
+    assert inference.parallel_stats()["timeouts"]["gnn"] == before + 2
+
+
+def test_parallel_model_timeout_includes_queueing(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(1)
+    busy = threading.Event()
+    pool.submit(busy.wait, 0.5)  # an earlier prediction's model holds the only thread past the timeout
+    monkeypatch.setattr(inference, "_model_pool", pool)
+    monkeypatch.setattr(inference, "MODEL_PARALLEL", True)
+    monkeypatch.setattr(inference, "MODEL_TIMEOUT_MS", 50.0)
+    monkeypatch.setattr(inference, "MODEL_TIMEOUTS_MS", {"gnn": 100.0})
+    before = inference.parallel_stats()
+    ran = []
+    start = time.monotonic()
+    try:
+        scores = inference._run_models({
+            "autoencoder": lambda: ran.append("autoencoder"),
+            "isolation_forest": None,
+            "gnn": lambda: ran.append("gnn"),
+        })
+        elapsed = time.monotonic() - start
+    finally:
+        busy.set()
+        pool.shutdown()
+
+    # Neither model got the thread within its timeout: both fall back, and neither runs later
+    assert scores == {"autoencoder": None, "isolation_forest": None, "gnn": None}
+    assert elapsed < 0.3
+    assert ran == []
+    stats = inference.parallel_stats()
+    assert stats["queue_timeouts"]["gnn"] == before["queue_timeouts"]["gnn"] + 1
+    assert stats["timeouts"]["autoencoder"] == before["timeouts"]["autoencoder"] + 1
+    assert stats["timeout_ms"] == {"autoencoder": 50.0, "isolation_forest": 50.0, "gnn": 100.0}
@@ -0,0 +1,92 @@
+import subprocess
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+
+from ml import inference
+from ml.numpy_autoencoder import NumpyAutoencoder
+from ml.training.export_autoencoder import export_autoencoder, reference_error
+
+N_FEATURES = 12
+
+
+def _training_rows(rng):
+    # Non-zero means and uneven scales, so a wrongly folded scaler shows up
+    return rng.normal(size=(500, N_FEATURES)) * rng.uniform(0.5, 50.0, N_FEATURES) + rng.uniform(-20, 20, N_FEATURES)
+
+
+@pytest.fixture
+def mlp_autoencoder():
+    rng = np.random.default_rng(1)
+    train = _training_rows(rng)
+    scaler = StandardScaler().fit(train)
+    scaled = scaler.transform(train)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = MLPRegressor(hidden_layer_sizes=(16, 8, 16), max_iter=50, random_state=0).fit(scaled, scaled)
+    return model, scaler, _training_rows(rng)
+
+
+def test_matches_mlp_autoencoder(mlp_autoencoder):
+    model, scaler, X = mlp_autoencoder
+    exported = NumpyAutoencoder.from_model(model, scaler, dtype=np.float64)
+
+    np.testing.assert_allclose(exported.reconstruction_error(X), reference_error(model, scaler, X), rtol=1e-9)
+    np.testing.assert_allclose(
+        inference._ae_scores(X, exported, None), inference._ae_scores(X, model, scaler), atol=1e-9,
+    )
+
+
+def test_matches_keras_autoencoder():
+    keras = pytest.importorskip("tensorflow.keras")
+    rng = np.random.default_rng(2)
+    train = _training_rows(rng)
+    scaler = StandardScaler().fit(train)
+    inputs = keras.layers.Input(shape=(N_FEATURES,))
+    hidden = keras.layers.Dense(16, activation="relu")(inputs)
+    hidden = keras.layers.Dense(8, activation="relu")(hidden)
+    hidden = keras.layers.Dense(16, activation="relu")(hidden)
+    model = keras.models.Model(inputs, keras.layers.Dense(N_FEATURES, activation="linear")(hidden))
+    model.fit(scaler.transform(train), scaler.transform(train), epochs=2, verbose=0)
+
+    X = _training_rows(rng)
+    exported = NumpyAutoencoder.from_keras(model, scaler)
+    np.testing.assert_allclose(exported.reconstruction_error(X), reference_error(model, scaler, X), rtol=1e-4)
+
+
+def test_export_round_trip_is_preferred_by_loader(tmp_path, mlp_autoencoder):
+    model, scaler, X = mlp_autoencoder
+    worst = export_autoencoder(model, scaler, str(tmp_path / "autoencoder.npz"))
+    assert worst < 1e-4
+
+    ae, aux = inference._read_ae(str(tmp_path))
+
+    assert isinstance(ae, NumpyAutoencoder) and aux is None
+    assert ae.weights[0].dtype == np.float32
+    np.testing.assert_allclose(
+        inference._ae_scores(X, ae, aux), inference._ae_scores(X, model, scaler), atol=1e-5,
+    )
+
+
+def test_export_rejects_unsupported_models():
+    with pytest.raises(TypeError):
+        NumpyAutoencoder.from_model(object())
+    with pytest.raises(ValueError):
+        NumpyAutoencoder([np.ones((4, 2))], [np.zeros(2)], ["relu"], np.ones(4))
+
+
+def test_scoring_does_not_import_tensorflow(tmp_path, mlp_autoencoder):
+    model, scaler, X = mlp_autoencoder
+    export_autoencoder(model, scaler, str(tmp_path / "autoencoder.npz"))
+    script = (
+        "import sys, numpy as np; from ml import inference; "
+        f"ae, aux = inference._read_ae({str(tmp_path)!r}); "
+        f"inference._ae_scores(np.zeros((4, {N_FEATURES})), ae, aux); "
+        "assert 'tensorflow' not in sys.modules and 'keras' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=Path(__file__).resolve().parents[2])
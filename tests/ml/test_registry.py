@@ -0,0 +1,98 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from ml.registry import ModelRegistry
+
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
+
+import server  # noqa: E402
+
+
+def _counting(result=None, error=None, delay=0.0):
+    calls = []
+
+    def reader(model_dir):
+        calls.append(model_dir)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return result() if callable(result) else result
+
+    return reader, calls
+
+
+def test_failures_and_missing_files_are_cached():
+    broken, broken_calls = _counting(error=EOFError("empty pickle"))
+    missing, missing_calls = _counting(result=None)
+    registry = ModelRegistry("/models", {"ae": broken, "gnn": missing})
+
+    for _ in range(3):
+        assert registry.get("ae") == (None, None)
+        assert registry.get("gnn") == (None, None)
+
+    assert len(broken_calls) == 1 and len(missing_calls) == 1
+    models = registry.stats()["models"]
+    assert models["ae"]["status"] == "failed"
+    assert models["ae"]["error"] == "EOFError: empty pickle"
+    assert models["gnn"]["status"] == "missing"
+
+    registry.clear()
+    registry.get("ae")
+    assert len(broken_calls) == 2
+
+
+def test_concurrent_first_requests_load_once():
+    reader, calls = _counting(result=("model", "scaler"), delay=0.05)
+    registry = ModelRegistry("/models", {"ae": reader})
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("ae"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [("model", "scaler")] * 8
+
+
+def test_warmup_records_load_stats_and_marks_ready():
+    reader, _ = _counting(result=lambda: (np.ones(100_000), None))
+    registry = ModelRegistry("/models", {"ae": reader}, trace_allocations=True)
+    warmed = []
+
+    def failing_call():
+        raise RuntimeError("warmup rows rejected")
+
+    assert not registry.ready
+    registry.warmup(lambda: warmed.append(True), failing_call)
+
+    stats = registry.stats()
+    assert stats["ready"] and warmed == [True]
+    assert stats["warmup_seconds"] >= 0.0
+    assert stats["models"]["ae"]["status"] == "loaded"
+    # The loaded array was allocated inside the reader
+    assert stats["models"]["ae"]["traced_bytes"] >= 800_000
+
+
+def test_ready_endpoint_gated_on_warmup(monkeypatch):
+    reader, _ = _counting(result=("model", None))
+    registry = ModelRegistry("/models", {"autoencoder": reader})
+    monkeypatch.setattr(server, "registry", registry)
+    client = TestClient(server.app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["detail"]["ready"] is False
+    # Liveness does not wait for models
+    assert client.get("/health").status_code == 200
+
+    registry.warmup()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["models"]["autoencoder"]["status"] == "loaded"
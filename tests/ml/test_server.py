@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
+
+import server  # noqa: E402
+from pipelines import feature_schema  # noqa: E402
+
+client = TestClient(server.app)
+HEADERS = {"Content-Type": feature_schema.CONTENT_TYPE}
+
+
+def _row(amount):
+    row = np.zeros((1, len(feature_schema.FEATURE_ORDER)), dtype=np.float32)
+    row[0, feature_schema.FEATURE_INDEX["amount"]] = amount
+    return row
+
+
+def test_predict_scores_binary_feature_row():
+    response = client.post("/predict", content=feature_schema.encode(_row(5000.0)), headers=HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    # Heuristic path (no models in the test tree) reads the amount column
+    assert body["anomaly_score"] == 0.6
+    assert body["features_used"] == list(feature_schema.FEATURE_ORDER)
+
+
+def test_predict_rejects_json_and_other_schemas():
+    response = client.post("/predict", json={"features": {"amount": 10}})
+    assert response.status_code == 415
+
+    body = bytearray(feature_schema.encode(_row(10.0)))
+    body[4] += 1  # schema version
+    response = client.post("/predict", content=bytes(body), headers=HEADERS)
+    assert response.status_code == 422
+    assert response.json()["detail"]["feature_schema"] == feature_schema.schema_info()
+
+    two_rows = feature_schema.encode(np.vstack([_row(1.0), _row(2.0)]))
+    assert client.post("/predict", content=two_rows, headers=HEADERS).status_code == 422
+
+
+def test_health_reports_feature_schema():
+    assert client.get("/health").json()["feature_schema"] == feature_schema.schema_info()
+
+
+def test_predict_batch_scores_every_row():
+    matrix = np.vstack([_row(amount) for amount in (0.0, 2500.0, 5000.0)])
+    response = client.post("/predict_batch", content=feature_schema.encode(matrix), headers=HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["rows"] == 3
+    assert body["anomaly_score"] == [0.1, 0.35, 0.6]
+    single = client.post("/predict", content=feature_schema.encode(matrix[2:]), headers=HEADERS).json()
+    assert body["combined_risk_score"][2] == single["combined_risk_score"]
+    assert body["risk_level"][2] == single["risk_level"]
+
+
+def test_predict_batch_rejects_oversized_and_json(monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH_ROWS", 2)
+    matrix = np.vstack([_row(1.0)] * 3)
+    response = client.post("/predict_batch", content=feature_schema.encode(matrix), headers=HEADERS)
+    assert response.status_code == 413
+    assert client.post("/predict_batch", json={"rows": []}).status_code == 415
+
+
+def test_metrics_reports_microbatching_histograms():
+    client.post("/predict", content=feature_schema.encode(_row(10.0)), headers=HEADERS)
+    stats = client.get("/metrics").json()["microbatching"]
+    assert stats["batch_size"]["count"] >= 1
+    assert stats["queue_wait_ms"]["count"] >= 1
+
+
+def test_predict_with_entity_keys_feeds_entity_graph():
+    keys = feature_schema.entity_keys({"user_id": "graph-user", "merchant_id": "graph-merchant"}).reshape(1, -1)
+    before = server.entity_graph.stats()["added"]
+
+    for amount in (10.0, 20.0):
+        body = feature_schema.encode_with_entities(_row(amount), keys)
+        assert client.post("/predict", content=body, headers=HEADERS).status_code == 200
+    body = feature_schema.encode_with_entities(np.vstack([_row(1.0), _row(2.0)]), np.vstack([keys, keys * 0]))
+    assert client.post("/predict_batch", content=body, headers=HEADERS).status_code == 200
+
+    assert server.entity_graph.stats()["added"] == before + 3  # the key-less row is not stored
+    assert len(server.entity_graph.sample(keys[0])[0]) == 3
+    metrics = client.get("/metrics").json()
+    assert metrics["entity_graph"]["nodes"] >= 3
+    assert metrics["gnn_embeddings"]["enabled"] is True
+